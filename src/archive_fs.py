@@ -0,0 +1,339 @@
+"""
+压缩包虚拟文件系统模块
+不解压到磁盘，直接列出和读取压缩包（含嵌套压缩包）中的成员。
+成员用 "<压缩包路径>!/<成员名>" 形式的虚拟路径表示，嵌套时逐层追加 "!/<成员名>"，
+原压缩包保持不变
+"""
+import io
+import os
+import tarfile
+import time
+import zipfile
+from contextlib import ExitStack, contextmanager
+from typing import BinaryIO, Iterator, List, Optional, TextIO, Tuple
+
+from config import ARCHIVE_MAX_DEPTH, ARCHIVE_MAX_MEMBER_BYTES, VERBOSE_LOGGING
+from file_index import FileEntry
+
+# 虚拟路径中压缩包与成员名之间的分隔符
+MEMBER_SEPARATOR = "!/"
+
+_TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# 已提示过缺少依赖的压缩格式，避免每个文件重复提示
+_warned_missing = set()
+
+
+def archive_kind(name: str) -> Optional[str]:
+    """
+    根据文件名判断压缩格式
+
+    Args:
+        name: 文件名或路径
+
+    Returns:
+        'zip'、'rar'、'7z'、'tar'，不是支持的压缩格式时返回 None
+    """
+    lower = name.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    if lower.endswith('.rar'):
+        return 'rar'
+    if lower.endswith('.7z'):
+        return '7z'
+    if lower.endswith(_TAR_SUFFIXES):
+        return 'tar'
+    return None
+
+
+def is_virtual_path(path: str) -> bool:
+    """判断路径是否指向压缩包内的成员"""
+    return MEMBER_SEPARATOR in path
+
+
+def split_virtual_path(path: str) -> Tuple[str, List[str]]:
+    """
+    拆分虚拟路径
+
+    Args:
+        path: 虚拟路径
+
+    Returns:
+        (磁盘上的压缩包路径, 逐层的成员名列表)
+    """
+    parts = path.split(MEMBER_SEPARATOR)
+    return parts[0], parts[1:]
+
+
+class _ZipArchive:
+    def __init__(self, fileobj: BinaryIO):
+        self._zf = zipfile.ZipFile(fileobj)
+        self._infos = {_zip_member_name(info): info
+                       for info in self._zf.infolist() if not info.is_dir()}
+
+    def members(self) -> Iterator[Tuple[str, int, float]]:
+        for name, info in self._infos.items():
+            yield name, info.file_size, _zip_mtime(info)
+
+    def open(self, name: str) -> BinaryIO:
+        return self._zf.open(self._infos[name])
+
+    def close(self) -> None:
+        self._zf.close()
+
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    # 未设置 UTF-8 标志的文件名按 cp437 解码，中文 Windows 打包的文件名实际多为 GBK
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('gbk')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _zip_mtime(info: zipfile.ZipInfo) -> float:
+    try:
+        return time.mktime(info.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return 0.0
+
+
+class _TarArchive:
+    def __init__(self, fileobj: BinaryIO):
+        self._tf = tarfile.open(fileobj=fileobj, mode='r:*')
+
+    def members(self) -> Iterator[Tuple[str, int, float]]:
+        for member in self._tf.getmembers():
+            if member.isfile():
+                yield member.name, member.size, float(member.mtime)
+
+    def open(self, name: str) -> BinaryIO:
+        return self._tf.extractfile(name)
+
+    def close(self) -> None:
+        self._tf.close()
+
+
+class _RarArchive:
+    def __init__(self, fileobj: BinaryIO):
+        import rarfile
+
+        self._rf = rarfile.RarFile(fileobj)
+
+    def members(self) -> Iterator[Tuple[str, int, float]]:
+        for info in self._rf.infolist():
+            if not info.is_dir():
+                mtime = info.mtime.timestamp() if info.mtime else 0.0
+                yield info.filename, info.file_size, mtime
+
+    def open(self, name: str) -> BinaryIO:
+        return self._rf.open(name)
+
+    def close(self) -> None:
+        self._rf.close()
+
+
+class _SevenZipArchive:
+    def __init__(self, fileobj: BinaryIO):
+        import py7zr
+
+        self._archive = py7zr.SevenZipFile(fileobj, 'r')
+
+    def members(self) -> Iterator[Tuple[str, int, float]]:
+        for info in self._archive.list():
+            if not info.is_directory:
+                mtime = info.creationtime.timestamp() if info.creationtime else 0.0
+                yield info.filename, info.uncompressed, mtime
+
+    def open(self, name: str) -> BinaryIO:
+        # 7z 为固实压缩，只能整体解码后取出目标成员
+        data = self._archive.read(targets=[name])[name]
+        self._archive.reset()
+        return data
+
+    def close(self) -> None:
+        self._archive.close()
+
+
+_ARCHIVE_CLASSES = {
+    'zip': _ZipArchive,
+    'tar': _TarArchive,
+    'rar': _RarArchive,
+    '7z': _SevenZipArchive,
+}
+
+
+def _open_archive(kind: str, fileobj: BinaryIO):
+    return _ARCHIVE_CLASSES[kind](fileobj)
+
+
+@contextmanager
+def open_binary(path: str) -> Iterator[BinaryIO]:
+    """
+    以二进制流方式打开磁盘文件或压缩包成员
+
+    嵌套的压缩包先读入内存再打开，最内层成员以流的方式读取，不写入磁盘。
+
+    Args:
+        path: 文件路径或虚拟路径
+
+    Yields:
+        二进制文件对象
+    """
+    if not is_virtual_path(path):
+        with open(path, 'rb') as f:
+            yield f
+        return
+
+    archive_path, members = split_virtual_path(path)
+    with ExitStack() as stack:
+        fileobj = stack.enter_context(open(archive_path, 'rb'))
+        container = archive_path
+        for depth, name in enumerate(members, 1):
+            archive = _open_archive(archive_kind(container), fileobj)
+            stack.callback(archive.close)
+            stream = archive.open(name)
+            stack.callback(stream.close)
+            if depth < len(members):
+                # 压缩流不支持随机访问，嵌套的压缩包需要整体读入内存
+                fileobj = io.BytesIO(stream.read())
+                container = name
+            else:
+                yield stream
+
+
+def read_bytes(path: str) -> bytes:
+    """
+    读取磁盘文件或压缩包成员的全部内容
+
+    Args:
+        path: 文件路径或虚拟路径
+
+    Returns:
+        文件内容
+    """
+    with open_binary(path) as f:
+        return f.read()
+
+
+@contextmanager
+def open_seekable(path: str) -> Iterator[BinaryIO]:
+    """
+    打开支持随机访问的二进制文件对象（供 PDF、DOCX 等解析库使用）
+
+    Args:
+        path: 文件路径或虚拟路径
+
+    Yields:
+        磁盘文件对象，压缩包成员则为内存中的 BytesIO
+    """
+    if not is_virtual_path(path):
+        with open(path, 'rb') as f:
+            yield f
+    else:
+        yield io.BytesIO(read_bytes(path))
+
+
+@contextmanager
+def open_text(path: str, encoding: str = 'utf-8', errors: str = 'ignore') -> Iterator[TextIO]:
+    """
+    以文本方式打开磁盘文件或压缩包成员（与内置 open 的换行处理一致）
+
+    Args:
+        path: 文件路径或虚拟路径
+        encoding: 文本编码
+        errors: 解码错误处理方式
+
+    Yields:
+        文本文件对象
+    """
+    if not is_virtual_path(path):
+        with open(path, 'r', encoding=encoding, errors=errors) as f:
+            yield f
+        return
+    with open_binary(path) as raw:
+        yield io.TextIOWrapper(raw, encoding=encoding, errors=errors)
+
+
+def list_archive_entries(archive_path: str) -> List[FileEntry]:
+    """
+    列出压缩包（含嵌套压缩包）中的全部文件，只读取目录信息，不解压
+
+    以 '.' 开头的成员（如 __MACOSX 中的 ._ 文件）和超出大小上限的成员被跳过。
+
+    Args:
+        archive_path: 磁盘上的压缩包路径
+
+    Returns:
+        成员的文件条目（path 为虚拟路径），嵌套压缩包的成员紧跟在该压缩包之后
+    """
+    kind = archive_kind(archive_path)
+    if kind is None:
+        return []
+    with open(archive_path, 'rb') as f:
+        return _list_members(archive_path, kind, f, 1)
+
+
+def _list_members(container: str, kind: str, fileobj: BinaryIO, depth: int) -> List[FileEntry]:
+    try:
+        archive = _open_archive(kind, fileobj)
+    except ImportError as e:
+        if kind not in _warned_missing:
+            _warned_missing.add(kind)
+            if VERBOSE_LOGGING:
+                print(f"    - 警告: 缺少 {kind} 格式支持，跳过此类压缩包: {e}")
+        return []
+    except Exception as e:
+        if VERBOSE_LOGGING:
+            print(f"    - 警告: 无法读取压缩包 {os.path.basename(container)}: {e}")
+        return []
+
+    entries: List[FileEntry] = []
+    try:
+        for name, size, mtime in archive.members():
+            if any(part.startswith('.') for part in name.split('/') if part):
+                continue
+            if size > ARCHIVE_MAX_MEMBER_BYTES:
+                if VERBOSE_LOGGING:
+                    print(f"    - 跳过过大的压缩包成员: {name} ({size} 字节)")
+                continue
+
+            path = container + MEMBER_SEPARATOR + name
+            entries.append(FileEntry(path=path, size=size, mtime=mtime,
+                                     ext=os.path.splitext(name)[1].lower()))
+
+            nested_kind = archive_kind(name)
+            if nested_kind and depth < ARCHIVE_MAX_DEPTH:
+                try:
+                    with archive.open(name) as stream:
+                        data = stream.read()
+                except Exception as e:
+                    if VERBOSE_LOGGING:
+                        print(f"    - 警告: 无法读取嵌套压缩包 {name}: {e}")
+                    continue
+                entries.extend(_list_members(path, nested_kind, io.BytesIO(data), depth + 1))
+    except Exception as e:
+        if VERBOSE_LOGGING:
+            print(f"    - 警告: 读取压缩包 {os.path.basename(container)} 目录失败: {e}")
+    finally:
+        archive.close()
+    return entries
+
+
+def expand_archives(entries: List[FileEntry]) -> List[FileEntry]:
+    """
+    在文件列表中展开压缩包，成员紧跟在所属压缩包之后
+
+    Args:
+        entries: 磁盘文件列表
+
+    Returns:
+        包含压缩包成员的文件列表（压缩包本身仍保留在列表中）
+    """
+    expanded: List[FileEntry] = []
+    for entry in entries:
+        expanded.append(entry)
+        if archive_kind(entry.path):
+            expanded.extend(list_archive_entries(entry.path))
+    return expanded
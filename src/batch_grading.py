@@ -0,0 +1,412 @@
+"""
+批量评分模块
+通过 OpenAI 兼容的 Batch API 评分：所有评分请求写入 JSONL 文件上传并创建批处理任务，
+轮询到任务结束后把结果映射回各学生，失败的请求在下一轮单独重新提交
+"""
+import hashlib
+import io
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL,
+    LLM_BATCH_DIR, LLM_BATCH_ENDPOINT, LLM_BATCH_COMPLETION_WINDOW, LLM_BATCH_POLL_INTERVAL,
+    LLM_BATCH_MAX_REQUESTS, LLM_BATCH_MAX_ATTEMPTS, SIMILARITY_SHARE_DUPLICATE_GRADES,
+    VERBOSE_LOGGING
+)
+from models import Grade, ProcessingResult, ScoreResult
+from llm_client import (
+    SYSTEM_PROMPT, build_chunk_requests, build_scoring_messages, completion_params,
+    ensure_openai, lookup_cache, parse_scoring_response, store_cache, ungraded_result
+)
+from chunked_grading import needs_chunking, parse_chunk_response, build_reduce_messages
+from llm_usage import record_usage
+from tracing import traced
+from similarity import exact_fingerprint, shared_grade
+import metrics
+
+# 批处理任务的终止状态
+_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+@dataclass
+class _Job:
+    """
+    一个学生的评分任务
+
+    整篇评分只有一个 score 请求；分块评分先提交各块的 chunk 请求，全部完成后再提交 reduce 请求。
+    """
+    index: int
+    result: ProcessingResult
+    # 评分请求的消息（同时作为 LLM 缓存的键）
+    messages: List[Dict[str, str]]
+    chunks: Optional[List[List[Dict[str, str]]]] = None
+    notes: Dict[int, Dict] = field(default_factory=dict)
+    # {请求 ID: 已提交次数}
+    attempts: Dict[str, int] = field(default_factory=dict)
+    # 最近一次请求失败的原因
+    last_error: Optional[str] = None
+    # 最终失败的原因（某个请求的提交次数用完）
+    error: Optional[str] = None
+    done: bool = False
+
+    def outstanding(self, rubric: str) -> List[Tuple[str, List[Dict[str, str]]]]:
+        """
+        本轮需要提交的请求
+
+        Returns:
+            [(请求 ID, 消息列表)]
+        """
+        if self.done or self.error:
+            return []
+        if self.chunks is None:
+            return [(f"{self.index}-score", self.messages)]
+        missing = [(f"{self.index}-chunk-{i}", messages)
+                   for i, messages in enumerate(self.chunks) if i not in self.notes]
+        if missing:
+            return missing
+        notes = [self.notes[i] for i in range(len(self.chunks))]
+        return [(f"{self.index}-reduce", build_reduce_messages(notes, rubric, SYSTEM_PROMPT))]
+
+
+class BatchGrader:
+    """
+    Batch API 评分器
+
+    每一轮把所有未完成的请求按 LLM_BATCH_MAX_REQUESTS 拆成若干批处理任务同时提交，
+    等待全部结束后解析输出文件和错误文件；出错、缺失或无法解析的请求在下一轮重新提交，
+    每个请求最多提交 LLM_BATCH_MAX_ATTEMPTS 次。
+
+    已提交的任务按请求文件的内容摘要记录在 LLM_BATCH_DIR 中，程序中断后重新运行时
+    （请求内容相同）直接继续等待原来的任务，不会重复提交。
+    """
+
+    def __init__(self, client=None, poll_interval: float = LLM_BATCH_POLL_INTERVAL):
+        if client is None:
+            ensure_openai()
+            from openai import OpenAI
+            client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+        self.client = client
+        self.poll_interval = poll_interval
+        self._state_path = os.path.join(str(LLM_BATCH_DIR), "batches.json")
+
+    def grade(self, results: List[ProcessingResult], rubric: str) -> None:
+        """
+        为一组学生评分，结果写入各自的 score_result
+
+        前序阶段已失败的学生跳过；命中 LLM 缓存的学生不提交请求；
+        内容完全相同的提交只提交一次，其余学生共用该评分。
+
+        Args:
+            results: 已提取文本的处理结果
+            rubric: 评分标准
+        """
+        jobs = []
+        leaders: Dict[str, ProcessingResult] = {}
+        duplicates: List[Tuple[ProcessingResult, ProcessingResult]] = []
+        for index, result in enumerate(results):
+            if result.errors:
+                continue
+            fingerprint = (exact_fingerprint(result.content)
+                           if SIMILARITY_SHARE_DUPLICATE_GRADES else None)
+            if fingerprint is not None:
+                if fingerprint in leaders:
+                    duplicates.append((result, leaders[fingerprint]))
+                    continue
+                leaders[fingerprint] = result
+            messages = build_scoring_messages(result.content, rubric)
+            cached = lookup_cache(messages)
+            if cached is not None:
+                _set_score(result, cached)
+                continue
+            job = _Job(index=index, result=result, messages=messages)
+            if needs_chunking(result.content):
+                job.chunks = build_chunk_requests(result.content, rubric)
+            jobs.append(job)
+
+        round_number = 0
+        while True:
+            requests: Dict[str, Tuple[_Job, List[Dict[str, str]]]] = {}
+            for job in jobs:
+                outstanding = job.outstanding(rubric)
+                if any(job.attempts.get(custom_id, 0) >= LLM_BATCH_MAX_ATTEMPTS
+                       for custom_id, _ in outstanding):
+                    job.error = f"提交 {LLM_BATCH_MAX_ATTEMPTS} 次均失败: {job.last_error}"
+                    continue
+                for custom_id, messages in outstanding:
+                    requests[custom_id] = (job, messages)
+            if not requests:
+                break
+
+            round_number += 1
+            if round_number > 1:
+                metrics.add('llm_batch', 'resubmitted', sum(
+                    1 for custom_id, (job, _) in requests.items() if job.attempts.get(custom_id)))
+            if VERBOSE_LOGGING:
+                print(f"\n批量评分第 {round_number} 轮: 提交 {len(requests)} 个请求")
+            for custom_id, (job, _) in requests.items():
+                job.attempts[custom_id] = job.attempts.get(custom_id, 0) + 1
+
+            outputs = self.run({custom_id: messages for custom_id, (_, messages) in requests.items()})
+            for custom_id, (job, _) in requests.items():
+                content, error = outputs.get(custom_id, (None, "批处理任务没有返回该请求的结果"))
+                _apply_output(job, custom_id, content, error)
+
+        for job in jobs:
+            if not job.done:
+                metrics.add('llm_batch', 'failed', 1)
+                if VERBOSE_LOGGING:
+                    print(f"  - 批量评分失败 {job.result.submission.folder_name}: {job.error}")
+                _set_score(job.result, ungraded_result(
+                    f"LLM分析失败，请手动评分。错误信息: {job.error}"))
+
+        for result, leader in duplicates:
+            leader_score = leader.score_result
+            _set_score(result, shared_grade(
+                Grade(score=leader_score.score, comment=leader_score.comment,
+                      samples=leader_score.samples),
+                leader.submission.folder_name))
+
+    def run(self, requests: Dict[str, List[Dict[str, str]]]
+            ) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        提交一轮请求并等待所有批处理任务结束
+
+        Args:
+            requests: {请求 ID: 消息列表}
+
+        Returns:
+            {请求 ID: (返回的消息内容, 错误信息)}，没有结果的请求不出现在字典中
+        """
+        items = list(requests.items())
+        batch_ids = []
+        for start in range(0, len(items), LLM_BATCH_MAX_REQUESTS):
+            batch_ids.append(self._submit(items[start:start + LLM_BATCH_MAX_REQUESTS]))
+
+        outputs: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        for batch_id in batch_ids:
+            outputs.update(self._collect(self._wait(batch_id)))
+            # 结果已取回（成功的结果已写入 LLM 缓存），之后同样内容的请求重新提交
+            self._forget(batch_id)
+        return outputs
+
+    def _submit(self, items: List[Tuple[str, List[Dict[str, str]]]]) -> str:
+        """写出请求文件并创建批处理任务，同样内容的任务已提交过时直接复用"""
+        lines = [json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": LLM_BATCH_ENDPOINT,
+            "body": completion_params(messages),
+        }, ensure_ascii=False) for custom_id, messages in items]
+        data = ("\n".join(lines) + "\n").encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+
+        state = self._load_state()
+        batch_id = state.get(digest)
+        if batch_id:
+            try:
+                status = self.client.batches.retrieve(batch_id).status
+            except Exception as e:
+                status = None
+                if VERBOSE_LOGGING:
+                    print(f"  - 无法查询之前提交的批处理任务 {batch_id}，重新提交: {e}")
+            if status and status not in ('failed', 'cancelled', 'cancelling'):
+                if VERBOSE_LOGGING:
+                    print(f"  - 继续等待已提交的批处理任务 {batch_id}（{status}）")
+                return batch_id
+
+        os.makedirs(str(LLM_BATCH_DIR), exist_ok=True)
+        input_path = os.path.join(str(LLM_BATCH_DIR), f"{digest[:16]}.jsonl")
+        with open(input_path, 'wb') as f:
+            f.write(data)
+
+        uploaded = self.client.files.create(
+            file=(os.path.basename(input_path), io.BytesIO(data)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=LLM_BATCH_ENDPOINT,
+            completion_window=LLM_BATCH_COMPLETION_WINDOW,
+        )
+        state[digest] = batch.id
+        self._save_state(state)
+        metrics.add('llm_batch', 'batches', 1)
+        metrics.add('llm_batch', 'requests', len(items))
+        if VERBOSE_LOGGING:
+            print(f"  - 已提交批处理任务 {batch.id}: {len(items)} 个请求")
+        return batch.id
+
+    def _wait(self, batch_id: str):
+        """轮询直到批处理任务结束"""
+        started = time.monotonic()
+        last_status = None
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if VERBOSE_LOGGING and batch.status != last_status:
+                counts = getattr(batch, 'request_counts', None)
+                progress = (f"（完成 {counts.completed}/{counts.total}，失败 {counts.failed}）"
+                            if counts else "")
+                print(f"  - 批处理任务 {batch_id}: {batch.status}{progress}")
+                last_status = batch.status
+            if batch.status in _FINAL_STATUSES:
+                metrics.add('llm_batch', 'wait_seconds', time.monotonic() - started)
+                return batch
+            time.sleep(self.poll_interval)
+
+    def _collect(self, batch) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        读取批处理任务的输出文件和错误文件
+
+        任务过期或取消时，已完成部分的结果仍在输出文件中。
+        """
+        outputs: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        for file_id in (getattr(batch, 'error_file_id', None), getattr(batch, 'output_file_id', None)):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    custom_id, content, error, usage = _parse_output_line(line)
+                    if content is not None:
+                        record_usage(usage, batch=True)
+                    if custom_id:
+                        outputs[custom_id] = (content, error)
+        if batch.status != 'completed' and VERBOSE_LOGGING:
+            errors = getattr(batch, 'errors', None)
+            print(f"  - 警告: 批处理任务 {batch.id} 状态为 {batch.status}，"
+                  f"返回 {len(outputs)} 个结果{f': {errors}' if errors else ''}")
+        return outputs
+
+    def _forget(self, batch_id: str) -> None:
+        state = self._load_state()
+        remaining = {digest: value for digest, value in state.items() if value != batch_id}
+        if remaining != state:
+            self._save_state(remaining)
+
+    def _load_state(self) -> Dict[str, str]:
+        try:
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, str]) -> None:
+        os.makedirs(os.path.dirname(self._state_path), exist_ok=True)
+        tmp_path = self._state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._state_path)
+
+
+def _parse_output_line(line: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[Dict]]:
+    """
+    解析输出文件或错误文件中的一行
+
+    Returns:
+        (请求 ID, 返回的消息内容, 错误信息, token 用量)
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None, None, None, None
+    custom_id = record.get('custom_id')
+    if record.get('error'):
+        error = record['error']
+        return (custom_id, None,
+                error.get('message', str(error)) if isinstance(error, dict) else str(error), None)
+    response = record.get('response') or {}
+    body = response.get('body') or {}
+    if response.get('status_code', 200) != 200:
+        message = (body.get('error') or {}).get('message') if isinstance(body, dict) else None
+        return custom_id, None, f"HTTP {response.get('status_code')}: {message or body}", None
+    try:
+        return custom_id, body['choices'][0]['message']['content'], None, body.get('usage')
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return custom_id, None, "返回内容格式不正确", None
+
+
+def _apply_output(job: _Job, custom_id: str, content: Optional[str], error: Optional[str]) -> None:
+    """
+    把一个请求的结果写入评分任务；无法解析的结果视为失败，下一轮重新提交
+
+    Args:
+        job: 评分任务
+        custom_id: 请求 ID
+        content: 返回的消息内容
+        error: 错误信息
+    """
+    if error is None:
+        try:
+            kind = custom_id.split('-')[1]
+            if kind == 'chunk':
+                job.notes[int(custom_id.split('-')[2])] = parse_chunk_response(content)
+                return
+            score, comment = parse_scoring_response(content)
+        except Exception as e:
+            error = f"无法解析返回内容: {e}"
+        else:
+            grade = Grade(score=score, comment=comment)
+            store_cache(job.messages, grade)
+            _set_score(job.result, grade)
+            job.done = True
+            return
+
+    metrics.add('llm_batch', 'request_errors', 1)
+    if VERBOSE_LOGGING:
+        print(f"  - 请求 {custom_id}（{job.result.submission.folder_name}）失败: {error}")
+    job.last_error = error
+
+
+def _set_score(result: ProcessingResult, grade: Grade) -> None:
+    submission = result.submission
+    result.score_result = ScoreResult(
+        student_id=submission.student_id,
+        student_name=submission.student_name,
+        folder_name=submission.folder_name,
+        score=grade.score,
+        comment=grade.comment,
+        samples=grade.samples
+    )
+
+
+@traced('llm', size=lambda results, rubric: sum(len(result.content.encode('utf-8'))
+                                                for result in results))
+def grade_in_batches(results: List[ProcessingResult], rubric: str) -> None:
+    """
+    通过 Batch API 为一组学生评分（结果写入各自的 score_result）
+
+    Batch API 不可用（未安装 openai 或没有 API 密钥）时，所有学生记为未评分。
+
+    Args:
+        results: 已提取文本的处理结果
+        rubric: 评分标准
+    """
+    try:
+        grader = BatchGrader()
+    except (ImportError, ValueError) as e:
+        if VERBOSE_LOGGING:
+            print(f"批量评分不可用: {e}")
+        for result in results:
+            if not result.errors:
+                _set_score(result, ungraded_result(f"LLM功能不可用: {e}"))
+        return
+    grader.grade(results, rubric)
+
+
+def get_batch_stats() -> Dict[str, float]:
+    """
+    返回批量评分统计
+
+    Returns:
+        批处理任务数、提交的请求数、重新提交数、请求错误数、最终失败的学生数和累计等待时间
+    """
+    stats = metrics.snapshot('llm_batch')
+    return {
+        'batches': stats.get('batches', 0),
+        'requests': stats.get('requests', 0),
+        'resubmitted': stats.get('resubmitted', 0),
+        'request_errors': stats.get('request_errors', 0),
+        'failed': stats.get('failed', 0),
+        'wait_seconds': stats.get('wait_seconds', 0.0),
+    }
@@ -0,0 +1,235 @@
+"""
+持久化缓存模块
+基于 SQLite 的键值缓存，支持按总大小进行 LRU 淘汰和命中统计
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+# 本进程中创建的缓存实例，按表名登记，用于汇总子进程的命中统计
+_instances: Dict[str, "SQLiteCache"] = {}
+
+# 从子进程合并过来的计数，按表名累计
+_merged_counters: Dict[str, Dict[str, int]] = {}
+
+_COUNTER_NAMES = ('hits', 'memory_hits', 'misses', 'writes', 'evictions')
+
+
+class SQLiteCache:
+    """
+    SQLite 键值缓存
+
+    每个缓存实例对应数据库中的一张表。写入后若总大小超过上限，
+    按最近访问时间淘汰最旧的条目。可在多线程、多进程间共享同一个数据库文件。
+    memory_entries 大于 0 时在数据库前增加一层进程内 LRU 缓存。
+    """
+
+    def __init__(self, db_path: Union[str, Path], table: str, max_bytes: int,
+                 memory_entries: int = 0):
+        self.db_path = str(db_path)
+        self.table = table
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._owner_pid = os.getpid()
+        _instances[table] = self
+
+    def _reset_if_forked(self) -> None:
+        # fork 出的子进程会继承父进程的计数，首次使用时清零，避免重复统计
+        if self._owner_pid != os.getpid():
+            for name in _COUNTER_NAMES:
+                setattr(self, name, 0)
+            self._owner_pid = os.getpid()
+
+    def _connection(self) -> sqlite3.Connection:
+        # 连接不能跨进程复用，fork 出的子进程需要重新连接
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)")
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed "
+                f"ON {self.table}(accessed)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        读取缓存并刷新访问时间
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存值，未命中时返回 None
+        """
+        with self._lock:
+            self._reset_if_forked()
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return self._memory[key]
+
+            conn = self._connection()
+            row = conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(
+                f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def contains(self, key: str) -> bool:
+        """
+        检查缓存中是否存在某个键（不刷新访问时间，不计入命中统计）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            是否存在
+        """
+        with self._lock:
+            if key in self._memory:
+                return True
+            row = self._connection().execute(
+                f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            return row is not None
+
+    def _remember(self, key: str, value: bytes) -> None:
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        写入缓存，必要时淘汰最久未访问的条目
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+        """
+        now = time.time()
+        with self._lock:
+            self._reset_if_forked()
+            conn = self._connection()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} "
+                "(key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now))
+            self.writes += 1
+            self._remember(key, value)
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # 淘汰到上限的 90%，避免每次写入都触发淘汰
+        target = self.max_bytes * 0.9
+        rows = conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY accessed ASC").fetchall()
+        for key, size in rows:
+            if total <= target:
+                break
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.commit()
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        返回缓存统计信息
+
+        Returns:
+            命中（含内存命中）、未命中、写入、淘汰次数以及当前条目数和总大小
+        """
+        with self._lock:
+            conn = self._connection()
+            entries, total = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        merged = _merged_counters.get(self.table, {})
+        stats = {name: getattr(self, name) + merged.get(name, 0)
+                 for name in _COUNTER_NAMES}
+        stats['entries'] = entries
+        stats['bytes'] = total
+        return stats
+
+    def drain_counters(self) -> Dict[str, int]:
+        """
+        取出并清零本进程的计数（供子进程上报给主进程）
+
+        Returns:
+            自上次取出以来的计数
+        """
+        with self._lock:
+            self._reset_if_forked()
+            counters = {name: getattr(self, name) for name in _COUNTER_NAMES}
+            for name in _COUNTER_NAMES:
+                setattr(self, name, 0)
+        return counters
+
+
+def drain_all_counters() -> Dict[str, Dict[str, int]]:
+    """
+    取出本进程所有缓存实例的计数
+
+    从父进程继承而来、在本进程中从未使用过的实例会被跳过，
+    它们的锁可能在 fork 时正被父进程的其他线程持有。
+
+    Returns:
+        {表名: 计数}
+    """
+    pid = os.getpid()
+    return {table: cache.drain_counters() for table, cache in _instances.items()
+            if cache._owner_pid == pid}
+
+
+def merge_all_counters(counters: Dict[str, Dict[str, int]]) -> None:
+    """
+    将子进程上报的计数合并到本进程的统计中
+
+    Args:
+        counters: drain_all_counters() 的返回值
+    """
+    for table, values in counters.items():
+        merged = _merged_counters.setdefault(table, dict.fromkeys(_COUNTER_NAMES, 0))
+        for name in _COUNTER_NAMES:
+            merged[name] += values.get(name, 0)
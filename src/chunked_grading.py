@@ -0,0 +1,227 @@
+"""
+长文本分块评分模块
+学生内容超出 token 预算时，按文件和章节边界切分为若干块，
+各块对照评分标准逐项摘录证据（map），最后由一次汇总调用给出最终分数和评语（reduce）
+"""
+import json
+import re
+from typing import Dict, List, Optional
+
+from config import LLM_CONTENT_TOKEN_BUDGET, LLM_CHUNK_TOKENS
+from tokenizer import count_tokens, fits_budget, split_by_tokens
+from llm_resilience import load_json_object
+
+# 章节边界: 文件分隔头、Markdown 标题、"一、"/"第一章" 式中文标题、"1." / "1.2 " 式编号标题
+_SECTION_PATTERN = re.compile(
+    r"^(?:--- 文件: .+ ---"
+    r"|#{1,6}\s+\S.*"
+    r"|[一二三四五六七八九十]+[、.．].*"
+    r"|第[一二三四五六七八九十\d]+[章节部分].*"
+    r"|\d+(?:\.\d+)*[.、．\s]\s*\S.{0,40})$",
+    re.MULTILINE)
+
+# 评分标准条目: Markdown 标题、列表项、编号项
+_CRITERION_PATTERN = re.compile(
+    r"^\s*(?:#{1,6}\s+|[-*+]\s+|\d+[.、．)]\s*|[一二三四五六七八九十]+[、.．]\s*)(\S.*)$",
+    re.MULTILINE)
+
+# 评分标准条目数超过该值时不再逐项列出（多为细则而非评分维度）
+_MAX_CRITERIA = 20
+
+# 未能从评分标准中识别出条目时使用的评估维度
+_DEFAULT_CRITERIA = [
+    "报告格式的清晰性和规范性",
+    "实验要求的覆盖程度",
+    "个性化内容的体现",
+    "分析与思考的深度",
+    "是否疑似大模型直接生成",
+]
+
+CHUNK_SYSTEM_PROMPT = """
+        你是一名经验丰富的大学计算机课程助教，正在分段审阅一份较长的学生软件测试综合实验报告。
+        你每次只会看到报告的一部分，请对照评分标准逐项记录这一部分中的证据和问题，不要打分。
+
+        你的输出必须是一个JSON对象，包含两个键：
+        1. 'findings' (一个对象): 以评分项为键，值为该部分中与此项相关的证据和问题（简明扼要，无相关内容时写"无"）
+        2. 'summary' (一个字符串): 这一部分内容的简要概括
+        """
+
+
+def needs_chunking(student_content: str, budget: Optional[int] = LLM_CONTENT_TOKEN_BUDGET) -> bool:
+    """
+    判断学生内容是否需要分块评分
+
+    Args:
+        student_content: 学生提交的内容
+        budget: token 预算，None 表示不分块
+
+    Returns:
+        是否超出预算
+    """
+    return not fits_budget(student_content, budget)
+
+
+def extract_rubric_criteria(rubric: str) -> List[str]:
+    """
+    从评分标准中识别评分项
+
+    Args:
+        rubric: 评分标准
+
+    Returns:
+        评分项列表，无法识别时返回通用评估维度
+    """
+    criteria = []
+    for match in _CRITERION_PATTERN.finditer(rubric):
+        item = match.group(1).strip().rstrip("：:")
+        if item and item not in criteria:
+            criteria.append(item)
+    if not criteria or len(criteria) > _MAX_CRITERIA:
+        return list(_DEFAULT_CRITERIA)
+    return criteria
+
+
+def split_into_sections(student_content: str) -> List[str]:
+    """
+    按文件分隔头和章节标题将内容切分为若干节
+
+    Args:
+        student_content: 学生提交的内容
+
+    Returns:
+        各节文本（拼接后与原文一致）
+    """
+    starts = [m.start() for m in _SECTION_PATTERN.finditer(student_content) if m.start() > 0]
+    bounds = [0] + starts + [len(student_content)]
+    return [student_content[a:b] for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+def split_into_chunks(student_content: str, max_tokens: int = LLM_CHUNK_TOKENS) -> List[str]:
+    """
+    将内容切分为不超过 token 上限的块
+
+    尽量整节放入同一块，相邻的短节合并；单节超出上限时先填满当前块，其余部分在换行处切开。
+
+    Args:
+        student_content: 学生提交的内容
+        max_tokens: 每块的 token 上限
+
+    Returns:
+        块列表
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for section in split_into_sections(student_content):
+        tokens = count_tokens(section)
+        room = max_tokens - current_tokens
+        if tokens <= room:
+            current.append(section)
+            current_tokens += tokens
+            continue
+        if tokens <= max_tokens:
+            # 整节放得进一个新块，不拆开
+            chunks.append("".join(current))
+            current, current_tokens = [section], tokens
+            continue
+
+        # 超长的节先填满当前块的剩余空间，其余部分按上限切开
+        head = split_by_tokens(section, room)[0] if room > 0 else ""
+        if head:
+            current.append(head)
+        if current:
+            chunks.append("".join(current))
+        pieces = split_by_tokens(section[len(head):], max_tokens)
+        chunks.extend(pieces[:-1])
+        current = [pieces[-1]]
+        current_tokens = count_tokens(pieces[-1])
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def build_chunk_messages(chunk: str, index: int, total: int, rubric: str,
+                         criteria: List[str]) -> List[Dict[str, str]]:
+    """
+    构造单块评估请求的消息列表
+
+    Args:
+        chunk: 块内容
+        index: 块序号（从 1 开始）
+        total: 总块数
+        rubric: 评分标准
+        criteria: 评分项列表
+
+    Returns:
+        chat.completions 接口使用的消息列表
+    """
+    criteria_list = "\n".join(f"        - {item}" for item in criteria)
+    # 块序号和块内容放在最后，各块请求共享评分标准部分的前缀
+    user_prompt = f"""
+        【评分标准】
+        {rubric}
+
+        【评分项】
+{criteria_list}
+
+        请以JSON格式返回下面这一部分的评估笔记，包含 'findings' 和 'summary' 两个键，
+        'findings' 的键使用上面列出的评分项。
+
+        【学生提交内容（第 {index}/{total} 部分）】
+        {chunk}
+        """
+    return [
+        {"role": "system", "content": CHUNK_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def parse_chunk_response(response_content: Optional[str]) -> Dict:
+    """
+    解析单块评估返回的 JSON
+
+    Args:
+        response_content: LLM 返回的消息内容
+
+    Returns:
+        评估笔记字典
+
+    Raises:
+        ValueError: 如果返回内容为空、不是合法 JSON（且无法修复）或不是 JSON 对象
+    """
+    return load_json_object(response_content)
+
+
+def build_reduce_messages(notes: List[Dict], rubric: str,
+                          system_prompt: str) -> List[Dict[str, str]]:
+    """
+    构造汇总评分请求的消息列表
+
+    Args:
+        notes: 按顺序排列的各块评估笔记
+        rubric: 评分标准
+        system_prompt: 评分系统提示词（与整篇评分相同）
+
+    Returns:
+        chat.completions 接口使用的消息列表
+    """
+    total = len(notes)
+    notes_text = "\n\n".join(
+        f"        第 {i}/{total} 部分:\n        {json.dumps(note, ensure_ascii=False)}"
+        for i, note in enumerate(notes, 1))
+    user_prompt = f"""
+        请根据以下【评分标准】对这位学生的【软件测试综合实验报告】进行评分。
+
+        【评分标准】
+        {rubric}
+
+        报告篇幅较长，已分部分别审阅。请综合下面各部分对照评分标准记录的评估笔记评估整份报告，
+        根据10分制评分标准，以JSON格式返回评分结果，包含 'score' 和 'comment' 两个键。
+
+        【各部分评估笔记（共 {total} 部分）】
+{notes_text}
+        """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
@@ -26,19 +26,106 @@ RUBRIC_FILE = TASK_DIR / "criteria" / "criteria.md"
 # 输出文件名
 OUTPUT_FILENAME = "LLM_评分结果.xlsx"
 
+# 报告输出格式: 'xlsx'、'csv'、'parquet'（CSV 在评分过程中持续更新；parquet 需要另外安装可选依赖 pyarrow）
+REPORT_FORMATS = ['xlsx', 'csv']
+
+# 每写入多少行同步一次报告文件
+REPORT_FLUSH_EVERY = 10
+
+# 评分日志文件名（位于学生作业收集目录下，用于崩溃后恢复）
+JOURNAL_FILENAME = ".grading_journal.jsonl"
+
 # === 文件处理配置 ===
 # 支持的文件扩展名
 SUPPORTED_EXTENSIONS = ['*.txt', '*.md', '*.py',
                         '*.java', '*.pdf', '*.docx', '*.doc']
 
+# 单个文件提取文本的字符上限（None 表示不限制），超出后停止解析
+MAX_CHARS_PER_FILE = 200000
+
+# 整份提交提取文本的字符上限（None 表示不限制）
+MAX_CHARS_PER_SUBMISSION = 500000
+
+# 纯文本文件每次读取的字符数
+PLAIN_TEXT_CHUNK_SIZE = 64 * 1024
+
 # 压缩文件扩展名
 ZIP_EXTENSIONS = ['*.zip']
 RAR_EXTENSIONS = ['*.rar']
 
+# 是否以虚拟文件系统方式直接读取压缩包成员（不解压到磁盘，不删除原压缩包）
+# 支持 zip、rar、tar、tar.gz/bz2/xz 和 7z（需要 py7zr），以及压缩包内嵌套的压缩包
+ARCHIVE_VIRTUAL_FS = True
+
+# 压缩包嵌套层数上限
+ARCHIVE_MAX_DEPTH = 3
+
+# 单个压缩包成员的大小上限（字节），超出的成员直接跳过
+ARCHIVE_MAX_MEMBER_BYTES = 200 * 1024 * 1024
+
 # === OCR 配置 ===
 # Tesseract OCR 语言设置
 OCR_LANGUAGES = 'eng+chi_sim'
 
+# 是否按图片自动选择语言模型：先用 OCR_FAST_LANGUAGE 快速识别，
+# 置信度不足时再按是否含有英文单词选用其余语言或完整的 OCR_LANGUAGES 重新识别
+OCR_AUTO_LANGUAGE = True
+
+# 自动选择语言时首先尝试的（较快的）语言模型，需包含在 OCR_LANGUAGES 中
+OCR_FAST_LANGUAGE = 'eng'
+
+# 识别结果的平均单词置信度（0-100）达到该值时直接采用，否则换语言、分辨率或页面分割模式重新识别
+OCR_MIN_CONFIDENCE = 70
+
+# 快速识别时图片的缩放比例（None 表示不做快速识别，直接识别原图），置信度不足时再识别原图；
+# 快速识别的语言设置含中日韩模型时不缩小
+OCR_FAST_PASS_SCALE = 0.5
+
+# 原图识别置信度仍不足时改用的页面分割模式（11 为稀疏文本，适合截图；None 表示不重试）
+OCR_RETRY_PSM = 11
+
+# 置信度低于该值的图片 OCR 文本块在送入 LLM 前替换为简短说明（None 表示不裁剪）
+OCR_MIN_BLOCK_CONFIDENCE = 40
+
+# 是否启用 OCR 结果缓存（按图片内容摘要，跨运行持久化）
+OCR_CACHE_ENABLED = True
+
+# OCR 缓存大小上限（字节）
+OCR_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# 每个进程内存中保留的 OCR 结果条数
+OCR_MEMORY_CACHE_ENTRIES = 2048
+
+# 并行 OCR 批次数（None 表示自动：主进程按 CPU 核数，流水线提取子进程为 1）
+OCR_WORKERS = None
+
+# 每次 tesseract 调用识别的图片数
+OCR_BATCH_SIZE = 16
+
+# 批量识别超时时间（秒/张）
+OCR_BATCH_TIMEOUT = 30
+
+# 是否在识别前预处理图片（缩放到目标 DPI、灰度化、二值化）
+OCR_PREPROCESS_ENABLED = True
+
+# 预处理的目标 DPI：图片 DPI 高于该值时按比例缩小，长边也不超过 A4 纸在该 DPI 下的像素数
+OCR_TARGET_DPI = 300
+
+# 是否二值化（Otsu 阈值）
+OCR_BINARIZE = True
+
+# 短边小于该像素数的图片（图标、项目符号等）不识别
+OCR_MIN_IMAGE_SIDE = 32
+
+# 灰度直方图熵（比特）低于该值的近似纯色图片不识别
+OCR_MIN_ENTROPY = 0.05
+
+# 每份提交最多识别的图片数（None 表示不限制），缓存命中的图片不计入
+OCR_MAX_IMAGES_PER_SUBMISSION = 100
+
+# 每份提交的 OCR 时间预算（秒，None 表示不限制），用完后其余图片跳过
+OCR_MAX_SECONDS_PER_SUBMISSION = 300
+
 # === 评分配置 ===
 # 评分温度参数
 SCORING_TEMPERATURE = 0.2
@@ -46,7 +133,223 @@ SCORING_TEMPERATURE = 0.2
 # 分数范围
 MIN_SCORE = 0
 MAX_SCORE = 10
-DEFAULT_SCORE = 5.0
+
+# === 多次采样评分配置 ===
+# 是否默认启用多次采样一致性评分：先采样若干次，分数一致即停止，只对有分歧的学生追加采样
+LLM_CONSENSUS_ENABLED = False
+
+# 首轮采样数（优先在一次请求中通过 n 参数取得，服务商不支持时改为并发请求）
+LLM_CONSENSUS_INITIAL_SAMPLES = 2
+
+# 有该数量的样本分数在容差内一致时停止采样
+LLM_CONSENSUS_AGREEMENT = 2
+
+# 视为一致的最大分差
+LLM_CONSENSUS_TOLERANCE = 0.5
+
+# 每位学生的采样次数上限，达到上限仍无一致结果时取中位数并在评语中提示人工复核
+LLM_CONSENSUS_MAX_SAMPLES = 5
+
+# 采样温度（None 表示使用 SCORING_TEMPERATURE）
+LLM_CONSENSUS_TEMPERATURE = None
+
+# 是否使用 n 参数在一次请求中获取多个样本（输入 token 只计一次）
+LLM_CONSENSUS_USE_N = True
+
+# === 长文本分块评分配置 ===
+# 学生内容超过该 token 数时改用分块评分（分块评估 + 汇总打分），None 表示始终整篇评分
+LLM_CONTENT_TOKEN_BUDGET = 48000
+
+# 分块评分时每块的 token 上限
+LLM_CHUNK_TOKENS = 12000
+
+# token 计数使用的 tiktoken 编码（未安装 tiktoken 时按字符估算）
+TOKENIZER_ENCODING = "cl100k_base"
+
+# === 缓存配置 ===
+# 持久化缓存目录（LLM 评分结果、文本提取结果等）
+CACHE_DIR = TASK_DIR / ".grader_cache"
+
+# 是否启用 LLM 评分结果缓存
+LLM_CACHE_ENABLED = True
+
+# 缓存模式: 'use' 读写缓存, 'refresh' 只写不读（强制重新评分）, 'bypass' 不读不写
+LLM_CACHE_MODE = 'use'
+
+# LLM 缓存大小上限（字节），超出后按最近访问时间淘汰
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# 是否启用文本提取结果缓存（DOCX/PDF/DOC 解析与 OCR 结果）
+EXTRACTION_CACHE_ENABLED = True
+
+# 提取缓存大小上限（字节），超出后按最近访问时间淘汰
+EXTRACTION_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# === DOC 转换配置 ===
+# LibreOffice 转换结果目录（按 DOC 文件内容哈希命名，跨运行复用）
+DOC_CONVERT_DIR = CACHE_DIR / "doc_converted"
+
+# 同时运行的 LibreOffice 实例数，每个实例使用独立的用户配置目录
+DOC_CONVERTER_INSTANCES = 2
+
+# 每次 LibreOffice 调用最多转换的文件数
+DOC_CONVERT_BATCH_SIZE = 16
+
+# 凑批等待时间（秒）：收到第一个转换请求后等待更多请求一起转换
+DOC_CONVERT_BATCH_WINDOW = 0.5
+
+# 转换超时时间（秒/文件）
+DOC_CONVERT_TIMEOUT = 30
+
+# === PDF 提取配置 ===
+# 按页并行解析的进程数（None 表示自动：主进程按 CPU 核数，流水线提取子进程内逐页串行）
+PDF_PAGE_WORKERS = None
+
+# 页数达到该值时才按页并行解析（页数少时进程间传输的开销大于收益）
+PDF_PARALLEL_MIN_PAGES = 8
+
+# 单页解析超时时间（秒，不含 OCR），超时的页跳过
+PDF_PAGE_TIMEOUT = 20
+
+# 文本层少于该字符数的页视为扫描页，对页内图片进行 OCR
+PDF_OCR_MIN_CHARS = 20
+
+# 解析耗时超过该值（秒）的页记为慢页并在日志中提示
+PDF_SLOW_PAGE_SECONDS = 5.0
+
+# === LLM 并发与限流配置 ===
+# 流水线评分阶段是否使用异步客户端（共享连接池 + 限流 + 自适应并发）
+LLM_ASYNC_ENABLED = True
+
+# 服务商限额：每分钟请求数 / 每分钟 token 数（None 表示不限制）
+LLM_RPM_LIMIT = 1000
+LLM_TPM_LIMIT = 1000000
+
+# HTTP 超时（秒）
+LLM_CONNECT_TIMEOUT = 10.0
+LLM_READ_TIMEOUT = 120.0
+
+# 共享连接池的最大连接数（保持长连接复用）
+LLM_MAX_CONNECTIONS = 64
+
+# 自适应并发（AIMD）的初始值和下限，上限由 LLM_WORKERS 决定
+LLM_INITIAL_CONCURRENCY = 4
+LLM_MIN_CONCURRENCY = 1
+
+# 单次请求延迟超过该值（秒）时视为拥塞并降低并发
+LLM_LATENCY_TARGET = 60.0
+
+# 遇到 429 限流时的最大重试次数
+LLM_RATE_LIMIT_RETRIES = 5
+
+# === LLM 容错配置 ===
+# 超时、连接错误和 5xx 错误的最大重试次数（429 的重试次数见 LLM_RATE_LIMIT_RETRIES）
+LLM_MAX_RETRIES = 4
+
+# 指数退避的基数和上限（秒），实际等待时间在 [0, min(上限, 基数 * 2^重试次数)] 内随机取值；
+# 服务商返回 Retry-After 时按其要求等待
+LLM_RETRY_BASE_DELAY = 1.0
+LLM_RETRY_MAX_DELAY = 60.0
+
+# 返回内容无法解析为评分 JSON 时，要求模型重新输出的次数（先尝试本地修复）
+LLM_JSON_REASK_ATTEMPTS = 1
+
+# 熔断器: 同一模型连续失败该次数后暂停所有请求（0 表示不熔断）
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5
+
+# 熔断后的暂停时间（秒），试探请求仍失败时加倍，最多到上限
+LLM_CIRCUIT_COOLDOWN = 30.0
+LLM_CIRCUIT_MAX_COOLDOWN = 300.0
+
+# 单次评分因熔断累计等待超过该时间（秒）后放弃，标记为未评分（None 表示一直等待）
+LLM_CIRCUIT_MAX_WAIT = 900.0
+
+# 主模型评分失败时改用的备用模型（None 表示不使用），评语中会注明
+LLM_FALLBACK_MODEL = None
+
+# === LLM 用量与费用配置 ===
+# 每百万 token 的单价（输入、命中前缀缓存的输入、输出），用于在运行摘要中估算费用；None 表示不估算
+LLM_PRICE_INPUT_PER_MTOK = 2.0
+LLM_PRICE_CACHED_INPUT_PER_MTOK = 0.5
+LLM_PRICE_OUTPUT_PER_MTOK = 8.0
+
+# 费用的货币单位（仅用于显示）
+LLM_PRICE_CURRENCY = "¥"
+
+# Batch API 请求的价格系数（相对于上面的单价）
+LLM_BATCH_PRICE_FACTOR = 0.5
+
+# === 批量评分配置 ===
+# 是否默认通过 Batch API 评分（先提取全部学生的文本，再整批提交；适合不要求时效的期末大批量评分）
+LLM_BATCH_ENABLED = False
+
+# 批量请求文件和批处理任务记录的目录（中断后重新运行时继续等待已提交的任务）
+LLM_BATCH_DIR = CACHE_DIR / "batches"
+
+# 批处理请求的接口路径和完成时限
+LLM_BATCH_ENDPOINT = "/v1/chat/completions"
+LLM_BATCH_COMPLETION_WINDOW = "24h"
+
+# 轮询批处理任务状态的间隔（秒）
+LLM_BATCH_POLL_INTERVAL = 30
+
+# 单个批处理任务的请求数上限，超出时拆分为多个任务
+LLM_BATCH_MAX_REQUESTS = 50000
+
+# 每个请求最多提交的次数（含首次），失败的请求在下一轮单独重新提交
+LLM_BATCH_MAX_ATTEMPTS = 3
+
+# === 相似提交检测配置 ===
+# 是否在文本提取后检测相似提交（MinHash + LSH），相似的提交对和分组写入单独的报告
+SIMILARITY_ENABLED = True
+
+# 内容完全相同（只忽略文件标题行）的提交是否只评分一次，其余提交共用该评分
+SIMILARITY_SHARE_DUPLICATE_GRADES = True
+
+# 字符 shingle 长度（中文文本按字符切分）
+SIMILARITY_SHINGLE_SIZE = 5
+
+# MinHash 签名长度（哈希函数个数）
+SIMILARITY_NUM_PERM = 128
+
+# LSH 分段数（SIMILARITY_NUM_PERM 需能被整除）；每段行数越少，越低的相似度也能成为候选
+SIMILARITY_LSH_BANDS = 32
+
+# 写入报告的最低估计相似度（Jaccard，0-1）
+SIMILARITY_THRESHOLD = 0.6
+
+# 规范化后少于该字符数的提交不参与比较（空提交、提取失败的占位文本等）
+SIMILARITY_MIN_CHARS = 200
+
+# 相似提交报告文件名（与评分报告位于同一目录）
+SIMILARITY_REPORT_FILENAME = "相似提交.csv"
+
+# === 并发流水线配置 ===
+# 是否默认使用分阶段并发流水线（False 时逐个学生串行处理）
+PIPELINE_ENABLED = True
+
+# 解压阶段线程数（I/O 密集）
+ARCHIVE_WORKERS = 4
+
+# 文本/OCR 提取阶段进程数（CPU 密集）
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# LLM 评分阶段并发请求数上限（网络密集）
+LLM_WORKERS = 16
+
+# 阶段间队列容量，队列满时上游阶段阻塞等待（背压）
+PIPELINE_QUEUE_SIZE = 16
+
+# === 性能追踪配置 ===
+# 是否记录各阶段（解压、文本提取、OCR、DOC 转换、LLM 评分）的耗时、CPU 时间、处理字节数和内存峰值，
+# 运行结束时输出 Chrome trace 文件和阶段汇总表
+TRACE_ENABLED = False
+
+# trace 文件名（位于学生作业收集目录下，可用 chrome://tracing 或 ui.perfetto.dev 打开）
+TRACE_FILENAME = "grading_trace.json"
+
+# 汇总表中列出的耗时最长的学生数和文件数
+TRACE_TOP_N = 10
 
 # === 日志配置 ===
 # 是否显示详细日志
@@ -0,0 +1,135 @@
+"""
+多次采样一致性评分模块
+对同一评分请求采样多次：有足够多的样本分数在容差内一致时停止，否则追加采样，
+最终取一致样本的中位数，并记录每位学生的采样次数和分差
+"""
+import statistics
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    LLM_CONSENSUS_INITIAL_SAMPLES, LLM_CONSENSUS_AGREEMENT, LLM_CONSENSUS_TOLERANCE,
+    LLM_CONSENSUS_MAX_SAMPLES, LLM_CONSENSUS_TEMPERATURE, SCORING_TEMPERATURE
+)
+from models import Grade
+import metrics
+
+# 采样结果无一致分数时的评语前缀
+DISAGREEMENT_MARK = "【多次采样分歧较大，建议人工复核】"
+
+
+def consensus_temperature() -> float:
+    return LLM_CONSENSUS_TEMPERATURE if LLM_CONSENSUS_TEMPERATURE is not None else SCORING_TEMPERATURE
+
+
+def consensus_cache_variant() -> str:
+    """缓存键中区分多次采样评分结果的标记（采样参数变化时不复用旧结果）"""
+    return (f"consensus:{LLM_CONSENSUS_AGREEMENT}/{LLM_CONSENSUS_TOLERANCE:g}"
+            f"/{LLM_CONSENSUS_MAX_SAMPLES}")
+
+
+def find_agreement(scores: List[float], agreement: int = LLM_CONSENSUS_AGREEMENT,
+                   tolerance: float = LLM_CONSENSUS_TOLERANCE) -> Optional[List[float]]:
+    """
+    寻找分差不超过容差的最大一组分数
+
+    Args:
+        scores: 各次采样的分数
+        agreement: 视为一致所需的样本数
+        tolerance: 组内最大分差
+
+    Returns:
+        一致的分数（升序），样本数不足 agreement 时返回 None
+    """
+    ordered = sorted(scores)
+    best: List[float] = []
+    start = 0
+    for end in range(len(ordered)):
+        while ordered[end] - ordered[start] > tolerance:
+            start += 1
+        if end - start + 1 > len(best):
+            best = ordered[start:end + 1]
+    return best if best and len(best) >= agreement else None
+
+
+def samples_needed(scores: List[float], spent: int) -> int:
+    """
+    返回还需追加的采样数，0 表示停止
+
+    Args:
+        scores: 已解析出的分数
+        spent: 已采样次数（含无法解析的样本）
+
+    Returns:
+        追加采样数
+    """
+    remaining = LLM_CONSENSUS_MAX_SAMPLES - spent
+    if remaining <= 0 or find_agreement(scores) is not None:
+        return 0
+    largest = find_agreement(scores, agreement=1) or []
+    return min(remaining, max(1, LLM_CONSENSUS_AGREEMENT - len(largest)))
+
+
+def initial_samples() -> int:
+    return max(1, min(LLM_CONSENSUS_INITIAL_SAMPLES, LLM_CONSENSUS_MAX_SAMPLES))
+
+
+def combine_samples(samples: List[Tuple[float, str]], spent: int) -> Grade:
+    """
+    汇总各次采样结果
+
+    取一致样本的中位数作为最终分数，评语使用分数最接近最终分数的样本；
+    没有一致结果时取全部样本的中位数，并在评语前提示人工复核。
+
+    Args:
+        samples: 各次采样的 (分数, 评语)
+        spent: 已采样次数（含无法解析的样本）
+
+    Returns:
+        最终评分
+
+    Raises:
+        ValueError: 没有任何可解析的样本
+    """
+    if not samples:
+        raise ValueError(f"{spent} 次采样均无法解析")
+    scores = [score for score, _ in samples]
+    agreed = find_agreement(scores)
+    final = statistics.median(agreed or scores)
+    _, comment = min(samples, key=lambda sample: abs(sample[0] - final))
+    if agreed is None and len(samples) > 1:
+        comment = f"{DISAGREEMENT_MARK}{comment}"
+
+    metrics.add('llm_consensus', 'students', 1)
+    metrics.add('llm_consensus', 'samples', spent)
+    metrics.add('llm_consensus', 'invalid_samples', spent - len(samples))
+    if agreed is None:
+        metrics.add('llm_consensus', 'disagreed', 1)
+    elif spent <= initial_samples():
+        metrics.add('llm_consensus', 'early_stopped', 1)
+    spread = max(scores) - min(scores)
+    metrics.add('llm_consensus', 'spread_total', spread)
+    if spread > LLM_CONSENSUS_TOLERANCE:
+        metrics.add('llm_consensus', 'spread_over_tolerance', 1)
+    return Grade(score=final, comment=comment, samples=scores)
+
+
+def get_consensus_stats() -> Dict[str, float]:
+    """
+    返回多次采样评分统计
+
+    Returns:
+        评分学生数、总采样次数、平均每人采样次数、首轮即一致的人数、无一致结果的人数、
+        无法解析的样本数、平均分差和分差超出容差的人数
+    """
+    stats = metrics.snapshot('llm_consensus')
+    students = stats.get('students', 0)
+    return {
+        'students': students,
+        'samples': stats.get('samples', 0),
+        'samples_per_student': stats.get('samples', 0) / students if students else 0.0,
+        'early_stopped': stats.get('early_stopped', 0),
+        'disagreed': stats.get('disagreed', 0),
+        'invalid_samples': stats.get('invalid_samples', 0),
+        'mean_spread': stats.get('spread_total', 0.0) / students if students else 0.0,
+        'spread_over_tolerance': stats.get('spread_over_tolerance', 0),
+    }
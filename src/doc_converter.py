@@ -0,0 +1,342 @@
+"""
+DOC 转换服务模块
+维护少量 LibreOffice 转换槽位，每个槽位使用独立且跨运行复用的用户配置目录；
+各学生待转换的 .doc 文件合并为尽量少的 LibreOffice 调用，转换结果按内容哈希写入缓存目录
+"""
+import itertools
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    DOC_CONVERT_DIR, DOC_CONVERTER_INSTANCES, DOC_CONVERT_BATCH_SIZE,
+    DOC_CONVERT_BATCH_WINDOW, DOC_CONVERT_TIMEOUT, VERBOSE_LOGGING
+)
+from archive_fs import is_virtual_path, read_bytes
+from extraction_cache import hash_file
+from tracing import path_size, traced
+import metrics
+
+# 队列结束标记
+_STOP = object()
+
+
+class DocConversionError(Exception):
+    """DOC 文件转换失败（未安装 LibreOffice、转换超时或没有生成结果）"""
+
+
+def find_office_binary() -> Optional[str]:
+    """
+    查找 LibreOffice 可执行文件
+
+    Returns:
+        可执行文件路径，未安装时返回 None
+    """
+    for name in ('soffice', 'libreoffice'):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+class DocConversionService:
+    """
+    批量 DOC 转换服务
+
+    每个转换槽位是一个后台线程，独占一个 LibreOffice 用户配置目录（多个实例共用
+    同一配置目录会互相冲突；配置目录跨运行保留，省去每次初始化配置的开销）。
+    槽位取到第一个待转换文件后等待 batch_window 秒收集更多请求，
+    用一次 LibreOffice 调用转换整批文件。内容相同的文件只转换一次，转换结果跨运行复用；
+    转换失败的文件在本次运行内不再重试。
+    """
+
+    def __init__(self, instances: int = DOC_CONVERTER_INSTANCES,
+                 batch_size: int = DOC_CONVERT_BATCH_SIZE,
+                 batch_window: float = DOC_CONVERT_BATCH_WINDOW,
+                 timeout: float = DOC_CONVERT_TIMEOUT,
+                 output_dir=DOC_CONVERT_DIR):
+        self.binary = find_office_binary()
+        self.instances = max(1, instances)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.output_dir = str(output_dir)
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: Dict[str, Future] = {}
+        self._failed: Dict[str, DocConversionError] = {}
+        self._digests: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._profile_locks = []
+
+    def output_path(self, digest: str) -> str:
+        """转换结果的缓存路径"""
+        return os.path.join(self.output_dir, f"{digest}.docx")
+
+    def _digest(self, file_path: str) -> str:
+        with self._lock:
+            digest = self._digests.get(file_path)
+        if digest is None:
+            digest = hash_file(file_path)
+            with self._lock:
+                self._digests[file_path] = digest
+        return digest
+
+    def submit(self, file_path: str) -> "Future[str]":
+        """
+        提交转换请求（不阻塞）
+
+        Args:
+            file_path: DOC 文件路径或压缩包成员的虚拟路径
+
+        Returns:
+            结果为转换后 DOCX 路径的 Future；失败时抛出 DocConversionError
+        """
+        digest = self._digest(file_path)
+        target = self.output_path(digest)
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is not None:
+                return future
+            future = Future()
+            if os.path.exists(target):
+                future.set_result(target)
+                return future
+            if digest in self._failed:
+                future.set_exception(self._failed[digest])
+                return future
+            if self.binary is None:
+                future.set_exception(
+                    DocConversionError("未找到 LibreOffice，请确保已安装 LibreOffice"))
+                return future
+            self._pending[digest] = future
+            self._ensure_started()
+        self._queue.put((digest, file_path))
+        return future
+
+    def convert(self, file_path: str) -> str:
+        """
+        转换 DOC 文件并等待结果
+
+        Args:
+            file_path: DOC 文件路径或压缩包成员的虚拟路径
+
+        Returns:
+            转换后的 DOCX 文件路径（位于缓存目录）
+
+        Raises:
+            DocConversionError: 转换失败
+        """
+        return self.submit(file_path).result()
+
+    def _ensure_started(self) -> None:
+        # 调用方已持有 self._lock
+        if self._threads:
+            return
+        for slot in range(self.instances):
+            thread = threading.Thread(target=self._worker, name=f"doc-convert-{slot}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self) -> None:
+        profile_dir = self._claim_profile()
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.put(_STOP)
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.put(_STOP)
+                    break
+                batch.append(item)
+
+            try:
+                self._convert_batch(batch, profile_dir)
+            except Exception as e:
+                for digest, _ in batch:
+                    self._finish(digest, error=DocConversionError(f"DOC 转换失败: {e}"))
+
+    def _claim_profile(self) -> str:
+        """
+        占用一个空闲的 LibreOffice 用户配置目录
+
+        用文件锁保证同一时刻每个配置目录只被一个实例（含其他进程中的实例）使用。
+        """
+        root = os.path.join(os.path.dirname(self.output_dir), "office_profiles")
+        os.makedirs(root, exist_ok=True)
+        try:
+            import fcntl
+        except ImportError:
+            return tempfile.mkdtemp(prefix="profile_", dir=root)
+
+        for slot in itertools.count():
+            profile_dir = os.path.join(root, f"profile_{slot}")
+            os.makedirs(profile_dir, exist_ok=True)
+            lock_file = open(os.path.join(profile_dir, "grader.lock"), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            with self._lock:
+                self._profile_locks.append(lock_file)
+            return profile_dir
+
+    @traced('doc_convert',
+            size=lambda self, batch, profile_dir: sum(path_size(path) or 0 for _, path in batch))
+    def _convert_batch(self, batch: List[Tuple[str, str]], profile_dir: str) -> None:
+        started = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        # 临时目录建在缓存目录下，转换结果可以直接 rename 到最终位置
+        with tempfile.TemporaryDirectory(prefix="batch-", dir=self.output_dir) as tmp_dir:
+            in_dir = os.path.join(tmp_dir, "in")
+            out_dir = os.path.join(tmp_dir, "out")
+            os.makedirs(in_dir)
+            os.makedirs(out_dir)
+
+            inputs = []
+            for digest, file_path in batch:
+                staged = os.path.join(in_dir, f"{digest}.doc")
+                try:
+                    _stage_input(file_path, staged)
+                except Exception as e:
+                    self._finish(digest, error=DocConversionError(f"读取 DOC 文件失败: {e}"))
+                    continue
+                inputs.append((digest, staged))
+
+            if VERBOSE_LOGGING:
+                print(f"    - 正在用 LibreOffice 批量转换 {len(inputs)} 个 .doc 文件...")
+            self._run_office([staged for _, staged in inputs], out_dir, profile_dir)
+            if len(inputs) > 1:
+                # 整批失败或超时时，未生成结果的文件逐个重试，避免一个坏文件拖累整批
+                for digest, staged in inputs:
+                    if not os.path.exists(os.path.join(out_dir, f"{digest}.docx")):
+                        self._run_office([staged], out_dir, profile_dir)
+
+            for digest, _ in inputs:
+                produced = os.path.join(out_dir, f"{digest}.docx")
+                if os.path.exists(produced):
+                    target = self.output_path(digest)
+                    os.replace(produced, target)
+                    self._finish(digest, result=target)
+                else:
+                    self._finish(digest, error=DocConversionError("LibreOffice 未生成转换结果"))
+
+        metrics.add('doc_convert', 'files', len(batch))
+        metrics.add('doc_convert', 'seconds', time.perf_counter() - started)
+
+    def _run_office(self, inputs: List[str], out_dir: str, profile_dir: str) -> None:
+        if not inputs:
+            return
+        command = [
+            self.binary, f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+            '--headless', '--invisible', '--norestore', '--nologo', '--nodefault',
+            '--convert-to', 'docx', '--outdir', out_dir, *inputs
+        ]
+        # 新建进程组，超时时连同 soffice.bin 子进程一起结束，避免残留进程占用配置目录
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, start_new_session=True)
+        metrics.add('doc_convert', 'batches', 1)
+        try:
+            process.wait(timeout=self.timeout * len(inputs))
+        except subprocess.TimeoutExpired:
+            if VERBOSE_LOGGING:
+                print(f"    - 警告: LibreOffice 转换超时（{len(inputs)} 个文件）")
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                process.kill()
+            process.wait()
+
+    def _finish(self, digest: str, result: Optional[str] = None,
+                error: Optional[Exception] = None) -> None:
+        with self._lock:
+            future = self._pending.pop(digest, None)
+            if error is not None:
+                self._failed[digest] = error
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def shutdown(self) -> None:
+        """停止转换槽位线程并释放配置目录"""
+        if self._threads:
+            self._queue.put(_STOP)
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+        with self._lock:
+            for lock_file in self._profile_locks:
+                lock_file.close()
+            self._profile_locks = []
+
+
+def _stage_input(file_path: str, staged: str) -> None:
+    """将待转换的文件放入批次输入目录（磁盘文件用符号链接，压缩包成员写出内容）"""
+    if is_virtual_path(file_path):
+        with open(staged, 'wb') as f:
+            f.write(read_bytes(file_path))
+        return
+    try:
+        os.symlink(os.path.abspath(file_path), staged)
+    except OSError:
+        shutil.copyfile(file_path, staged)
+
+
+def get_doc_conversion_stats() -> Dict[str, float]:
+    """
+    返回 DOC 转换统计
+
+    Returns:
+        原生解析文件数、转换文件数、LibreOffice 调用次数和累计耗时
+    """
+    stats = metrics.snapshot('doc_convert')
+    return {
+        'native': stats.get('native', 0),
+        'files': stats.get('files', 0),
+        'batches': stats.get('batches', 0),
+        'seconds': stats.get('seconds', 0.0),
+    }
+
+
+# 全局转换服务实例（每个进程一个）
+_service: Optional[DocConversionService] = None
+_service_pid: Optional[int] = None
+
+
+def get_doc_converter() -> DocConversionService:
+    """
+    获取本进程的 DOC 转换服务（单例模式）
+
+    Returns:
+        转换服务实例
+    """
+    global _service, _service_pid
+    if _service is None or _service_pid != os.getpid():
+        # fork 出的子进程不会继承父进程的转换线程，需要重新创建
+        _service = DocConversionService()
+        _service_pid = os.getpid()
+    return _service
@@ -0,0 +1,421 @@
+"""
+DOC 原生文本提取模块
+纯 Python 读取 Word 97-2003 (.doc) 文件：解析 OLE2 复合文档，
+按 WordDocument 流中 FIB 指向的分段表 (piece table) 拼出正文（支持中文等 UTF-16 文本），
+并从文档中提取嵌入的 PNG/JPEG 图片供 OCR 使用。无法处理的文件抛出 DocFormatError，由调用方改用 LibreOffice 转换
+"""
+import re
+import struct
+from typing import Dict, List, Optional, Tuple
+
+# OLE2 复合文档签名
+_OLE_MAGIC = b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"
+
+# 扇区编号中的特殊值
+_MAX_REG_SECT = 0xFFFFFFFA
+_END_OF_CHAIN = 0xFFFFFFFE
+
+# 目录项类型
+_STREAM = 2
+_ROOT = 5
+_NO_STREAM = 0xFFFFFFFF
+
+# Word 97 及以后版本的 FIB 标识和最小版本号（Word 6/95 的 FIB 结构不同）
+_WORD_IDENT = 0xA5EC
+_MIN_NFIB = 0x00C0
+
+# FibRgFcLcb97 中 fcClx/lcbClx 的序号
+_CLX_INDEX = 33
+
+# 压缩分段使用的 8 位编码中 0x80-0x9F 的字符映射（与 cp1252 一致，cp1252 未定义的保持原值）
+_COMPRESSED_MAP = {}
+for _byte in range(0x80, 0xA0):
+    try:
+        _COMPRESSED_MAP[_byte] = bytes([_byte]).decode('cp1252')
+    except UnicodeDecodeError:
+        pass
+
+# 正文中的特殊字符: 段落/换行/分页转为换行，图片、脚注引用等对象占位符删除
+_SPECIAL_CHARS = str.maketrans({
+    '\r': '\n',
+    '\x0b': '\n',
+    '\x0c': '\n',
+    '\x0e': '\n',
+    '\x1e': '-',
+    '\x1f': None,
+    '\x00': None,
+    '\x01': None,
+    '\x02': None,
+    '\x03': None,
+    '\x04': None,
+    '\x05': None,
+    '\x08': None,
+})
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_JPEG_SIGNATURE = b"\xFF\xD8\xFF"
+
+# 小于该字节数的图片（图标、项目符号等）不做 OCR
+_MIN_IMAGE_BYTES = 1024
+
+
+class DocFormatError(ValueError):
+    """无法用原生方式解析的 DOC 文件（非 OLE2、加密、Word 95 及更早格式或结构损坏）"""
+
+
+def _u16(data: bytes, offset: int) -> int:
+    return struct.unpack_from('<H', data, offset)[0]
+
+
+def _u32(data: bytes, offset: int) -> int:
+    return struct.unpack_from('<I', data, offset)[0]
+
+
+class CompoundFile:
+    """
+    OLE2 复合文档（CFB）的只读解析器
+
+    只支持读取根存储下的流，足够读取 WordDocument、0Table/1Table 和 Data 流。
+    """
+
+    def __init__(self, data: bytes):
+        if len(data) < 512 or data[:8] != _OLE_MAGIC:
+            raise DocFormatError("不是 OLE2 复合文档")
+        self.data = data
+        try:
+            self._parse_header()
+        except struct.error as e:
+            raise DocFormatError(f"复合文档结构损坏: {e}")
+
+    def _parse_header(self) -> None:
+        data = self.data
+        self.sector_size = 1 << _u16(data, 0x1E)
+        self.mini_sector_size = 1 << _u16(data, 0x20)
+        num_fat_sectors = _u32(data, 0x2C)
+        first_dir_sector = _u32(data, 0x30)
+        self.mini_cutoff = _u32(data, 0x38)
+        first_minifat_sector = _u32(data, 0x3C)
+        first_difat_sector = _u32(data, 0x44)
+        num_difat_sectors = _u32(data, 0x48)
+
+        # 头部的 109 个 DIFAT 条目之后是 DIFAT 扇区链，每个扇区最后一项指向下一个扇区
+        difat = list(struct.unpack_from('<109I', data, 0x4C))
+        per_sector = self.sector_size // 4
+        sector = first_difat_sector
+        for _ in range(num_difat_sectors):
+            if sector >= _MAX_REG_SECT:
+                break
+            values = struct.unpack('<%dI' % per_sector, self._sector(sector))
+            difat.extend(values[:-1])
+            sector = values[-1]
+        fat_sectors = [s for s in difat if s < _MAX_REG_SECT][:num_fat_sectors]
+        fat_data = b"".join(self._sector(s) for s in fat_sectors)
+        self.fat = struct.unpack('<%dI' % (len(fat_data) // 4), fat_data)
+
+        self.entries = self._parse_directory(self._read_chain(first_dir_sector))
+        root = self.entries[0]
+        if root[0] != _ROOT:
+            raise DocFormatError("复合文档缺少根目录项")
+        self._mini_stream = self._read_chain(root[1])[:root[2]]
+        minifat_data = self._read_chain(first_minifat_sector) if first_minifat_sector < _MAX_REG_SECT else b""
+        self.minifat = struct.unpack('<%dI' % (len(minifat_data) // 4), minifat_data)
+        self.streams = self._root_streams()
+
+    def _sector(self, sector: int) -> bytes:
+        offset = (sector + 1) * self.sector_size
+        chunk = self.data[offset:offset + self.sector_size]
+        if len(chunk) < self.sector_size:
+            raise DocFormatError("扇区超出文件范围")
+        return chunk
+
+    def _read_chain(self, start: int) -> bytes:
+        parts = []
+        sector = start
+        for _ in range(len(self.fat) + 1):
+            if sector >= _MAX_REG_SECT:
+                return b"".join(parts)
+            parts.append(self._sector(sector))
+            if sector >= len(self.fat):
+                raise DocFormatError("扇区链超出 FAT 范围")
+            sector = self.fat[sector]
+        raise DocFormatError("扇区链存在循环")
+
+    def _read_mini_chain(self, start: int, size: int) -> bytes:
+        parts = []
+        sector = start
+        for _ in range(len(self.minifat) + 1):
+            if sector >= _MAX_REG_SECT:
+                break
+            offset = sector * self.mini_sector_size
+            parts.append(self._mini_stream[offset:offset + self.mini_sector_size])
+            if sector >= len(self.minifat):
+                raise DocFormatError("短扇区链超出 MiniFAT 范围")
+            sector = self.minifat[sector]
+        else:
+            raise DocFormatError("短扇区链存在循环")
+        return b"".join(parts)[:size]
+
+    def _parse_directory(self, data: bytes) -> List[Tuple[int, int, int, str, int, int, int]]:
+        # (类型, 起始扇区, 大小, 名称, 左兄弟, 右兄弟, 子节点)
+        entries = []
+        for offset in range(0, len(data) - 127, 128):
+            name_length = _u16(data, offset + 0x40)
+            name = data[offset:offset + max(0, name_length - 2)].decode('utf-16-le', 'replace')
+            size = struct.unpack_from('<Q', data, offset + 0x78)[0]
+            if self.sector_size == 512:
+                # 版本 3 的文件中大小字段的高 32 位可能未初始化
+                size &= 0xFFFFFFFF
+            entries.append((data[offset + 0x42], _u32(data, offset + 0x74), size, name,
+                            _u32(data, offset + 0x44), _u32(data, offset + 0x48),
+                            _u32(data, offset + 0x4C)))
+        if not entries:
+            raise DocFormatError("复合文档目录为空")
+        return entries
+
+    def _root_streams(self) -> Dict[str, int]:
+        # 根存储的子节点组织为红黑树，遍历整棵树得到根目录下的全部条目
+        streams = {}
+        pending = [self.entries[0][6]]
+        seen = set()
+        while pending:
+            index = pending.pop()
+            if index == _NO_STREAM or index >= len(self.entries) or index in seen:
+                continue
+            seen.add(index)
+            kind, _, _, name, left, right, _ = self.entries[index]
+            if kind == _STREAM:
+                streams[name] = index
+            pending.extend((left, right))
+        return streams
+
+    def has_stream(self, name: str) -> bool:
+        return name in self.streams
+
+    def read_stream(self, name: str) -> bytes:
+        """
+        读取根存储下的流
+
+        Args:
+            name: 流名称
+
+        Returns:
+            流内容
+
+        Raises:
+            DocFormatError: 流不存在
+        """
+        if name not in self.streams:
+            raise DocFormatError(f"复合文档中没有 {name} 流")
+        _, start, size, _, _, _, _ = self.entries[self.streams[name]]
+        if size < self.mini_cutoff:
+            return self._read_mini_chain(start, size)
+        return self._read_chain(start)[:size]
+
+
+def read_doc(data: bytes) -> Tuple[str, List[bytes]]:
+    """
+    解析 DOC 文件，提取正文和嵌入图片
+
+    Args:
+        data: DOC 文件内容
+
+    Returns:
+        (正文文本, 图片数据列表)
+
+    Raises:
+        DocFormatError: 无法用原生方式解析
+    """
+    ole = CompoundFile(data)
+    word = ole.read_stream('WordDocument')
+    try:
+        text = _read_main_text(ole, word)
+    except (struct.error, IndexError) as e:
+        raise DocFormatError(f"WordDocument 结构损坏: {e}")
+
+    images = []
+    for stream_name in ('Data', 'WordDocument'):
+        if ole.has_stream(stream_name):
+            stream = word if stream_name == 'WordDocument' else ole.read_stream(stream_name)
+            for image in carve_images(stream):
+                if image not in images:
+                    images.append(image)
+    return text, images
+
+
+def is_native_doc(data: bytes) -> bool:
+    """
+    判断 DOC 文件能否用原生方式解析（只解析正文结构，不提取图片）
+
+    Args:
+        data: DOC 文件内容
+
+    Returns:
+        能原生解析返回 True，需要 LibreOffice 转换返回 False
+    """
+    try:
+        ole = CompoundFile(data)
+        _read_main_text(ole, ole.read_stream('WordDocument'))
+        return True
+    except (DocFormatError, struct.error, IndexError):
+        return False
+
+
+def _read_main_text(ole: CompoundFile, word: bytes) -> str:
+    if len(word) < 32 or _u16(word, 0) != _WORD_IDENT:
+        raise DocFormatError("不是 Word 文档")
+    if _u16(word, 2) < _MIN_NFIB:
+        raise DocFormatError("不支持 Word 95 及更早版本的格式")
+    flags = _u16(word, 0x0A)
+    if flags & 0x0100:
+        raise DocFormatError("文档已加密")
+
+    # FIB: FibBase(32 字节) + csw + fibRgW + cslw + fibRgLw + cbRgFcLcb + fibRgFcLcbBlob
+    offset = 32
+    csw = _u16(word, offset)
+    offset += 2 + csw * 2
+    cslw = _u16(word, offset)
+    ccp_text = _u32(word, offset + 2 + 3 * 4)
+    offset += 2 + cslw * 4
+    cb_rg_fc_lcb = _u16(word, offset)
+    offset += 2
+    if cb_rg_fc_lcb <= _CLX_INDEX:
+        raise DocFormatError("FIB 中缺少分段表位置")
+    fc_clx = _u32(word, offset + _CLX_INDEX * 8)
+    lcb_clx = _u32(word, offset + _CLX_INDEX * 8 + 4)
+
+    table = ole.read_stream('1Table' if flags & 0x0200 else '0Table')
+    clx = table[fc_clx:fc_clx + lcb_clx]
+    if len(clx) != lcb_clx or not lcb_clx:
+        raise DocFormatError("分段表超出表格流范围")
+
+    # Clx: 若干 Prc (0x01) 之后是 Pcdt (0x02)，其中为 PlcPcd
+    position = 0
+    while position < len(clx) and clx[position] == 0x01:
+        position += 3 + struct.unpack_from('<h', clx, position + 1)[0]
+    if position >= len(clx) or clx[position] != 0x02:
+        raise DocFormatError("找不到分段表")
+    lcb = _u32(clx, position + 1)
+    plc = clx[position + 5:position + 5 + lcb]
+    count = (lcb - 4) // 12
+    if count <= 0 or len(plc) < lcb:
+        raise DocFormatError("分段表为空或不完整")
+    cps = struct.unpack_from('<%dI' % (count + 1), plc, 0)
+
+    pieces = []
+    for index in range(count):
+        start, end = cps[index], min(cps[index + 1], ccp_text)
+        if start >= ccp_text:
+            break
+        if end <= start:
+            continue
+        fc_value = _u32(plc, 4 * (count + 1) + 8 * index + 2)
+        fc = fc_value & 0x3FFFFFFF
+        length = end - start
+        if fc_value & 0x40000000:
+            raw = word[fc // 2:fc // 2 + length]
+            pieces.append(raw.decode('latin-1').translate(_COMPRESSED_MAP))
+        else:
+            raw = word[fc:fc + 2 * length]
+            pieces.append(raw.decode('utf-16-le', 'replace'))
+    return clean_doc_text("".join(pieces))
+
+
+def clean_doc_text(text: str) -> str:
+    """
+    将 Word 正文中的控制字符转换为普通文本
+
+    去掉域代码（保留域结果），表格单元格以制表符分隔、每行一段，
+    删除对象占位符，并丢弃空段落（与 DOCX 提取结果的段落格式一致）。
+
+    Args:
+        text: 分段表拼出的原始正文
+
+    Returns:
+        整理后的文本
+    """
+    if '\x13' in text:
+        text = _strip_field_codes(text)
+    # 单元格结束标记 \x07，行结束时连续出现两个
+    text = text.replace('\x07\x07', '\n').replace('\x07', '\t')
+    text = text.translate(_SPECIAL_CHARS)
+    return "\n".join(line.rstrip() for line in text.split('\n') if line.strip())
+
+
+def _strip_field_codes(text: str) -> str:
+    # \x13 域开始、\x14 域分隔（其后为域结果）、\x15 域结束，域可以嵌套
+    out = []
+    stack: List[bool] = []
+    for ch in text:
+        if ch == '\x13':
+            stack.append(False)
+        elif ch == '\x14':
+            if stack:
+                stack[-1] = True
+        elif ch == '\x15':
+            if stack:
+                stack.pop()
+        elif all(stack):
+            out.append(ch)
+    return "".join(out)
+
+
+def carve_images(data: bytes) -> List[bytes]:
+    """
+    从二进制流中找出嵌入的 PNG 和 JPEG 图片
+
+    Args:
+        data: 流内容
+
+    Returns:
+        按出现顺序排列的图片数据
+    """
+    images = []
+    position = 0
+    while True:
+        png = data.find(_PNG_SIGNATURE, position)
+        jpeg = data.find(_JPEG_SIGNATURE, position)
+        candidates = [p for p in (png, jpeg) if p >= 0]
+        if not candidates:
+            return images
+        start = min(candidates)
+        end = _png_end(data, start) if start == png else _jpeg_end(data, start)
+        if end is None:
+            position = start + 1
+            continue
+        if end - start >= _MIN_IMAGE_BYTES:
+            images.append(data[start:end])
+        position = end
+
+
+def _png_end(data: bytes, start: int) -> Optional[int]:
+    # 逐个 chunk 跳过直到 IEND
+    position = start + len(_PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length = struct.unpack_from('>I', data, position)[0]
+        chunk_type = data[position + 4:position + 8]
+        position += 12 + length
+        if chunk_type == b'IEND':
+            return position if position <= len(data) else None
+    return None
+
+
+def _jpeg_end(data: bytes, start: int) -> Optional[int]:
+    # 按段长度跳过各段（缩略图等嵌套在段内，不会误判），到 SOS 后在熵编码数据中查找 EOI
+    position = start + 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        length = struct.unpack_from('>H', data, position + 2)[0]
+        position += 2 + length
+        if marker == 0xDA:
+            match = _JPEG_EOI.search(data, position)
+            return match.end() if match else None
+    return None
+
+
+# 熵编码数据中 0xFF 之后只会是 0x00 或 RSTn，遇到 0xFFD9 即图片结束
+_JPEG_EOI = re.compile(b"\xFF\xD9")
@@ -0,0 +1,227 @@
+"""
+DOCX 流式文本提取模块
+直接从 zip 中用 iterparse 流式解析 word/document.xml，不构建 python-docx 对象模型：
+按文档顺序输出段落和表格行（含文本框、页眉），图片关系只解析一次，图片数据在需要 OCR 时才读取
+"""
+import posixpath
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+_V = '{urn:schemas-microsoft-com:vml}'
+_MC = '{http://schemas.openxmlformats.org/markup-compatibility/2006}'
+_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_DOCUMENT_PART = 'word/document.xml'
+
+_IMAGE_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+_HEADER_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/header'
+
+# 段落内换行类元素
+_BREAKS = {_W + 'br': '\n', _W + 'cr': '\n', _W + 'tab': '\t', _W + 'noBreakHyphen': '-'}
+
+# 输出块类型
+TEXT = 'text'
+IMAGE = 'image'
+
+
+class DocxPackage:
+    """
+    DOCX 包的只读视图
+
+    关系文件在打开时解析一次，正文和页眉按需流式读取，图片按部件名读取。
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self._zip = zipfile.ZipFile(fileobj)
+        self._names = set(self._zip.namelist())
+        if _DOCUMENT_PART not in self._names:
+            raise ValueError("不是有效的 DOCX 文件（缺少 word/document.xml）")
+        self.relationships = self._read_relationships(_DOCUMENT_PART)
+
+    def _read_relationships(self, part: str) -> Dict[str, Tuple[str, str]]:
+        # {rId: (关系类型, 目标部件名)}，外部链接不收录
+        directory, name = posixpath.split(part)
+        rels_part = posixpath.join(directory, '_rels', name + '.rels')
+        if rels_part not in self._names:
+            return {}
+        root = ElementTree.fromstring(self._zip.read(rels_part))
+        relationships = {}
+        for rel in root.iter(_PKG_REL + 'Relationship'):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(directory, target))
+            relationships[rel.get('Id')] = (rel.get('Type'), target)
+        return relationships
+
+    def header_parts(self) -> List[str]:
+        """按关系顺序返回正文引用的页眉部件"""
+        return [target for rel_type, target in self.relationships.values()
+                if rel_type == _HEADER_REL and target in self._names]
+
+    def __enter__(self) -> "DocxPackage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def iter_document(self) -> Iterator[Tuple[str, str]]:
+        """
+        按阅读顺序输出页眉和正文
+
+        页眉中的段落去重后排在正文之前（页眉图片多为徽标，不输出）。
+
+        Yields:
+            (TEXT, 文本) 或 (IMAGE, 图片部件名)
+        """
+        seen = set()
+        for part in self.header_parts():
+            for kind, value in self.iter_blocks(part):
+                if kind == TEXT and value not in seen:
+                    seen.add(value)
+                    yield kind, value
+        yield from self.iter_blocks()
+
+    def iter_blocks(self, part: str = _DOCUMENT_PART) -> Iterator[Tuple[str, str]]:
+        """
+        流式解析一个正文类部件（document.xml、页眉等）
+
+        Args:
+            part: 部件名
+
+        Yields:
+            (TEXT, 段落或表格行文本) 或 (IMAGE, 图片部件名)，按文档顺序
+        """
+        relationships = (self.relationships if part == _DOCUMENT_PART
+                         else self._read_relationships(part))
+        with self._zip.open(part) as stream:
+            yield from _iter_blocks(stream, relationships)
+
+    def read_part(self, part: str) -> Optional[bytes]:
+        """读取部件内容（如图片），不存在时返回 None"""
+        if part not in self._names:
+            return None
+        return self._zip.read(part)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class _Paragraph:
+    __slots__ = ('parts', 'images', 'followers')
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.images: List[str] = []
+        # 文本框等嵌套在段落中的内容，在该段落之后输出
+        self.followers: List[Tuple[str, str]] = []
+
+
+def _iter_blocks(stream, relationships: Dict[str, Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """
+    iterparse 状态机
+
+    表格单元格内的段落以空格连接，同一行的单元格以制表符分隔，每行作为一个文本块；
+    嵌套表格的行并入所在单元格。文本框内容跟在其锚点段落之后。mc:Fallback 中是 mc:Choice 内容的兼容副本，直接跳过。
+    """
+    paragraphs: List[_Paragraph] = []
+    # 表格栈: 每层为 [当前行的单元格列表, 当前单元格的文本列表]
+    tables: List[List[List[str]]] = []
+    # 表格内收集到的图片，整行输出后紧跟输出
+    table_images: List[str] = []
+    skip = 0
+    depth = 0
+    body_depth = None
+    body = None
+
+    def emit(blocks: List[Tuple[str, str]], kind: str, value: str) -> None:
+        # 嵌套段落（文本框）的内容挂到外层段落上，其余直接输出
+        if paragraphs:
+            paragraphs[-1].followers.append((kind, value))
+        else:
+            blocks.append((kind, value))
+
+    for event, elem in ElementTree.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            depth += 1
+            if skip or tag == _MC + 'Fallback':
+                skip += 1
+                continue
+            if tag == _W + 'body':
+                body, body_depth = elem, depth
+            elif tag == _W + 'p':
+                paragraphs.append(_Paragraph())
+            elif tag == _W + 'tbl':
+                tables.append([[], []])
+            elif tag == _W + 'tr' and tables:
+                tables[-1][0] = []
+            elif tag == _W + 'tc' and tables:
+                tables[-1][1] = []
+            continue
+
+        depth -= 1
+        if skip:
+            skip -= 1
+            continue
+
+        blocks: List[Tuple[str, str]] = []
+        if tag == _W + 't':
+            if paragraphs and elem.text:
+                paragraphs[-1].parts.append(elem.text)
+        elif tag in _BREAKS:
+            if paragraphs:
+                paragraphs[-1].parts.append(_BREAKS[tag])
+        elif tag == _A + 'blip' or tag == _V + 'imagedata':
+            rel_id = elem.get(_R + 'embed') or elem.get(_R + 'id')
+            rel = relationships.get(rel_id)
+            if paragraphs and rel and rel[0] == _IMAGE_REL:
+                paragraphs[-1].images.append(rel[1])
+        elif tag == _W + 'p' and paragraphs:
+            paragraph = paragraphs.pop()
+            text = "".join(paragraph.parts).strip()
+            if tables:
+                if text:
+                    tables[-1][1].append(text)
+                table_images.extend(paragraph.images)
+                for kind, value in paragraph.followers:
+                    if kind == TEXT:
+                        tables[-1][1].append(value)
+                    else:
+                        table_images.append(value)
+            else:
+                if text:
+                    emit(blocks, TEXT, text)
+                for image in paragraph.images:
+                    emit(blocks, IMAGE, image)
+                for kind, value in paragraph.followers:
+                    emit(blocks, kind, value)
+        elif tag == _W + 'tc' and tables:
+            tables[-1][0].append(" ".join(tables[-1][1]))
+        elif tag == _W + 'tr' and tables:
+            cells = tables[-1][0]
+            if len(tables) > 1:
+                # 嵌套表格的单元格以空格连接，不影响外层表格的列对齐
+                row = " ".join(cell for cell in cells if cell)
+                if row:
+                    tables[-2][1].append(row)
+            else:
+                if any(cells):
+                    emit(blocks, TEXT, "\t".join(cells))
+                for image in table_images:
+                    emit(blocks, IMAGE, image)
+                table_images.clear()
+        elif tag == _W + 'tbl' and tables:
+            tables.pop()
+
+        if depth == body_depth and body is not None:
+            # 正文的直接子元素处理完毕，释放已解析的节点，内存占用与文档大小无关
+            body.clear()
+        yield from blocks
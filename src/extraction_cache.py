@@ -0,0 +1,128 @@
+"""
+文本提取结果缓存模块
+以文件内容哈希、提取器版本和 OCR 语言为键缓存提取结果，
+未变化的文件以及多名组员提交的相同文件只需解析一次
+"""
+import hashlib
+import os
+from typing import Dict, Optional
+
+from config import (
+    CACHE_DIR, OCR_LANGUAGES, OCR_AUTO_LANGUAGE, EXTRACTION_CACHE_ENABLED, EXTRACTION_CACHE_MAX_BYTES
+)
+from cache_store import SQLiteCache
+from archive_fs import open_binary
+from ocr import ocr_settings_signature
+
+# 提取器版本，文本提取逻辑的输出发生变化时需要递增，使旧缓存自动失效
+EXTRACTOR_VERSION = "6"
+
+# 计算文件哈希时每次读取的字节数
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """
+    计算文件内容的 SHA-256 摘要
+
+    Args:
+        file_path: 文件路径或压缩包成员的虚拟路径
+
+    Returns:
+        十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open_binary(file_path) as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """文本提取结果的持久化缓存"""
+
+    def __init__(self):
+        self.store = SQLiteCache(CACHE_DIR / "extraction_cache.sqlite3",
+                                 "extractions", EXTRACTION_CACHE_MAX_BYTES)
+
+    @staticmethod
+    def make_key(file_path: str) -> str:
+        """
+        计算文件的缓存键
+
+        扩展名决定使用哪个提取器，因此也计入键中；OCR 是否按图片自动选择语言以及其他影响识别结果的
+        OCR 设置（见 ocr_settings_signature）同样计入。
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            缓存键
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+        ocr_lang = f"{OCR_LANGUAGES}:auto" if OCR_AUTO_LANGUAGE else OCR_LANGUAGES
+        return (f"{hash_file(file_path)}:{file_ext}:{EXTRACTOR_VERSION}:{ocr_lang}"
+                f"{ocr_settings_signature()}")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存的提取结果
+
+        Args:
+            key: make_key() 计算的缓存键
+
+        Returns:
+            提取的文本，未命中时返回 None
+        """
+        value = self.store.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def contains(self, key: str) -> bool:
+        """
+        检查是否已缓存提取结果（不计入命中统计）
+
+        Args:
+            key: make_key() 计算的缓存键
+
+        Returns:
+            是否已缓存
+        """
+        return self.store.contains(key)
+
+    def put(self, key: str, text: str) -> None:
+        """
+        写入提取结果
+
+        Args:
+            key: make_key() 计算的缓存键
+            text: 提取的文本
+        """
+        self.store.put(key, text.encode('utf-8'))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        返回缓存统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return self.store.stats()
+
+
+# 全局缓存实例
+_extraction_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """
+    获取提取缓存实例（单例模式）
+
+    Returns:
+        缓存实例，未启用时返回 None
+    """
+    global _extraction_cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionCache()
+    return _extraction_cache
@@ -0,0 +1,144 @@
+"""
+文件索引模块
+用一次 os.scandir 遍历建立学生文件夹的文件索引（路径、大小、修改时间、扩展名），
+解压和文本提取共用同一份索引，本次运行内缓存，避免对每种扩展名分别递归 glob
+"""
+import os
+import threading
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, List, Optional
+
+from config import ARCHIVE_VIRTUAL_FS
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    """索引中的一个文件"""
+    path: str
+    size: int
+    mtime: float
+    ext: str
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+
+class FileIndex:
+    """一个文件夹（含子目录）中全部文件的索引"""
+
+    def __init__(self, folder_path: str, entries: List[FileEntry]):
+        self.folder_path = folder_path
+        self.entries = entries
+
+    def match(self, patterns: Iterable[str]) -> List[FileEntry]:
+        """
+        按通配符筛选文件
+
+        结果与对每个模式依次执行 glob('**/<模式>', recursive=True) 的顺序一致。
+
+        Args:
+            patterns: 通配符列表，如 ['*.zip', '*.rar']
+
+        Returns:
+            匹配的文件列表
+        """
+        matched = []
+        for pattern in patterns:
+            matched.extend(entry for entry in self.entries
+                           if fnmatchcase(entry.name, pattern))
+        return matched
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self.entries)
+
+
+def scan_folder(folder_path: str) -> List[FileEntry]:
+    """
+    单次遍历文件夹，收集所有文件的元数据
+
+    与 glob 一致：跳过以 '.' 开头的文件和目录，先列出当前目录的文件再依次进入子目录。
+
+    Args:
+        folder_path: 文件夹路径
+
+    Returns:
+        文件列表
+    """
+    entries: List[FileEntry] = []
+    _scan_into(folder_path, entries)
+    return entries
+
+
+def _scan_into(dir_path: str, entries: List[FileEntry]) -> None:
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        entries.append(FileEntry(
+                            path=entry.path,
+                            size=stat.st_size,
+                            mtime=stat.st_mtime,
+                            ext=os.path.splitext(entry.name)[1].lower()
+                        ))
+                except OSError:
+                    # 遍历过程中被删除或无权访问的条目直接跳过
+                    continue
+    except OSError:
+        return
+    for subdir in subdirs:
+        _scan_into(subdir, entries)
+
+
+# 本次运行内的索引缓存: {文件夹绝对路径: 索引}
+_indexes: Dict[str, FileIndex] = {}
+_lock = threading.Lock()
+
+
+def get_file_index(folder_path: str) -> FileIndex:
+    """
+    获取文件夹的索引，首次访问时遍历文件系统，之后直接使用缓存
+
+    启用虚拟文件系统时，压缩包中的成员也会列入索引（虚拟路径，紧跟在所属压缩包之后）。
+
+    Args:
+        folder_path: 文件夹路径
+
+    Returns:
+        文件索引
+    """
+    key = os.path.abspath(folder_path)
+    with _lock:
+        index = _indexes.get(key)
+    if index is None:
+        entries = scan_folder(folder_path)
+        if ARCHIVE_VIRTUAL_FS:
+            from archive_fs import expand_archives
+            entries = expand_archives(entries)
+        index = FileIndex(folder_path, entries)
+        with _lock:
+            _indexes[key] = index
+    return index
+
+
+def invalidate_file_index(folder_path: Optional[str] = None) -> None:
+    """
+    使索引缓存失效（文件夹内容被修改后调用，如解压了压缩文件）
+
+    Args:
+        folder_path: 文件夹路径，None 表示清空全部缓存
+    """
+    with _lock:
+        if folder_path is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(os.path.abspath(folder_path), None)
@@ -2,10 +2,12 @@
 文件处理工具模块
 负责压缩文件的解压、文件类型检测等功能
 """
-from config import ZIP_EXTENSIONS, RAR_EXTENSIONS, VERBOSE_LOGGING
+from config import ZIP_EXTENSIONS, RAR_EXTENSIONS, ARCHIVE_VIRTUAL_FS, VERBOSE_LOGGING
+from file_index import get_file_index, invalidate_file_index
+from archive_fs import archive_kind, is_virtual_path
+from tracing import traced
 import os
 import zipfile
-import glob
 from pathlib import Path
 from typing import List, Optional
 
@@ -16,7 +18,7 @@ RARFILE_AVAILABLE = None
 
 def find_archive_files(folder_path: str, archive_extensions: List[str]) -> List[str]:
     """
-    在文件夹中递归查找指定类型的压缩文件
+    在文件夹中递归查找指定类型的压缩文件（使用文件索引，不重复遍历文件系统）
 
     Args:
         folder_path: 要搜索的文件夹路径
@@ -25,11 +27,7 @@ def find_archive_files(folder_path: str, archive_extensions: List[str]) -> List[
     Returns:
         找到的压缩文件路径列表
     """
-    archive_files = []
-    for ext in archive_extensions:
-        pattern = os.path.join(folder_path, '**', ext)
-        archive_files.extend(glob.glob(pattern, recursive=True))
-    return archive_files
+    return [entry.path for entry in get_file_index(folder_path).match(archive_extensions)]
 
 
 def extract_zip_file(zip_path: str, extract_to: Optional[str] = None) -> bool:
@@ -125,13 +123,26 @@ def extract_rar_file(rar_path: str, extract_to: Optional[str] = None) -> bool:
         return False
 
 
+@traced('archive', size=lambda folder_path: get_file_index(folder_path).total_size, file_arg=True)
 def extract_archives_in_folder(folder_path: str) -> None:
     """
     在文件夹中查找并解压所有压缩文件
 
+    启用虚拟文件系统时不解压也不删除压缩包，只建立包含压缩包成员的文件索引，
+    后续文本提取直接从压缩包中读取成员。
+
     Args:
         folder_path: 要处理的文件夹路径
     """
+    if ARCHIVE_VIRTUAL_FS:
+        index = get_file_index(folder_path)
+        archives = [entry for entry in index.entries if archive_kind(entry.path)]
+        if archives and VERBOSE_LOGGING:
+            members = sum(1 for entry in index.entries if is_virtual_path(entry.path))
+            print(f"  - 找到 {len(archives)} 个压缩文件（含嵌套），"
+                  f"直接读取其中的 {members} 个文件，不解压到磁盘")
+        return
+
     # 查找 ZIP 文件
     zip_files = find_archive_files(folder_path, ZIP_EXTENSIONS)
     if zip_files:
@@ -139,6 +150,8 @@ def extract_archives_in_folder(folder_path: str) -> None:
             print(f"  - 找到 {len(zip_files)} 个 ZIP 文件，正在解压...")
         for zip_file in zip_files:
             extract_zip_file(zip_file)
+        # 解压改变了文件夹内容，下次查找时重新建立索引（ZIP 中的 RAR 也能被找到）
+        invalidate_file_index(folder_path)
 
     # 查找 RAR 文件
     rar_files = find_archive_files(folder_path, RAR_EXTENSIONS)
@@ -147,6 +160,7 @@ def extract_archives_in_folder(folder_path: str) -> None:
             print(f"  - 找到 {len(rar_files)} 个 RAR 文件，正在解压...")
         for rar_file in rar_files:
             extract_rar_file(rar_file)
+        invalidate_file_index(folder_path)
 
 
 def is_archive_file(file_path: str) -> bool:
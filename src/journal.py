@@ -0,0 +1,98 @@
+"""
+评分日志模块
+每完成一个学生的评分就追加写入 JSONL 日志并立即落盘，
+程序崩溃或中断后可以从日志恢复，已评分的学生无需重新调用 LLM
+"""
+import dataclasses
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from config import VERBOSE_LOGGING
+from models import ScoreResult
+
+
+class GradingJournal:
+    """追加写入的评分日志（每行一个 JSON 对象）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._checked_tail = False
+
+    def _repair_tail(self) -> None:
+        # 上次崩溃可能留下没有换行符的半行，先补上换行，避免新记录与其粘连
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        self._checked_tail = True
+
+    def append(self, result: ScoreResult) -> None:
+        """
+        追加一条评分结果并同步到磁盘
+
+        Args:
+            result: 评分结果
+        """
+        line = json.dumps(dataclasses.asdict(result), ensure_ascii=False) + "\n"
+        with self._lock:
+            if not self._checked_tail:
+                self._repair_tail()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self) -> Dict[str, ScoreResult]:
+        """
+        读取日志中已完成的评分结果
+
+        同一学生出现多次时以最后一条为准；崩溃时写了一半的最后一行会被忽略。
+
+        Returns:
+            {文件夹名: 评分结果}
+        """
+        results: Dict[str, ScoreResult] = {}
+        if not os.path.exists(self.path):
+            return results
+
+        field_names = {f.name for f in dataclasses.fields(ScoreResult)}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                    result = ScoreResult(
+                        **{k: v for k, v in data.items() if k in field_names})
+                except (json.JSONDecodeError, TypeError) as e:
+                    if VERBOSE_LOGGING:
+                        print(f"  - 警告: 跳过评分日志第 {line_number} 行: {e}")
+                    continue
+                results[result.folder_name] = result
+        return results
+
+    def reset(self) -> Optional[str]:
+        """
+        开始一次全新的评分: 已有的日志改名为带时间戳的 .bak 备份，不直接删除
+
+        Returns:
+            备份文件路径，没有旧日志时为 None
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                return None
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            backup = f"{self.path}.{stamp}.bak"
+            index = 1
+            while os.path.exists(backup):
+                backup = f"{self.path}.{stamp}-{index}.bak"
+                index += 1
+            os.replace(self.path, backup)
+            self._checked_tail = False
+            return backup
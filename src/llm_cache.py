@@ -0,0 +1,137 @@
+"""
+LLM 评分结果缓存模块
+以提示词、模型和温度的哈希为键缓存评分结果，重复运行时无需再次调用 API
+"""
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from config import (
+    CACHE_DIR, LLM_MODEL, SCORING_TEMPERATURE,
+    LLM_CACHE_ENABLED, LLM_CACHE_MODE, LLM_CACHE_MAX_BYTES
+)
+from cache_store import SQLiteCache
+from models import Grade
+
+# 缓存模式
+CACHE_MODE_USE = 'use'          # 命中则直接返回，未命中时调用并写入
+CACHE_MODE_REFRESH = 'refresh'  # 忽略已有缓存，调用后覆盖写入
+CACHE_MODE_BYPASS = 'bypass'    # 完全不读写缓存
+CACHE_MODES = (CACHE_MODE_USE, CACHE_MODE_REFRESH, CACHE_MODE_BYPASS)
+
+
+def make_cache_key(messages: List[Dict[str, str]], model: str = LLM_MODEL,
+                   temperature: float = SCORING_TEMPERATURE, variant: str = "") -> str:
+    """
+    计算评分请求的缓存键
+
+    Args:
+        messages: 请求消息列表（系统提示词 + 用户提示词）
+        model: 模型名称
+        temperature: 采样温度
+        variant: 评分方式标记（如多次采样评分），为空时与单次评分的键相同
+
+    Returns:
+        SHA-256 十六进制摘要
+    """
+    key = {'messages': messages, 'model': model, 'temperature': temperature}
+    if variant:
+        key['variant'] = variant
+    payload = json.dumps(key, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """LLM 评分结果的持久化缓存"""
+
+    def __init__(self, mode: str = LLM_CACHE_MODE):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的缓存模式: {mode}，可选值: {', '.join(CACHE_MODES)}")
+        self.mode = mode
+        self.store = SQLiteCache(CACHE_DIR / "llm_cache.sqlite3",
+                                 "llm_responses", LLM_CACHE_MAX_BYTES)
+
+    def get(self, messages: List[Dict[str, str]], model: str = LLM_MODEL,
+            temperature: float = SCORING_TEMPERATURE, variant: str = "") -> Optional[Grade]:
+        """
+        查询缓存的评分结果
+
+        Args:
+            messages: 请求消息列表
+            model: 模型名称
+            temperature: 采样温度
+            variant: 评分方式标记
+
+        Returns:
+            评分，未命中或非读取模式时返回 None
+        """
+        if self.mode != CACHE_MODE_USE:
+            return None
+        value = self.store.get(make_cache_key(messages, model, temperature, variant))
+        if value is None:
+            return None
+        data = json.loads(value.decode('utf-8'))
+        return Grade(score=data['score'], comment=data['comment'], samples=data.get('samples'))
+
+    def put(self, messages: List[Dict[str, str]], grade: Grade, model: str = LLM_MODEL,
+            temperature: float = SCORING_TEMPERATURE, variant: str = "") -> None:
+        """
+        写入评分结果
+
+        Args:
+            messages: 请求消息列表
+            grade: 评分
+            model: 模型名称
+            temperature: 采样温度
+            variant: 评分方式标记
+        """
+        if self.mode == CACHE_MODE_BYPASS:
+            return
+        data = {'score': grade.score, 'comment': grade.comment}
+        if grade.samples:
+            data['samples'] = grade.samples
+        value = json.dumps(data, ensure_ascii=False)
+        self.store.put(make_cache_key(messages, model, temperature, variant), value.encode('utf-8'))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        返回缓存统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return self.store.stats()
+
+
+# 全局缓存实例
+_llm_cache: Optional[LLMResponseCache] = None
+_cache_mode: str = LLM_CACHE_MODE if LLM_CACHE_ENABLED else CACHE_MODE_BYPASS
+
+
+def set_llm_cache_mode(mode: str) -> None:
+    """
+    设置本次运行的缓存模式（需在首次评分前调用）
+
+    Args:
+        mode: 'use'、'refresh' 或 'bypass'
+    """
+    global _llm_cache, _cache_mode
+    if mode not in CACHE_MODES:
+        raise ValueError(f"未知的缓存模式: {mode}，可选值: {', '.join(CACHE_MODES)}")
+    _cache_mode = mode
+    _llm_cache = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    获取 LLM 缓存实例（单例模式）
+
+    Returns:
+        缓存实例，缓存被绕过时返回 None
+    """
+    global _llm_cache
+    if _cache_mode == CACHE_MODE_BYPASS:
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(_cache_mode)
+    return _llm_cache
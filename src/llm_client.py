@@ -4,52 +4,47 @@ LLM 客户端模块
 """
 from config import (
     OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MODEL,
-    SCORING_TEMPERATURE, MIN_SCORE, MAX_SCORE, DEFAULT_SCORE,
-    VERBOSE_LOGGING
+    SCORING_TEMPERATURE, MIN_SCORE, MAX_SCORE,
+    LLM_WORKERS, LLM_RPM_LIMIT, LLM_TPM_LIMIT,
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_CONNECTIONS,
+    LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_LATENCY_TARGET,
+    LLM_JSON_REASK_ATTEMPTS, LLM_FALLBACK_MODEL,
+    LLM_CONSENSUS_ENABLED, LLM_CONSENSUS_USE_N, VERBOSE_LOGGING
 )
-import json
-from typing import Tuple, Optional
+from models import Grade
+from rate_limiter import RateLimiter, AdaptiveConcurrency
+from llm_cache import get_llm_cache
+from llm_usage import record_usage
+from llm_resilience import (
+    RetryBudget, get_circuit_breaker, wait_for_circuit, await_circuit,
+    is_rate_limit, load_json_object, build_reask_messages
+)
+from consensus import (
+    consensus_temperature, consensus_cache_variant, initial_samples, samples_needed,
+    combine_samples
+)
+from tracing import traced
+from tokenizer import count_tokens, count_message_tokens
+from chunked_grading import (
+    needs_chunking, split_into_chunks, extract_rubric_criteria,
+    build_chunk_messages, parse_chunk_response, build_reduce_messages
+)
+import metrics
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional, TypeVar
 
 # 将可选依赖的导入移至函数内部
 OPENAI_AVAILABLE = None
 
+# 未评分结果的评语前缀（分数留空）
+UNGRADED_MARK = "【未评分】"
 
-class LLMClient:
-    """LLM 客户端类"""
-
-    def __init__(self):
-        global OPENAI_AVAILABLE
-        if OPENAI_AVAILABLE is None:
-            try:
-                from openai import OpenAI
-                OPENAI_AVAILABLE = True
-            except ImportError:
-                OPENAI_AVAILABLE = False
-
-        if not OPENAI_AVAILABLE:
-            raise ImportError("OpenAI 包未安装，无法使用 LLM 功能")
-
-        if not OPENAI_API_KEY:
-            raise ValueError("未找到 OpenAI API 密钥，请设置环境变量 'OPENAI_API_KEY'")
-
-        from openai import OpenAI
-        self.client = OpenAI(
-            api_key=OPENAI_API_KEY,
-            base_url=OPENAI_BASE_URL
-        )
-
-    def score_content(self, student_content: str, rubric: str) -> Tuple[float, str]:
-        """
-        使用 LLM 对学生内容进行评分
-
-        Args:
-            student_content: 学生提交的内容
-            rubric: 评分标准
+T = TypeVar("T")
 
-        Returns:
-            (分数, 评语) 元组
-        """
-        system_prompt = """
+SYSTEM_PROMPT = """
         你是一名经验丰富的大学计算机课程助教，你的任务是根据提供的评分标准，对学生的软件测试综合实验报告进行细致、公正的评分。
 
         重要评分原则：
@@ -63,15 +58,49 @@ class LLMClient:
         2. 'comment' (一个字符串): 详细的评分评语，说明得分理由和改进建议
         """
 
-        user_prompt = f"""
+
+def ensure_openai() -> None:
+    """
+    检查 OpenAI 包和 API 密钥是否可用
+
+    Raises:
+        ImportError: 如果 OpenAI 包未安装
+        ValueError: 如果 API 密钥未设置
+    """
+    global OPENAI_AVAILABLE
+    if OPENAI_AVAILABLE is None:
+        try:
+            from openai import OpenAI
+            OPENAI_AVAILABLE = True
+        except ImportError:
+            OPENAI_AVAILABLE = False
+
+    if not OPENAI_AVAILABLE:
+        raise ImportError("OpenAI 包未安装，无法使用 LLM 功能")
+
+    if not OPENAI_API_KEY:
+        raise ValueError("未找到 OpenAI API 密钥，请设置环境变量 'OPENAI_API_KEY'")
+
+
+def build_scoring_messages(student_content: str, rubric: str) -> List[Dict[str, str]]:
+    """
+    构造评分请求的消息列表
+
+    Args:
+        student_content: 学生提交的内容
+        rubric: 评分标准
+
+    Returns:
+        chat.completions 接口使用的消息列表
+    """
+    # 评分标准和评分要求放在前面、学生内容放在最后，同一次运行中所有请求的前缀逐字节相同，
+    # 可以命中服务商的前缀缓存
+    user_prompt = f"""
         请根据以下【评分标准】对这位学生的【软件测试综合实验报告】进行评分。
 
         【评分标准】
         {rubric}
 
-        【学生提交内容】
-        {student_content}
-
         请仔细分析报告的以下方面：
         1. 报告格式的清晰性和规范性
         2. 实验要求的覆盖程度
@@ -80,43 +109,746 @@ class LLMClient:
         5. 是否疑似大模型直接生成（注意格式风格和是否提供prompt过程）
 
         根据10分制评分标准，以JSON格式返回评分结果，包含 'score' 和 'comment' 两个键。
+
+        【学生提交内容】
+        {student_content}
         """
 
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def completion_params(messages: List[Dict[str, str]], model: str = LLM_MODEL,
+                      temperature: Optional[float] = None, n: int = 1) -> Dict:
+    """
+    构造 JSON 模式评分请求的参数（同步、异步和批量评分共用）
+
+    Args:
+        messages: 消息列表
+        model: 模型名称
+        temperature: 采样温度，None 表示使用 SCORING_TEMPERATURE
+        n: 一次请求返回的样本数
+
+    Returns:
+        chat.completions 接口的请求参数
+    """
+    params = {
+        "model": model,
+        "messages": messages,
+        "response_format": {"type": "json_object"},
+        "temperature": SCORING_TEMPERATURE if temperature is None else temperature,
+    }
+    if n > 1:
+        params["n"] = n
+    return params
+
+
+def parse_scoring_response(response_content: Optional[str]) -> Tuple[float, str]:
+    """
+    解析 LLM 返回的评分 JSON
+
+    Args:
+        response_content: LLM 返回的消息内容
+
+    Returns:
+        (分数, 评语) 元组
+
+    Raises:
+        ValueError: 如果返回内容为空、不是合法 JSON（且无法修复）或缺少有效的分数
+    """
+    result_json = load_json_object(response_content)
+    try:
+        score = float(result_json['score'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("返回的 JSON 中缺少有效的 'score'")
+    comment = result_json.get('comment', "LLM未提供评语，请手动检查。")
+
+    # 确保分数在合理范围内
+    score = max(MIN_SCORE, min(MAX_SCORE, score))
+    return score, comment
+
+
+def ungraded_result(reason: str) -> Grade:
+    """
+    构造未评分结果（分数留空，评语中说明原因），不再以默认分数代替
+
+    Args:
+        reason: 未评分的原因
+
+    Returns:
+        分数为 None 的评分
+    """
+    metrics.add('llm_resilience', 'ungraded', 1)
+    return Grade(score=None, comment=f"{UNGRADED_MARK}{reason}")
+
+
+def _fallback_comment(model: str, comment: str) -> str:
+    metrics.add('llm_resilience', 'fallback_used', 1)
+    return f"[由备用模型 {model} 评分] {comment}"
+
+
+def _scoring_models() -> List[str]:
+    return [LLM_MODEL] + ([LLM_FALLBACK_MODEL] if LLM_FALLBACK_MODEL else [])
+
+
+# 是否使用多次采样一致性评分
+_consensus_enabled: bool = LLM_CONSENSUS_ENABLED
+
+
+def set_consensus_mode(enabled: bool) -> None:
+    """
+    设置本次运行是否使用多次采样一致性评分（需在首次评分前调用）
+
+    Args:
+        enabled: 是否启用
+    """
+    global _consensus_enabled
+    _consensus_enabled = enabled
+
+
+def is_consensus_enabled() -> bool:
+    return _consensus_enabled
+
+
+def _cache_scope() -> Tuple[float, str]:
+    # 多次采样的结果与单次评分的结果分开缓存
+    if _consensus_enabled:
+        return consensus_temperature(), consensus_cache_variant()
+    return SCORING_TEMPERATURE, ""
+
+
+def build_chunk_requests(student_content: str, rubric: str) -> List[List[Dict[str, str]]]:
+    """
+    将超出 token 预算的学生内容切块，构造各块的评估请求
+
+    Args:
+        student_content: 学生提交的内容
+        rubric: 评分标准
+
+    Returns:
+        各块的消息列表，按块顺序排列
+    """
+    chunks = split_into_chunks(student_content)
+    criteria = extract_rubric_criteria(rubric)
+    if VERBOSE_LOGGING:
+        print(f"  - 内容约 {count_tokens(student_content)} tokens，超出单次评分预算，"
+              f"分 {len(chunks)} 块评估后汇总评分...")
+    return [build_chunk_messages(chunk, index, len(chunks), rubric, criteria)
+            for index, chunk in enumerate(chunks, 1)]
+
+
+def lookup_cache(messages: List[Dict[str, str]]) -> Optional[Grade]:
+    """
+    查询评分缓存，缓存不可用时视为未命中
+
+    Args:
+        messages: 请求消息列表
+
+    Returns:
+        评分，未命中时返回 None
+    """
+    temperature, variant = _cache_scope()
+    try:
+        cache = get_llm_cache()
+        cached = cache.get(messages, LLM_MODEL, temperature, variant) if cache else None
+    except Exception as e:
+        if VERBOSE_LOGGING:
+            print(f"  - 警告: 读取 LLM 缓存失败: {e}")
+        return None
+
+    if cached is not None and VERBOSE_LOGGING:
+        print("  - 命中 LLM 缓存，跳过 API 调用。")
+    return cached
+
+
+def store_cache(messages: List[Dict[str, str]], grade: Grade, model: str = LLM_MODEL) -> None:
+    """
+    将成功的评分结果写入缓存
+
+    Args:
+        messages: 请求消息列表
+        grade: 评分
+        model: 实际评分的模型（备用模型的结果不会在下次运行时被主模型的查询命中）
+    """
+    temperature, variant = _cache_scope()
+    try:
+        cache = get_llm_cache()
+        if cache:
+            cache.put(messages, grade, model, temperature, variant)
+    except Exception as e:
+        if VERBOSE_LOGGING:
+            print(f"  - 警告: 写入 LLM 缓存失败: {e}")
+
+
+def _log_retry(error: Exception, delay: float, model: str) -> None:
+    if VERBOSE_LOGGING:
+        reason = "触发限流" if is_rate_limit(error) else f"请求失败（{error}）"
+        print(f"  - {model} {reason}，{delay:.1f} 秒后重试")
+
+
+def _log_reask(error: Exception) -> None:
+    metrics.add('llm_resilience', 'reasked', 1)
+    if VERBOSE_LOGGING:
+        print(f"  - 返回内容无法解析（{error}），要求模型重新输出")
+
+
+def _n_rejected(error: Exception) -> bool:
+    # 服务商不支持 n 参数时通常返回 400，此后改为并发请求
+    rejected = getattr(error, "status_code", None) == 400
+    if rejected and VERBOSE_LOGGING:
+        print(f"  - 服务商不支持 n 参数，改为并发请求采样: {error}")
+    return rejected
+
+
+def _parse_samples(contents: List[Optional[str]]) -> List[Tuple[float, str]]:
+    samples = []
+    for content in contents:
         try:
-            if VERBOSE_LOGGING:
-                print("  - 正在调用 LLM 进行分析...")
+            samples.append(parse_scoring_response(content))
+        except ValueError:
+            # 无法解析的样本计入采样次数但不参与汇总
+            continue
+    return samples
+
+
+def _log_consensus(grade: Grade) -> None:
+    if VERBOSE_LOGGING and grade.samples and len(grade.samples) > 1:
+        print(f"  - 采样 {len(grade.samples)} 次: {', '.join(f'{s:g}' for s in grade.samples)}")
 
-            response = self.client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=SCORING_TEMPERATURE,
-            )
 
-            response_content = response.choices[0].message.content
-            if response_content is None:
-                raise ValueError("LLM 返回了空内容")
+class LLMClient:
+    """LLM 客户端类"""
 
-            result_json = json.loads(response_content)
-            score = float(result_json.get('score', DEFAULT_SCORE))
-            comment = result_json.get('comment', "LLM未提供评语，请手动检查。")
+    def __init__(self):
+        ensure_openai()
 
-            # 确保分数在合理范围内
-            score = max(MIN_SCORE, min(MAX_SCORE, score))
+        from openai import OpenAI
+        # 关闭 SDK 内置重试，由本客户端统一退避重试并反馈给熔断器
+        self.client = OpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            max_retries=0
+        )
+        self.use_n = LLM_CONSENSUS_USE_N
 
+    def grade_content(self, student_content: str, rubric: str) -> Grade:
+        """
+        使用 LLM 对学生内容进行评分
+
+        启用多次采样时对最终评分请求采样多次；主模型重试后仍失败时改用备用模型（如已配置），
+        都失败时返回未评分结果。
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+
+        Returns:
+            评分
+        """
+        messages = build_scoring_messages(student_content, rubric)
+        cached = lookup_cache(messages)
+        if cached is not None:
+            return cached
+
+        if VERBOSE_LOGGING:
+            print("  - 正在调用 LLM 进行分析...")
+
+        error: Optional[Exception] = None
+        for model in _scoring_models():
+            try:
+                if needs_chunking(student_content):
+                    grade = self._grade_chunked(student_content, rubric, model)
+                else:
+                    grade = self._grade_messages(messages, model)
+            except Exception as e:
+                error = e
+                if VERBOSE_LOGGING:
+                    print(f"  - LLM API 调用失败（{model}）: {e}")
+                continue
+
+            if model != LLM_MODEL:
+                grade.comment = _fallback_comment(model, grade.comment)
+            store_cache(messages, grade, model)
             if VERBOSE_LOGGING:
+                _log_consensus(grade)
                 print("  - LLM分析完成。")
+            return grade
 
-            return score, comment
+        return ungraded_result(f"LLM分析失败，请手动评分。错误信息: {error}")
 
-        except Exception as e:
-            error_msg = f"LLM分析失败，请手动评分。错误信息: {e}"
-            if VERBOSE_LOGGING:
-                print(f"  - LLM API 调用失败: {e}")
-            return DEFAULT_SCORE, error_msg
+    def score_content(self, student_content: str, rubric: str) -> Tuple[Optional[float], str]:
+        """
+        使用 LLM 对学生内容进行评分
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+
+        Returns:
+            (分数, 评语) 元组，未评分时分数为 None
+        """
+        grade = self.grade_content(student_content, rubric)
+        return grade.score, grade.comment
+
+    def _request(self, messages: List[Dict[str, str]], model: str = LLM_MODEL,
+                 temperature: Optional[float] = None, n: int = 1):
+        """
+        发出一次 JSON 模式的请求，暂时性错误按退避策略重试，熔断期间等待
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            temperature: 采样温度，None 表示使用 SCORING_TEMPERATURE
+            n: 一次请求返回的样本数
+
+        Returns:
+            chat.completions 响应对象
+        """
+        breaker = get_circuit_breaker(model)
+        budget = RetryBudget()
+        while True:
+            wait_for_circuit(breaker)
+            try:
+                response = self.client.chat.completions.create(
+                    **completion_params(messages, model, temperature, n))
+            except Exception as e:
+                breaker.record(e)
+                delay = budget.next_delay(e)
+                if delay is None:
+                    raise
+                _log_retry(e, delay, model)
+                time.sleep(delay)
+                continue
+            breaker.record(None)
+            record_usage(getattr(response, "usage", None))
+            return response
+
+    def _complete(self, messages: List[Dict[str, str]], model: str = LLM_MODEL) -> Optional[str]:
+        """
+        发出一次请求并返回消息内容
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+
+        Returns:
+            LLM 返回的消息内容
+        """
+        return self._request(messages, model).choices[0].message.content
+
+    def _complete_json(self, messages: List[Dict[str, str]], parse: Callable[[Optional[str]], T],
+                       model: str = LLM_MODEL) -> T:
+        """
+        发出请求并解析返回的 JSON，无法解析时要求模型重新输出
+
+        Args:
+            messages: 消息列表
+            parse: 解析函数，无法解析时抛出 ValueError
+            model: 模型名称
+
+        Returns:
+            解析结果
+        """
+        content = self._complete(messages, model)
+        for attempt in range(LLM_JSON_REASK_ATTEMPTS + 1):
+            try:
+                return parse(content)
+            except ValueError as e:
+                if attempt == LLM_JSON_REASK_ATTEMPTS:
+                    raise
+                _log_reask(e)
+                messages = build_reask_messages(messages, content, e)
+                content = self._complete(messages, model)
+
+    def _grade_messages(self, messages: List[Dict[str, str]], model: str = LLM_MODEL) -> Grade:
+        """
+        对评分请求（整篇评分或分块评分的汇总请求）给出评分
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+
+        Returns:
+            评分
+        """
+        if not _consensus_enabled:
+            score, comment = self._complete_json(messages, parse_scoring_response, model)
+            return Grade(score=score, comment=comment)
+
+        samples: List[Tuple[float, str]] = []
+        spent = 0
+        count = initial_samples()
+        while count:
+            samples += _parse_samples(self._sample(messages, model, count))
+            spent += count
+            count = samples_needed([score for score, _ in samples], spent)
+        return combine_samples(samples, spent)
+
+    def _sample(self, messages: List[Dict[str, str]], model: str, count: int) -> List[Optional[str]]:
+        """
+        获取 count 个样本: 优先用 n 参数在一次请求中获取，不足的部分并发请求补齐
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            count: 样本数
+
+        Returns:
+            各样本的消息内容
+        """
+        temperature = consensus_temperature()
+        contents: List[Optional[str]] = []
+        if count > 1 and self.use_n:
+            try:
+                response = self._request(messages, model, temperature, count)
+                contents = [choice.message.content for choice in response.choices][:count]
+            except Exception as e:
+                if not _n_rejected(e):
+                    raise
+                self.use_n = False
+
+        missing = count - len(contents)
+        if missing > 0:
+            with ThreadPoolExecutor(max_workers=min(missing, LLM_WORKERS)) as executor:
+                contents += executor.map(
+                    lambda _: self._request(
+                        messages, model, temperature).choices[0].message.content,
+                    range(missing))
+        return contents
+
+    def _grade_chunked(self, student_content: str, rubric: str,
+                       model: str = LLM_MODEL) -> Grade:
+        """
+        分块评分：并行评估各块，再汇总给出最终分数（多次采样只作用于汇总请求）
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+            model: 模型名称
+
+        Returns:
+            评分
+        """
+        requests = build_chunk_requests(student_content, rubric)
+        with ThreadPoolExecutor(max_workers=min(len(requests), LLM_WORKERS)) as executor:
+            notes = list(executor.map(
+                lambda chunk_messages: self._complete_json(
+                    chunk_messages, parse_chunk_response, model),
+                requests))
+        reduce_messages = build_reduce_messages(notes, rubric, SYSTEM_PROMPT)
+        return self._grade_messages(reduce_messages, model)
+
+
+class AsyncLLMClient:
+    """
+    异步 LLM 客户端
+
+    所有请求共享一个长连接 HTTP 连接池，发出请求前经过 RPM/TPM 令牌桶限流，
+    并发数由 AIMD 控制器根据 429 响应和请求延迟自动调整。
+    """
+
+    def __init__(self, max_concurrency: int = LLM_WORKERS):
+        ensure_openai()
+
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        )
+        # 关闭 SDK 内置重试，由本客户端处理，429 才能反馈给并发控制器
+        self.client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            http_client=self.http_client,
+            max_retries=0
+        )
+        self.limiter = RateLimiter(LLM_RPM_LIMIT, LLM_TPM_LIMIT)
+        self.concurrency = AdaptiveConcurrency(
+            initial=LLM_INITIAL_CONCURRENCY,
+            minimum=LLM_MIN_CONCURRENCY,
+            maximum=max_concurrency,
+            latency_target=LLM_LATENCY_TARGET
+        )
+        self.use_n = LLM_CONSENSUS_USE_N
+
+    async def _create_completion(self, messages: List[Dict[str, str]], model: str = LLM_MODEL,
+                                 temperature: Optional[float] = None, n: int = 1):
+        """
+        在限流、并发控制和熔断器下发出请求，暂时性错误按退避策略重试
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            temperature: 采样温度，None 表示使用 SCORING_TEMPERATURE
+            n: 一次请求返回的样本数
+
+        Returns:
+            chat.completions 响应对象
+        """
+        estimated = count_message_tokens(messages)
+        breaker = get_circuit_breaker(model)
+        budget = RetryBudget()
+        while True:
+            await await_circuit(breaker)
+            await self.limiter.acquire(estimated)
+            async with self.concurrency:
+                started = time.monotonic()
+                try:
+                    response = await self.client.chat.completions.create(
+                        **completion_params(messages, model, temperature, n))
+                except Exception as e:
+                    if is_rate_limit(e):
+                        self.concurrency.on_rate_limited()
+                    breaker.record(e)
+                    delay = budget.next_delay(e)
+                    if delay is None:
+                        raise
+                    error = e
+                else:
+                    self.concurrency.on_success(time.monotonic() - started)
+                    breaker.record(None)
+                    usage = getattr(response, "usage", None)
+                    record_usage(usage)
+                    self.limiter.reconcile(
+                        estimated, getattr(usage, "total_tokens", None))
+                    return response
+
+            _log_retry(error, delay, model)
+            if VERBOSE_LOGGING and is_rate_limit(error):
+                print(f"    （当前并发上限 {int(self.concurrency.limit)}）")
+            await asyncio.sleep(delay)
+
+    async def _complete_json(self, messages: List[Dict[str, str]],
+                             parse: Callable[[Optional[str]], T], model: str = LLM_MODEL) -> T:
+        """
+        发出请求并解析返回的 JSON，无法解析时要求模型重新输出（异步）
+
+        Args:
+            messages: 消息列表
+            parse: 解析函数，无法解析时抛出 ValueError
+            model: 模型名称
+
+        Returns:
+            解析结果
+        """
+        response = await self._create_completion(messages, model)
+        content = response.choices[0].message.content
+        for attempt in range(LLM_JSON_REASK_ATTEMPTS + 1):
+            try:
+                return parse(content)
+            except ValueError as e:
+                if attempt == LLM_JSON_REASK_ATTEMPTS:
+                    raise
+                _log_reask(e)
+                messages = build_reask_messages(messages, content, e)
+                response = await self._create_completion(messages, model)
+                content = response.choices[0].message.content
+
+    async def grade_content(self, student_content: str, rubric: str) -> Grade:
+        """
+        使用 LLM 对学生内容进行评分（异步）
+
+        启用多次采样时对最终评分请求采样多次；主模型重试后仍失败时改用备用模型（如已配置），
+        都失败时返回未评分结果。
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+
+        Returns:
+            评分
+        """
+        messages = build_scoring_messages(student_content, rubric)
+        cached = lookup_cache(messages)
+        if cached is not None:
+            return cached
+
+        error: Optional[Exception] = None
+        for model in _scoring_models():
+            try:
+                if needs_chunking(student_content):
+                    grade = await self._grade_chunked(student_content, rubric, model)
+                else:
+                    grade = await self._grade_messages(messages, model)
+            except Exception as e:
+                error = e
+                if VERBOSE_LOGGING:
+                    print(f"  - LLM API 调用失败（{model}）: {e}")
+                continue
+
+            if model != LLM_MODEL:
+                grade.comment = _fallback_comment(model, grade.comment)
+            store_cache(messages, grade, model)
+            _log_consensus(grade)
+            return grade
+
+        return ungraded_result(f"LLM分析失败，请手动评分。错误信息: {error}")
+
+    async def score_content(self, student_content: str, rubric: str) -> Tuple[Optional[float], str]:
+        """
+        使用 LLM 对学生内容进行评分（异步）
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+
+        Returns:
+            (分数, 评语) 元组，未评分时分数为 None
+        """
+        grade = await self.grade_content(student_content, rubric)
+        return grade.score, grade.comment
+
+    async def _grade_messages(self, messages: List[Dict[str, str]],
+                              model: str = LLM_MODEL) -> Grade:
+        """
+        对评分请求（整篇评分或分块评分的汇总请求）给出评分（异步）
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+
+        Returns:
+            评分
+        """
+        if not _consensus_enabled:
+            score, comment = await self._complete_json(messages, parse_scoring_response, model)
+            return Grade(score=score, comment=comment)
+
+        samples: List[Tuple[float, str]] = []
+        spent = 0
+        count = initial_samples()
+        while count:
+            samples += _parse_samples(await self._sample(messages, model, count))
+            spent += count
+            count = samples_needed([score for score, _ in samples], spent)
+        return combine_samples(samples, spent)
+
+    async def _sample(self, messages: List[Dict[str, str]], model: str,
+                      count: int) -> List[Optional[str]]:
+        """
+        获取 count 个样本: 优先用 n 参数在一次请求中获取，不足的部分并发请求补齐（异步）
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            count: 样本数
+
+        Returns:
+            各样本的消息内容
+        """
+        temperature = consensus_temperature()
+        contents: List[Optional[str]] = []
+        if count > 1 and self.use_n:
+            try:
+                response = await self._create_completion(messages, model, temperature, count)
+                contents = [choice.message.content for choice in response.choices][:count]
+            except Exception as e:
+                if not _n_rejected(e):
+                    raise
+                self.use_n = False
+
+        missing = count - len(contents)
+        if missing > 0:
+            responses = await asyncio.gather(
+                *(self._create_completion(messages, model, temperature) for _ in range(missing)))
+            contents += [response.choices[0].message.content for response in responses]
+        return contents
+
+    async def _grade_chunked(self, student_content: str, rubric: str,
+                             model: str = LLM_MODEL) -> Grade:
+        """
+        分块评分：并发评估各块，再汇总给出最终分数（异步，多次采样只作用于汇总请求）
+
+        各块请求同样经过限流和并发控制。
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+            model: 模型名称
+
+        Returns:
+            评分
+        """
+        requests = build_chunk_requests(student_content, rubric)
+        notes = await asyncio.gather(
+            *(self._complete_json(chunk_messages, parse_chunk_response, model)
+              for chunk_messages in requests))
+        reduce_messages = build_reduce_messages(notes, rubric, SYSTEM_PROMPT)
+        return await self._grade_messages(reduce_messages, model)
+
+    async def aclose(self) -> None:
+        """关闭共享的 HTTP 连接池"""
+        await self.client.close()
+
+
+class AsyncLLMRunner:
+    """
+    在后台线程的事件循环中运行 AsyncLLMClient
+
+    供流水线等同步代码从多个线程并发调用，所有调用共享同一个异步客户端。
+    """
+
+    def __init__(self, max_concurrency: int = LLM_WORKERS):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="llm-event-loop", daemon=True)
+        self._thread.start()
+        try:
+            self.client = self._run(self._create_client(max_concurrency))
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    async def _create_client(max_concurrency: int) -> AsyncLLMClient:
+        # 在事件循环内创建，使连接池与该循环绑定
+        return AsyncLLMClient(max_concurrency)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    @traced('llm', size=lambda self, student_content, rubric: len(student_content.encode('utf-8')))
+    def grade_content(self, student_content: str, rubric: str) -> Grade:
+        """
+        同步接口：阻塞当前线程直到评分完成
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+
+        Returns:
+            评分
+        """
+        return self._run(self.client.grade_content(student_content, rubric))
+
+    def score_content(self, student_content: str, rubric: str) -> Tuple[Optional[float], str]:
+        """
+        同步接口：阻塞当前线程直到评分完成
+
+        Args:
+            student_content: 学生提交的内容
+            rubric: 评分标准
+
+        Returns:
+            (分数, 评语) 元组，未评分时分数为 None
+        """
+        grade = self.grade_content(student_content, rubric)
+        return grade.score, grade.comment
+
+    def close(self) -> None:
+        """关闭客户端并停止事件循环"""
+        if hasattr(self, "client"):
+            self._run(self.client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
 
 
 # 全局 LLM 客户端实例
@@ -140,21 +872,37 @@ def get_llm_client() -> LLMClient:
     return _llm_client
 
 
-def analyze_with_llm(student_content: str, rubric: str) -> Tuple[float, str]:
+@traced('llm', size=lambda student_content, rubric: len(student_content.encode('utf-8')))
+def grade_with_llm(student_content: str, rubric: str) -> Grade:
     """
-    分析学生内容并返回评分结果（兼容性函数）
+    分析学生内容并返回评分（启用多次采样时包含各次采样的分数）
 
     Args:
         student_content: 学生提交的内容
         rubric: 评分标准
 
     Returns:
-        (分数, 评语) 元组
+        评分，未评分时分数为 None
     """
     try:
         client = get_llm_client()
-        return client.score_content(student_content, rubric)
+        return client.grade_content(student_content, rubric)
     except (ImportError, ValueError) as e:
         if VERBOSE_LOGGING:
             print(f"  - LLM 客户端初始化失败: {e}")
-        return DEFAULT_SCORE, f"LLM功能不可用: {e}"
+        return ungraded_result(f"LLM功能不可用: {e}")
+
+
+def analyze_with_llm(student_content: str, rubric: str) -> Tuple[Optional[float], str]:
+    """
+    分析学生内容并返回评分结果（兼容性函数）
+
+    Args:
+        student_content: 学生提交的内容
+        rubric: 评分标准
+
+    Returns:
+        (分数, 评语) 元组，未评分时分数为 None
+    """
+    grade = grade_with_llm(student_content, rubric)
+    return grade.score, grade.comment
@@ -0,0 +1,386 @@
+"""
+LLM 调用容错模块
+提供带抖动的指数退避（遵循 Retry-After）、熔断器和 JSON 修复，同步和异步客户端共用
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import (
+    LLM_MAX_RETRIES, LLM_RATE_LIMIT_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_COOLDOWN, LLM_CIRCUIT_MAX_COOLDOWN, LLM_CIRCUIT_MAX_WAIT, VERBOSE_LOGGING
+)
+import metrics
+
+# 熔断器打开后，试探请求进行期间其他请求的等待间隔（秒）
+_PROBE_WAIT = 1.0
+
+# 需要重试的 HTTP 状态码（另加全部 5xx）
+_RETRYABLE_STATUS = {408, 409, 429}
+
+_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+REASK_PROMPT = ("上面的输出无法解析（{error}）。请只返回一个符合要求的JSON对象，"
+                "不要包含代码块标记、解释或其他内容。")
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时间过长，放弃本次调用"""
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    判断错误是否是暂时性的（超时、连接错误、429、5xx），值得重试
+
+    Args:
+        error: OpenAI SDK 抛出的异常
+
+    Returns:
+        是否重试
+    """
+    try:
+        from openai import APIConnectionError, APIStatusError
+    except ImportError:
+        return False
+    # APITimeoutError 是 APIConnectionError 的子类
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    判断错误是否说明服务商不可用（计入熔断器）
+
+    429 说明服务商正常但超出限额，由限流和自适应并发处理，不计入。
+    """
+    return is_retryable(error) and not is_rate_limit(error)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    从响应的 retry-after-ms 或 Retry-After 头中读取等待秒数
+
+    Args:
+        error: OpenAI SDK 抛出的异常
+
+    Returns:
+        等待秒数，无法解析时返回 None
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        milliseconds = headers.get("retry-after-ms")
+        if milliseconds is not None:
+            return float(milliseconds) / 1000
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """
+    计算第 attempt 次重试前的等待时间
+
+    服务商给出 Retry-After 时照办（另加少量抖动，避免所有请求同时重试），
+    否则使用全抖动指数退避: [0, min(上限, 基数 * 2^attempt)] 内均匀取值。
+
+    Args:
+        attempt: 已重试次数（从 0 开始）
+        error: 触发重试的异常
+
+    Returns:
+        等待秒数
+    """
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        return retry_after + random.uniform(0, LLM_RETRY_BASE_DELAY)
+    ceiling = min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+class RetryBudget:
+    """单个请求的重试计数，429 和其他暂时性错误分别计数"""
+
+    def __init__(self):
+        self.rate_limited = 0
+        self.errors = 0
+
+    def next_delay(self, error: Exception) -> Optional[float]:
+        """
+        记录一次失败并返回重试前的等待秒数
+
+        Args:
+            error: 本次请求的异常
+
+        Returns:
+            等待秒数，不可重试或重试次数已用完时返回 None
+        """
+        if is_rate_limit(error):
+            if self.rate_limited >= LLM_RATE_LIMIT_RETRIES:
+                return None
+            delay = retry_delay(self.rate_limited, error)
+            self.rate_limited += 1
+            metrics.add('llm_resilience', 'rate_limited', 1)
+        elif is_retryable(error):
+            if self.errors >= LLM_MAX_RETRIES:
+                return None
+            delay = retry_delay(self.errors, error)
+            self.errors += 1
+        else:
+            return None
+        metrics.add('llm_resilience', 'retries', 1)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续 threshold 次请求因服务商故障失败时打开，打开期间所有请求暂停；
+    冷却结束后只放行一个试探请求，成功则关闭，失败则以加倍的冷却时间重新打开。
+    线程安全，同步和异步客户端共用。
+    """
+
+    def __init__(self, name: str, threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown: float = LLM_CIRCUIT_COOLDOWN,
+                 max_cooldown: float = LLM_CIRCUIT_MAX_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """
+        返回发出请求前需要等待的秒数，0 表示可以立即发出
+
+        冷却结束后第一个调用方成为试探请求，其余调用方继续等待试探结果。
+        """
+        if not self.threshold:
+            return 0.0
+        with self._lock:
+            if self._open_until is None:
+                return 0.0
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probing:
+                return _PROBE_WAIT
+            self._probing = True
+            return 0.0
+
+    def on_success(self) -> None:
+        """服务商正常响应（包括 4xx 等非暂时性错误）"""
+        with self._lock:
+            if self._open_until is not None and VERBOSE_LOGGING:
+                print(f"  - {self.name} 恢复正常，继续发送请求")
+            self._failures = 0
+            self._open_until = None
+            self._probing = False
+            self._cooldown = self.base_cooldown
+
+    def record(self, error: Optional[Exception]) -> None:
+        """
+        根据一次请求的结果更新状态
+
+        Args:
+            error: 请求抛出的异常，成功时为 None；429 和 4xx 等说明服务商仍在响应，按成功处理
+        """
+        if error is not None and is_provider_failure(error):
+            self.on_failure()
+        else:
+            self.on_success()
+
+    def on_failure(self) -> None:
+        """请求因服务商故障失败"""
+        if not self.threshold:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # 试探失败，加倍冷却时间后重新打开
+                self._probing = False
+                self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+            elif self._open_until is not None or self._failures < self.threshold:
+                return
+            self._open_until = time.monotonic() + self._cooldown
+            metrics.add('llm_resilience', 'circuit_opened', 1)
+            if VERBOSE_LOGGING:
+                print(f"  - 警告: {self.name} 连续 {self._failures} 次请求失败，"
+                      f"暂停所有请求 {self._cooldown:.0f} 秒")
+
+
+def _next_wait(breaker: CircuitBreaker, waited: float) -> float:
+    """返回本轮等待的秒数（不超过剩余的最长等待时间），0 表示可以发出请求"""
+    delay = breaker.wait_time()
+    if delay <= 0 or LLM_CIRCUIT_MAX_WAIT is None:
+        return delay
+    if waited >= LLM_CIRCUIT_MAX_WAIT:
+        raise CircuitOpenError(f"{breaker.name} 持续不可用，已等待 {waited:.0f} 秒")
+    return min(delay, LLM_CIRCUIT_MAX_WAIT - waited)
+
+
+def wait_for_circuit(breaker: CircuitBreaker) -> None:
+    """
+    熔断器打开时阻塞等待（同步客户端使用）
+
+    Raises:
+        CircuitOpenError: 累计等待超过 LLM_CIRCUIT_MAX_WAIT
+    """
+    waited = 0.0
+    while True:
+        delay = _next_wait(breaker, waited)
+        if delay <= 0:
+            break
+        time.sleep(delay)
+        waited += delay
+    if waited:
+        metrics.add('llm_resilience', 'circuit_wait_seconds', waited)
+
+
+async def await_circuit(breaker: CircuitBreaker) -> None:
+    """
+    熔断器打开时异步等待（异步客户端使用）
+
+    Raises:
+        CircuitOpenError: 累计等待超过 LLM_CIRCUIT_MAX_WAIT
+    """
+    waited = 0.0
+    while True:
+        delay = _next_wait(breaker, waited)
+        if delay <= 0:
+            break
+        await asyncio.sleep(delay)
+        waited += delay
+    if waited:
+        metrics.add('llm_resilience', 'circuit_wait_seconds', waited)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """
+    获取模型对应的熔断器（单例，同一模型的所有客户端共用）
+
+    Args:
+        model: 模型名
+
+    Returns:
+        熔断器实例
+    """
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+
+def repair_json(content: str) -> Optional[dict]:
+    """
+    尝试修复常见的 JSON 格式问题: 代码块标记、JSON 前后的说明文字、多余的尾随逗号
+
+    Args:
+        content: LLM 返回的消息内容
+
+    Returns:
+        修复后解析出的 JSON 对象，无法修复时返回 None
+    """
+    text = content.strip()
+    fenced = _FENCE_PATTERN.match(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    text = _TRAILING_COMMA_PATTERN.sub(r"\1", text[start:end + 1])
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def load_json_object(response_content: Optional[str]) -> dict:
+    """
+    解析 LLM 返回的 JSON 对象，直接解析失败时尝试修复
+
+    Args:
+        response_content: LLM 返回的消息内容
+
+    Returns:
+        JSON 对象
+
+    Raises:
+        ValueError: 返回内容为空、不是合法 JSON（且无法修复）或不是 JSON 对象
+    """
+    if response_content is None:
+        raise ValueError("LLM 返回了空内容")
+    try:
+        value = json.loads(response_content)
+    except ValueError:
+        value = repair_json(response_content)
+        if value is None:
+            raise
+        metrics.add('llm_resilience', 'json_repaired', 1)
+    if not isinstance(value, dict):
+        raise ValueError("返回内容不是 JSON 对象")
+    return value
+
+
+def build_reask_messages(messages: List[Dict[str, str]], content: Optional[str],
+                         error: Exception) -> List[Dict[str, str]]:
+    """
+    构造要求模型重新输出合法 JSON 的消息列表（原请求 + 模型的错误输出 + 纠正要求）
+
+    Args:
+        messages: 原请求的消息列表
+        content: 模型返回的无法解析的内容
+        error: 解析错误
+
+    Returns:
+        新的消息列表
+    """
+    return messages + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": REASK_PROMPT.format(error=error)},
+    ]
+
+
+def get_llm_resilience_stats() -> Dict[str, float]:
+    """
+    返回 LLM 调用容错统计
+
+    Returns:
+        重试次数、限流次数、熔断次数和等待时间、JSON 修复和重新询问次数、备用模型评分数、未评分数
+    """
+    stats = metrics.snapshot('llm_resilience')
+    return {
+        'retries': stats.get('retries', 0),
+        'rate_limited': stats.get('rate_limited', 0),
+        'circuit_opened': stats.get('circuit_opened', 0),
+        'circuit_wait_seconds': stats.get('circuit_wait_seconds', 0.0),
+        'json_repaired': stats.get('json_repaired', 0),
+        'reasked': stats.get('reasked', 0),
+        'fallback_used': stats.get('fallback_used', 0),
+        'ungraded': stats.get('ungraded', 0),
+    }
@@ -0,0 +1,101 @@
+"""
+LLM 用量统计模块
+记录每次调用返回的 usage（输入、命中前缀缓存的输入、输出 token 数），汇总缓存命中率和估算费用
+"""
+from typing import Any, Dict, Optional
+
+from config import (
+    LLM_PRICE_INPUT_PER_MTOK, LLM_PRICE_CACHED_INPUT_PER_MTOK, LLM_PRICE_OUTPUT_PER_MTOK,
+    LLM_BATCH_PRICE_FACTOR
+)
+import metrics
+
+
+def _field(obj: Any, name: str) -> Any:
+    # SDK 返回对象，批量评分的输出文件中是字典
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _cached_tokens(usage: Any) -> int:
+    """
+    读取命中前缀缓存的输入 token 数
+
+    OpenAI 格式放在 prompt_tokens_details.cached_tokens 中，DeepSeek 格式为 prompt_cache_hit_tokens。
+    """
+    details = _field(usage, 'prompt_tokens_details')
+    cached = _field(details, 'cached_tokens') if details is not None else None
+    if cached is None:
+        cached = _field(usage, 'prompt_cache_hit_tokens')
+    return int(cached or 0)
+
+
+def estimate_cost(prompt_tokens: float, cached_tokens: float, completion_tokens: float,
+                  factor: float = 1.0) -> Optional[float]:
+    """
+    按配置的单价估算费用
+
+    Args:
+        prompt_tokens: 输入 token 数（含命中缓存的部分）
+        cached_tokens: 命中前缀缓存的输入 token 数
+        completion_tokens: 输出 token 数
+        factor: 价格系数
+
+    Returns:
+        费用，未配置单价时返回 None
+    """
+    if LLM_PRICE_INPUT_PER_MTOK is None or LLM_PRICE_OUTPUT_PER_MTOK is None:
+        return None
+    cached_price = (LLM_PRICE_CACHED_INPUT_PER_MTOK
+                    if LLM_PRICE_CACHED_INPUT_PER_MTOK is not None else LLM_PRICE_INPUT_PER_MTOK)
+    cost = ((prompt_tokens - cached_tokens) * LLM_PRICE_INPUT_PER_MTOK
+            + cached_tokens * cached_price
+            + completion_tokens * LLM_PRICE_OUTPUT_PER_MTOK) / 1_000_000
+    return cost * factor
+
+
+def record_usage(usage: Any, batch: bool = False) -> None:
+    """
+    记录一次调用的 token 用量
+
+    Args:
+        usage: 响应中的 usage（SDK 对象或字典），为 None 时只计调用次数
+        batch: 是否为 Batch API 请求（按 LLM_BATCH_PRICE_FACTOR 折算费用）
+    """
+    metrics.add('llm_usage', 'calls', 1)
+    if usage is None:
+        metrics.add('llm_usage', 'missing_usage', 1)
+        return
+    prompt = int(_field(usage, 'prompt_tokens') or 0)
+    completion = int(_field(usage, 'completion_tokens') or 0)
+    cached = min(_cached_tokens(usage), prompt)
+    metrics.add('llm_usage', 'prompt_tokens', prompt)
+    metrics.add('llm_usage', 'cached_tokens', cached)
+    metrics.add('llm_usage', 'completion_tokens', completion)
+    cost = estimate_cost(prompt, cached, completion, LLM_BATCH_PRICE_FACTOR if batch else 1.0)
+    if cost is not None:
+        metrics.add('llm_usage', 'cost', cost)
+
+
+def get_llm_usage_stats() -> Dict[str, float]:
+    """
+    返回本次运行的 LLM 用量统计
+
+    Returns:
+        调用次数、各类 token 数、缓存命中率和估算费用（未配置单价时为 None）
+    """
+    stats = metrics.snapshot('llm_usage')
+    prompt = stats.get('prompt_tokens', 0)
+    cached = stats.get('cached_tokens', 0)
+    completion = stats.get('completion_tokens', 0)
+    return {
+        'calls': stats.get('calls', 0),
+        'missing_usage': stats.get('missing_usage', 0),
+        'prompt_tokens': prompt,
+        'cached_tokens': cached,
+        'completion_tokens': completion,
+        'total_tokens': prompt + completion,
+        'cache_hit_ratio': cached / prompt if prompt else 0.0,
+        'cost': stats.get('cost', 0.0) if estimate_cost(0, 0, 0) is not None else None,
+    }
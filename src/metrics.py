@@ -0,0 +1,76 @@
+"""
+运行指标模块
+按分组累计数值型指标（如 OCR 图片数、耗时），支持从子进程取出并合并到主进程
+"""
+import os
+import threading
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[str, float]] = {}
+_owner_pid = os.getpid()
+
+
+def _reset_if_forked() -> None:
+    # fork 出的子进程会继承父进程的指标和锁，首次使用时重新初始化
+    global _lock, _counters, _owner_pid
+    if _owner_pid != os.getpid():
+        _lock = threading.Lock()
+        _counters = {}
+        _owner_pid = os.getpid()
+
+
+def add(group: str, name: str, value: float = 1) -> None:
+    """
+    累加指标
+
+    Args:
+        group: 指标分组，如 'ocr'
+        name: 指标名
+        value: 增量
+    """
+    _reset_if_forked()
+    with _lock:
+        values = _counters.setdefault(group, {})
+        values[name] = values.get(name, 0) + value
+
+
+def snapshot(group: str) -> Dict[str, float]:
+    """
+    读取某个分组的当前指标
+
+    Args:
+        group: 指标分组
+
+    Returns:
+        {指标名: 累计值}
+    """
+    _reset_if_forked()
+    with _lock:
+        return dict(_counters.get(group, {}))
+
+
+def drain() -> Dict[str, Dict[str, float]]:
+    """
+    取出并清空本进程的全部指标（供子进程上报给主进程）
+
+    Returns:
+        {分组: {指标名: 累计值}}
+    """
+    global _counters
+    _reset_if_forked()
+    with _lock:
+        drained, _counters = _counters, {}
+    return drained
+
+
+def merge(counters: Dict[str, Dict[str, float]]) -> None:
+    """
+    合并子进程上报的指标
+
+    Args:
+        counters: drain() 的返回值
+    """
+    for group, values in counters.items():
+        for name, value in values.items():
+            add(group, name, value)
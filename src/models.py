@@ -14,14 +14,36 @@ class StudentSubmission:
     folder_path: str
 
 
+@dataclass
+class Grade:
+    """LLM 给出的评分（多次采样评分时附带各次采样的分数）"""
+    # None 表示未评分（LLM 调用失败等），原因见评语
+    score: Optional[float]
+    comment: str
+    samples: Optional[List[float]] = None
+
+
 @dataclass
 class ScoreResult:
     """评分结果"""
     student_id: str
     student_name: str
     folder_name: str
-    score: float
+    # None 表示未评分（LLM 调用失败等），原因见评语
+    score: Optional[float]
     comment: str
+    # 多次采样评分时各次采样的分数，单次评分时为 None
+    samples: Optional[List[float]] = None
+
+    @property
+    def sample_scores(self) -> str:
+        """各次采样的分数（报告中显示）"""
+        return ", ".join(f"{score:g}" for score in self.samples) if self.samples else ""
+
+    @property
+    def score_spread(self) -> Optional[float]:
+        """各次采样分数的极差"""
+        return max(self.samples) - min(self.samples) if self.samples else None
 
 
 @dataclass
@@ -31,3 +53,14 @@ class ProcessingResult:
     content: str
     score_result: Optional[ScoreResult] = None
     errors: List[str] = field(default_factory=list)
+
+
+@dataclass
+class SimilarPair:
+    """一对相似的提交"""
+    first: str
+    second: str
+    # MinHash 估计的 Jaccard 相似度（0-1）
+    similarity: float
+    # 忽略空白和大小写后内容是否相同
+    identical: bool = False
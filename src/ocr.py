@@ -2,67 +2,1044 @@
 OCR 文本提取模块
 负责从图片中提取文本内容
 """
+import hashlib
 import io
-from typing import Optional
+import json
+import math
+import multiprocessing
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    CACHE_DIR, OCR_LANGUAGES, OCR_CACHE_ENABLED, OCR_CACHE_MAX_BYTES,
+    OCR_MEMORY_CACHE_ENTRIES, OCR_WORKERS, OCR_BATCH_SIZE, OCR_BATCH_TIMEOUT,
+    OCR_AUTO_LANGUAGE, OCR_FAST_LANGUAGE, OCR_MIN_CONFIDENCE, OCR_FAST_PASS_SCALE, OCR_RETRY_PSM,
+    OCR_MIN_BLOCK_CONFIDENCE,
+    OCR_PREPROCESS_ENABLED, OCR_TARGET_DPI, OCR_BINARIZE, OCR_MIN_IMAGE_SIDE, OCR_MIN_ENTROPY,
+    OCR_MAX_IMAGES_PER_SUBMISSION, OCR_MAX_SECONDS_PER_SUBMISSION, VERBOSE_LOGGING
+)
+from cache_store import SQLiteCache
+from tracing import traced
+import metrics
 
 # 全局导入可能导致 Pylance 警告，移至函数内部
 PYTESSERACT_AVAILABLE = None
 PILLOW_AVAILABLE = None
 
+# OCR 结果缓存（进程内 LRU + 磁盘），按图片内容摘要和语言索引，另存自动选择的语言
+_ocr_cache: Optional[SQLiteCache] = None
 
-def extract_text_from_image(image_data: bytes, lang: Optional[str] = None) -> str:
+# A4 纸长边（英寸），用于在图片没有可靠 DPI 信息时估算缩放上限
+_A4_LONG_EDGE_INCHES = 11.69
+
+
+def get_ocr_cache() -> Optional[SQLiteCache]:
+    """
+    获取 OCR 结果缓存实例（单例模式）
+
+    Returns:
+        缓存实例，未启用时返回 None
+    """
+    global _ocr_cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _ocr_cache is None:
+        _ocr_cache = SQLiteCache(CACHE_DIR / "ocr_cache.sqlite3", "ocr_results",
+                                 OCR_CACHE_MAX_BYTES, memory_entries=OCR_MEMORY_CACHE_ENTRIES)
+    return _ocr_cache
+
+
+def image_digest(image_data: bytes) -> str:
     """
-    从图片数据中提取文本
+    计算图片内容的 SHA-256 摘要
 
     Args:
         image_data: 图片的二进制数据
-        lang: OCR 语言设置，默认使用配置中的设置
 
     Returns:
-        提取的文本内容
+        十六进制摘要
     """
-    global PYTESSERACT_AVAILABLE, PILLOW_AVAILABLE
-    if PYTESSERACT_AVAILABLE is None:
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def preprocess_image(image_data: bytes) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    OCR 前的图片过滤与预处理
+
+    过小的图片和近似纯色的图片直接跳过；其余图片转为灰度，
+    缩小到目标 DPI（长边不超过 A4 纸在目标 DPI 下的像素数），再按 Otsu 阈值二值化。
+
+    Args:
+        image_data: 图片的二进制数据
+
+    Returns:
+        (预处理后的 PNG 数据, 跳过原因)；需要跳过时数据为 None，原因为 'small' 或 'blank'
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    width, height = image.size
+    if min(width, height) < OCR_MIN_IMAGE_SIDE:
+        return None, 'small'
+
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        # 透明背景直接转灰度会变成黑色，先铺白底
+        background = Image.new('RGBA', image.size, 'white')
+        background.alpha_composite(image.convert('RGBA'))
+        image_gray = background.convert('L')
+    else:
+        image_gray = image.convert('L')
+
+    histogram = image_gray.histogram()
+    if _entropy(histogram) < OCR_MIN_ENTROPY:
+        return None, 'blank'
+    if not OCR_PREPROCESS_ENABLED:
+        return image_data, None
+
+    scale = 1.0
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] and dpi[0] > OCR_TARGET_DPI:
+        scale = OCR_TARGET_DPI / float(dpi[0])
+    scale = min(scale, OCR_TARGET_DPI * _A4_LONG_EDGE_INCHES / max(width, height))
+    if scale < 1:
+        image_gray = image_gray.resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+        histogram = image_gray.histogram()
+        metrics.add('ocr', 'downscaled', 1)
+
+    if OCR_BINARIZE:
+        threshold = _otsu_threshold(histogram)
+        image_gray = image_gray.point([255 if v > threshold else 0 for v in range(256)])
+
+    output = io.BytesIO()
+    image_gray.save(output, format='PNG')
+    return output.getvalue(), None
+
+
+def _entropy(histogram: List[int]) -> float:
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    return -sum(count / total * math.log2(count / total) for count in histogram if count)
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    # 最大化前景与背景的类间方差
+    total = sum(histogram)
+    sum_all = sum(value * count for value, count in enumerate(histogram))
+    weight_bg = 0
+    sum_bg = 0
+    best_threshold, best_variance = 127, -1.0
+    for value, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += value * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = value, variance
+    return best_threshold
+
+
+def ocr_settings_signature() -> str:
+    """
+    影响识别结果的 OCR 设置签名，写入 OCR 缓存和提取结果缓存的键
+
+    过滤阈值也计入其中：被跳过的图片以空结果缓存，放宽阈值后不再复用这些结果；
+    渐进式识别的置信度阈值、快速识别缩放比例和重试的页面分割模式决定采用哪一次的结果，同样计入。
+
+    Returns:
+        签名字符串
+    """
+    signature = f":s{OCR_MIN_IMAGE_SIDE}e{OCR_MIN_ENTROPY:g}"
+    if OCR_PREPROCESS_ENABLED:
+        signature += f"p{OCR_TARGET_DPI}{'b' if OCR_BINARIZE else ''}"
+    signature += f"c{OCR_MIN_CONFIDENCE:g}f{OCR_FAST_PASS_SCALE or 0:g}r{OCR_RETRY_PSM}"
+    return signature
+
+
+@dataclass
+class OcrBudget:
+    """
+    一份提交的 OCR 预算
+
+    可以传给提取子进程，子进程用完后连同已用量一起带回。
+    """
+    max_images: Optional[int] = OCR_MAX_IMAGES_PER_SUBMISSION
+    max_seconds: Optional[float] = OCR_MAX_SECONDS_PER_SUBMISSION
+    images: int = 0
+    seconds: float = 0.0
+    skipped: int = 0
+
+    def allowance(self) -> Optional[int]:
+        """
+        还可以识别的图片数
+
+        Returns:
+            图片数，None 表示不限制
+        """
+        if self.max_seconds is not None and self.seconds >= self.max_seconds:
+            return 0
+        if self.max_images is None:
+            return None
+        return max(0, self.max_images - self.images)
+
+
+# 当前线程正在处理的提交的 OCR 预算
+_budget_local = threading.local()
+
+
+@contextmanager
+def ocr_budget(budget: Optional[OcrBudget]) -> Iterator[Optional[OcrBudget]]:
+    """
+    在代码块内对当前线程的 OCR 调用启用预算
+
+    Args:
+        budget: OCR 预算，None 表示不限制
+
+    Yields:
+        传入的预算
+    """
+    previous = getattr(_budget_local, 'budget', None)
+    _budget_local.budget = budget
+    try:
+        yield budget
+    finally:
+        _budget_local.budget = previous
+
+
+def current_ocr_budget() -> Optional[OcrBudget]:
+    """返回当前线程生效的 OCR 预算"""
+    return getattr(_budget_local, 'budget', None)
+
+
+@dataclass
+class OcrWords:
+    """单张图片带置信度的识别结果"""
+    text: str
+    # [(单词, 置信度 0-100)]
+    words: List[Tuple[str, float]]
+
+    def mean_confidence(self) -> Optional[float]:
+        """
+        单词的平均置信度
+
+        Returns:
+            平均置信度，没有识别出单词时返回 None
+        """
+        if not self.words:
+            return None
+        return sum(conf for _, conf in self.words) / len(self.words)
+
+
+def parse_tsv(tsv: str) -> Dict[int, OcrWords]:
+    """
+    解析 tesseract 的 TSV 输出
+
+    同一行的单词以空格连接（相邻的中日韩文字之间不加空格），同一段落的行以换行连接，段落之间空一行。
+
+    Args:
+        tsv: TSV 文本（可包含多页）
+
+    Returns:
+        {页码（从 1 开始）: 识别结果}
+    """
+    pages: Dict[int, Tuple[List[Tuple[str, float]], Dict[Tuple[int, int, int], List[str]]]] = {}
+    for row in tsv.splitlines():
+        columns = row.split('\t')
+        # 跳过表头和不完整的行
+        if len(columns) < 11 or not columns[0].isdigit():
+            continue
+        level, page_num = int(columns[0]), int(columns[1])
+        words, lines = pages.setdefault(page_num, ([], {}))
+        text = columns[11].strip() if len(columns) > 11 else ""
+        if level != 5 or not text:
+            continue
+        words.append((text, float(columns[10])))
+        lines.setdefault((int(columns[2]), int(columns[3]), int(columns[4])), []).append(text)
+
+    results = {}
+    for page_num, (words, lines) in pages.items():
+        parts = []
+        previous = None
+        for (block, par, _), line_words in lines.items():
+            if previous is not None:
+                parts.append("\n\n" if previous != (block, par) else "\n")
+            parts.append(_join_words(line_words))
+            previous = (block, par)
+        results[page_num] = OcrWords(text="".join(parts), words=words)
+    return results
+
+
+def _join_words(words: List[str]) -> str:
+    parts = []
+    for word in words:
+        if parts and not (_is_cjk(parts[-1][-1]) and _is_cjk(word[0])):
+            parts.append(" ")
+        parts.append(word)
+    return "".join(parts)
+
+
+def _is_cjk(char: str) -> bool:
+    # 中日韩文字及全角标点
+    return '\u2e80' <= char <= '\u9fff' or '\uf900' <= char <= '\ufaff' or '\uff00' <= char <= '\uffef'
+
+
+class TesseractEngine:
+    """
+    批量 Tesseract OCR 引擎
+
+    pytesseract 每识别一张图片都要启动一个 tesseract 进程并重新加载语言模型。
+    本引擎将多张图片写入临时目录，通过图片列表文件交给一次 tesseract 调用识别，
+    各页结果以换页符分隔；多个批次在线程池中并行执行（识别工作在 tesseract 子进程中完成）。
+    """
+
+    # 可以直接交给 tesseract 读取、无需转换的图片格式
+    _NATIVE_FORMATS = {'PNG', 'JPEG', 'TIFF', 'BMP'}
+
+    def __init__(self, workers: Optional[int] = None, batch_size: int = OCR_BATCH_SIZE):
+        if workers is None:
+            workers = OCR_WORKERS or _default_ocr_workers()
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="ocr")
+
+    def recognize(self, images: List[bytes], lang: str) -> List[Optional[str]]:
+        """
+        识别一组图片
+
+        Args:
+            images: 图片二进制数据列表
+            lang: OCR 语言
+
+        Returns:
+            与输入顺序一致的识别文本列表，识别失败的图片对应 None
+        """
+        return self._map_batches(images, lang, tsv=False, psm=None)
+
+    def recognize_words(self, images: List[bytes], lang: str,
+                        psm: Optional[int] = None) -> List[Optional["OcrWords"]]:
+        """
+        识别一组图片，同时返回每个单词的置信度（tesseract 的 TSV 输出）
+
+        Args:
+            images: 图片二进制数据列表
+            lang: OCR 语言
+            psm: 页面分割模式，None 表示使用 tesseract 的默认值
+
+        Returns:
+            与输入顺序一致的识别结果列表，识别失败的图片对应 None
+        """
+        return self._map_batches(images, lang, tsv=True, psm=psm)
+
+    def _map_batches(self, images: List[bytes], lang: str, tsv: bool, psm: Optional[int]) -> list:
+        batches = [images[i:i + self.batch_size]
+                   for i in range(0, len(images), self.batch_size)]
+        results = []
+        for texts in self._executor.map(lambda b: self._recognize_batch(b, lang, tsv, psm), batches):
+            results.extend(texts)
+        return results
+
+    def _recognize_batch(self, images: List[bytes], lang: str, tsv: bool, psm: Optional[int]) -> list:
+        started = time.perf_counter()
         try:
-            import pytesseract
-            PYTESSERACT_AVAILABLE = True
-        except ImportError:
-            PYTESSERACT_AVAILABLE = False
-    if PILLOW_AVAILABLE is None:
+            texts = self._run_batch(images, lang, tsv, psm)
+        except Exception as e:
+            if VERBOSE_LOGGING:
+                print(f"    - 警告: 批量 OCR 失败，改为逐张识别: {e}")
+            texts = [self._recognize_single(image, lang, tsv, psm) for image in images]
+
+        metrics.add('ocr', 'images', len(images))
+        metrics.add('ocr', 'batches', 1)
+        metrics.add('ocr', 'seconds', time.perf_counter() - started)
+        return texts
+
+    def _run_batch(self, images: List[bytes], lang: str, tsv: bool, psm: Optional[int]) -> list:
+        import pytesseract
+
+        with tempfile.TemporaryDirectory(prefix="ocr-batch-") as tmp_dir:
+            paths = [self._write_image(image, tmp_dir, index)
+                     for index, image in enumerate(images)]
+            list_file = os.path.join(tmp_dir, "images.txt")
+            with open(list_file, 'w', encoding='utf-8') as f:
+                f.write("\n".join(paths) + "\n")
+
+            # 多个批次并行时限制 tesseract 内部线程数，避免 CPU 超额订阅
+            env = dict(os.environ, OMP_THREAD_LIMIT="1")
+            command = [pytesseract.pytesseract.tesseract_cmd, list_file, 'stdout', '-l', lang]
+            if psm is not None:
+                command += ['--psm', str(psm)]
+            if tsv:
+                command.append('tsv')
+            completed = subprocess.run(
+                command,
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                timeout=OCR_BATCH_TIMEOUT * len(images),
+                env=env
+            )
+
+        output = completed.stdout.decode('utf-8', errors='ignore')
+        if tsv:
+            # TSV 输出不分隔各页，按 page_num 列（从 1 开始）归属到各图片
+            words = parse_tsv(output)
+            if len(words) < len(images):
+                raise ValueError(f"期望 {len(images)} 页结果，实际得到 {len(words)} 页")
+            return [words[number] for number in range(1, len(images) + 1)]
+
+        # tesseract 在每页结果之后输出一个换页符
+        pages = output.split('\f')
+        if len(pages) < len(images):
+            raise ValueError(f"期望 {len(images)} 页结果，实际得到 {len(pages)} 页")
+        return [page.strip() for page in pages[:len(images)]]
+
+    def _write_image(self, image_data: bytes, tmp_dir: str, index: int) -> str:
+        from PIL import Image
+
+        image = Image.open(io.BytesIO(image_data))
+        # 多帧图片会产生多页结果，和非原生格式一样先转换为单帧 PNG
+        if image.format in self._NATIVE_FORMATS and getattr(image, 'n_frames', 1) == 1:
+            path = os.path.join(tmp_dir, f"{index}.{image.format.lower()}")
+            with open(path, 'wb') as f:
+                f.write(image_data)
+        else:
+            path = os.path.join(tmp_dir, f"{index}.png")
+            image.save(path, format='PNG')
+        return path
+
+    @staticmethod
+    def _recognize_single(image_data: bytes, lang: str, tsv: bool = False, psm: Optional[int] = None):
         try:
-            from PIL import Image
-            PILLOW_AVAILABLE = True
-        except ImportError:
-            PILLOW_AVAILABLE = False
+            if tsv:
+                return _run_tesseract_words(image_data, lang, psm)
+            return _run_tesseract(image_data, lang)
+        except Exception as e:
+            if VERBOSE_LOGGING:
+                print(f"    - 警告: OCR 提取失败: {e}")
+            return None
+
+    def shutdown(self) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=True)
 
-    if not (PYTESSERACT_AVAILABLE and PILLOW_AVAILABLE):
+
+def _default_ocr_workers() -> int:
+    """
+    默认的 OCR 并行批次数
+
+    在流水线的提取子进程中只使用 1 个，避免与进程池叠加后超额占用 CPU。
+
+    Returns:
+        并行批次数
+    """
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return max(1, os.cpu_count() or 1)
+
+
+# 全局 OCR 引擎实例
+_engine: Optional[TesseractEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine() -> TesseractEngine:
+    """
+    获取 OCR 引擎实例（单例模式）
+
+    Returns:
+        OCR 引擎实例
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TesseractEngine()
+        return _engine
+
+
+@dataclass
+class OcrResult:
+    """单张图片的最终识别结果"""
+    text: str
+    # 单词平均置信度（0-100），没有识别出文字或识别被跳过时为 None
+    confidence: Optional[float] = None
+
+
+@traced('ocr', size=lambda images, lang=None: sum(len(image) for image in images))
+def extract_ocr_results(images: List[bytes], lang: Optional[str] = None) -> List[OcrResult]:
+    """
+    批量识别图片，返回文本及其置信度
+
+    已缓存的图片直接返回结果，其余图片交给 OCR 引擎批量、渐进地识别（见 _OcrRecognizer）；
+    同一批中内容相同的图片只识别一次。未指定语言且启用了自动语言选择时，按图片选择语言模型。
+
+    Args:
+        images: 图片二进制数据列表
+        lang: OCR 语言设置，默认使用配置中的设置
+
+    Returns:
+        与输入顺序一致的识别结果列表
+    """
+    if not images:
+        return []
+
+    if not is_ocr_available():
         if VERBOSE_LOGGING:
             print("    - 警告: OCR 功能不可用，请安装 pytesseract 和 Pillow")
-        return ""
+        return [OcrResult("") for _ in images]
 
-    # 导入必要的模块
-    import pytesseract
+    # 使用配置中的语言设置
+    recognizer = _OcrRecognizer(lang or OCR_LANGUAGES, auto=lang is None and OCR_AUTO_LANGUAGE)
+    cache = get_ocr_cache()
+    signature = ocr_settings_signature()
+    digests = [image_digest(image) for image in images]
+
+    resolved: Dict[str, OcrResult] = {}
+    pending: Dict[str, bytes] = {}
+    for digest, image in zip(digests, images):
+        if digest in resolved or digest in pending:
+            continue
+        cached = recognizer.cache_get(cache, digest, signature)
+        if cached is not None:
+            resolved[digest] = cached
+        else:
+            pending[digest] = image
+
+    prepared: Dict[str, bytes] = {}
+    for digest, image in pending.items():
+        data, reason = _prepare_image(image)
+        if reason:
+            # 过滤结果只取决于图片内容和过滤阈值（已计入签名），同样写入缓存
+            metrics.add('ocr', f'skipped_{reason}', 1)
+            resolved[digest] = OcrResult("")
+            recognizer.cache_put(cache, digest, signature, recognizer.fast, resolved[digest])
+        else:
+            prepared[digest] = data
+
+    if prepared:
+        engine = get_ocr_engine()
+        _recognize_within_budget(
+            prepared, lambda chunk: recognizer.recognize(engine, chunk, cache, signature),
+            engine.workers * engine.batch_size, resolved)
+
+    return [resolved[digest] for digest in digests]
+
+
+def extract_text_from_images(images: List[bytes], lang: Optional[str] = None) -> List[str]:
+    """
+    批量从图片数据中提取文本
+
+    Args:
+        images: 图片二进制数据列表
+        lang: OCR 语言设置，默认使用配置中的设置
+
+    Returns:
+        与输入顺序一致的文本列表
+    """
+    return [result.text for result in extract_ocr_results(images, lang)]
+
+
+def _text_key(digest: str, lang: str, signature: str) -> str:
+    return f"{digest}:{lang}{signature}"
+
+
+# 中日韩语言模型（含竖排模型）
+_CJK_MODELS = ('chi_sim', 'chi_tra', 'jpn', 'kor')
+
+
+def _has_cjk_model(lang: str) -> bool:
+    return any(language.startswith(_CJK_MODELS) for language in lang.split('+'))
+
+
+class _OcrRecognizer:
+    """
+    渐进式识别一组图片
+
+    1. 快速识别: 以 TSV 模式识别（自动选择语言时只用 OCR_FAST_LANGUAGE），平均单词置信度达到
+       OCR_MIN_CONFIDENCE 时直接采用。图片缩小到 OCR_FAST_PASS_SCALE，但语言设置含中日韩模型时
+       识别原图（缩小后的汉字笔画难以辨认，几乎总要再识别原图）；
+    2. 原图识别: 其余图片用原始分辨率重新识别。自动选择语言时，快速识别几乎全是乱码的用其余语言
+       （默认 chi_sim），其他情况用完整的 OCR_LANGUAGES；快速识别没有找到文字的仍用快速模型；
+    3. 换页面分割模式: 原图识别置信度仍不足时，以 OCR_RETRY_PSM 和完整的语言设置再识别一次。
+
+    每张图片取置信度最高的一次结果。每一轮使用的语言只取决于图片本身的识别结果，
+    与之前识别过哪些图片无关，串行、进程池和重复运行得到相同的文本。
+    自动选择语言时，选定的语言按图片内容摘要写入缓存。
+    """
+
+    # 快速识别结果中拉丁字符单词的最低占比
+    _LATIN_RATIO = 0.9
+
+    def __init__(self, lang: str, auto: bool):
+        languages = lang.split('+')
+        self.full = lang
+        rest = "+".join(language for language in languages if language != OCR_FAST_LANGUAGE)
+        self.auto = auto and OCR_FAST_LANGUAGE in languages and bool(rest)
+        self.fast = OCR_FAST_LANGUAGE if self.auto else lang
+        self.rest = rest if self.auto else lang
+
+    def cache_get(self, cache: Optional[SQLiteCache], digest: str, signature: str) -> Optional[OcrResult]:
+        """读取图片的识别结果，自动选择语言时先读取选定的语言；未缓存时返回 None"""
+        chosen = self.full
+        if self.auto:
+            chosen = _cache_get(cache, f"{digest}:lang{signature}")
+            if chosen is None:
+                return None
+        value = _cache_get(cache, _text_key(digest, chosen, signature))
+        if value is None:
+            return None
+        try:
+            data = json.loads(value)
+            result = OcrResult(data['text'], data.get('confidence'))
+        except (ValueError, KeyError, TypeError):
+            return None
+        if self.auto:
+            metrics.add('ocr_lang', 'cached', 1)
+        return result
+
+    def cache_put(self, cache: Optional[SQLiteCache], digest: str, signature: str,
+                  chosen: str, result: OcrResult) -> None:
+        """写入识别结果，自动选择语言时同时写入选定的语言"""
+        value = json.dumps({'text': result.text, 'confidence': result.confidence}, ensure_ascii=False)
+        _cache_put(cache, _text_key(digest, chosen, signature), value)
+        if self.auto:
+            _cache_put(cache, f"{digest}:lang{signature}", chosen)
+
+    def first_pass(self) -> Tuple[str, Optional[float]]:
+        """
+        第 1 轮识别使用的语言设置和缩放比例
+
+        Returns:
+            (语言设置, 缩放比例)，缩放比例为 None 表示识别原图
+        """
+        return self.fast, None if _has_cjk_model(self.fast) else OCR_FAST_PASS_SCALE
+
+    def accepts(self, result: Optional[OcrWords], lang: str) -> bool:
+        """识别结果的置信度是否足够高，可以直接采用"""
+        if result is None or not result.words or result.mean_confidence() < OCR_MIN_CONFIDENCE:
+            return False
+        if not self.auto or lang != self.fast:
+            return True
+        # 其他文字在快速模型下大多识别为低置信度的乱码，可信的结果应基本都是拉丁字符
+        return self.is_latin(result)
+
+    def is_latin(self, result: OcrWords) -> bool:
+        """识别结果是否基本都是拉丁字符"""
+        latin = sum(1 for word, _ in result.words if _is_latin_word(word))
+        return latin >= self._LATIN_RATIO * len(result.words)
+
+    def choose(self, result: Optional[OcrWords]) -> str:
+        """
+        根据快速识别的结果选择原图识别使用的语言
+
+        Args:
+            result: 快速识别结果
+
+        Returns:
+            语言设置
+        """
+        if not self.auto:
+            return self.full
+        if result is None:
+            return self.full
+        if not result.words:
+            # 快速识别没有找到任何文字（如示意图或缩小后无法辨认），原图仍先用快速模型
+            return self.fast
+        if any(conf >= OCR_MIN_CONFIDENCE and len(word) > 1 and _is_latin_word(word)
+               for word, conf in result.words):
+            return self.full
+        # 其他文字在快速模型下几乎全是乱码；置信度只是略低时（如缩小后模糊的英文）仍用完整设置
+        if result.mean_confidence() < OCR_MIN_CONFIDENCE / 2:
+            return self.rest
+        return self.full
+
+    def recognize(self, engine: "TesseractEngine", chunk: List[Tuple[str, bytes]],
+                  cache: Optional[SQLiteCache], signature: str) -> List[Optional[OcrResult]]:
+        """
+        渐进式识别一组图片，写入缓存
+
+        Args:
+            engine: OCR 引擎
+            chunk: [(图片摘要, 预处理后的图片)]
+            cache: OCR 缓存
+            signature: OCR 设置签名
+
+        Returns:
+            与输入顺序一致的识别结果列表，识别失败的图片对应 None
+        """
+        images = [data for _, data in chunk]
+        # 每张图片目前最好的结果: (语言, 识别结果)
+        best: List[Optional[Tuple[str, OcrWords]]] = [None] * len(chunk)
+
+        def keep(index: int, lang: str, result: Optional[OcrWords]) -> None:
+            if result is not None and (best[index] is None
+                                       or _confidence(result) > _confidence(best[index][1])):
+                best[index] = (lang, result)
+
+        # 第 1 轮: 快速识别（不缩小或图片太小无法缩小时直接用原图）
+        first_lang, scale = self.first_pass()
+        small = [_downscale(data, scale) for data in images]
+        first = engine.recognize_words(
+            [reduced or data for reduced, data in zip(small, images)], first_lang)
+        full_res: Dict[str, List[int]] = {}
+        retry = []
+        for index, result in enumerate(first):
+            keep(index, first_lang, result)
+            if self.accepts(result, first_lang):
+                metrics.add('ocr_pass', 'fast_accepted', 1)
+                continue
+            lang = self.choose(result)
+            if small[index] is None and lang == first_lang:
+                # 第 1 轮已经是原图识别
+                if _needs_retry(result):
+                    retry.append(index)
+            else:
+                full_res.setdefault(lang, []).append(index)
+
+        # 第 2 轮: 原图识别，按语言分组
+        for lang, indexes in full_res.items():
+            metrics.add('ocr_pass', 'full_resolution', len(indexes))
+            for index, result in zip(indexes, engine.recognize_words([images[i] for i in indexes], lang)):
+                keep(index, lang, result)
+                if _needs_retry(result):
+                    retry.append(index)
+
+        # 第 3 轮: 换页面分割模式
+        if retry and OCR_RETRY_PSM is not None:
+            metrics.add('ocr_pass', 'psm_retry', len(retry))
+            results = engine.recognize_words([images[i] for i in retry], self.full, psm=OCR_RETRY_PSM)
+            for index, result in zip(retry, results):
+                previous = best[index]
+                keep(index, self.full, result)
+                if best[index] is not previous:
+                    metrics.add('ocr_pass', 'psm_improved', 1)
+
+        outputs: List[Optional[OcrResult]] = []
+        for (digest, _), candidate in zip(chunk, best):
+            if candidate is None:
+                # 识别失败的结果不写入缓存，下次运行重试
+                outputs.append(None)
+                continue
+            lang, result = candidate
+            output = OcrResult(result.text, result.mean_confidence())
+            if self.auto:
+                metrics.add('ocr_lang', lang, 1)
+            metrics.add('ocr_pass', 'images', 1)
+            metrics.add('ocr_pass', 'confidence', output.confidence or 0.0)
+            self.cache_put(cache, digest, signature, lang, output)
+            outputs.append(output)
+        return outputs
+
+
+def _needs_retry(result: Optional[OcrWords]) -> bool:
+    # 原图识别仍只有低置信度文字的图片换一种页面分割模式重试
+    return result is not None and bool(result.words) and result.mean_confidence() < OCR_MIN_CONFIDENCE
+
+
+def _confidence(result: OcrWords) -> float:
+    # 没有识别出文字的结果排在任何有文字的结果之后
+    confidence = result.mean_confidence()
+    return -1.0 if confidence is None else confidence
+
+
+def _downscale(image_data: bytes, scale: Optional[float]) -> Optional[bytes]:
+    """
+    按比例缩小图片用于快速识别
+
+    Returns:
+        缩小后的 PNG 数据；未启用快速识别或缩小后过小时返回 None
+    """
+    if not scale or scale >= 1:
+        return None
     from PIL import Image
-    from config import OCR_LANGUAGES, VERBOSE_LOGGING
 
     try:
-        # 使用配置中的语言设置
-        ocr_lang = lang or OCR_LANGUAGES
+        image = Image.open(io.BytesIO(image_data))
+        width, height = image.size
+        # 缩小后文字过小时快速识别没有意义，直接识别原图
+        if min(width, height) * scale < 2 * OCR_MIN_IMAGE_SIDE:
+            return None
+        image = image.convert('L').resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+    except Exception:
+        return None
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
 
-        # 从二进制数据创建图片对象
-        image_stream = io.BytesIO(image_data)
-        image = Image.open(image_stream)
 
-        # 执行 OCR
-        ocr_text = pytesseract.image_to_string(image, lang=ocr_lang)
+def _is_latin_word(word: str) -> bool:
+    # 拉丁字母（含扩展）、数字和 ASCII 标点
+    return all(ord(char) < 0x250 for char in word)
 
-        # 返回清理后的文本
-        return ocr_text.strip()
 
+def _prepare_image(image_data: bytes) -> Tuple[bytes, Optional[str]]:
+    try:
+        data, reason = preprocess_image(image_data)
     except Exception as e:
+        # 无法解码的图片原样交给引擎，由引擎报告识别失败
         if VERBOSE_LOGGING:
-            print(f"    - 警告: OCR 提取失败: {e}")
+            print(f"    - 警告: 图片预处理失败: {e}")
+        return image_data, None
+    return (data if data is not None else image_data), reason
+
+
+def _recognize_within_budget(prepared: Dict[str, bytes],
+                             recognize: Callable[[List[Tuple[str, bytes]]], List[Optional[OcrResult]]],
+                             step: int, resolved: Dict[str, OcrResult]) -> None:
+    """
+    在当前提交的 OCR 预算内分轮识别图片，预算用完后其余图片跳过（不写入缓存）
+
+    Args:
+        prepared: {图片摘要: 预处理后的图片}
+        recognize: 识别一轮图片的函数，负责写入缓存
+        step: 每轮识别的图片数
+        resolved: 写入识别结果的字典
+    """
+    budget = current_ocr_budget()
+    items = list(prepared.items())
+    position = 0
+    while position < len(items):
+        allowance = budget.allowance() if budget else None
+        if allowance == 0:
+            break
+        size = step if allowance is None else min(step, allowance)
+        chunk = items[position:position + size]
+        started = time.perf_counter()
+        results = recognize(chunk)
+        if budget:
+            budget.images += len(chunk)
+            budget.seconds += time.perf_counter() - started
+        for (digest, _), result in zip(chunk, results):
+            resolved[digest] = result or OcrResult("")
+        position += len(chunk)
+
+    skipped = items[position:]
+    if skipped:
+        budget.skipped += len(skipped)
+        metrics.add('ocr', 'skipped_budget', len(skipped))
+        if VERBOSE_LOGGING:
+            print(f"    - 本份提交的 OCR 预算已用完，跳过 {len(skipped)} 张图片")
+        for digest, _ in skipped:
+            resolved[digest] = OcrResult("")
+
+
+def format_ocr_block(result: OcrResult) -> str:
+    """
+    将图片识别结果包装为带置信度标记的文本块
+
+    Args:
+        result: 识别结果
+
+    Returns:
+        文本块，没有识别出文字时返回空字符串
+    """
+    if not result.text:
         return ""
+    label = "图片OCR内容开始"
+    if result.confidence is not None:
+        label += f" 置信度 {result.confidence:.0f}"
+    return f"--- [{label}] ---\n{result.text}\n--- [图片OCR内容结束] ---"
+
+
+_OCR_BLOCK_PATTERN = re.compile(
+    r"--- \[图片OCR内容开始 置信度 (\d+)\] ---\n.*?\n--- \[图片OCR内容结束\] ---", re.S)
+
+
+def trim_low_confidence_blocks(text: str,
+                               min_confidence: Optional[float] = OCR_MIN_BLOCK_CONFIDENCE) -> str:
+    """
+    将置信度低于阈值的 OCR 文本块替换为简短说明，避免识别乱码占用 LLM 的 token
+
+    Args:
+        text: 提取的文本
+        min_confidence: 置信度阈值，None 表示不裁剪
+
+    Returns:
+        裁剪后的文本
+    """
+    if min_confidence is None or "置信度" not in text:
+        return text
+
+    def replace(match: "re.Match") -> str:
+        confidence = int(match.group(1))
+        if confidence >= min_confidence:
+            return match.group(0)
+        metrics.add('ocr_pass', 'trimmed_blocks', 1)
+        metrics.add('ocr_pass', 'trimmed_chars', len(match.group(0)))
+        return f"[图片OCR内容置信度过低（{confidence}），已省略]"
+
+    return _OCR_BLOCK_PATTERN.sub(replace, text)
+
+
+def extract_text_from_image(image_data: bytes, lang: Optional[str] = None) -> str:
+    """
+    从图片数据中提取文本（兼容接口，内部使用批量 OCR 引擎）
+
+    相同内容的图片（如报告模板中的校徽、作业说明中的截图）只识别一次，
+    之后从缓存读取结果。
+
+    Args:
+        image_data: 图片的二进制数据
+        lang: OCR 语言设置，默认使用配置中的设置
+
+    Returns:
+        提取的文本内容
+    """
+    return extract_ocr_results([image_data], lang)[0].text
+
+
+def _cache_get(cache: Optional[SQLiteCache], key: str) -> Optional[str]:
+    if not cache:
+        return None
+    try:
+        cached = cache.get(key)
+        return cached.decode('utf-8') if cached is not None else None
+    except Exception as e:
+        if VERBOSE_LOGGING:
+            print(f"    - 警告: 读取 OCR 缓存失败: {e}")
+        return None
+
+
+def _cache_put(cache: Optional[SQLiteCache], key: str, text: str) -> None:
+    if not cache:
+        return
+    try:
+        cache.put(key, text.encode('utf-8'))
+    except Exception as e:
+        if VERBOSE_LOGGING:
+            print(f"    - 警告: 写入 OCR 缓存失败: {e}")
+
+
+def get_ocr_throughput() -> Dict[str, float]:
+    """
+    返回 OCR 引擎的吞吐量统计
+
+    Returns:
+        图片数、批次数、累计识别耗时和每秒识别图片数
+    """
+    stats = metrics.snapshot('ocr')
+    images = stats.get('images', 0)
+    seconds = stats.get('seconds', 0.0)
+    return {
+        'images': images,
+        'batches': stats.get('batches', 0),
+        'seconds': seconds,
+        'images_per_sec': images / seconds if seconds else 0.0,
+    }
+
+
+def get_ocr_skip_stats() -> Dict[str, float]:
+    """
+    返回 OCR 预处理与过滤统计
+
+    节省的时间按本次运行中每张图片的平均识别耗时估算。
+
+    Returns:
+        跳过的小图、纯色图、超出预算的图片数，缩小的图片数和估计节省的识别耗时
+    """
+    stats = metrics.snapshot('ocr')
+    images = stats.get('images', 0)
+    per_image = stats.get('seconds', 0.0) / images if images else 0.0
+    skipped = {reason: stats.get(f'skipped_{reason}', 0) for reason in ('small', 'blank', 'budget')}
+    return {
+        'skipped_small': skipped['small'],
+        'skipped_blank': skipped['blank'],
+        'skipped_budget': skipped['budget'],
+        'downscaled': stats.get('downscaled', 0),
+        'saved_seconds': sum(skipped.values()) * per_image,
+    }
+
+
+def get_ocr_language_stats() -> Dict[str, float]:
+    """
+    返回自动语言选择统计
+
+    Returns:
+        {选定的语言: 图片数}，另含 'cached'（缓存命中数）
+    """
+    return metrics.snapshot('ocr_lang')
+
+
+def get_ocr_pass_stats() -> Dict[str, float]:
+    """
+    返回渐进式识别统计
+
+    Returns:
+        识别图片数、快速识别即采用的图片数、原图重新识别数、换页面分割模式重试数及其中结果更好的数、
+        平均置信度，以及送入 LLM 前裁剪的低置信度文本块数和字符数
+    """
+    stats = metrics.snapshot('ocr_pass')
+    images = stats.get('images', 0)
+    return {
+        'images': images,
+        'fast_accepted': stats.get('fast_accepted', 0),
+        'full_resolution': stats.get('full_resolution', 0),
+        'psm_retry': stats.get('psm_retry', 0),
+        'psm_improved': stats.get('psm_improved', 0),
+        'mean_confidence': stats.get('confidence', 0.0) / images if images else 0.0,
+        'trimmed_blocks': stats.get('trimmed_blocks', 0),
+        'trimmed_chars': stats.get('trimmed_chars', 0),
+    }
+
+
+def _run_tesseract(image_data: bytes, lang: str) -> str:
+    """
+    调用 Tesseract 识别单张图片
+
+    Args:
+        image_data: 图片的二进制数据
+        lang: OCR 语言
+
+    Returns:
+        清理后的识别文本
+    """
+    import pytesseract
+    from PIL import Image
+
+    # 从二进制数据创建图片对象
+    image_stream = io.BytesIO(image_data)
+    image = Image.open(image_stream)
+
+    # 执行 OCR
+    ocr_text = pytesseract.image_to_string(image, lang=lang)
+
+    # 返回清理后的文本
+    return ocr_text.strip()
+
+
+def _run_tesseract_words(image_data: bytes, lang: str, psm: Optional[int] = None) -> OcrWords:
+    """
+    调用 Tesseract 识别单张图片，返回带置信度的结果
+
+    Args:
+        image_data: 图片的二进制数据
+        lang: OCR 语言
+        psm: 页面分割模式，None 表示使用默认值
+
+    Returns:
+        识别结果
+    """
+    import pytesseract
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    tsv = pytesseract.image_to_data(image, lang=lang, config=f"--psm {psm}" if psm is not None else "")
+    return parse_tsv(tsv).get(1, OcrWords(text="", words=[]))
 
 
 def is_ocr_available() -> bool:
@@ -0,0 +1,296 @@
+"""
+PDF 按页并行提取模块
+在进程池中按页并行提取 PDF 文本，单页解析有超时限制；
+没有文本层的页（扫描件、拍照上传的手写作业）对页内图片进行 OCR，并统计每页耗时
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    PDF_PAGE_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGE_TIMEOUT, PDF_OCR_MIN_CHARS,
+    PDF_SLOW_PAGE_SECONDS, OCR_BATCH_SIZE, VERBOSE_LOGGING
+)
+from archive_fs import open_seekable
+from cache_store import drain_all_counters, merge_all_counters
+from ocr import extract_ocr_results, format_ocr_block, is_ocr_available
+import metrics
+
+
+class PdfEncryptedError(Exception):
+    """PDF 文件已加密"""
+
+
+class PageTimeout(Exception):
+    """单页解析超时"""
+
+
+@dataclass
+class PdfPage:
+    """单页提取结果"""
+    number: int
+    text: str
+    seconds: float
+    ocr: bool = False
+    timed_out: bool = False
+    error: Optional[str] = None
+    # 待 OCR 的页内图片（扫描页），识别后清空
+    images: List[bytes] = field(default_factory=list)
+
+
+@contextmanager
+def _time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """
+    限制代码块的执行时间，超时抛出 PageTimeout
+
+    依赖 SIGALRM，只在类 Unix 系统的主线程中生效（进程池的任务在子进程主线程中执行），其他情况不限时。
+    """
+    if (not seconds or not hasattr(signal, 'setitimer')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def on_timeout(signum, frame):
+        raise PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_page(reader, index: int, timeout: Optional[float]) -> PdfPage:
+    """
+    提取单页文本；文本层过少时取出页内图片留待 OCR
+
+    Args:
+        reader: PyPDF2.PdfReader
+        index: 页序号（从 0 开始）
+        timeout: 解析超时时间（秒）
+
+    Returns:
+        单页提取结果
+    """
+    started = time.perf_counter()
+    page = PdfPage(number=index + 1, text="", seconds=0.0)
+    try:
+        with _time_limit(timeout):
+            pdf_page = reader.pages[index]
+            page.text = (pdf_page.extract_text() or "").strip()
+            if len(page.text) < PDF_OCR_MIN_CHARS and is_ocr_available():
+                page.images = [image.data for image in pdf_page.images]
+    except PageTimeout:
+        page.images = []
+        page.timed_out = True
+    except Exception as e:
+        page.images = []
+        page.error = str(e)
+
+    page.seconds = time.perf_counter() - started
+    _record_page(page)
+    return page
+
+
+def _ocr_pages(pages: List[PdfPage]) -> None:
+    """
+    对一组扫描页的图片统一进行 OCR（同一次调用中的图片合并成批，受当前提交的 OCR 预算约束）
+
+    Args:
+        pages: 页面列表，识别结果追加到各页文本中
+    """
+    images = [image for page in pages for image in page.images]
+    if not images:
+        return
+    results = iter(extract_ocr_results(images))
+    for page in pages:
+        if not page.images:
+            continue
+        # 每张图片单独成块，各自带置信度
+        blocks = [format_ocr_block(next(results)) for _ in page.images]
+        page.images = []
+        page.ocr = True
+        metrics.add('pdf', 'ocr_pages', 1)
+        page.text = "\n".join(part for part in [page.text, *blocks] if part)
+
+
+def _with_ocr(pages: Iterator[PdfPage]) -> Iterator[PdfPage]:
+    """
+    按页序输出页面，扫描页凑满一个 OCR 批次（或到文件末尾）后统一识别
+
+    只有文本层的页不等待，直接输出。
+    """
+    window: List[PdfPage] = []
+    for page in pages:
+        window.append(page)
+        if len(window) >= OCR_BATCH_SIZE or not any(p.images for p in window):
+            _ocr_pages(window)
+            yield from window
+            window = []
+    _ocr_pages(window)
+    yield from window
+
+
+def _record_page(page: PdfPage) -> None:
+    metrics.add('pdf', 'pages', 1)
+    metrics.add('pdf', 'seconds', page.seconds)
+    if page.timed_out:
+        metrics.add('pdf', 'timeouts', 1)
+    if page.seconds >= PDF_SLOW_PAGE_SECONDS:
+        metrics.add('pdf', 'slow_pages', 1)
+
+
+# 页面任务进程中最近打开的 PDF: (文件路径, 文件对象的 ExitStack, PdfReader)
+_worker_reader: Optional[Tuple[str, ExitStack, object]] = None
+
+
+def _open_reader(file_path: str) -> Tuple[ExitStack, object]:
+    import PyPDF2
+
+    with ExitStack() as stack:
+        reader = PyPDF2.PdfReader(stack.enter_context(open_seekable(file_path)))
+        # 解析成功后把文件对象的关闭责任转交给调用方
+        return stack.pop_all(), reader
+
+
+def _page_job(file_path: str, index: int, timeout: Optional[float]
+              ) -> Tuple[PdfPage, Dict[str, Dict[str, int]], Dict[str, Dict[str, float]]]:
+    """
+    在页面进程中执行的任务: 解析单页并带回本进程的缓存计数和运行指标
+
+    扫描页的图片随结果带回，由调用方进程在该提交的 OCR 预算内统一识别。
+
+    同一文件的各页通常由同一批进程处理，每个进程只打开一次文件。
+    """
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != file_path:
+        if _worker_reader is not None:
+            _worker_reader[1].close()
+            _worker_reader = None
+        stack, reader = _open_reader(file_path)
+        _worker_reader = (file_path, stack, reader)
+    page = _extract_page(_worker_reader[2], index, timeout)
+    return page, drain_all_counters(), metrics.drain()
+
+
+# 全局页面进程池
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _page_workers() -> int:
+    # 流水线的提取子进程已经按文件并行，子进程内不再开进程池
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return max(1, PDF_PAGE_WORKERS or os.cpu_count() or 1)
+
+
+def _get_page_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    workers = _page_workers()
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers)
+        return _pool
+
+
+def _reset_page_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def iter_pdf_pages(file_path: str, timeout: Optional[float] = PDF_PAGE_TIMEOUT) -> Iterator[PdfPage]:
+    """
+    按页提取 PDF 文本，页数较多时在进程池中并行解析
+
+    结果按页序输出；调用方提前停止迭代时，尚未开始的页不再解析。
+
+    Args:
+        file_path: PDF 文件路径或压缩包成员的虚拟路径
+        timeout: 单页解析超时时间（秒）
+
+    Yields:
+        各页提取结果
+
+    Raises:
+        PdfEncryptedError: 文件已加密
+    """
+    stack, reader = _open_reader(file_path)
+    try:
+        if reader.is_encrypted:
+            raise PdfEncryptedError("文件已加密")
+        for page in _with_ocr(_iter_raw_pages(file_path, reader, timeout)):
+            yield _report_slow(file_path, page)
+    finally:
+        stack.close()
+
+
+def _iter_raw_pages(file_path: str, reader, timeout: Optional[float]) -> Iterator[PdfPage]:
+    """按页序输出解析结果（尚未 OCR），页数较多时由进程池并行解析"""
+    page_count = len(reader.pages)
+    pool = _get_page_pool() if page_count >= PDF_PARALLEL_MIN_PAGES else None
+    if pool is None:
+        for index in range(page_count):
+            yield _extract_page(reader, index, timeout)
+        return
+
+    futures = [pool.submit(_page_job, file_path, index, timeout)
+               for index in range(page_count)]
+    try:
+        for index, future in enumerate(futures):
+            try:
+                page, counters, worker_metrics = future.result()
+            except BrokenProcessPool:
+                # 页面进程异常退出（如解析时内存耗尽），重建进程池，本页在当前进程中重试
+                _reset_page_pool()
+                page = _extract_page(reader, index, timeout)
+            else:
+                merge_all_counters(counters)
+                metrics.merge(worker_metrics)
+            yield page
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _report_slow(file_path: str, page: PdfPage) -> PdfPage:
+    if VERBOSE_LOGGING:
+        name = os.path.basename(file_path)
+        if page.timed_out:
+            print(f"    - 警告: {name} 第 {page.number} 页解析超时，已跳过")
+        elif page.error:
+            print(f"    - 警告: {name} 第 {page.number} 页解析失败: {page.error}")
+        elif page.seconds >= PDF_SLOW_PAGE_SECONDS:
+            print(f"    - 提示: {name} 第 {page.number} 页解析耗时 {page.seconds:.1f} 秒")
+    return page
+
+
+def get_pdf_stats() -> Dict[str, float]:
+    """
+    返回 PDF 提取统计
+
+    Returns:
+        页数、OCR 页数、超时页数、慢页数和累计解析耗时
+    """
+    stats = metrics.snapshot('pdf')
+    return {
+        'pages': stats.get('pages', 0),
+        'ocr_pages': stats.get('ocr_pages', 0),
+        'timeouts': stats.get('timeouts', 0),
+        'slow_pages': stats.get('slow_pages', 0),
+        'seconds': stats.get('seconds', 0.0),
+    }
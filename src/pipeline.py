@@ -0,0 +1,373 @@
+"""
+并发评分流水线模块
+将解压、文本提取、LLM 评分拆分为三个阶段，各阶段使用独立的工作池，
+阶段之间通过有界队列连接，队列满时上游阶段自动阻塞（背压）
+"""
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from config import (
+    ARCHIVE_WORKERS, EXTRACT_WORKERS, LLM_WORKERS, PIPELINE_QUEUE_SIZE,
+    MAX_CHARS_PER_FILE, MAX_CHARS_PER_SUBMISSION, LLM_ASYNC_ENABLED, SIMILARITY_SHARE_DUPLICATE_GRADES, VERBOSE_LOGGING
+)
+from models import Grade, StudentSubmission, ScoreResult, ProcessingResult
+from file_utils import extract_archives_in_folder
+from text_extractor import (
+    CACHED_EXTENSIONS, EMPTY_FOLDER_TEXT, TRUNCATED_MARKER, CharBudget, find_supported_files,
+    extract_text_from_file, join_extracted_texts, needs_doc_conversion, prefetch_doc_conversions
+)
+from llm_client import AsyncLLMRunner, grade_with_llm
+from similarity import DuplicateGrades
+from cache_store import drain_all_counters, merge_all_counters
+from ocr import OcrBudget, ocr_budget
+import metrics
+import tracing
+
+# 队列结束标记
+_STOP = object()
+
+
+@dataclass
+class PipelineConfig:
+    """流水线各阶段的并发配置"""
+    archive_workers: int = ARCHIVE_WORKERS
+    extract_workers: int = EXTRACT_WORKERS
+    llm_workers: int = LLM_WORKERS
+    queue_size: int = PIPELINE_QUEUE_SIZE
+
+
+class _Stage:
+    """
+    流水线中的一个阶段
+
+    启动固定数量的工作线程，从输入队列取出工作项处理后放入输出队列。
+    最后一个退出的工作线程负责向下游传递结束标记。
+    """
+
+    def __init__(self, name: str, handler: Callable[[ProcessingResult], None],
+                 workers: int, in_queue: queue.Queue, out_queue: queue.Queue):
+        self.name = name
+        self.handler = handler
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self._alive = max(1, workers)
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(self._alive)
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self.in_queue.get()
+            if item is _STOP:
+                # 放回结束标记，让同阶段的其他线程也能退出
+                self.in_queue.put(_STOP)
+                break
+
+            _, result = item
+            # 前序阶段已失败的学生直接透传，与串行路径的行为保持一致
+            if not result.errors:
+                try:
+                    with tracing.student(result.submission.folder_name):
+                        self.handler(result)
+                except Exception as e:
+                    result.errors.append(f"处理失败: {e}")
+                    if VERBOSE_LOGGING:
+                        print(f"  - 处理失败 {result.submission.folder_name}: {e}")
+
+            # put 在队列满时阻塞，从而对上游形成背压
+            self.out_queue.put(item)
+
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last:
+            self.out_queue.put(_STOP)
+
+
+def _archive_handler(result: ProcessingResult) -> None:
+    """阶段 1: 解压压缩文件，并提前提交 DOC 转换请求（与其他学生的 DOC 文件合并转换）"""
+    if VERBOSE_LOGGING:
+        print(f"\n正在处理: {result.submission.folder_name}")
+    extract_archives_in_folder(result.submission.folder_path)
+    prefetch_doc_conversions(find_supported_files(result.submission.folder_path))
+
+
+def _extract_file_job(file_path: str, budget: Optional[OcrBudget] = None,
+                      max_chars: Optional[int] = MAX_CHARS_PER_FILE
+                      ) -> Tuple[str, Dict[str, Dict[str, int]], Dict[str, Dict[str, float]],
+                                 Optional[OcrBudget], List[dict]]:
+    """
+    在提取进程中执行的任务: 提取单个文件并带回本进程的缓存计数、运行指标和追踪事件
+
+    Args:
+        file_path: 文件路径
+        budget: 所属提交剩余的 OCR 预算，None 表示不限制
+        max_chars: 字符上限，超出后停止解析，None 表示不限制
+
+    Returns:
+        (提取的文本, 缓存计数, 运行指标, 更新了已用量的 OCR 预算, 追踪事件)
+    """
+    with ocr_budget(budget):
+        text = extract_text_from_file(file_path, max_chars)
+    return text, drain_all_counters(), metrics.drain(), budget, tracing.drain()
+
+
+def _may_contain_images(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() in CACHED_EXTENSIONS
+
+
+def _file_char_limit(budget: CharBudget) -> Optional[int]:
+    # 单个文件的字符上限: 单文件预算与整份提交剩余预算中较小的一个
+    if budget.remaining is None:
+        return MAX_CHARS_PER_FILE
+    return budget.remaining if MAX_CHARS_PER_FILE is None else min(MAX_CHARS_PER_FILE, budget.remaining)
+
+
+def _make_extract_handler(executor: Executor, lookahead: int) -> Callable[[ProcessingResult], None]:
+    """
+    构造阶段 2 的处理函数: 将学生文件夹内的文件分别提交到进程池并行提取
+
+    每份提交最多同时提交 lookahead 个文件，按文件原始顺序收集结果并消耗整份提交的字符预算；
+    预算用完后不再提交其余文件，已提交但未开始的任务被取消，与串行路径一样不解析超出预算的文件。
+    每个任务的字符上限取提交时剩余的预算，单个超长文件在提取进程中即停止解析。
+
+    需要 LibreOffice 转换的 DOC 文件在本线程中提取，转换由主进程的 DOC 转换服务批量完成。
+    设置了 OCR 预算时，可能包含图片的文件（DOCX/PDF/DOC）依次提取，预算在它们之间传递；
+    此时并行度来自同时处理的多份提交。
+
+    Args:
+        executor: 文本提取进程池
+        lookahead: 每份提交同时提交到进程池的文件数
+
+    Returns:
+        处理函数
+    """
+    def handler(result: ProcessingResult) -> None:
+        files = find_supported_files(result.submission.folder_path)
+        if not files:
+            result.content = EMPTY_FOLDER_TEXT
+            return
+
+        folder_name = result.submission.folder_name
+        prefetch_doc_conversions(files)
+        budget = OcrBudget()
+        limited = budget.max_images is not None or budget.max_seconds is not None
+        chars = CharBudget(MAX_CHARS_PER_SUBMISSION)
+        # 已提交的文件: (文件路径, 进程池任务)，任务为 None 的文件在收集时依次提取
+        pending: Deque[Tuple[str, Optional[Future]]] = deque()
+        submitted = 0
+
+        def merge(outputs) -> None:
+            text, counters, worker_metrics, _, events = outputs
+            merge_all_counters(counters)
+            metrics.merge(worker_metrics)
+            tracing.merge(events, folder_name)
+
+        texts = []
+        while len(texts) < len(files) and chars.remaining != 0:
+            while submitted < len(files) and len(pending) < max(1, lookahead):
+                file_path = files[submitted]
+                if needs_doc_conversion(file_path) or (limited and _may_contain_images(file_path)):
+                    future = None
+                else:
+                    future = executor.submit(_extract_file_job, file_path, None,
+                                             _file_char_limit(chars))
+                pending.append((file_path, future))
+                submitted += 1
+
+            file_path, future = pending.popleft()
+            if future is not None:
+                outputs = future.result()
+                merge(outputs)
+                text = outputs[0]
+            elif needs_doc_conversion(file_path):
+                with ocr_budget(budget):
+                    text = extract_text_from_file(file_path, _file_char_limit(chars))
+            else:
+                outputs = executor.submit(_extract_file_job, file_path, budget,
+                                          _file_char_limit(chars)).result()
+                merge(outputs)
+                text, budget = outputs[0], outputs[3]
+            texts.append(text)
+            chars.take(text[:-len(TRUNCATED_MARKER)] if text.endswith(TRUNCATED_MARKER) else text)
+
+        # 预算用完: 取消尚未开始的任务，已在运行的任务只合并计数和指标
+        for _, future in pending:
+            if future is not None and not future.cancel():
+                merge(future.result())
+        # 未提取的文件以空文本占位，拼接时输出省略说明
+        result.content = join_extracted_texts(zip(files, texts + [""] * (len(files) - len(texts))),
+                                              MAX_CHARS_PER_SUBMISSION)
+
+    return handler
+
+
+def _make_llm_handler(rubric: str, runner: Optional[AsyncLLMRunner]
+                     ) -> Callable[[ProcessingResult], None]:
+    """
+    构造阶段 3 的处理函数: 调用 LLM 评分（内容完全相同的提交只评分一次）
+
+    Args:
+        rubric: 评分标准
+        runner: 异步 LLM 客户端运行器，为 None 时使用同步客户端
+
+    Returns:
+        处理函数
+    """
+    score_fn = runner.grade_content if runner else grade_with_llm
+    duplicates = DuplicateGrades() if SIMILARITY_SHARE_DUPLICATE_GRADES else None
+
+    def grade_fn(content: str) -> Grade:
+        return score_fn(content, rubric)
+
+    def handler(result: ProcessingResult) -> None:
+        submission = result.submission
+        if duplicates:
+            grade = duplicates.grade(submission.folder_name, result.content, grade_fn)
+        else:
+            grade = grade_fn(result.content)
+        result.score_result = ScoreResult(
+            student_id=submission.student_id,
+            student_name=submission.student_name,
+            folder_name=submission.folder_name,
+            score=grade.score,
+            comment=grade.comment,
+            samples=grade.samples
+        )
+        if VERBOSE_LOGGING:
+            print(f"  - 评分完成: {submission.folder_name}, "
+                  f"得分: {grade.score if grade.score is not None else '未评分'}")
+
+    return handler
+
+
+def run_pipeline(student_folders: List[StudentSubmission], rubric: str,
+                 config: Optional[PipelineConfig] = None,
+                 on_result: Optional[Callable[[ProcessingResult], None]] = None,
+                 extract_only: bool = False) -> List[ProcessingResult]:
+    """
+    使用分阶段并发流水线处理所有学生文件夹
+
+    Args:
+        student_folders: 学生提交列表
+        rubric: 评分标准
+        config: 流水线并发配置，为 None 时使用配置文件中的默认值
+        on_result: 每个学生处理完成时在主线程中调用的回调（按完成顺序）
+        extract_only: 只解压和提取文本，不评分（用于之后整批提交评分）
+
+    Returns:
+        处理结果列表，顺序与输入的学生列表一致
+    """
+    config = config or PipelineConfig()
+
+    if VERBOSE_LOGGING:
+        print(f"使用并发流水线: 解压 {config.archive_workers} 线程, "
+              f"提取 {config.extract_workers} 进程"
+              + ("" if extract_only else f", LLM {config.llm_workers} 并发"))
+
+    results: List[Optional[ProcessingResult]] = [None] * len(student_folders)
+    runner = (_create_llm_runner(config.llm_workers)
+              if LLM_ASYNC_ENABLED and not extract_only else None)
+
+    try:
+        _run_stages(student_folders, rubric, config, runner, results, on_result, extract_only)
+    finally:
+        if runner:
+            runner.close()
+
+    return [r for r in results if r is not None]
+
+
+def _create_llm_runner(max_concurrency: int) -> Optional[AsyncLLMRunner]:
+    """
+    创建异步 LLM 运行器，不可用时退回同步客户端
+
+    Args:
+        max_concurrency: 并发上限
+
+    Returns:
+        运行器实例，创建失败时返回 None
+    """
+    try:
+        return AsyncLLMRunner(max_concurrency)
+    except (ImportError, ValueError) as e:
+        if VERBOSE_LOGGING:
+            print(f"异步 LLM 客户端不可用，改用同步客户端: {e}")
+        return None
+
+
+def _run_stages(student_folders: List[StudentSubmission], rubric: str,
+                config: PipelineConfig, runner: Optional[AsyncLLMRunner],
+                results: List[Optional[ProcessingResult]],
+                on_result: Optional[Callable[[ProcessingResult], None]],
+                extract_only: bool = False) -> None:
+    """
+    启动各阶段并收集结果
+
+    Args:
+        student_folders: 学生提交列表
+        rubric: 评分标准
+        config: 流水线并发配置
+        runner: 异步 LLM 运行器
+        results: 按学生序号写入处理结果的列表
+        on_result: 每个学生处理完成时的回调
+        extract_only: 不启动 LLM 评分阶段，提取结果直接输出
+    """
+    queue_size = max(1, config.queue_size)
+    archive_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    extract_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    llm_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    done_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+    with ProcessPoolExecutor(max_workers=max(1, config.extract_workers)) as executor:
+        stages = [
+            _Stage("archive", _archive_handler,
+                   config.archive_workers, archive_queue, extract_queue),
+            _Stage("extract", _make_extract_handler(executor, config.extract_workers),
+                   config.extract_workers, extract_queue,
+                   done_queue if extract_only else llm_queue),
+        ]
+        if not extract_only:
+            stages.append(_Stage("llm", _make_llm_handler(rubric, runner),
+                                 config.llm_workers, llm_queue, done_queue))
+        for stage in stages:
+            stage.start()
+
+        def feed() -> None:
+            for index, submission in enumerate(student_folders):
+                archive_queue.put(
+                    (index, ProcessingResult(submission=submission, content="")))
+            archive_queue.put(_STOP)
+
+        feeder = threading.Thread(target=feed, name="pipeline-feeder", daemon=True)
+        feeder.start()
+
+        # 主线程负责消费最终结果，保证最后一个队列不会阻塞
+        while True:
+            item = done_queue.get()
+            if item is _STOP:
+                break
+            index, result = item
+            results[index] = result
+            if on_result:
+                on_result(result)
+
+        feeder.join()
+        for stage in stages:
+            stage.join()
+
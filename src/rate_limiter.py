@@ -0,0 +1,144 @@
+"""
+限流与自适应并发模块
+提供令牌桶限流（每分钟请求数/每分钟 token 数）和 AIMD 自适应并发控制
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    以固定速率补充令牌，桶容量为一分钟的配额。取令牌不足时异步等待。
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        取出指定数量的令牌，不足时等待补充
+
+        Args:
+            amount: 令牌数量，超过桶容量时按桶容量计算
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def adjust(self, delta: float) -> None:
+        """
+        按实际消耗修正令牌余量（正数退还，负数追扣）
+
+        Args:
+            delta: 修正量
+        """
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + delta)
+
+
+class RateLimiter:
+    """同时限制每分钟请求数（RPM）和每分钟 token 数（TPM）"""
+
+    def __init__(self, requests_per_minute: Optional[float],
+                 tokens_per_minute: Optional[float]):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        """
+        在发出请求前获取配额
+
+        Args:
+            estimated_tokens: 预估本次请求消耗的 token 数
+        """
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens:
+            await self.tokens.acquire(estimated_tokens)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """
+        请求完成后按实际 token 用量修正 TPM 余量
+
+        Args:
+            estimated_tokens: 请求前的预估值
+            actual_tokens: 响应中报告的实际用量，未知时为 None
+        """
+        if self.tokens and actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 自适应并发控制
+
+    每次成功且延迟低于目标时，并发上限加性增长（每满一轮增加 1）；
+    遇到 429 限流或延迟超过目标时，并发上限乘性减半。
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int,
+                 latency_target: Optional[float] = None, decrease_factor: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.rate_limited_count = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> "AdaptiveConcurrency":
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        """
+        记录一次成功请求
+
+        Args:
+            latency: 请求耗时（秒）
+        """
+        if self.latency_target and latency > self.latency_target:
+            self._decrease()
+        else:
+            # 每完成 limit 个请求增加 1 个并发
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+    def on_rate_limited(self) -> None:
+        """记录一次 429 限流响应"""
+        self.rate_limited_count += 1
+        self._decrease()
+
+    def _decrease(self) -> None:
+        # 同一批并发请求几乎同时收到 429，短时间内只减半一次
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
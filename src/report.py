@@ -4,11 +4,10 @@
 """
 from models import ScoreResult
 from config import OUTPUT_FILENAME, VERBOSE_LOGGING
+from report_sink import MultiReportSink, XlsxReportSink
 import os
-from typing import List
-
-# 将可选依赖的导入移至函数内部
-PANDAS_AVAILABLE = None
+from collections import Counter
+from typing import Dict, List
 
 
 def generate_excel_report(results: List[ScoreResult], output_dir: str) -> str:
@@ -23,40 +22,16 @@ def generate_excel_report(results: List[ScoreResult], output_dir: str) -> str:
         生成的报告文件路径
 
     Raises:
-        ImportError: 如果 pandas 未安装
+        ImportError: 如果 openpyxl 未安装
     """
-    global PANDAS_AVAILABLE
-    if PANDAS_AVAILABLE is None:
-        try:
-            import pandas as pd
-            PANDAS_AVAILABLE = True
-        except ImportError:
-            PANDAS_AVAILABLE = False
-
-    if not PANDAS_AVAILABLE:
-        raise ImportError("pandas 未安装，无法生成 Excel 报告")
-
-    import pandas as pd
-
-    # 转换为字典列表
-    data = []
-    for result in results:
-        data.append({
-            '学号': result.student_id,
-            '姓名': result.student_name,
-            '文件夹名': result.folder_name,
-            '分数': result.score,
-            '评语': result.comment
-        })
-
-    # 创建 DataFrame
-    df = pd.DataFrame(data)
-
     # 生成输出文件路径
     output_filename = os.path.join(output_dir, OUTPUT_FILENAME)
 
-    # 保存到 Excel
-    df.to_excel(output_filename, index=False, engine='openpyxl')
+    sink = XlsxReportSink(output_filename)
+    sink.open()
+    for result in results:
+        sink.write(result)
+    sink.close()
 
     if VERBOSE_LOGGING:
         print(f"\n所有评分完成！结果已保存到 {output_filename}")
@@ -77,14 +52,18 @@ def calculate_statistics(results: List[ScoreResult]) -> dict:
     if not results:
         return {}
 
-    scores = [r.score for r in results]
+    # 未评分（分数为 None）的学生不计入分数统计
+    scores = [r.score for r in results if r.score is not None]
 
-    stats = {
-        '平均分': round(sum(scores) / len(scores), 2),
-        '最高分': max(scores),
-        '最低分': min(scores),
-        '总人数': len(results)
-    }
+    stats = {}
+    if scores:
+        stats.update({
+            '平均分': round(sum(scores) / len(scores), 2),
+            '最高分': max(scores),
+            '最低分': min(scores),
+        })
+    stats['总人数'] = len(results)
+    stats['未评分人数'] = len(results) - len(scores)
 
     return stats
 
@@ -105,45 +84,95 @@ def print_statistics(results: List[ScoreResult]) -> None:
 
     if VERBOSE_LOGGING:
         print("\n评分统计:")
-        print(f"平均分: {stats['平均分']:.2f}")
-        print(f"最高分: {stats['最高分']:.2f}")
-        print(f"最低分: {stats['最低分']:.2f}")
+        if '平均分' in stats:
+            print(f"平均分: {stats['平均分']:.2f}")
+            print(f"最高分: {stats['最高分']:.2f}")
+            print(f"最低分: {stats['最低分']:.2f}")
         print(f"总人数: {stats['总人数']}")
+        if stats['未评分人数']:
+            print(f"未评分: {stats['未评分人数']}人（分数留空，原因见评语，可使用 --resume 重新评分）")
 
         # 分数分布
-        scores = [r.score for r in results]
-
-        global PANDAS_AVAILABLE
-        if PANDAS_AVAILABLE is None:
-            try:
-                import pandas as pd
-                PANDAS_AVAILABLE = True
-            except ImportError:
-                PANDAS_AVAILABLE = False
-
-        if PANDAS_AVAILABLE:
-            import pandas as pd
-            score_distribution = pd.Series(scores).value_counts().sort_index()
+        score_distribution = Counter(r.score for r in results if r.score is not None)
+        if score_distribution:
             print("\n分数分布:")
-            for score, count in score_distribution.items():
-                print(f"  {score}分: {count}人")
+        for score, count in sorted(score_distribution.items()):
+            print(f"  {score}分: {count}人")
+
+
+def format_cache_stats(stats: Dict[str, int]) -> Dict[str, object]:
+    """
+    将缓存统计信息转换为运行摘要中的展示项
+
+    Args:
+        stats: SQLiteCache.stats() 返回的统计信息
+
+    Returns:
+        展示项字典
+    """
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / lookups if lookups else 0.0
+    summary = {'命中': stats['hits']}
+    if stats.get('memory_hits'):
+        summary['其中内存命中'] = stats['memory_hits']
+    summary.update({
+        '未命中': stats['misses'],
+        '命中率': f"{hit_rate:.1%}",
+        '淘汰': stats['evictions'],
+        '条目数': stats['entries'],
+        '占用': f"{stats['bytes'] / 1024 / 1024:.1f} MB",
+    })
+    return summary
+
+
+def print_run_summary(sections: Dict[str, Dict[str, object]]) -> None:
+    """
+    打印运行摘要（缓存命中等运行指标）
+
+    Args:
+        sections: {分组标题: {指标名: 指标值}}
+    """
+    if not (VERBOSE_LOGGING and sections):
+        return
+
+    print("\n运行摘要:")
+    for title, metrics in sections.items():
+        print(f"  [{title}]")
+        for name, value in metrics.items():
+            print(f"    {name}: {value}")
 
 
 def generate_report(results: List[ScoreResult], output_dir: str) -> str:
     """
-    生成完整报告（Excel + 统计信息）
+    生成完整报告（配置中的各格式报告 + 统计信息）
 
     Args:
         results: 评分结果列表
         output_dir: 输出目录
 
     Returns:
-        生成的报告文件路径
+        生成的第一个报告文件路径
+    """
+    sink = MultiReportSink(output_dir)
+    for result in results:
+        sink.write(result)
+    report_paths = sink.close()
+
+    finish_report(results, report_paths)
+
+    return report_paths[0] if report_paths else ""
+
+
+def finish_report(results: List[ScoreResult], report_paths: List[str]) -> None:
     """
-    # 生成 Excel 报告
-    report_path = generate_excel_report(results, output_dir)
+    输出报告位置和统计信息
+
+    Args:
+        results: 评分结果列表
+        report_paths: 已生成的报告文件路径
+    """
+    if VERBOSE_LOGGING and report_paths:
+        print(f"\n所有评分完成！结果已保存到 {', '.join(report_paths)}")
 
     # 打印统计信息
     print_statistics(results)
-
-    return report_path
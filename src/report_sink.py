@@ -0,0 +1,275 @@
+"""
+流式报告输出模块
+评分结果产生后立即逐行写入报告文件，支持 xlsx（openpyxl 只写模式）、CSV 和 Parquet，
+不依赖 pandas，也不需要在内存中保留全部结果
+"""
+import csv
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence, Tuple
+
+from config import OUTPUT_FILENAME, REPORT_FORMATS, REPORT_FLUSH_EVERY, VERBOSE_LOGGING
+from models import ScoreResult
+
+# 报告列: (表头, ScoreResult 属性名)
+REPORT_COLUMNS = [
+    ('学号', 'student_id'),
+    ('姓名', 'student_name'),
+    ('文件夹名', 'folder_name'),
+    ('分数', 'score'),
+    ('评语', 'comment'),
+]
+
+# 启用多次采样评分时追加的列
+CONSENSUS_COLUMNS = [
+    ('采样分数', 'sample_scores'),
+    ('分差', 'score_spread'),
+]
+
+# Parquet 中以 float64 存储的列，其余为字符串
+_NUMERIC_ATTRS = ('score', 'score_spread')
+
+SUPPORTED_FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def result_to_row(result: ScoreResult, columns: Sequence[Tuple[str, str]] = REPORT_COLUMNS) -> list:
+    """
+    将评分结果转换为报告中的一行
+
+    Args:
+        result: 评分结果
+        columns: 报告列
+
+    Returns:
+        按 columns 顺序排列的单元格值
+    """
+    return [getattr(result, attr) for _, attr in columns]
+
+
+class ReportSink(ABC):
+    """报告输出基类，子类实现具体文件格式"""
+
+    def __init__(self, path: str, flush_every: int = REPORT_FLUSH_EVERY,
+                 columns: Sequence[Tuple[str, str]] = REPORT_COLUMNS):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.columns = list(columns)
+        self.rows_written = 0
+        self._unflushed = 0
+
+    @abstractmethod
+    def open(self) -> None:
+        """创建报告文件并写入表头"""
+
+    @abstractmethod
+    def write_row(self, row: list) -> None:
+        """写入一行单元格值"""
+
+    def flush(self) -> None:
+        """将已写入的行同步到磁盘（默认无操作）"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """写出剩余内容并关闭报告文件"""
+
+    def write(self, result: ScoreResult) -> None:
+        """
+        写入一条评分结果，每写满 flush_every 行同步一次
+
+        Args:
+            result: 评分结果
+        """
+        self.write_row(result_to_row(result, self.columns))
+        self.rows_written += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+            self._unflushed = 0
+
+
+class CsvReportSink(ReportSink):
+    """CSV 报告，定期 fsync，磁盘上的文件始终反映最新进度"""
+
+    def open(self) -> None:
+        # utf-8-sig 使 Excel 能正确识别中文
+        self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([header for header, _ in self.columns])
+
+    def write_row(self, row: list) -> None:
+        self._writer.writerow(row)
+
+    def flush(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+class XlsxReportSink(ReportSink):
+    """
+    xlsx 报告，使用 openpyxl 只写模式逐行写入
+
+    只写模式下各行先写入 openpyxl 的临时文件，内存占用与行数无关；
+    xlsx 是压缩包格式，只能在关闭时一次性生成，进行中的进度请查看 CSV 报告。
+    """
+
+    def open(self) -> None:
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append([header for header, _ in self.columns])
+
+    def write_row(self, row: list) -> None:
+        self._sheet.append(row)
+
+    def close(self) -> None:
+        # 先写临时文件再替换，避免中途失败时留下损坏的报告
+        tmp_path = self.path + ".tmp"
+        self._workbook.save(tmp_path)
+        os.replace(tmp_path, self.path)
+
+
+class ParquetReportSink(ReportSink):
+    """
+    Parquet 报告，每 flush_every 行写出一个 row group
+
+    注意: 环境中安装了 pandas 时，pyarrow 自身可能会导入 pandas。
+    """
+
+    def open(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            (header, pa.float64() if attr in _NUMERIC_ATTRS else pa.string())
+            for header, attr in self.columns
+        ])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._buffer: List[list] = []
+
+    def write_row(self, row: list) -> None:
+        self._buffer.append(row)
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        columns = list(zip(*self._buffer))
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(list(values), type=field.type)
+             for values, field in zip(columns, self._schema)],
+            schema=self._schema)
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+
+_SINK_CLASSES = {
+    'xlsx': XlsxReportSink,
+    'csv': CsvReportSink,
+    'parquet': ParquetReportSink,
+}
+
+
+class MultiReportSink:
+    """
+    同时写出多种格式的报告
+
+    首次写入时才创建文件，没有任何评分结果时不会生成空报告。
+    某种格式的依赖缺失或写入失败时跳过该格式，不影响其他格式。
+    """
+
+    def __init__(self, output_dir: str, formats: Sequence[str] = REPORT_FORMATS,
+                 flush_every: int = REPORT_FLUSH_EVERY,
+                 columns: Sequence[Tuple[str, str]] = REPORT_COLUMNS):
+        unknown = [fmt for fmt in formats if fmt not in _SINK_CLASSES]
+        if unknown:
+            raise ValueError(f"不支持的报告格式: {', '.join(unknown)}，"
+                             f"可选值: {', '.join(SUPPORTED_FORMATS)}")
+        stem = os.path.splitext(OUTPUT_FILENAME)[0]
+        self.sinks: List[ReportSink] = [
+            _SINK_CLASSES[fmt](os.path.join(output_dir, f"{stem}.{fmt}"), flush_every, columns)
+            for fmt in formats
+        ]
+        self._opened = False
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        opened = []
+        for sink in self.sinks:
+            try:
+                sink.open()
+                opened.append(sink)
+            except ImportError as e:
+                if VERBOSE_LOGGING:
+                    print(f"  - 警告: 无法生成 {os.path.basename(sink.path)}，缺少依赖: {e}")
+        self.sinks = opened
+        self._opened = True
+
+    def write(self, result: ScoreResult) -> None:
+        """
+        向所有格式写入一条评分结果
+
+        Args:
+            result: 评分结果
+        """
+        with self._lock:
+            if not self._opened:
+                self._open()
+            for sink in list(self.sinks):
+                try:
+                    sink.write(result)
+                except Exception as e:
+                    if VERBOSE_LOGGING:
+                        print(f"  - 警告: 写入 {os.path.basename(sink.path)} 失败，"
+                              f"停止输出该格式: {e}")
+                    self.sinks.remove(sink)
+
+    def close(self) -> List[str]:
+        """
+        关闭所有报告文件
+
+        Returns:
+            成功生成的报告文件路径列表
+        """
+        paths = []
+        with self._lock:
+            if not self._opened:
+                return paths
+            for sink in self.sinks:
+                try:
+                    sink.close()
+                    paths.append(sink.path)
+                except Exception as e:
+                    if VERBOSE_LOGGING:
+                        print(f"  - 警告: 保存 {os.path.basename(sink.path)} 失败: {e}")
+        return paths
+
+    def __enter__(self) -> "MultiReportSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def parse_report_formats(value: Optional[str]) -> List[str]:
+    """
+    解析命令行中以逗号分隔的报告格式
+
+    Args:
+        value: 如 "xlsx,csv"
+
+    Returns:
+        格式列表，为空时返回配置中的默认格式
+    """
+    if not value:
+        return list(REPORT_FORMATS)
+    return [fmt.strip().lower() for fmt in value.split(',') if fmt.strip()]
@@ -2,27 +2,52 @@
 自动评分系统主模块
 负责协调各个模块完成评分任务
 """
+import argparse
 import os
-from typing import List
+from typing import List, Optional
 
-from config import COLLECTED_DIR, RUBRIC_FILE, VERBOSE_LOGGING
+from config import (
+    COLLECTED_DIR, RUBRIC_FILE, JOURNAL_FILENAME, PIPELINE_ENABLED, REPORT_FORMATS,
+    PDF_SLOW_PAGE_SECONDS, LLM_BATCH_ENABLED, LLM_PRICE_CURRENCY, LLM_CONSENSUS_ENABLED,
+    LLM_CONSENSUS_TOLERANCE, SIMILARITY_ENABLED, SIMILARITY_SHARE_DUPLICATE_GRADES,
+    TRACE_ENABLED, TRACE_FILENAME, VERBOSE_LOGGING
+)
 from models import StudentSubmission, ScoreResult, ProcessingResult
 from file_utils import extract_archives_in_folder
 from text_extractor import extract_text_from_folder
-from llm_client import analyze_with_llm
-from report import generate_report
+from llm_client import analyze_with_llm, grade_with_llm, set_consensus_mode
+from batch_grading import get_batch_stats, grade_in_batches
+from llm_usage import get_llm_usage_stats
+from llm_resilience import get_llm_resilience_stats
+from consensus import get_consensus_stats
+from similarity import (
+    DuplicateGrades, create_similarity_index, get_similarity_stats, report_similar_submissions
+)
+from report import finish_report, format_cache_stats, print_run_summary
+from report_sink import (
+    MultiReportSink, REPORT_COLUMNS, CONSENSUS_COLUMNS, SUPPORTED_FORMATS, parse_report_formats
+)
+from llm_cache import CACHE_MODES, get_llm_cache, set_llm_cache_mode
+from extraction_cache import get_extraction_cache
+from ocr import (
+    get_ocr_cache, get_ocr_language_stats, get_ocr_pass_stats, get_ocr_skip_stats, get_ocr_throughput
+)
+from doc_converter import get_doc_conversion_stats
+from pdf_extractor import get_pdf_stats
+from pipeline import PipelineConfig, run_pipeline
+from journal import GradingJournal
+import tracing
 
 
-def process_student_folder(student_folder: StudentSubmission, rubric: str) -> ProcessingResult:
+def extract_student_folder(student_folder: StudentSubmission) -> ProcessingResult:
     """
-    处理单个学生文件夹
+    解压并提取单个学生文件夹的文本（不评分）
 
     Args:
         student_folder: 学生提交信息
-        rubric: 评分标准
 
     Returns:
-        处理结果
+        处理结果，失败时 errors 不为空
     """
     result = ProcessingResult(submission=student_folder, content="")
 
@@ -34,22 +59,53 @@ def process_student_folder(student_folder: StudentSubmission, rubric: str) -> Pr
         extract_archives_in_folder(student_folder.folder_path)
 
         # 2. 提取文本内容
-        content = extract_text_from_folder(student_folder.folder_path)
-        result.content = content
+        result.content = extract_text_from_folder(student_folder.folder_path)
+
+    except Exception as e:
+        result.errors.append(f"处理失败: {e}")
+        if VERBOSE_LOGGING:
+            print(f"  - 处理失败 {student_folder.folder_name}: {e}")
+
+    return result
+
+
+def process_student_folder(student_folder: StudentSubmission, rubric: str,
+                           duplicates: Optional[DuplicateGrades] = None) -> ProcessingResult:
+    """
+    处理单个学生文件夹
 
+    Args:
+        student_folder: 学生提交信息
+        rubric: 评分标准
+        duplicates: 内容完全相同的提交共用评分的登记表，为 None 时每份提交都单独评分
+
+    Returns:
+        处理结果
+    """
+    result = extract_student_folder(student_folder)
+    if result.errors:
+        return result
+
+    try:
         # 3. 使用 LLM 评分
-        score, comment = analyze_with_llm(content, rubric)
+        if duplicates:
+            grade = duplicates.grade(student_folder.folder_name, result.content,
+                                     lambda content: grade_with_llm(content, rubric))
+        else:
+            grade = grade_with_llm(result.content, rubric)
         score_result = ScoreResult(
             student_id=student_folder.student_id,
             student_name=student_folder.student_name,
             folder_name=student_folder.folder_name,
-            score=score,
-            comment=comment
+            score=grade.score,
+            comment=grade.comment,
+            samples=grade.samples
         )
         result.score_result = score_result
 
         if VERBOSE_LOGGING:
-            print(f"  - 评分完成: {student_folder.folder_name}, 得分: {score}")
+            print(f"  - 评分完成: {student_folder.folder_name}, "
+                  f"得分: {grade.score if grade.score is not None else '未评分'}")
 
     except Exception as e:
         error_msg = f"处理失败: {e}"
@@ -101,9 +157,26 @@ def collect_student_folders(directory: str) -> List[StudentSubmission]:
     return student_folders
 
 
-def main(current_dir=None, rubric_path=None):
+def main(current_dir=None, rubric_path=None, use_pipeline: Optional[bool] = None,
+         pipeline_config: Optional[PipelineConfig] = None, resume: bool = False,
+         report_formats: Optional[List[str]] = None, use_batch: Optional[bool] = None,
+         consensus: Optional[bool] = None, trace: Optional[bool] = None):
     """
     主函数，遍历学生文件夹，处理内部的zip文件，使用LLM分析，并创建Excel报告。
+
+    每个学生评分完成后立即写入评分日志并追加到报告文件；resume 为 True 时跳过日志中
+    已评分的学生（未评分的学生重新评分），日志中的结果先写入报告，本次新评分的结果按完成顺序追加。
+
+    Args:
+        current_dir: 学生作业收集目录
+        rubric_path: 评分标准文件路径
+        use_pipeline: 是否使用并发流水线，为 None 时使用配置中的 PIPELINE_ENABLED
+        pipeline_config: 流水线各阶段的并发配置
+        resume: 是否从上次中断的评分日志继续
+        report_formats: 报告输出格式列表，为 None 时使用配置中的 REPORT_FORMATS
+        use_batch: 是否先提取全部学生的文本再通过 Batch API 整批评分，为 None 时使用配置中的 LLM_BATCH_ENABLED
+        consensus: 是否对每位学生多次采样评分，为 None 时使用配置中的 LLM_CONSENSUS_ENABLED（批量评分模式下不可用）
+        trace: 是否记录各阶段耗时并输出 trace 文件和阶段汇总表，为 None 时使用配置中的 TRACE_ENABLED
     """
     # 使用配置中的默认路径，如果没有提供参数
     current_dir = current_dir or str(COLLECTED_DIR)
@@ -127,20 +200,297 @@ def main(current_dir=None, rubric_path=None):
     if VERBOSE_LOGGING:
         print(f"找到 {len(student_folders)} 个学生文件夹，开始处理...")
 
-    # 处理所有学生文件夹
-    results = []
+    # 评分日志：恢复模式下读取已完成的结果，否则开始新的日志
+    journal = GradingJournal(os.path.join(current_dir, JOURNAL_FILENAME))
+    if resume:
+        # 未评分（分数为空）的学生重新评分
+        completed = {name: result for name, result in journal.load().items()
+                     if result.score is not None}
+        if VERBOSE_LOGGING:
+            print(f"从评分日志恢复 {len(completed)} 个已完成的评分结果")
+    else:
+        backup = journal.reset()
+        if backup and VERBOSE_LOGGING:
+            print(f"上次的评分日志已备份为 {os.path.basename(backup)}")
+        completed = {}
+
+    pending = [s for s in student_folders if s.folder_name not in completed]
+
+    if use_pipeline is None:
+        use_pipeline = PIPELINE_ENABLED
+    if use_batch is None:
+        use_batch = LLM_BATCH_ENABLED
+    if consensus is None:
+        consensus = LLM_CONSENSUS_ENABLED
+    if consensus and use_batch:
+        # 批处理请求各自独立，无法根据前几次采样的结果决定是否追加采样
+        print("警告: 批量评分模式不支持多次采样评分，每位学生只评分一次")
+        consensus = False
+    set_consensus_mode(consensus)
+    # 在创建提取进程池之前设置，子进程才能继承
+    tracing.set_tracing(TRACE_ENABLED if trace is None else trace)
+
+    # 报告随评分进度逐行写出，先写入日志中已有的结果
+    columns = REPORT_COLUMNS + CONSENSUS_COLUMNS if consensus else REPORT_COLUMNS
+    sink = MultiReportSink(current_dir, report_formats or REPORT_FORMATS, columns=columns)
     for student_folder in student_folders:
-        processing_result = process_student_folder(student_folder, rubric)
+        if student_folder.folder_name in completed:
+            sink.write(completed[student_folder.folder_name])
+
+    # 相似提交检测只覆盖本次提取了文本的学生（恢复模式下日志中已评分的学生不参与）
+    similarity_index = create_similarity_index() if SIMILARITY_ENABLED and pending else None
+
+    def record(processing_result: ProcessingResult) -> None:
+        if similarity_index is not None and not processing_result.errors:
+            similarity_index.add(processing_result.submission.folder_name,
+                                 processing_result.content)
         if processing_result.score_result:
-            results.append(processing_result.score_result)
+            journal.append(processing_result.score_result)
+            sink.write(processing_result.score_result)
+            completed[processing_result.submission.folder_name] = \
+                processing_result.score_result
+
+    # 处理尚未评分的学生文件夹
+    try:
+        if not pending:
+            if VERBOSE_LOGGING:
+                print("所有学生均已评分，直接从评分日志生成报告")
+        elif use_batch:
+            if use_pipeline:
+                extracted = run_pipeline(pending, rubric, pipeline_config, extract_only=True)
+            else:
+                extracted = []
+                for student_folder in pending:
+                    with tracing.student(student_folder.folder_name):
+                        extracted.append(extract_student_folder(student_folder))
+            grade_in_batches(extracted, rubric)
+            for processing_result in extracted:
+                record(processing_result)
+        elif use_pipeline:
+            run_pipeline(pending, rubric, pipeline_config, on_result=record)
+        else:
+            duplicates = DuplicateGrades() if SIMILARITY_SHARE_DUPLICATE_GRADES else None
+            for student_folder in pending:
+                with tracing.student(student_folder.folder_name):
+                    processing_result = process_student_folder(student_folder, rubric, duplicates)
+                record(processing_result)
+    finally:
+        # 中断时也保存已写出的部分报告
+        report_paths = sink.close()
+
+    # 按学生文件夹顺序汇总日志中的和本次新评分的结果
+    results = [completed[s.folder_name] for s in student_folders
+               if s.folder_name in completed]
 
-    # 生成报告
     if results:
-        generate_report(results, current_dir)
+        finish_report(results, report_paths)
     else:
         print("没有成功处理的评分结果")
 
+    report_similar_submissions(similarity_index, current_dir)
+
+    print_run_summary(collect_run_summary())
+
+    if tracing.is_tracing_enabled():
+        tracing.print_trace_summary()
+        trace_path = tracing.write_trace(os.path.join(current_dir, TRACE_FILENAME))
+        if trace_path:
+            print(f"\n追踪数据已保存到 {trace_path}（可用 chrome://tracing 或 ui.perfetto.dev 打开）")
+
+
+def collect_run_summary() -> dict:
+    """
+    收集本次运行的缓存等运行指标
+
+    Returns:
+        运行摘要分组字典
+    """
+    sections = {}
+    cache = get_llm_cache()
+    if cache:
+        sections['LLM 缓存'] = format_cache_stats(cache.stats())
+    extraction_cache = get_extraction_cache()
+    if extraction_cache:
+        sections['文本提取缓存'] = format_cache_stats(extraction_cache.stats())
+    ocr_cache = get_ocr_cache()
+    if ocr_cache:
+        sections['OCR 缓存'] = format_cache_stats(ocr_cache.stats())
+    throughput = get_ocr_throughput()
+    if throughput['images']:
+        sections['OCR 引擎'] = {
+            '识别图片数': int(throughput['images']),
+            'tesseract 调用次数': int(throughput['batches']),
+            '累计识别耗时': f"{throughput['seconds']:.1f} 秒",
+            '吞吐量': f"{throughput['images_per_sec']:.2f} 张/秒",
+        }
+    skips = get_ocr_skip_stats()
+    if skips['skipped_small'] or skips['skipped_blank'] or skips['skipped_budget'] or skips['downscaled']:
+        sections['OCR 预处理'] = {
+            '跳过过小图片': int(skips['skipped_small']),
+            '跳过纯色图片': int(skips['skipped_blank']),
+            '超出预算跳过': int(skips['skipped_budget']),
+            '缩小的图片': int(skips['downscaled']),
+            '预计节省识别耗时': f"{skips['saved_seconds']:.1f} 秒",
+        }
+    languages = get_ocr_language_stats()
+    if languages:
+        section = {f'{name} 模型': int(count) for name, count in sorted(languages.items())
+                   if name != 'cached'}
+        section['缓存命中'] = int(languages.get('cached', 0))
+        sections['OCR 语言选择'] = section
+    passes = get_ocr_pass_stats()
+    if passes['images'] or passes['trimmed_blocks']:
+        sections['OCR 渐进识别'] = {
+            '识别图片数': int(passes['images']),
+            '快速识别即采用': int(passes['fast_accepted']),
+            '原图重新识别': int(passes['full_resolution']),
+            '换页面分割模式重试': int(passes['psm_retry']),
+            '重试后结果更好': int(passes['psm_improved']),
+            '平均置信度': f"{passes['mean_confidence']:.1f}",
+            '裁剪的低置信度文本块': int(passes['trimmed_blocks']),
+            '裁剪字符数': int(passes['trimmed_chars']),
+        }
+    conversions = get_doc_conversion_stats()
+    if conversions['files'] or conversions['native']:
+        sections['DOC 转换'] = {
+            '原生解析文件数': int(conversions['native']),
+            '转换文件数': int(conversions['files']),
+            'LibreOffice 调用次数': int(conversions['batches']),
+            '累计转换耗时': f"{conversions['seconds']:.1f} 秒",
+        }
+    pdf_stats = get_pdf_stats()
+    if pdf_stats['pages']:
+        sections['PDF 提取'] = {
+            '解析页数': int(pdf_stats['pages']),
+            'OCR 页数（无文本层）': int(pdf_stats['ocr_pages']),
+            '超时页数': int(pdf_stats['timeouts']),
+            f'慢页数（≥{PDF_SLOW_PAGE_SECONDS:g} 秒）': int(pdf_stats['slow_pages']),
+            '累计解析耗时': f"{pdf_stats['seconds']:.1f} 秒",
+        }
+    resilience = get_llm_resilience_stats()
+    if any(resilience.values()):
+        sections['LLM 容错'] = {
+            '重试次数': int(resilience['retries']),
+            '其中限流': int(resilience['rate_limited']),
+            '熔断次数': int(resilience['circuit_opened']),
+            '熔断等待时间': f"{resilience['circuit_wait_seconds']:.0f} 秒",
+            '修复的 JSON': int(resilience['json_repaired']),
+            '要求重新输出': int(resilience['reasked']),
+            '备用模型评分数': int(resilience['fallback_used']),
+            '未评分学生数': int(resilience['ungraded']),
+        }
+    usage = get_llm_usage_stats()
+    if usage['calls']:
+        section = {
+            'API 调用次数': int(usage['calls']),
+            '输入 tokens': int(usage['prompt_tokens']),
+            '其中命中前缀缓存': int(usage['cached_tokens']),
+            '前缀缓存命中率': f"{usage['cache_hit_ratio']:.1%}",
+            '输出 tokens': int(usage['completion_tokens']),
+            '总 tokens': int(usage['total_tokens']),
+        }
+        if usage['missing_usage']:
+            section['未返回用量的调用'] = int(usage['missing_usage'])
+        if usage['cost'] is not None:
+            section['估算费用'] = f"{LLM_PRICE_CURRENCY}{usage['cost']:.4f}"
+        sections['LLM 用量'] = section
+    consensus = get_consensus_stats()
+    if consensus['students']:
+        sections['多次采样评分'] = {
+            '评分学生数': int(consensus['students']),
+            '总采样次数': int(consensus['samples']),
+            '平均每人采样次数': f"{consensus['samples_per_student']:.2f}",
+            '首轮即一致': int(consensus['early_stopped']),
+            '无一致结果（需复核）': int(consensus['disagreed']),
+            '无法解析的样本': int(consensus['invalid_samples']),
+            '平均分差': f"{consensus['mean_spread']:.2f}",
+            f'分差超过 {LLM_CONSENSUS_TOLERANCE:g} 分的学生': int(consensus['spread_over_tolerance']),
+        }
+    similarity = get_similarity_stats()
+    if similarity['documents']:
+        sections['相似提交检测'] = {
+            '参与比较的提交': int(similarity['documents']),
+            'LSH 候选对': int(similarity['candidate_pairs']),
+            '相似提交对': int(similarity['similar_pairs']),
+            '其中忽略空白后相同': int(similarity['identical_pairs']),
+            '相似组': int(similarity['clusters']),
+            '相似组内的提交': int(similarity['clustered']),
+            '共用评分的提交': int(similarity['shared_grades']),
+            '累计耗时': f"{similarity['seconds']:.2f} 秒",
+        }
+    batch = get_batch_stats()
+    if batch['batches']:
+        sections['批量评分'] = {
+            '批处理任务数': int(batch['batches']),
+            '提交请求数': int(batch['requests']),
+            '重新提交请求数': int(batch['resubmitted']),
+            '请求错误数': int(batch['request_errors']),
+            '评分失败学生数': int(batch['failed']),
+            '累计等待时间': f"{batch['wait_seconds']:.0f} 秒",
+        }
+    return sections
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """
+    解析命令行参数
+
+    Args:
+        argv: 参数列表，为 None 时读取 sys.argv
+
+    Returns:
+        解析后的参数
+    """
+    defaults = PipelineConfig()
+    parser = argparse.ArgumentParser(description="学生实验报告自动评分")
+    parser.add_argument('--collected-dir', default=None,
+                        help="学生作业收集目录（默认使用配置文件中的路径）")
+    parser.add_argument('--rubric-file', default=None,
+                        help="评分标准文件路径（默认使用配置文件中的路径）")
+    parser.add_argument('--serial', action='store_true',
+                        help="逐个学生串行处理，不使用并发流水线")
+    parser.add_argument('--archive-workers', type=int, default=defaults.archive_workers,
+                        help="解压阶段线程数")
+    parser.add_argument('--extract-workers', type=int, default=defaults.extract_workers,
+                        help="文本/OCR 提取阶段进程数")
+    parser.add_argument('--llm-workers', type=int, default=defaults.llm_workers,
+                        help="LLM 评分阶段并发请求数上限")
+    parser.add_argument('--queue-size', type=int, default=defaults.queue_size,
+                        help="阶段间队列容量")
+    parser.add_argument('--batch', action='store_true', default=None,
+                        help="先提取全部学生的文本，再通过 Batch API 整批评分（吞吐量高、价格低，需等待批处理完成）")
+    parser.add_argument('--consensus', action='store_true', default=None,
+                        help="每位学生多次采样评分，分数一致时提前停止，取一致结果的中位数（费用更高，评分更稳定）")
+    parser.add_argument('--trace', action='store_true', default=None,
+                        help="记录各阶段耗时、CPU 时间、处理字节数和内存峰值，结束时输出 trace 文件和阶段汇总表")
+    parser.add_argument('--resume', action='store_true',
+                        help="从评分日志继续上次中断的评分，跳过已完成的学生，未评分的学生重新评分")
+    parser.add_argument('--report-formats', default=None,
+                        help=f"报告格式，逗号分隔，可选 {','.join(SUPPORTED_FORMATS)}"
+                             f"（默认 {','.join(REPORT_FORMATS)}；parquet 需要安装 pyarrow）")
+    parser.add_argument('--llm-cache', choices=CACHE_MODES, default=None,
+                        help="LLM 缓存模式: use 读写缓存, refresh 强制重新评分并覆盖缓存, "
+                             "bypass 不使用缓存")
+    return parser.parse_args(argv)
+
 
 if __name__ == '__main__':
-    # 使用配置文件中的路径
-    main()
+    args = parse_args()
+    if args.llm_cache:
+        set_llm_cache_mode(args.llm_cache)
+    main(
+        current_dir=args.collected_dir,
+        rubric_path=args.rubric_file,
+        use_pipeline=False if args.serial else None,
+        pipeline_config=PipelineConfig(
+            archive_workers=args.archive_workers,
+            extract_workers=args.extract_workers,
+            llm_workers=args.llm_workers,
+            queue_size=args.queue_size,
+        ),
+        resume=args.resume,
+        report_formats=parse_report_formats(args.report_formats),
+        use_batch=args.batch,
+        consensus=args.consensus,
+        trace=args.trace,
+    )
@@ -0,0 +1,435 @@
+"""
+相似提交检测模块
+对提取出的文本做字符 shingle，用 NumPy 计算 MinHash 签名，再通过 LSH 分桶在近线性时间内找出相似的提交对；
+内容完全相同（只忽略文件标题行）的提交只评分一次，其余提交共用该评分
+"""
+import csv
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from config import (
+    SIMILARITY_SHINGLE_SIZE, SIMILARITY_NUM_PERM, SIMILARITY_LSH_BANDS, SIMILARITY_THRESHOLD,
+    SIMILARITY_MIN_CHARS, SIMILARITY_REPORT_FILENAME, VERBOSE_LOGGING
+)
+from models import Grade, SimilarPair
+import metrics
+
+# 将可选依赖的导入移至函数内部
+NUMPY_AVAILABLE = None
+
+# 拼接文本时插入的文件标题行（文件名不同不影响比较）
+_FILE_HEADER_PATTERN = re.compile(r"^--- 文件: .* ---$", re.MULTILINE)
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# shingle 滚动哈希的乘数
+_SHINGLE_PRIME = 1000003
+
+# 每次参与 MinHash 计算的 shingle 数（限制中间矩阵的内存占用）
+_MINHASH_CHUNK = 4096
+
+# 固定随机种子，同一配置下签名可复现
+_MINHASH_SEED = 1
+
+
+def _check_numpy() -> bool:
+    global NUMPY_AVAILABLE
+    if NUMPY_AVAILABLE is None:
+        try:
+            import numpy  # noqa: F401
+            NUMPY_AVAILABLE = True
+        except ImportError:
+            NUMPY_AVAILABLE = False
+    return NUMPY_AVAILABLE
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化提交文本: 去掉文件标题行和所有空白，英文转小写
+
+    Args:
+        text: 提取出的提交文本
+
+    Returns:
+        规范化后的文本
+    """
+    text = _FILE_HEADER_PATTERN.sub("", text)
+    return _WHITESPACE_PATTERN.sub("", text).lower()
+
+
+def exact_fingerprint(text: str) -> Optional[str]:
+    """
+    计算提交文本的摘要，用于识别可以共用评分的、内容完全相同的提交
+
+    只去掉文件标题行（文件名不同不影响判断），空白、标点或大小写的任何差异都会得到不同的摘要。
+
+    Args:
+        text: 提取出的提交文本
+
+    Returns:
+        摘要，文本过短（空提交、提取失败等）时返回 None
+    """
+    content = _FILE_HEADER_PATTERN.sub("", text)
+    if len(normalize_text(content)) < SIMILARITY_MIN_CHARS:
+        return None
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def shingle_hashes(normalized: str, size: int = SIMILARITY_SHINGLE_SIZE):
+    """
+    计算文本所有字符 shingle 的 32 位哈希（去重）
+
+    Args:
+        normalized: 规范化后的文本
+        size: shingle 长度
+
+    Returns:
+        uint64 数组（取值在 32 位范围内）
+    """
+    import numpy as np
+
+    codes = np.frombuffer(normalized.encode('utf-32-le'), dtype='<u4').astype(np.uint64)
+    count = len(codes) - size + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    # 多项式滚动哈希，数组运算按 2^64 自然回绕
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * np.uint64(_SHINGLE_PRIME) + codes[offset:offset + count]
+    hashes ^= hashes >> np.uint64(32)
+    return np.unique(hashes & np.uint64(0xFFFFFFFF))
+
+
+class MinHasher:
+    """
+    MinHash 签名计算
+
+    使用 multiply-shift 哈希族 h(x) = ((a * x + b) mod 2^64) >> 32 模拟随机排列，
+    签名的每一位是该哈希下所有 shingle 的最小值。
+    """
+
+    def __init__(self, num_perm: int = SIMILARITY_NUM_PERM, seed: int = _MINHASH_SEED):
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        # a 取奇数
+        self._a = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, shingles):
+        """
+        计算一组 shingle 哈希的 MinHash 签名
+
+        Args:
+            shingles: shingle_hashes 返回的数组
+
+        Returns:
+            长度为 num_perm 的 uint64 数组
+        """
+        import numpy as np
+
+        signature = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(shingles), _MINHASH_CHUNK):
+            chunk = shingles[start:start + _MINHASH_CHUNK, None]
+            values = (chunk * self._a + self._b) >> np.uint64(32)
+            np.minimum(signature, values.min(axis=0), out=signature)
+        return signature
+
+
+class SimilarityIndex:
+    """
+    相似提交索引
+
+    add 在各提交文本提取完成后逐个加入（线程安全），签名按 LSH 分段写入哈希桶；
+    find_similar_pairs 只比较至少有一段签名完全相同的提交对，而不是所有提交两两比较。
+    """
+
+    def __init__(self, num_perm: int = SIMILARITY_NUM_PERM, bands: int = SIMILARITY_LSH_BANDS):
+        if bands <= 0 or num_perm % bands:
+            raise ValueError(f"SIMILARITY_NUM_PERM ({num_perm}) 必须能被 "
+                             f"SIMILARITY_LSH_BANDS ({bands}) 整除")
+        self._hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._keys: List[str] = []
+        self._signatures: list = []
+        self._fingerprints: List[str] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, text: str) -> bool:
+        """
+        加入一份提交
+
+        Args:
+            key: 提交标识（学生文件夹名）
+            text: 提取出的提交文本
+
+        Returns:
+            是否加入（文本过短时不参与比较）
+        """
+        normalized = normalize_text(text)
+        if len(normalized) < max(SIMILARITY_MIN_CHARS, SIMILARITY_SHINGLE_SIZE):
+            return False
+
+        started = time.perf_counter()
+        signature = self._hasher.signature(shingle_hashes(normalized))
+        fingerprint = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        band_keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                     for band in range(self.bands)]
+
+        with self._lock:
+            index = len(self._keys)
+            self._keys.append(key)
+            self._signatures.append(signature)
+            self._fingerprints.append(fingerprint)
+            for buckets, band_key in zip(self._buckets, band_keys):
+                buckets.setdefault(band_key, []).append(index)
+
+        metrics.add('similarity', 'documents', 1)
+        metrics.add('similarity', 'seconds', time.perf_counter() - started)
+        return True
+
+    def _candidate_pairs(self) -> Set[Tuple[int, int]]:
+        candidates: Set[Tuple[int, int]] = set()
+        for buckets in self._buckets:
+            for members in buckets.values():
+                for i, first in enumerate(members):
+                    for second in members[i + 1:]:
+                        candidates.add((first, second))
+        return candidates
+
+    def find_similar_pairs(self, threshold: float = SIMILARITY_THRESHOLD) -> List[SimilarPair]:
+        """
+        找出估计相似度不低于阈值的提交对
+
+        Args:
+            threshold: 最低估计相似度（Jaccard）
+
+        Returns:
+            相似的提交对，按相似度从高到低排列
+        """
+        import numpy as np
+
+        started = time.perf_counter()
+        with self._lock:
+            candidates = sorted(self._candidate_pairs())
+            if not candidates:
+                return []
+            signatures = np.stack(self._signatures)
+            keys = list(self._keys)
+            fingerprints = list(self._fingerprints)
+
+        first = np.fromiter((pair[0] for pair in candidates), dtype=np.intp, count=len(candidates))
+        second = np.fromiter((pair[1] for pair in candidates), dtype=np.intp, count=len(candidates))
+        estimates = (signatures[first] == signatures[second]).mean(axis=1)
+
+        pairs = [
+            SimilarPair(*sorted((keys[a], keys[b])), similarity=float(similarity),
+                        identical=fingerprints[a] == fingerprints[b])
+            for a, b, similarity in zip(first, second, estimates)
+            if similarity >= threshold
+        ]
+        pairs.sort(key=lambda pair: (-pair.similarity, pair.first, pair.second))
+
+        metrics.add('similarity', 'candidate_pairs', len(candidates))
+        metrics.add('similarity', 'seconds', time.perf_counter() - started)
+        return pairs
+
+
+def find_clusters(pairs: List[SimilarPair]) -> List[List[str]]:
+    """
+    将相似的提交对合并为相似组（并查集求连通分量）
+
+    Args:
+        pairs: 相似的提交对
+
+    Returns:
+        各组的提交标识（组内按名称排序），按组大小从大到小排列
+    """
+    parent: Dict[str, str] = {}
+
+    def find(key: str) -> str:
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for pair in pairs:
+        root_first, root_second = find(pair.first), find(pair.second)
+        if root_first != root_second:
+            parent[root_second] = root_first
+
+    groups: Dict[str, List[str]] = {}
+    for key in parent:
+        groups.setdefault(find(key), []).append(key)
+    return sorted((sorted(members) for members in groups.values()),
+                  key=lambda members: (-len(members), members[0]))
+
+
+def write_similarity_report(pairs: List[SimilarPair], clusters: List[List[str]],
+                            output_dir: str) -> str:
+    """
+    将相似的提交对写入 CSV 报告（按相似组分组，组内按相似度排列）
+
+    Args:
+        pairs: 相似的提交对
+        clusters: find_clusters 返回的相似组
+        output_dir: 输出目录
+
+    Returns:
+        报告文件路径
+    """
+    group_of = {key: number for number, members in enumerate(clusters, 1) for key in members}
+    rows = sorted(pairs, key=lambda pair: (group_of[pair.first], -pair.similarity))
+    path = os.path.join(output_dir, SIMILARITY_REPORT_FILENAME)
+    # utf-8-sig 使 Excel 能正确识别中文
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['相似组', '组内提交数', '提交 A', '提交 B', '估计相似度', '忽略空白后相同'])
+        for pair in rows:
+            number = group_of[pair.first]
+            writer.writerow([number, len(clusters[number - 1]), pair.first, pair.second,
+                             f"{pair.similarity:.2f}", '是' if pair.identical else ''])
+    return path
+
+
+def report_similar_submissions(index: Optional[SimilarityIndex], output_dir: str) -> Optional[str]:
+    """
+    检测相似提交，写出报告并打印相似组
+
+    Args:
+        index: 本次运行的相似提交索引，为 None 时不检测
+        output_dir: 输出目录
+
+    Returns:
+        相似提交报告路径，未检测时返回 None
+    """
+    if index is None or len(index) < 2:
+        return None
+    pairs = index.find_similar_pairs()
+    clusters = find_clusters(pairs)
+    metrics.add('similarity', 'similar_pairs', len(pairs))
+    metrics.add('similarity', 'identical_pairs', sum(1 for pair in pairs if pair.identical))
+    metrics.add('similarity', 'clusters', len(clusters))
+    metrics.add('similarity', 'clustered', sum(len(members) for members in clusters))
+    path = write_similarity_report(pairs, clusters, output_dir)
+
+    if VERBOSE_LOGGING:
+        if clusters:
+            print(f"\n发现 {len(clusters)} 组相似提交（估计相似度 ≥ {SIMILARITY_THRESHOLD:.0%}），"
+                  f"详见 {path}")
+            for number, members in enumerate(clusters, 1):
+                print(f"  {number}. {', '.join(members)}")
+        else:
+            print(f"\n未发现相似提交（共比较 {len(index)} 份）")
+    return path
+
+
+def create_similarity_index() -> Optional[SimilarityIndex]:
+    """
+    创建相似提交索引
+
+    Returns:
+        索引实例，NumPy 未安装时返回 None（跳过相似提交检测）
+    """
+    if not _check_numpy():
+        if VERBOSE_LOGGING:
+            print("警告: 未安装 numpy，跳过相似提交检测")
+        return None
+    return SimilarityIndex()
+
+
+def shared_grade(grade: Grade, leader: str) -> Grade:
+    """
+    构造共用评分: 分数与首个提交相同，评语末尾注明来源
+
+    Args:
+        grade: 首个提交的评分
+        leader: 首个提交的标识（学生文件夹名）
+
+    Returns:
+        评分
+    """
+    metrics.add('similarity', 'shared_grades', 1)
+    return Grade(score=grade.score,
+                 comment=f"{grade.comment}\n【与 {leader} 的提交内容完全相同，共用其评分】",
+                 samples=grade.samples)
+
+
+class DuplicateGrades:
+    """
+    内容完全相同的提交只评分一次（按 exact_fingerprint 判断）
+
+    第一份提交正常评分，其余提交等待该评分完成后共用结果（线程安全，流水线的多个评分线程共用）。
+    """
+
+    def __init__(self):
+        self._graded: Dict[str, Tuple[str, "Future[Grade]"]] = {}
+        self._lock = threading.Lock()
+
+    def grade(self, key: str, content: str, grade_fn: Callable[[str], Grade]) -> Grade:
+        """
+        为一份提交评分，内容与已评分（或正在评分）的提交相同时共用其结果
+
+        Args:
+            key: 提交标识（学生文件夹名）
+            content: 提取出的提交文本
+            grade_fn: 评分函数
+
+        Returns:
+            评分
+        """
+        fingerprint = exact_fingerprint(content)
+        if fingerprint is None:
+            return grade_fn(content)
+
+        with self._lock:
+            entry = self._graded.get(fingerprint)
+            if entry is None:
+                future: "Future[Grade]" = Future()
+                self._graded[fingerprint] = (key, future)
+
+        if entry is not None:
+            leader, leader_future = entry
+            if VERBOSE_LOGGING:
+                print(f"  - {key} 与 {leader} 的提交内容完全相同，共用评分")
+            return shared_grade(leader_future.result(), leader)
+
+        try:
+            grade = grade_fn(content)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(grade)
+        return grade
+
+
+def get_similarity_stats() -> Dict[str, float]:
+    """
+    返回相似提交检测统计
+
+    Returns:
+        参与比较的提交数、LSH 候选对数、相似提交对数（其中忽略空白后相同的对数）、相似组数、
+        相似组内的提交数、共用评分的提交数和累计耗时
+    """
+    stats = metrics.snapshot('similarity')
+    return {
+        'documents': stats.get('documents', 0),
+        'candidate_pairs': stats.get('candidate_pairs', 0),
+        'similar_pairs': stats.get('similar_pairs', 0),
+        'identical_pairs': stats.get('identical_pairs', 0),
+        'clusters': stats.get('clusters', 0),
+        'clustered': stats.get('clustered', 0),
+        'shared_grades': stats.get('shared_grades', 0),
+        'seconds': stats.get('seconds', 0.0),
+    }
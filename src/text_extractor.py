@@ -2,16 +2,173 @@
 文本提取模块
 负责从各种文件格式中提取文本内容
 """
-from ocr import extract_text_from_image, is_ocr_available
-from config import SUPPORTED_EXTENSIONS, VERBOSE_LOGGING
+from ocr import (
+    OcrBudget, current_ocr_budget, extract_ocr_results, format_ocr_block, is_ocr_available,
+    ocr_budget, trim_low_confidence_blocks
+)
+from config import (
+    SUPPORTED_EXTENSIONS, MAX_CHARS_PER_FILE, MAX_CHARS_PER_SUBMISSION,
+    OCR_BATCH_SIZE, PLAIN_TEXT_CHUNK_SIZE, VERBOSE_LOGGING
+)
+from extraction_cache import get_extraction_cache
+from file_index import get_file_index
+from archive_fs import open_seekable, open_text, read_bytes
+from doc_converter import DocConversionError, get_doc_converter
+from doc_extractor import DocFormatError, is_native_doc, read_doc
+from docx_extractor import TEXT, DocxPackage
+from pdf_extractor import PdfEncryptedError, iter_pdf_pages
+from tracing import traced
+import metrics
 import os
 import io
-import subprocess
-from typing import List
+from concurrent.futures import Future
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 # 将可选依赖的导入移至函数内部，避免 Pylance 警告
 PYPDF2_AVAILABLE = None
-DOCX_AVAILABLE = None
+
+# 文件夹中没有任何可提取文件时返回的占位文本
+EMPTY_FOLDER_TEXT = "[内容为空或文件格式不支持]"
+
+# 文本超出字符预算被截断时追加的标记
+TRUNCATED_MARKER = "\n[内容过长，已截断]"
+
+# 解析开销较大、需要缓存提取结果的文件类型
+CACHED_EXTENSIONS = ('.docx', '.pdf', '.doc')
+
+# 本次运行内 DOC 文件能否原生解析的判断结果: {文件路径: 是否需要 LibreOffice 转换}
+_doc_needs_conversion: Dict[str, bool] = {}
+
+
+def find_supported_files(folder_path: str) -> List[str]:
+    """
+    递归查找文件夹中所有支持提取文本的文件（使用文件索引，不重复遍历文件系统）
+
+    Args:
+        folder_path: 文件夹路径
+
+    Returns:
+        支持的文件路径列表（按扩展名配置顺序排列）
+    """
+    return [entry.path for entry in get_file_index(folder_path).match(SUPPORTED_EXTENSIONS)]
+
+
+class CharBudget:
+    """
+    字符预算
+
+    按顺序消耗文本块，超出预算的部分被截掉，此后 exhausted 为 True。
+    """
+
+    def __init__(self, limit: Optional[int]):
+        self.remaining = limit
+        self.exhausted = False
+
+    def take(self, chunk: str) -> str:
+        """
+        从文本块中取出预算允许的部分
+
+        Args:
+            chunk: 文本块
+
+        Returns:
+            未超出预算的部分
+        """
+        if self.remaining is None:
+            return chunk
+        if len(chunk) <= self.remaining:
+            self.remaining -= len(chunk)
+            return chunk
+        piece = chunk[:self.remaining]
+        self.remaining = 0
+        self.exhausted = True
+        return piece
+
+
+def _omitted_files_text(count: int) -> str:
+    return f"[提交内容超出长度上限，该文件及其后共 {count} 个文件已省略]"
+
+
+def join_extracted_texts(extracted: Iterable[Tuple[str, str]],
+                         max_total_chars: Optional[int] = MAX_CHARS_PER_SUBMISSION) -> str:
+    """
+    将各文件的提取结果拼接为完整的提交文本
+
+    各文件文本应已按单文件预算截断（见 extract_text_from_file），
+    这里再按整份提交的预算截断，结果与 iter_text_from_folder 逐块生成的文本一致。
+
+    Args:
+        extracted: (文件路径, 提取文本) 序列
+        max_total_chars: 整份提交的字符上限，None 表示不限制
+
+    Returns:
+        拼接后的文本内容
+    """
+    extracted = list(extracted)
+    budget = CharBudget(max_total_chars)
+    parts = []
+    for index, (file_path, content) in enumerate(extracted):
+        if budget.remaining == 0:
+            content = _omitted_files_text(len(extracted) - index)
+            parts.append(_file_header(file_path) + content)
+            break
+
+        truncated = content.endswith(TRUNCATED_MARKER)
+        if truncated:
+            content = content[:-len(TRUNCATED_MARKER)]
+        content = budget.take(content)
+        if budget.exhausted or truncated:
+            content += TRUNCATED_MARKER
+        if content:
+            parts.append(_file_header(file_path) + content)
+
+    if not parts:
+        return "[内容为空或所有文件均无法提取]"
+
+    return "".join(parts)
+
+
+def _file_header(file_path: str) -> str:
+    return f"\n\n--- 文件: {os.path.basename(file_path)} ---\n\n"
+
+
+def iter_text_from_folder(folder_path: str,
+                          max_file_chars: Optional[int] = MAX_CHARS_PER_FILE,
+                          max_total_chars: Optional[int] = MAX_CHARS_PER_SUBMISSION
+                          ) -> Iterator[Tuple[str, str]]:
+    """
+    逐块提取文件夹中所有支持文件的文本
+
+    单个文件或整份提交超出字符预算后立即停止解析，已超出预算的文件追加截断标记，
+    其后的文件不再解析，只输出一条省略说明。整份提交共用一份 OCR 预算。
+
+    Args:
+        folder_path: 文件夹路径
+        max_file_chars: 单个文件的字符上限，None 表示不限制
+        max_total_chars: 整份提交的字符上限，None 表示不限制
+
+    Yields:
+        (文件路径, 文本块)
+    """
+    files = find_supported_files(folder_path)
+    prefetch_doc_conversions(files)
+    budget = CharBudget(max_total_chars)
+
+    with ocr_budget(OcrBudget()):
+        for index, file_path in enumerate(files):
+            if budget.remaining == 0:
+                yield file_path, _omitted_files_text(len(files) - index)
+                return
+
+            limit = max_file_chars
+            if budget.remaining is not None:
+                limit = budget.remaining if limit is None else min(limit, budget.remaining)
+
+            for chunk in iter_text_from_file(file_path, limit):
+                if chunk == TRUNCATED_MARKER:
+                    yield file_path, chunk
+                else:
+                    yield file_path, budget.take(chunk)
 
 
 def extract_text_from_folder(folder_path: str) -> str:
@@ -24,73 +181,174 @@ def extract_text_from_folder(folder_path: str) -> str:
     Returns:
         提取的文本内容
     """
-    import glob
-
     if VERBOSE_LOGGING:
         print(f"  - 开始从 {os.path.basename(folder_path)} 提取文本...")
 
-    full_text = ""
-    supported_extensions = SUPPORTED_EXTENSIONS
+    parts = []
+    current_file = None
+    for file_path, chunk in iter_text_from_folder(folder_path):
+        if not chunk:
+            continue
+        if file_path != current_file:
+            parts.append(_file_header(file_path))
+            current_file = file_path
+        parts.append(chunk)
+
+    if current_file is None:
+        # 区分没有可提取的文件和文件均无内容两种情况
+        if not find_supported_files(folder_path):
+            if VERBOSE_LOGGING:
+                print("    - 未找到支持的文本文件。")
+            return EMPTY_FOLDER_TEXT
+        return "[内容为空或所有文件均无法提取]"
 
-    # 查找所有支持的文件
-    files_to_process = []
-    for ext in supported_extensions:
-        pattern = os.path.join(folder_path, '**', ext)
-        files_to_process.extend(glob.glob(pattern, recursive=True))
+    return "".join(parts)
 
-    if not files_to_process:
-        if VERBOSE_LOGGING:
-            print("    - 未找到支持的文本文件。")
-        return "[内容为空或文件格式不支持]"
 
-    # 处理每个文件
-    for file_path in files_to_process:
-        content = extract_text_from_file(file_path)
-        if content:
-            file_name = os.path.basename(file_path)
-            full_text += f"\n\n--- 文件: {file_name} ---\n\n{content}"
+def is_failed_extraction(text: str) -> bool:
+    """
+    判断提取结果是否为失败占位文本（失败结果不写入缓存，下次运行重试）
 
-    if not full_text:
-        return "[内容为空或所有文件均无法提取]"
+    Args:
+        text: 提取结果
 
-    return full_text
+    Returns:
+        是否为失败占位文本
+    """
+    return (text.startswith('[') and text.endswith(']') and
+            ('失败' in text or '不可用' in text))
 
 
-def extract_text_from_file(file_path: str) -> str:
+def iter_text_from_file(file_path: str,
+                        max_chars: Optional[int] = MAX_CHARS_PER_FILE) -> Iterator[str]:
+    """
+    逐块提取单个文件的文本内容
+
+    DOCX/PDF/DOC 文件的完整提取结果会按内容哈希缓存，内容未变化的文件直接读取缓存；
+    因超出字符预算而提前停止、或因 OCR 预算用完而跳过了图片的提取结果不写入缓存。
+    缓存中保留全部 OCR 文本块，置信度过低的文本块在输出时才替换为简短说明（不占用字符预算）。
+
+    Args:
+        file_path: 文件路径
+        max_chars: 字符上限，超出后停止解析并输出截断标记，None 表示不限制
+
+    Yields:
+        文本块
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    cache = get_extraction_cache() if file_ext in CACHED_EXTENSIONS else None
+
+    cache_key = None
+    source = None
+    if cache:
+        try:
+            cache_key = cache.make_key(file_path)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                source = iter([cached])
+                cache_key = None
+        except Exception as e:
+            if VERBOSE_LOGGING:
+                print(f"    - 警告: 读取提取缓存失败: {e}")
+            cache_key = None
+
+    if source is None:
+        source = _iter_text_uncached(file_path)
+
+    budget = CharBudget(max_chars)
+    collected = [] if cache_key else None
+    ocr = current_ocr_budget()
+    ocr_skipped = ocr.skipped if ocr else 0
+    for chunk in source:
+        if collected is not None:
+            collected.append(chunk)
+        piece = budget.take(trim_low_confidence_blocks(chunk))
+        if piece:
+            yield piece
+        if budget.exhausted:
+            # 关闭生成器，停止解析剩余内容
+            close = getattr(source, 'close', None)
+            if close:
+                close()
+            yield TRUNCATED_MARKER
+            return
+
+    # 因 OCR 预算用完而跳过了图片的结果不完整，不写入缓存
+    if collected is not None and not (ocr and ocr.skipped > ocr_skipped):
+        content = "".join(collected)
+        if not is_failed_extraction(content):
+            try:
+                cache.put(cache_key, content)
+            except Exception as e:
+                if VERBOSE_LOGGING:
+                    print(f"    - 警告: 写入提取缓存失败: {e}")
+
+
+def extract_text_from_file(file_path: str,
+                           max_chars: Optional[int] = MAX_CHARS_PER_FILE) -> str:
     """
     从单个文件中提取文本内容
 
     Args:
         file_path: 文件路径
+        max_chars: 字符上限，超出部分被截断，None 表示不限制
 
     Returns:
         提取的文本内容
     """
+    return "".join(iter_text_from_file(file_path, max_chars))
+
+
+def _iter_text_uncached(file_path: str) -> Iterator[str]:
+    """
+    按文件类型调用对应的提取函数
+
+    Args:
+        file_path: 文件路径
+
+    Yields:
+        文本块
+    """
     file_name = os.path.basename(file_path)
     file_ext = os.path.splitext(file_name)[1].lower()
 
     try:
         if file_ext == '.docx':
-            return extract_text_from_docx(file_path)
+            yield from iter_text_from_docx(file_path)
         elif file_ext == '.pdf':
-            return extract_text_from_pdf(file_path)
+            yield from iter_text_from_pdf(file_path)
         elif file_ext == '.doc':
-            return extract_text_from_doc(file_path)
+            yield from iter_text_from_doc(file_path)
         elif file_ext in ['.txt', '.md', '.py', '.java']:
-            return extract_text_from_plain_text(file_path)
-        else:
-            return ""
+            yield from iter_text_from_plain_text(file_path)
 
     except Exception as e:
         error_message = f"提取失败: {e}"
         if VERBOSE_LOGGING:
             print(f"    - 警告: 无法从 {file_path} 提取文本: {e}")
-        return f"[{error_message}]"
+        yield f"[{error_message}]"
+
+
+def _join_lines(parts: Iterable[str]) -> Iterator[str]:
+    # 逐个输出非空的部分，部分之间以换行分隔（与 "\n".join 的结果一致）
+    separator = ""
+    for part in parts:
+        if part:
+            yield separator + part
+            separator = "\n"
+
+
+def _ocr_block_text(result, file_path: str) -> str:
+    if not result.text:
+        return ""
+    if VERBOSE_LOGGING:
+        print(f"      - 成功对 {os.path.basename(file_path)} 中的一张图片进行OCR。")
+    return f"\n{format_ocr_block(result)}\n"
 
 
 def extract_text_from_docx(file_path: str) -> str:
     """
-    从 DOCX 文件中提取文本内容（包含图片 OCR）
+    从 DOCX 文件中提取文本内容（包含表格、文本框、页眉和图片 OCR）
 
     Args:
         file_path: DOCX 文件路径
@@ -98,72 +356,79 @@ def extract_text_from_docx(file_path: str) -> str:
     Returns:
         提取的文本内容
     """
-    global DOCX_AVAILABLE
-    if DOCX_AVAILABLE is None:
-        try:
-            import docx
-            DOCX_AVAILABLE = True
-        except ImportError:
-            DOCX_AVAILABLE = False
+    return "".join(iter_text_from_docx(file_path))
+
 
-    if not DOCX_AVAILABLE:
-        return "[DOCX 处理功能不可用，请安装 python-docx]"
+@traced('extract', file_arg=True)
+def iter_text_from_docx(file_path: str) -> Iterator[str]:
+    """
+    按文档顺序逐段提取 DOCX 文件的文本内容（包含表格、文本框、页眉和图片 OCR）
 
-    import docx
+    段落和表格行解析出来即输出；遇到图片时才从压缩包中读取，图片凑满一个 OCR 批次
+    （或其后积压的文本超过 PLAIN_TEXT_CHUNK_SIZE、或到文件末尾）后统一识别。
+    调用方提前关闭生成器时，其后的内容不再解析，图片也不再读取和识别。
 
+    Args:
+        file_path: DOCX 文件路径
+
+    Yields:
+        文本块
+    """
+    started = False
     try:
-        doc = docx.Document(file_path)
-        content_parts = []
-
-        for para in doc.paragraphs:
-            # 添加段落文本
-            if para.text.strip():
-                content_parts.append(para.text)
-
-            # 检查并处理图片
-            if is_ocr_available():
-                for run in para.runs:
-                    if run.element.xpath('.//pic:pic'):
-                        # 提取图片并进行 OCR
-                        ocr_text = extract_ocr_from_docx_run(run)
-                        if ocr_text:
-                            ocr_block = f"\n--- [图片OCR内容开始] ---\n{ocr_text}\n--- [图片OCR内容结束] ---\n"
-                            content_parts.append(ocr_block)
-                            if VERBOSE_LOGGING:
-                                print(
-                                    f"      - 成功对 {os.path.basename(file_path)} 中的一张图片进行OCR。")
-
-        return "\n".join(content_parts)
+        with open_seekable(file_path) as f, DocxPackage(f) as package:
+            for chunk in _join_lines(_iter_docx_parts(package, file_path)):
+                started = True
+                yield chunk
 
     except Exception as e:
         if VERBOSE_LOGGING:
             print(f"    - DOCX 处理失败: {e}")
-        return f"[DOCX 文件处理失败: {e}]"
+        # 已输出部分内容时，错误说明另起一行
+        prefix = "\n" if started else ""
+        yield f"{prefix}[DOCX 文件处理失败: {e}]"
 
 
-def extract_ocr_from_docx_run(run) -> str:
+def _iter_docx_parts(package: DocxPackage, file_path: str) -> Iterator[str]:
     """
-    从 DOCX 的 run 对象中提取图片并进行 OCR
+    按文档顺序输出段落、表格行和图片的 OCR 文本块
 
-    Args:
-        run: DOCX run 对象
-
-    Returns:
-        OCR 提取的文本
+    图片之后的文本先暂存，待图片识别完成后按原顺序输出。
     """
-    try:
-        # 获取图片的 rId
-        for r in run.element.xpath(".//a:blip"):
-            rId = r.get(
-                '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-            if rId:
-                image_part = run.part.related_parts[rId]
-                image_data = image_part.blob
-                return extract_text_from_image(image_data)
-    except Exception as e:
-        if VERBOSE_LOGGING:
-            print(f"      - 图片 OCR 失败: {e}")
-    return ""
+    ocr_enabled = is_ocr_available()
+    # 等待 OCR 的窗口: [(块类型, 文本或图片部件名)]
+    window: List[Tuple[str, str]] = []
+    images = held = 0
+    for kind, value in package.iter_document():
+        if kind == TEXT:
+            if not images:
+                yield value
+                continue
+            held += len(value)
+        elif not ocr_enabled:
+            continue
+        else:
+            images += 1
+        window.append((kind, value))
+        if images >= OCR_BATCH_SIZE or held >= PLAIN_TEXT_CHUNK_SIZE:
+            yield from _ocr_docx_window(package, window, file_path)
+            window = []
+            images = held = 0
+    yield from _ocr_docx_window(package, window, file_path)
+
+
+def _ocr_docx_window(package: DocxPackage, window: List[Tuple[str, str]],
+                     file_path: str) -> List[str]:
+    """识别窗口中的图片（图片数据此时才从压缩包中读取），返回按原顺序排列的文本块"""
+    parts = [value if kind == TEXT else "" for kind, value in window]
+    images = [(index, package.read_part(value)) for index, (kind, value) in enumerate(window)
+              if kind != TEXT]
+    images = [(index, data) for index, data in images if data]
+    if images:
+        results = extract_ocr_results([data for _, data in images])
+        for (index, _), result in zip(images, results):
+            parts[index] = _ocr_block_text(result, file_path)
+    return parts
 
 
 def extract_text_from_pdf(file_path: str) -> str:
@@ -176,6 +441,22 @@ def extract_text_from_pdf(file_path: str) -> str:
     Returns:
         提取的文本内容
     """
+    return "".join(iter_text_from_pdf(file_path))
+
+
+@traced('extract', file_arg=True)
+def iter_text_from_pdf(file_path: str) -> Iterator[str]:
+    """
+    逐页提取 PDF 文件的文本内容
+
+    页数较多时按页并行解析；没有文本层的扫描页对页内图片进行 OCR。
+
+    Args:
+        file_path: PDF 文件路径
+
+    Yields:
+        每页的文本
+    """
     global PYPDF2_AVAILABLE
     if PYPDF2_AVAILABLE is None:
         try:
@@ -185,35 +466,25 @@ def extract_text_from_pdf(file_path: str) -> str:
             PYPDF2_AVAILABLE = False
 
     if not PYPDF2_AVAILABLE:
-        return "[PDF 处理功能不可用，请安装 PyPDF2]"
-
-    import PyPDF2
+        yield "[PDF 处理功能不可用，请安装 PyPDF2]"
+        return
 
     try:
-        with open(file_path, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-
-            # 检查是否加密
-            if reader.is_encrypted:
-                return "[文件已加密，无法提取内容]"
-
-            content = ""
-            for page in reader.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    content += extracted + "\n"
-
-            return content
+        for page in iter_pdf_pages(file_path):
+            if page.text:
+                yield page.text + "\n"
 
+    except PdfEncryptedError:
+        yield "[文件已加密，无法提取内容]"
     except Exception as e:
         if VERBOSE_LOGGING:
             print(f"    - PDF 处理失败: {e}")
-        return f"[PDF 文件处理失败: {e}]"
+        yield f"[PDF 文件处理失败: {e}]"
 
 
 def extract_text_from_doc(file_path: str) -> str:
     """
-    从 DOC 文件中提取文本内容（通过转换为 DOCX）
+    从 DOC 文件中提取文本内容（包含图片 OCR）
 
     Args:
         file_path: DOC 文件路径
@@ -221,45 +492,120 @@ def extract_text_from_doc(file_path: str) -> str:
     Returns:
         提取的文本内容
     """
+    return "".join(iter_text_from_doc(file_path))
+
+
+@traced('extract', file_arg=True)
+def iter_text_from_doc(file_path: str) -> Iterator[str]:
+    """
+    逐块提取 DOC 文件的文本内容（包含图片 OCR）
+
+    优先直接解析 Word 97-2003 二进制格式：先输出正文，再按 OCR 批次逐批识别图片，
+    调用方提前关闭生成器时其余图片不再识别。Word 95 及更早版本、加密或结构损坏的文件
+    改用 LibreOffice 转换服务转换为 DOCX 后提取。
+
+    Args:
+        file_path: DOC 文件路径
+
+    Yields:
+        文本块
+    """
     try:
-        # 尝试使用 libreoffice 转换为 DOCX
-        docx_path = os.path.splitext(file_path)[0] + '.docx'
+        text, images = read_doc(read_bytes(file_path))
+    except DocFormatError as e:
+        if VERBOSE_LOGGING:
+            print(f"    - 无法直接解析 {os.path.basename(file_path)}（{e}），改用 LibreOffice 转换。")
+        yield from _iter_text_from_doc_with_office(file_path)
+        return
+    except Exception as e:
+        if VERBOSE_LOGGING:
+            print(f"    - DOC 文件处理失败: {e}")
+        yield f"[DOC 文件处理失败: {e}]"
+        return
 
-        # 检查转换后的文件是否已存在
-        if not os.path.exists(docx_path):
-            if VERBOSE_LOGGING:
-                print(
-                    f"    - 正在尝试将 {os.path.basename(file_path)} 转换为 .docx...")
-
-            # 使用 subprocess 调用 libreoffice
-            result = subprocess.run(
-                ['libreoffice', '--headless', '--convert-to', 'docx',
-                 '--outdir', os.path.dirname(file_path), file_path],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=30
-            )
-
-        # 读取转换后的 DOCX 文件
-        if os.path.exists(docx_path):
-            if VERBOSE_LOGGING:
-                print(f"    - 已从转换后的 {os.path.basename(docx_path)} 中读取内容。")
-            content = extract_text_from_docx(docx_path)
-            # 可选：清理转换生成的文件
-            # os.remove(docx_path)
-            return content
-        else:
-            return "[DOC 文件转换失败]"
+    metrics.add('doc_convert', 'native', 1)
+    if not (images and is_ocr_available()):
+        images = []
+    yield from _join_lines(_iter_doc_parts(text, images, file_path))
+
+
+def _iter_doc_parts(text: str, images: List[bytes], file_path: str) -> Iterator[str]:
+    yield text
+    for start in range(0, len(images), OCR_BATCH_SIZE):
+        for result in extract_ocr_results(images[start:start + OCR_BATCH_SIZE]):
+            yield _ocr_block_text(result, file_path)
+
+
+def _iter_text_from_doc_with_office(file_path: str) -> Iterator[str]:
+    """通过 LibreOffice 转换服务将 DOC 转换为 DOCX 后提取文本"""
+    try:
+        docx_path = get_doc_converter().convert(file_path)
+        if VERBOSE_LOGGING:
+            print(f"    - 已从 {os.path.basename(file_path)} 转换后的 DOCX 中读取内容。")
 
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as e:
+    except DocConversionError as e:
         if VERBOSE_LOGGING:
             print(f"    - DOC 文件转换失败: {e}")
-        return "[DOC 文件处理失败，请确保已安装 LibreOffice]"
+        yield f"[DOC 文件处理失败: {e}]"
+        return
     except Exception as e:
         if VERBOSE_LOGGING:
             print(f"    - DOC 文件处理失败: {e}")
-        return f"[DOC 文件处理失败: {e}]"
+        yield f"[DOC 文件处理失败: {e}]"
+        return
+
+    yield from iter_text_from_docx(docx_path)
+
+
+def needs_doc_conversion(file_path: str) -> bool:
+    """
+    判断文件是否是需要 LibreOffice 转换的 DOC 文件（结果在本次运行内缓存）
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        是无法原生解析的 .doc 文件时返回 True
+    """
+    if os.path.splitext(file_path)[1].lower() != '.doc':
+        return False
+    needed = _doc_needs_conversion.get(file_path)
+    if needed is None:
+        try:
+            needed = not is_native_doc(read_bytes(file_path))
+        except Exception:
+            needed = True
+        _doc_needs_conversion[file_path] = needed
+    return needed
+
+
+def prefetch_doc_conversions(files: List[str]) -> List["Future[str]"]:
+    """
+    提前提交 DOC 文件的转换请求（不阻塞），使多个学生的 DOC 文件合并到同一批转换
+
+    提取结果已缓存的文件和能原生解析的文件无需转换，直接跳过。
+
+    Args:
+        files: 文件路径列表（非 .doc 文件会被忽略）
+
+    Returns:
+        已提交的转换请求
+    """
+    cache = get_extraction_cache()
+    futures = []
+    for file_path in files:
+        if os.path.splitext(file_path)[1].lower() != '.doc':
+            continue
+        try:
+            if cache and cache.contains(cache.make_key(file_path)):
+                continue
+            if not needs_doc_conversion(file_path):
+                continue
+            futures.append(get_doc_converter().submit(file_path))
+        except Exception as e:
+            if VERBOSE_LOGGING:
+                print(f"    - 警告: 提交 DOC 转换失败: {e}")
+    return futures
 
 
 def extract_text_from_plain_text(file_path: str) -> str:
@@ -272,10 +618,25 @@ def extract_text_from_plain_text(file_path: str) -> str:
     Returns:
         文件内容
     """
+    return "".join(iter_text_from_plain_text(file_path))
+
+
+@traced('extract', file_arg=True)
+def iter_text_from_plain_text(file_path: str) -> Iterator[str]:
+    """
+    分块读取纯文本文件
+
+    Args:
+        file_path: 文本文件路径
+
+    Yields:
+        文本块
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            return f.read()
+        with open_text(file_path, encoding='utf-8', errors='ignore') as f:
+            for chunk in iter(lambda: f.read(PLAIN_TEXT_CHUNK_SIZE), ''):
+                yield chunk
     except Exception as e:
         if VERBOSE_LOGGING:
             print(f"    - 文本文件读取失败: {e}")
-        return f"[文本文件读取失败: {e}]"
+        yield f"[文本文件读取失败: {e}]"
@@ -0,0 +1,134 @@
+"""
+token 计数模块
+优先使用 tiktoken 精确计数，未安装时按字符类别估算（中日韩字符每字约 1 个 token）
+"""
+from typing import Dict, List, Optional
+
+from config import TOKENIZER_ENCODING
+
+# 每条消息的格式开销（role 标记等）
+_MESSAGE_OVERHEAD = 4
+
+# tiktoken 编码器: None 表示尚未加载，False 表示不可用
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # 未安装或无法下载编码文件时退回估算
+            _encoding = False
+    return _encoding or None
+
+
+def _is_wide_char(ch: str) -> bool:
+    # 中日韩统一表意文字及扩展 A、假名、谚文、全角标点
+    return ('\u4e00' <= ch <= '\u9fff' or '\u3400' <= ch <= '\u4dbf'
+            or '\u3000' <= ch <= '\u30ff' or '\uac00' <= ch <= '\ud7af'
+            or '\uff00' <= ch <= '\uffef')
+
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    按字符类别估算 token 数
+
+    中日韩字符及全角标点每字按 1 个 token 计算，其余字符每 4 个按 1 个 token 计算。
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的 token 数
+    """
+    wide = sum(1 for ch in text if _is_wide_char(ch))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def count_tokens(text: str) -> int:
+    """
+    计算文本的 token 数
+
+    Args:
+        text: 文本
+
+    Returns:
+        token 数
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_text_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    计算消息列表的 token 数（用于 TPM 限流预扣和分块判断）
+
+    Args:
+        messages: chat.completions 接口使用的消息列表
+
+    Returns:
+        token 数
+    """
+    return sum(count_tokens(message["content"]) + _MESSAGE_OVERHEAD
+               for message in messages)
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    将文本按 token 上限切分为若干段，尽量在换行处断开
+
+    Args:
+        text: 文本
+        max_tokens: 每段的 token 上限
+
+    Returns:
+        文本段列表
+    """
+    pieces: List[str] = []
+    start = 0
+    while start < len(text):
+        end = _fit_end(text, start, max_tokens)
+        if end < len(text):
+            newline = text.rfind("\n", start, end)
+            if newline > start + (end - start) // 2:
+                end = newline + 1
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+def _fit_end(text: str, start: int, max_tokens: int) -> int:
+    """二分查找从 start 开始不超过 max_tokens 的最远位置（至少前进一个字符）"""
+    # 一个 token 很少超过 8 个字符，只在这个窗口内查找，避免每段都扫描剩余全文
+    window_end = min(len(text), start + max(1, max_tokens) * 8)
+    if count_tokens(text[start:window_end]) <= max_tokens:
+        return window_end
+    low, high = start + 1, window_end
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[start:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def fits_budget(text: str, budget: Optional[int]) -> bool:
+    """
+    判断文本是否在 token 预算以内
+
+    Args:
+        text: 文本
+        budget: token 预算，None 表示不限制
+
+    Returns:
+        是否未超出预算
+    """
+    return budget is None or count_tokens(text) <= budget
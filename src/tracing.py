@@ -0,0 +1,468 @@
+"""
+性能追踪模块
+记录解压、文本提取、OCR、DOC 转换和 LLM 评分各阶段的墙钟时间、CPU 时间、处理字节数和进程内存峰值，
+运行结束时输出 Chrome trace（可用 chrome://tracing 或 ui.perfetto.dev 打开）和阶段汇总表；
+未启用时每次调用只多一次布尔判断
+"""
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import TRACE_ENABLED, TRACE_TOP_N
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 通过环境变量把开关传给提取子进程（spawn/forkserver 启动的子进程不继承模块状态）
+_ENV_VAR = "AUTO_GRADER_TRACE"
+
+# 阶段: 汇总表中的名称（按流水线顺序排列）
+STAGES = {
+    'archive': '解压',
+    'extract': '文本提取',
+    'ocr': 'OCR',
+    'doc_convert': 'DOC 转换',
+    'llm': 'LLM 评分',
+}
+
+# 计入每位学生总耗时的阶段（OCR 和 DOC 转换已包含在文本提取中）
+_STUDENT_STAGES = ('archive', 'extract', 'llm')
+
+# ru_maxrss 在 macOS 上以字节为单位，在 Linux 上以 KB 为单位
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+_enabled = os.environ.get(_ENV_VAR, "1" if TRACE_ENABLED else "0") == "1"
+_lock = threading.Lock()
+_events: List[Dict[str, Any]] = []
+_thread_names: Dict[tuple, str] = {}
+_local = threading.local()
+_owner_pid = os.getpid()
+
+
+def set_tracing(enabled: bool) -> None:
+    """
+    设置本次运行是否记录追踪数据（需在创建提取进程池之前调用）
+
+    Args:
+        enabled: 是否启用
+    """
+    global _enabled
+    _enabled = enabled
+    os.environ[_ENV_VAR] = "1" if enabled else "0"
+
+
+def is_tracing_enabled() -> bool:
+    return _enabled
+
+
+def _reset_if_forked() -> None:
+    # fork 出的子进程会继承父进程已记录的事件和发起 fork 的线程所标记的学生，首次使用时清空
+    global _lock, _events, _thread_names, _local, _owner_pid
+    if _owner_pid != os.getpid():
+        _lock = threading.Lock()
+        _events = []
+        _thread_names = {}
+        _local = threading.local()
+        _owner_pid = os.getpid()
+
+
+@contextmanager
+def student(name: str) -> Iterator[None]:
+    """
+    标记当前线程正在处理的学生，期间记录的事件归属于该学生
+
+    Args:
+        name: 学生文件夹名
+    """
+    previous = getattr(_local, 'student', None)
+    _local.student = name
+    try:
+        yield
+    finally:
+        _local.student = previous
+
+
+def _rusage() -> tuple:
+    if resource is None:
+        return 0.0, None
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+    return children.ru_utime + children.ru_stime, peak
+
+
+def path_size(path: str) -> Optional[int]:
+    """返回文件大小，压缩包成员等无法直接读取大小的路径返回 None"""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def _stage_depth() -> Dict[str, int]:
+    # 当前线程中各阶段正在计时的区间层数
+    depth = getattr(_local, 'depth', None)
+    if depth is None:
+        depth = _local.depth = {}
+    return depth
+
+
+class Span:
+    """
+    一次计时区间
+
+    CPU 时间为当前线程的 CPU 时间；子进程 CPU 时间（tesseract、LibreOffice）取自整个进程
+    在区间内结束的子进程，并发时只是近似值。内存为区间结束时进程的常驻内存峰值。
+    pause() 与 resume() 之间的时间不计入区间的耗时和 CPU 时间。
+    """
+
+    __slots__ = ('stage', 'name', 'file', 'bytes', '_started', '_wall', '_cpu', '_children',
+                 '_rss', '_nested', '_wall_total', '_cpu_total', '_paused')
+
+    def __init__(self, stage: str, name: str, file: Optional[str] = None,
+                 size: Optional[int] = None):
+        self.stage = stage
+        self.name = name
+        self.file = file
+        self.bytes = size
+
+    def __enter__(self) -> "Span":
+        depth = _stage_depth()
+        # 同一阶段内嵌套的区间（如 DOC 转换后再提取 DOCX）不重复计入汇总
+        self._nested = depth.get(self.stage, 0) > 0
+        depth[self.stage] = depth.get(self.stage, 0) + 1
+        self._children, self._rss = _rusage()
+        self._started = time.time_ns()
+        self._wall_total = self._cpu_total = 0
+        self._paused = False
+        self._wall = time.perf_counter_ns()
+        self._cpu = time.thread_time_ns()
+        return self
+
+    def pause(self) -> None:
+        """暂停计时（如生成器把结果交给调用方期间）"""
+        self._wall_total += time.perf_counter_ns() - self._wall
+        self._cpu_total += time.thread_time_ns() - self._cpu
+        self._paused = True
+        depth = _stage_depth()
+        depth[self.stage] = max(0, depth.get(self.stage, 0) - 1)
+
+    def resume(self) -> None:
+        """继续计时"""
+        depth = _stage_depth()
+        depth[self.stage] = depth.get(self.stage, 0) + 1
+        self._paused = False
+        self._wall = time.perf_counter_ns()
+        self._cpu = time.thread_time_ns()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self._paused:
+            self.pause()
+        wall, cpu = self._wall_total, self._cpu_total
+        children, rss = _rusage()
+
+        args: Dict[str, Any] = {'cpu_ms': cpu / 1e6}
+        if children > self._children:
+            args['child_cpu_ms'] = (children - self._children) * 1e3
+        if self.bytes is not None:
+            args['bytes'] = self.bytes
+        if rss is not None:
+            args['peak_rss_mb'] = rss / 2 ** 20
+            if self._rss is not None and rss > self._rss:
+                args['rss_growth_mb'] = (rss - self._rss) / 2 ** 20
+        if self.file:
+            args['file'] = self.file
+        current = getattr(_local, 'student', None)
+        if current:
+            args['student'] = current
+        if self._nested:
+            args['nested'] = True
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+
+        thread = threading.current_thread()
+        event = {
+            'name': self.name, 'cat': self.stage, 'ph': 'X',
+            'ts': self._started / 1e3, 'dur': wall / 1e3,
+            'pid': os.getpid(), 'tid': thread.native_id, 'args': args,
+        }
+        _reset_if_forked()
+        with _lock:
+            _events.append(event)
+            _thread_names.setdefault((event['pid'], event['tid']), thread.name)
+
+
+def span(stage: str, name: str, file: Optional[str] = None, size: Optional[int] = None):
+    """
+    创建计时区间（with 语句使用），未启用追踪时返回空操作的上下文管理器
+
+    Args:
+        stage: 阶段，见 STAGES
+        name: 区间名称
+        file: 处理的文件路径
+        size: 处理的字节数
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(stage, name, file, size)
+
+
+class _NullSpan:
+    bytes = None
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def traced(stage: str, size: Optional[Callable[..., Optional[int]]] = None,
+           file_arg: bool = False) -> Callable:
+    """
+    装饰器: 为函数的每次调用记录计时区间（生成器函数只计生成各个结果的时间）
+
+    Args:
+        stage: 阶段，见 STAGES
+        size: 根据调用参数计算处理字节数的函数
+        file_arg: 第一个参数是否为文件路径（记录路径和文件大小）
+    """
+    def decorate(func: Callable) -> Callable:
+        name = func.__name__
+
+        def open_span(args, kwargs) -> Span:
+            file = args[0] if file_arg and args else None
+            nbytes = size(*args, **kwargs) if size else (path_size(file) if file else None)
+            return Span(stage, name, file, nbytes)
+
+        if inspect.isgeneratorfunction(func):
+            def iterate(args, kwargs):
+                # 只计生成器自身的耗时，调用方处理每个结果的时间不计入；
+                # 调用方提前关闭生成器（如超出字符预算）不算出错
+                current = open_span(args, kwargs)
+                current.__enter__()
+                generator = func(*args, **kwargs)
+                error = None
+                try:
+                    while True:
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        current.pause()
+                        try:
+                            yield item
+                        finally:
+                            current.resume()
+                except GeneratorExit:
+                    generator.close()
+                    raise
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    current.__exit__(type(error) if error else None, error, None)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return func(*args, **kwargs)
+                return iterate(args, kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return func(*args, **kwargs)
+                with open_span(args, kwargs):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def drain() -> List[Dict[str, Any]]:
+    """
+    取出并清空本进程记录的事件（供子进程上报给主进程）
+
+    Returns:
+        事件列表
+    """
+    global _events, _thread_names
+    _reset_if_forked()
+    if not _enabled:
+        return []
+    with _lock:
+        drained, _events = _events, []
+        names, _thread_names = _thread_names, {}
+    for event in drained:
+        event['args'].setdefault('thread', names.get((event['pid'], event['tid'])))
+    return drained
+
+
+def merge(events: List[Dict[str, Any]], student_name: Optional[str] = None) -> None:
+    """
+    合并子进程上报的事件
+
+    Args:
+        events: drain() 的返回值
+        student_name: 事件所属的学生（子进程中无法得知，由主进程补上）
+    """
+    if not events:
+        return
+    with _lock:
+        for event in events:
+            thread = event['args'].pop('thread', None)
+            if student_name:
+                event['args']['student'] = student_name
+            _events.append(event)
+            if thread:
+                _thread_names.setdefault((event['pid'], event['tid']), thread)
+
+
+def _snapshot() -> List[Dict[str, Any]]:
+    _reset_if_forked()
+    with _lock:
+        return list(_events)
+
+
+def write_trace(path: str) -> Optional[str]:
+    """
+    写出 Chrome trace 格式的追踪文件
+
+    Args:
+        path: 输出文件路径
+
+    Returns:
+        文件路径，没有记录任何事件时返回 None
+    """
+    events = _snapshot()
+    if not events:
+        return None
+    with _lock:
+        names = dict(_thread_names)
+    main_pid = os.getpid()
+    metadata = [
+        {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+         'args': {'name': '主进程' if pid == main_pid else f'提取进程 {pid}'}}
+        for pid in sorted({event['pid'] for event in events})
+    ] + [
+        {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+        for (pid, tid), name in names.items()
+    ]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f,
+                  ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def summarize() -> Dict[str, Dict[str, float]]:
+    """
+    按阶段汇总追踪数据（同一阶段内嵌套的区间不重复计入）
+
+    Returns:
+        {阶段: {'spans', 'wall', 'cpu', 'child_cpu', 'bytes', 'peak_rss'}}，时间以秒、内存以字节为单位
+    """
+    totals: Dict[str, Dict[str, float]] = {}
+    for event in _snapshot():
+        args = event['args']
+        if args.get('nested'):
+            continue
+        stage = totals.setdefault(event['cat'], {
+            'spans': 0, 'wall': 0.0, 'cpu': 0.0, 'child_cpu': 0.0, 'bytes': 0, 'peak_rss': 0})
+        stage['spans'] += 1
+        stage['wall'] += event['dur'] / 1e6
+        stage['cpu'] += args.get('cpu_ms', 0.0) / 1e3
+        stage['child_cpu'] += args.get('child_cpu_ms', 0.0) / 1e3
+        stage['bytes'] += args.get('bytes') or 0
+        stage['peak_rss'] = max(stage['peak_rss'], args.get('peak_rss_mb', 0.0) * 2 ** 20)
+    return totals
+
+
+def slowest_students(limit: int = TRACE_TOP_N) -> List[tuple]:
+    """
+    返回总耗时最长的学生
+
+    Returns:
+        [(学生, 总耗时, {阶段: 耗时})]，时间以秒为单位
+    """
+    students: Dict[str, Dict[str, float]] = {}
+    for event in _snapshot():
+        args = event['args']
+        if args.get('nested') or event['cat'] not in _STUDENT_STAGES or not args.get('student'):
+            continue
+        stages = students.setdefault(args['student'], {})
+        stages[event['cat']] = stages.get(event['cat'], 0.0) + event['dur'] / 1e6
+    ranked = sorted(((name, sum(stages.values()), stages) for name, stages in students.items()),
+                    key=lambda item: -item[1])
+    return ranked[:limit]
+
+
+def slowest_files(limit: int = TRACE_TOP_N) -> List[Dict[str, Any]]:
+    """
+    返回提取耗时最长的文件
+
+    Returns:
+        [{'file', 'student', 'seconds', 'cpu', 'bytes'}]
+    """
+    files = [
+        {'file': event['args']['file'], 'student': event['args'].get('student'),
+         'seconds': event['dur'] / 1e6, 'cpu': event['args'].get('cpu_ms', 0.0) / 1e3,
+         'bytes': event['args'].get('bytes')}
+        for event in _snapshot()
+        if event['cat'] == 'extract' and event['args'].get('file') and not event['args'].get('nested')
+    ]
+    files.sort(key=lambda item: -item['seconds'])
+    return files[:limit]
+
+
+def _megabytes(value: Optional[float]) -> str:
+    return f"{value / 2 ** 20:.1f}" if value else "-"
+
+
+def _format_size(value: int) -> str:
+    if value >= 2 ** 20:
+        return f"{value / 2 ** 20:.1f} MB"
+    return f"{value / 2 ** 10:.1f} KB"
+
+
+def print_trace_summary() -> None:
+    """打印阶段汇总表、最慢的学生和最慢的文件"""
+    totals = summarize()
+    if not totals:
+        return
+    print("\n阶段耗时汇总（文本提取包含其中的 OCR 和 DOC 转换；各阶段并发执行，耗时为累计值）:")
+    print(f"  {'阶段':<10}{'次数':>8}{'墙钟(秒)':>12}{'CPU(秒)':>12}{'子进程CPU(秒)':>16}"
+          f"{'处理量(MB)':>12}{'内存峰值(MB)':>14}")
+    for stage, label in STAGES.items():
+        if stage not in totals:
+            continue
+        row = totals[stage]
+        print(f"  {label:<10}{int(row['spans']):>8}{row['wall']:>12.2f}{row['cpu']:>12.2f}"
+              f"{row['child_cpu']:>16.2f}{_megabytes(row['bytes']):>12}"
+              f"{_megabytes(row['peak_rss']):>14}")
+
+    students = slowest_students()
+    if students:
+        print(f"\n耗时最长的 {len(students)} 位学生:")
+        for name, total, stages in students:
+            detail = ", ".join(f"{STAGES[stage]} {stages[stage]:.2f}"
+                               for stage in _STUDENT_STAGES if stage in stages)
+            print(f"  {name}: {total:.2f} 秒（{detail}）")
+
+    files = slowest_files()
+    if files:
+        print(f"\n提取耗时最长的 {len(files)} 个文件:")
+        for item in files:
+            size = f", {_format_size(item['bytes'])}" if item['bytes'] else ""
+            print(f"  {item['file']}: {item['seconds']:.2f} 秒（CPU {item['cpu']:.2f} 秒{size}）")
@@ -0,0 +1,8 @@
+"""
+pytest 配置：把 src 目录加入导入路径，测试环境不需要真实的 API 密钥
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('OPENAI_API_KEY', 'test_key_for_testing')
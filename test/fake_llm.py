@@ -0,0 +1,121 @@
+"""
+LLM 客户端测试共用的假 OpenAI 客户端和异常
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import llm_cache
+import llm_client
+import llm_resilience
+
+
+def api_error(status: int, headers=None, message: str = "error"):
+    """构造 OpenAI SDK 的 HTTP 状态码异常"""
+    import openai
+
+    classes = {400: openai.BadRequestError, 429: openai.RateLimitError,
+               500: openai.InternalServerError}
+    response = SimpleNamespace(status_code=status, headers=headers or {},
+                               request=SimpleNamespace(method="POST", url="https://llm.test"))
+    return classes.get(status, openai.APIStatusError)(message, response=response, body=None)
+
+
+def connection_error():
+    import openai
+
+    return openai.APIConnectionError(request=SimpleNamespace(method="POST", url="https://llm.test"))
+
+
+def response(*contents: str, total_tokens=None):
+    usage = None if total_tokens is None else SimpleNamespace(
+        prompt_tokens=total_tokens, completion_tokens=0, total_tokens=total_tokens)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content)) for content in contents],
+        usage=usage)
+
+
+class FakeCompletions:
+    """
+    按脚本依次返回结果的 chat.completions
+
+    脚本中的每一项是异常（抛出）、字符串（单个样本的消息内容）、字符串列表（n 个样本）
+    或 response() 构造的响应；也可以是接受请求参数、返回上述结果之一的函数。
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+
+    def next_outcome(self, params):
+        self.requests.append(params)
+        outcome = self.script.pop(0)
+        if callable(outcome):
+            outcome = outcome(params)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, list):
+            return response(*outcome)
+        if isinstance(outcome, SimpleNamespace):
+            return outcome
+        return response(outcome)
+
+    def create(self, **params):
+        return self.next_outcome(params)
+
+    @property
+    def models(self):
+        return [params['model'] for params in self.requests]
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    """异步版本，每次请求先让出事件循环，使并发请求交错执行"""
+
+    async def create(self, **params):
+        await asyncio.sleep(0)
+        return self.next_outcome(params)
+
+
+def make_client(script) -> llm_client.LLMClient:
+    client = llm_client.LLMClient()
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(script)))
+    return client
+
+
+def make_async_client(script, concurrency=None, limiter=None) -> llm_client.AsyncLLMClient:
+    # 不创建 HTTP 连接池，直接装配限流器、并发控制器和假的 SDK 客户端
+    async def close():
+        client.closed = True
+
+    client = object.__new__(llm_client.AsyncLLMClient)
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=AsyncFakeCompletions(script)),
+                                    close=close)
+    client.closed = False
+    client.limiter = limiter or llm_client.RateLimiter(None, None)
+    client.concurrency = concurrency or llm_client.AdaptiveConcurrency(
+        initial=4, minimum=1, maximum=8)
+    client.use_n = True
+    return client
+
+
+def completions(client):
+    return client.client.chat.completions
+
+
+def isolate(monkeypatch) -> list:
+    """
+    隔离 LLM 测试：不读写缓存、每个测试使用新的熔断器、不做多次采样，
+    重试等待不实际睡眠，全抖动取上限
+
+    Returns:
+        同步客户端每次重试前等待的秒数
+    """
+    delays = []
+    monkeypatch.setattr(llm_cache, '_cache_mode', llm_cache.CACHE_MODE_BYPASS)
+    monkeypatch.setattr(llm_resilience, '_breakers', {})
+    monkeypatch.setattr(llm_client, '_consensus_enabled', False)
+    monkeypatch.setattr(llm_client, 'LLM_FALLBACK_MODEL', None)
+    monkeypatch.setattr(llm_client, 'time', SimpleNamespace(sleep=delays.append,
+                                                            monotonic=time.monotonic))
+    monkeypatch.setattr(llm_resilience, 'random', SimpleNamespace(uniform=lambda low, high: high))
+    return delays
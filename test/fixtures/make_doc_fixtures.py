@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+生成 DOC 解析测试使用的 .doc 样例文件
+
+样例是最小化的 Word 97 二进制文档：OLE2 复合文档（512 字节扇区，小于 4096 字节的流放在短流中）
+内含 WordDocument（FIB + 正文）、1Table（Clx 分段表）和可选的 Data 流。
+修改样例后重新运行本脚本并提交生成的文件:
+
+    python test/fixtures/make_doc_fixtures.py
+"""
+import io
+import os
+import random
+import struct
+import zlib
+
+from PIL import Image
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'doc')
+
+_SECTOR = 512
+_MINI_SECTOR = 64
+_MINI_CUTOFF = 4096
+_FREE = 0xFFFFFFFF
+_END = 0xFFFFFFFE
+_FAT_SECT = 0xFFFFFFFD
+
+# 正文在 WordDocument 流中的起始位置（FIB 之后）
+_TEXT_OFFSET = 1024
+
+
+def _sectors(data: bytes, size: int):
+    data += b"\0" * (-len(data) % size)
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _dir_entry(name: str, kind: int, start: int, size: int, right: int = _FREE,
+               child: int = _FREE) -> bytes:
+    encoded = (name + "\0").encode('utf-16-le') if name else b""
+    entry = encoded.ljust(64, b"\0")
+    entry += struct.pack('<HBBIII', len(encoded), kind, 1, _FREE, right, child)
+    entry += b"\0" * 36
+    entry += struct.pack('<IQ', start, size)
+    return entry
+
+
+def build_compound_file(streams) -> bytes:
+    """
+    构造 OLE2 复合文档
+
+    Args:
+        streams: [(流名称, 内容)]，全部放在根存储下
+    """
+    sectors = []
+    fat = []
+
+    def allocate(chunks):
+        if not chunks:
+            return _END
+        start = len(sectors)
+        for i, chunk in enumerate(chunks):
+            sectors.append(chunk)
+            fat.append(start + i + 1 if i + 1 < len(chunks) else _END)
+        return start
+
+    # 短流依次放入 mini stream，MiniFAT 记录各自的短扇区链
+    mini_data = b""
+    minifat = []
+    placed = []
+    for name, data in streams:
+        if len(data) < _MINI_CUTOFF:
+            start = len(mini_data) // _MINI_SECTOR
+            count = max(1, -(-len(data) // _MINI_SECTOR))
+            minifat.extend(start + i + 1 if i + 1 < count else _END for i in range(count))
+            mini_data += data.ljust(count * _MINI_SECTOR, b"\0")
+            placed.append((name, start, len(data)))
+        else:
+            placed.append((name, allocate(_sectors(data, _SECTOR)), len(data)))
+
+    mini_start = allocate(_sectors(mini_data, _SECTOR))
+    minifat_bytes = struct.pack('<%dI' % len(minifat), *minifat)
+    minifat_bytes += struct.pack('<I', _FREE) * (-len(minifat) % (_SECTOR // 4))
+    minifat_start = allocate(_sectors(minifat_bytes, _SECTOR)) if minifat else _END
+    minifat_count = len(minifat_bytes) // _SECTOR if minifat else 0
+
+    # 根目录项的子节点是第一个流，其余流依次挂在右兄弟上
+    entries = _dir_entry("Root Entry", 5, mini_start, len(mini_data),
+                         child=1 if placed else _FREE)
+    for index, (name, start, size) in enumerate(placed, 1):
+        right = index + 1 if index < len(placed) else _FREE
+        entries += _dir_entry(name, 2, start, size, right=right)
+    entries += _dir_entry("", 0, _FREE, 0) * (-len(placed) - 1 & 3)
+    dir_start = allocate(_sectors(entries, _SECTOR))
+
+    # FAT 扇区本身也要在 FAT 中标记
+    per_sector = _SECTOR // 4
+    fat_count = 1
+    while (len(sectors) + fat_count) > fat_count * per_sector:
+        fat_count += 1
+    fat_sectors = list(range(len(sectors), len(sectors) + fat_count))
+    fat.extend([_FAT_SECT] * fat_count)
+    fat += [_FREE] * (fat_count * per_sector - len(fat))
+    fat_bytes = struct.pack('<%dI' % len(fat), *fat)
+    sectors.extend(_sectors(fat_bytes, _SECTOR))
+
+    header = b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1" + b"\0" * 16
+    header += struct.pack('<HHHHH', 0x3E, 3, 0xFFFE, 9, 6) + b"\0" * 6
+    header += struct.pack('<IIIIIIIII', 0, fat_count, dir_start, 0, _MINI_CUTOFF,
+                          minifat_start, minifat_count, _END, 0)
+    header += struct.pack('<109I', *(fat_sectors + [_FREE] * (109 - fat_count)))
+    return header + b"".join(sectors)
+
+
+def build_word_document(pieces, n_fib: int = 0x00C1, encrypted: bool = False,
+                        padding: int = 0) -> tuple:
+    """
+    构造 WordDocument 流和 1Table 流
+
+    Args:
+        pieces: [(文本, 是否压缩)]，压缩分段按 cp1252 存储，否则按 UTF-16 存储
+        n_fib: FIB 版本号
+        encrypted: 是否设置加密标志
+        padding: 正文之后追加的字节数（用于让流超过短流上限）
+
+    Returns:
+        (WordDocument 流, 1Table 流)
+    """
+    body = b""
+    cps = [0]
+    descriptors = b""
+    for text, compressed in pieces:
+        fc = _TEXT_OFFSET + len(body)
+        if compressed:
+            body += text.encode('cp1252')
+            fc_value = (fc * 2) | 0x40000000
+        else:
+            body += text.encode('utf-16-le')
+            fc_value = fc
+        cps.append(cps[-1] + len(text))
+        descriptors += struct.pack('<HIH', 0, fc_value, 0)
+    plc = struct.pack('<%dI' % len(cps), *cps) + descriptors
+    table = b"\0" * 16 + b"\x02" + struct.pack('<I', len(plc)) + plc
+    fc_clx, lcb_clx = 16, len(table) - 16
+
+    flags = 0x0200 | (0x0100 if encrypted else 0)
+    fib = struct.pack('<HHHHHH', 0xA5EC, n_fib, 0, 0, 0, flags).ljust(32, b"\0")
+    fib += struct.pack('<H', 14) + b"\0" * 28
+    rg_lw = [0] * 22
+    rg_lw[3] = cps[-1]
+    fib += struct.pack('<H', 22) + struct.pack('<22I', *rg_lw)
+    rg_fc_lcb = [0] * (93 * 2)
+    rg_fc_lcb[33 * 2], rg_fc_lcb[33 * 2 + 1] = fc_clx, lcb_clx
+    fib += struct.pack('<H', 93) + struct.pack('<%dI' % len(rg_fc_lcb), *rg_fc_lcb)
+
+    word = fib.ljust(_TEXT_OFFSET, b"\0") + body + b"\0" * padding
+    return word, table
+
+
+def make_png(width: int, height: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    rows = b"".join(b"\0" + bytes(rng.randrange(256) for _ in range(width * 3))
+                    for _ in range(height))
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b""))
+
+
+def make_jpeg(seed: int) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new('RGB', (40, 40))
+    image.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+                   for _ in range(40 * 40)])
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def build_fixtures():
+    fixtures = {}
+
+    # 单个压缩分段，包含 0x80-0x9F 区间的 cp1252 字符
+    word, table = build_word_document([("Café “quoted” – résumé\r", True)])
+    fixtures['compressed.doc'] = build_compound_file([('WordDocument', word), ('1Table', table)])
+
+    # UTF-16 分段与压缩分段混排；WordDocument 超过短流上限，走普通扇区链
+    word, table = build_word_document([
+        ("第一章 实验报告\r", False),
+        ("Plain English line\r", True),
+        ("总结：测试通过\r", False),
+    ], padding=5000)
+    fixtures['mixed.doc'] = build_compound_file([('WordDocument', word), ('1Table', table)])
+
+    # 域代码（含嵌套域）、表格单元格和对象占位符
+    word, table = build_word_document([(
+        "参见 \x13 HYPERLINK \"http://example.com\" \x14链接\x15 和 "
+        "\x13 REF a \x13 PAGE \x14 1\x15 \x14引用\x15。\r"
+        "A\x07B\x07\x07C\x07D\x07\x07\x01\r\r", False)])
+    fixtures['fields.doc'] = build_compound_file([('WordDocument', word), ('1Table', table)])
+
+    # Data 流中嵌入一张 PNG、一张 JPEG 和一个小图标（小于 1KB，不做 OCR）
+    word, table = build_word_document([("带图片的文档\r", False)])
+    data = (b"junk\x89PNG\r\n\x1a\ntruncated" + make_png(24, 24, 1) + b"\0" * 32
+            + make_jpeg(2) + b"\xff\xd8\xff" + b"\0" * 16 + make_png(2, 2, 3))
+    fixtures['images.doc'] = build_compound_file(
+        [('WordDocument', word), ('1Table', table), ('Data', data)])
+
+    # Word 95 (nFib 0x0065) 和加密文档不能原生解析
+    word, table = build_word_document([("Word 95\r", True)], n_fib=0x0065)
+    fixtures['word95.doc'] = build_compound_file([('WordDocument', word), ('1Table', table)])
+    word, table = build_word_document([("secret\r", True)], encrypted=True)
+    fixtures['encrypted.doc'] = build_compound_file([('WordDocument', word), ('1Table', table)])
+    return fixtures
+
+
+if __name__ == '__main__':
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, content in build_fixtures().items():
+        with open(os.path.join(FIXTURE_DIR, name), 'wb') as f:
+            f.write(content)
+        print(f"{name}: {len(content)} 字节")
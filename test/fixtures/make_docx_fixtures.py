@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+生成 DOCX 解析测试使用的 .docx 样例文件
+
+样例只包含 docx_extractor 读取的部件（document.xml、页眉及其关系文件、图片），
+覆盖表格、嵌套表格、文本框（mc:AlternateContent 及其 mc:Fallback 副本）、页眉去重和各种图片引用。
+修改样例后重新运行本脚本并提交生成的文件:
+
+    python test/fixtures/make_docx_fixtures.py
+"""
+import io
+import os
+import zipfile
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'docx')
+
+_NS = ' '.join([
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"',
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"',
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"',
+    'xmlns:v="urn:schemas-microsoft-com:vml"',
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"',
+    'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape"',
+])
+_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+
+
+def paragraph(*runs: str) -> str:
+    return "<w:p>" + "".join(runs) + "</w:p>"
+
+
+def run(text: str) -> str:
+    return f'<w:r><w:t xml:space="preserve">{text}</w:t></w:r>'
+
+
+def blip(rel_id: str) -> str:
+    return f'<w:r><w:drawing><a:graphic><a:blip r:embed="{rel_id}"/></a:graphic></w:drawing></w:r>'
+
+
+def table(*rows) -> str:
+    return "<w:tbl>" + "".join(
+        "<w:tr>" + "".join(f"<w:tc>{cell}</w:tc>" for cell in row) + "</w:tr>" for row in rows
+    ) + "</w:tbl>"
+
+
+def text_box(content: str, fallback: str) -> str:
+    # 新版 Word 把文本框写在 mc:Choice 中，mc:Fallback 中是给旧版本看的 VML 副本
+    return ('<w:r><mc:AlternateContent><mc:Choice Requires="wps"><w:drawing><wps:txbx>'
+            f'<w:txbxContent>{content}</w:txbxContent></wps:txbx></w:drawing></mc:Choice>'
+            f'<mc:Fallback><w:pict><v:textbox><w:txbxContent>{fallback}</w:txbxContent>'
+            '</v:textbox></w:pict></mc:Fallback></mc:AlternateContent></w:r>')
+
+
+def relationships(rels) -> str:
+    entries = []
+    for rel_id, kind, target, external in rels:
+        mode = ' TargetMode="External"' if external else ''
+        entries.append(f'<Relationship Id="{rel_id}" Type="{_REL_TYPE}{kind}" '
+                       f'Target="{target}"{mode}/>')
+    return f'<Relationships xmlns="{_REL_NS}">{"".join(entries)}</Relationships>'
+
+
+def part(body: str, root: str = 'w:document') -> str:
+    if root == 'w:document':
+        body = f"<w:body>{body}</w:body>"
+    return f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><{root} {_NS}>{body}</{root}>'
+
+
+def build_structure_docx() -> bytes:
+    body = "".join([
+        # 段落内的制表符和换行
+        paragraph(run("实验目的"), '<w:r><w:tab/></w:r>', run("验证排序算法"), '<w:r><w:br/></w:r>',
+                  run("第二行")),
+        # 空段落不输出
+        paragraph(),
+        # 单元格内的多个段落以空格连接；嵌套表格的行并入所在单元格；单元格中的图片在整行之后输出
+        table(
+            [paragraph(run("输入")), paragraph(run("期望输出"))],
+            [paragraph(run("3 1 2")),
+             paragraph(run("1 2 3")) + paragraph(run("通过"), blip('rIdTableImage'))],
+            [paragraph(run("嵌套")),
+             table([paragraph(run("内层 A")), paragraph(run("内层 B"))]) + paragraph(run("备注"))],
+        ),
+        # 文本框内容跟在锚点段落之后；mc:Fallback 中的副本不输出
+        paragraph(run("见右侧说明"), text_box(paragraph(run("文本框内容")),
+                                              paragraph(run("文本框内容（副本）")))),
+        # DrawingML 和 VML 图片；外部链接的图片和非图片关系不输出
+        paragraph(run("运行截图"), blip('rIdImage')),
+        paragraph('<w:r><w:pict><v:shape><v:imagedata r:id="rIdVml"/></v:shape></w:pict></w:r>'),
+        paragraph(blip('rIdExternal'), blip('rIdHeader1')),
+        paragraph(run("结论")),
+    ])
+    document_rels = relationships([
+        ('rIdHeader1', 'header', 'header1.xml', False),
+        ('rIdHeader2', 'header', 'header2.xml', False),
+        ('rIdImage', 'image', 'media/image1.png', False),
+        ('rIdTableImage', 'image', 'media/image2.png', False),
+        ('rIdVml', 'image', '/word/media/image3.png', False),
+        ('rIdExternal', 'image', 'http://example.com/remote.png', True),
+    ])
+    # 两个页眉中重复的段落只输出一次；页眉中的图片（徽标）不输出
+    header1 = part(paragraph(run("软件工程实验报告")) + paragraph(blip('rIdLogo')), 'w:hdr')
+    header2 = part(paragraph(run("软件工程实验报告")) + paragraph(run("第二页页眉")), 'w:hdr')
+
+    return _zip({
+        'word/document.xml': part(body),
+        'word/_rels/document.xml.rels': document_rels,
+        'word/header1.xml': header1,
+        'word/_rels/header1.xml.rels': relationships([('rIdLogo', 'image', 'media/logo.png', False)]),
+        'word/header2.xml': header2,
+        'word/media/image1.png': b"image-1",
+        'word/media/image2.png': b"image-2",
+        'word/media/image3.png': b"image-3",
+        'word/media/logo.png': b"logo",
+    })
+
+
+def _zip(parts) -> bytes:
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as docx:
+        for name, content in parts.items():
+            # 固定时间戳，重新生成的文件内容不变
+            docx.writestr(zipfile.ZipInfo(name, (2024, 1, 1, 0, 0, 0)), content,
+                          compress_type=zipfile.ZIP_DEFLATED)
+    return output.getvalue()
+
+
+def build_fixtures():
+    return {
+        'structure.docx': build_structure_docx(),
+        # 缺少 word/document.xml 的压缩包
+        'not_a_document.docx': _zip({'word/styles.xml': part("", 'w:styles')}),
+    }
+
+
+if __name__ == '__main__':
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, content in build_fixtures().items():
+        with open(os.path.join(FIXTURE_DIR, name), 'wb') as f:
+            f.write(content)
+        print(f"{name}: {len(content)} 字节")
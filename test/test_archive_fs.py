@@ -0,0 +1,219 @@
+"""
+压缩包虚拟文件系统测试：索引中的压缩包成员、成员文本与解压到磁盘后一致、原压缩包不变
+"""
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+
+import pytest
+
+import archive_fs
+import file_index
+import file_utils
+import text_extractor
+from archive_fs import MEMBER_SEPARATOR, is_virtual_path, list_archive_entries
+from file_index import get_file_index, invalidate_file_index
+from text_extractor import extract_text_from_file, extract_text_from_folder
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'docx')
+
+
+def fixture_path(name: str) -> str:
+    return os.path.join(FIXTURE_DIR, name)
+
+
+def zip_bytes(members) -> bytes:
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+    return output.getvalue()
+
+
+def write_tar(path, members) -> None:
+    with tarfile.open(path, 'w:gz') as tf:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+
+
+def write_gbk_zip(path, name: str, content: bytes) -> None:
+    # 中文 Windows 打包工具按 GBK 写文件名且不设置 UTF-8 标志；先用等长的 ASCII 占位再替换字节
+    encoded = name.encode('gbk')
+    placeholder = b"x" * len(encoded)
+    data = zip_bytes({placeholder.decode(): content})
+    with open(path, 'wb') as f:
+        f.write(data.replace(placeholder, encoded))
+
+
+@pytest.fixture(autouse=True)
+def virtual_fs(monkeypatch):
+    monkeypatch.setattr(file_index, 'ARCHIVE_VIRTUAL_FS', True)
+    monkeypatch.setattr(file_utils, 'ARCHIVE_VIRTUAL_FS', True)
+    monkeypatch.setattr(text_extractor, 'get_extraction_cache', lambda: None)
+    monkeypatch.setattr(text_extractor, 'is_ocr_available', lambda: False)
+    yield
+    invalidate_file_index()
+
+
+@pytest.fixture
+def submission(tmp_path):
+    """学生文件夹：一个普通文件、含嵌套压缩包的 zip 和一个 tar.gz"""
+    folder = tmp_path / "2023001张三"
+    folder.mkdir()
+    (folder / "说明.txt").write_text("直接提交的文件\n", encoding='utf-8')
+    with open(fixture_path('structure.docx'), 'rb') as f:
+        docx = f.read()
+    (folder / "code.zip").write_bytes(zip_bytes({
+        'src/main.py': "print('hello')\r\n# 第二行\r\n",
+        'src/README.md': "# 实验一\n\n说明",
+        'report.docx': docx,
+        'screenshot.png': b"\x89PNG not really",
+        '__MACOSX/src/._main.py': b"resource fork",
+        'inner.zip': zip_bytes({'deep/notes.txt': "嵌套压缩包中的文件"}),
+    }))
+    write_tar(folder / "extra.tar.gz", {'extra/Main.java': "class Main {}".encode()})
+    return folder
+
+
+def snapshot(folder) -> dict:
+    """文件夹中每个文件的内容哈希和修改时间"""
+    result = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                result[path] = (hashlib.sha256(f.read()).hexdigest(), os.stat(path).st_mtime_ns)
+    return result
+
+
+def extract_to_disk(archive_path: str, target: str) -> None:
+    """把压缩包（含嵌套压缩包）完整解压到目录"""
+    if archive_path.endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as zf:
+            zf.extractall(target)
+    else:
+        with tarfile.open(archive_path) as tf:
+            tf.extractall(target)
+    for root, _, files in os.walk(target):
+        for name in files:
+            if name.endswith('.zip'):
+                extract_to_disk(os.path.join(root, name), os.path.join(root, name + "_extracted"))
+
+
+def test_index_lists_archive_members_after_their_archive(submission):
+    paths = [os.path.relpath(entry.path, submission) for entry in get_file_index(str(submission)).entries]
+
+    code = paths.index("code.zip")
+    members = [path for path in paths if path.startswith("code.zip" + MEMBER_SEPARATOR)]
+    assert paths[code + 1:code + 1 + len(members)] == members
+    assert sorted(members) == sorted([
+        "code.zip!/src/main.py",
+        "code.zip!/src/README.md",
+        "code.zip!/report.docx",
+        "code.zip!/screenshot.png",
+        "code.zip!/inner.zip",
+        "code.zip!/inner.zip!/deep/notes.txt",
+    ])
+    # 嵌套压缩包的成员紧跟在该压缩包之后
+    assert members.index("code.zip!/inner.zip!/deep/notes.txt") == members.index("code.zip!/inner.zip") + 1
+    assert "extra.tar.gz!/extra/Main.java" in paths
+
+    supported = [os.path.relpath(path, submission) for path in text_extractor.find_supported_files(str(submission))]
+    assert set(supported) == {
+        "说明.txt", "code.zip!/src/main.py", "code.zip!/src/README.md", "code.zip!/report.docx",
+        "code.zip!/inner.zip!/deep/notes.txt", "extra.tar.gz!/extra/Main.java",
+    }
+
+
+def test_member_text_matches_extracting_to_disk(submission, tmp_path):
+    disk = tmp_path / "extracted"
+    extract_to_disk(str(submission / "code.zip"), str(disk / "code"))
+    extract_to_disk(str(submission / "extra.tar.gz"), str(disk / "extra"))
+    on_disk = {
+        "code.zip!/src/main.py": disk / "code" / "src" / "main.py",
+        "code.zip!/src/README.md": disk / "code" / "src" / "README.md",
+        "code.zip!/report.docx": disk / "code" / "report.docx",
+        "code.zip!/inner.zip!/deep/notes.txt": disk / "code" / "inner.zip_extracted" / "deep" / "notes.txt",
+        "extra.tar.gz!/extra/Main.java": disk / "extra" / "extra" / "Main.java",
+    }
+
+    for member, disk_path in on_disk.items():
+        virtual = str(submission) + os.sep + member
+        assert is_virtual_path(virtual)
+        text = extract_text_from_file(virtual)
+        assert text == extract_text_from_file(str(disk_path)), member
+        assert text
+
+    # 换行处理与内置 open 一致
+    assert extract_text_from_file(str(submission) + os.sep + "code.zip!/src/main.py") == "print('hello')\n# 第二行\n"
+
+
+def test_grading_a_folder_leaves_archives_untouched(submission):
+    before = snapshot(submission)
+
+    file_utils.extract_archives_in_folder(str(submission))
+    text = extract_text_from_folder(str(submission))
+
+    assert snapshot(submission) == before
+    assert "嵌套压缩包中的文件" in text and "class Main {}" in text and "软件工程实验报告" in text
+
+
+def test_gbk_member_names_are_decoded(tmp_path):
+    archive = tmp_path / "作业.zip"
+    write_gbk_zip(archive, "实验报告.txt", "GBK 文件名".encode('utf-8'))
+    with zipfile.ZipFile(archive) as zf:
+        assert not zf.infolist()[0].flag_bits & 0x800
+
+    [entry] = list_archive_entries(str(archive))
+
+    assert entry.path == str(archive) + "!/实验报告.txt"
+    assert extract_text_from_file(entry.path) == "GBK 文件名"
+
+
+def test_oversized_members_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_fs, 'ARCHIVE_MAX_MEMBER_BYTES', 1000)
+    archive = tmp_path / "code.zip"
+    archive.write_bytes(zip_bytes({'small.txt': "a" * 1000, 'large.txt': "a" * 1001}))
+
+    assert [entry.name for entry in list_archive_entries(str(archive))] == ["small.txt"]
+
+
+def test_nested_archives_beyond_max_depth_are_not_listed(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_fs, 'ARCHIVE_MAX_DEPTH', 1)
+    archive = tmp_path / "code.zip"
+    archive.write_bytes(zip_bytes({'inner.zip': zip_bytes({'notes.txt': "嵌套"})}))
+
+    assert [entry.name for entry in list_archive_entries(str(archive))] == ["inner.zip"]
+
+
+def test_unsupported_members_are_never_read(submission, monkeypatch):
+    opened = []
+    open_member = archive_fs._ZipArchive.open
+
+    def recording_open(self, name):
+        opened.append(name)
+        return open_member(self, name)
+
+    monkeypatch.setattr(archive_fs._ZipArchive, 'open', recording_open)
+
+    extract_text_from_folder(str(submission))
+
+    assert "screenshot.png" not in opened
+    assert not any("__MACOSX" in name for name in opened)
+    assert "src/main.py" in opened and "deep/notes.txt" in opened
+
+
+def test_corrupt_archive_is_listed_without_members(tmp_path):
+    archive = tmp_path / "broken.zip"
+    archive.write_bytes(b"not a zip file")
+    shutil.copy(fixture_path('structure.docx'), tmp_path / "report.docx")
+
+    paths = [entry.path for entry in get_file_index(str(tmp_path)).entries]
+
+    assert sorted(os.path.basename(path) for path in paths) == ["broken.zip", "report.docx"]
+    assert not any(is_virtual_path(path) for path in paths)
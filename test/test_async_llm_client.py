@@ -0,0 +1,155 @@
+"""
+异步 LLM 客户端测试：限流、自适应并发、重试和后台事件循环，使用假的 SDK 客户端
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('openai')
+
+import llm_client
+import llm_resilience
+import rate_limiter
+from fake_llm import api_error, completions, isolate, make_async_client, response
+from rate_limiter import AdaptiveConcurrency, RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    isolate(monkeypatch)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """异步客户端的重试等待只记录不睡眠"""
+    recorded = []
+
+    async def sleep(seconds):
+        recorded.append(seconds)
+
+    monkeypatch.setattr(llm_client, 'asyncio', SimpleNamespace(sleep=sleep, gather=asyncio.gather))
+    return recorded
+
+
+def score_json(score: float, comment: str = "评语") -> str:
+    return json.dumps({'score': score, 'comment': comment}, ensure_ascii=False)
+
+
+def test_rate_limit_halves_concurrency_and_retries(sleeps):
+    concurrency = AdaptiveConcurrency(initial=8, minimum=1, maximum=16)
+    client = make_async_client([api_error(429, {'retry-after': '3'}), score_json(8)],
+                               concurrency=concurrency)
+
+    grade = asyncio.run(client.grade_content("报告", "评分标准"))
+
+    assert grade.score == 8
+    assert sleeps == [3 + llm_resilience.LLM_RETRY_BASE_DELAY]
+    assert concurrency.rate_limited_count == 1
+    # 429 时减半，随后的成功请求加性增长
+    assert concurrency.limit == pytest.approx(4 + 1 / 4)
+    assert concurrency.in_flight == 0
+
+
+def test_server_errors_do_not_reduce_concurrency(sleeps):
+    concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=16)
+    client = make_async_client([api_error(500), score_json(7)], concurrency=concurrency)
+
+    grade = asyncio.run(client.grade_content("报告", "评分标准"))
+
+    assert grade.score == 7
+    assert sleeps == [1.0]
+    assert concurrency.rate_limited_count == 0
+    assert concurrency.limit == pytest.approx(4 + 1 / 4)
+
+
+def test_failed_request_is_ungraded(sleeps):
+    client = make_async_client([api_error(400)])
+
+    grade = asyncio.run(client.grade_content("报告", "评分标准"))
+
+    assert sleeps == []
+    assert grade.score is None and grade.comment.startswith(llm_client.UNGRADED_MARK)
+
+
+def test_token_budget_is_reconciled_with_reported_usage(monkeypatch):
+    # 时钟不走，桶内令牌不补充
+    monkeypatch.setattr(rate_limiter, 'time', SimpleNamespace(monotonic=lambda: 1000.0))
+    limiter = RateLimiter(None, 100000)
+    client = make_async_client([response(score_json(8), total_tokens=50)], limiter=limiter)
+    messages = llm_client.build_scoring_messages("报告", "评分标准")
+    estimated = llm_client.count_message_tokens(messages)
+    assert estimated > 50
+
+    asyncio.run(client.grade_content("报告", "评分标准"))
+
+    # 预估多扣的 token 已退还，桶内只少了实际用量
+    assert limiter.tokens._tokens == 100000 - 50
+
+
+def test_concurrent_grading_respects_the_concurrency_limit():
+    concurrency = AdaptiveConcurrency(initial=2, minimum=1, maximum=2)
+    peak = []
+
+    def outcome(params):
+        peak.append(concurrency.in_flight)
+        return score_json(6)
+
+    client = make_async_client([outcome] * 6, concurrency=concurrency)
+
+    async def grade_all():
+        return await asyncio.gather(*(client.grade_content(f"报告 {i}", "评分标准") for i in range(6)))
+
+    grades = asyncio.run(grade_all())
+
+    assert [grade.score for grade in grades] == [6] * 6
+    assert max(peak) == 2
+
+
+def test_sampling_falls_back_to_concurrent_requests_when_n_is_rejected(monkeypatch):
+    monkeypatch.setattr(llm_client, '_consensus_enabled', True)
+    client = make_async_client([api_error(400), score_json(8), score_json(8.5)])
+
+    grade = asyncio.run(client.grade_content("报告", "评分标准"))
+
+    assert [params.get('n', 1) for params in completions(client).requests] == [2, 1, 1]
+    assert client.use_n is False
+    assert grade.score == 8.25 and sorted(grade.samples) == [8, 8.5]
+
+
+def test_runner_grades_from_synchronous_threads(monkeypatch):
+    fake = make_async_client([score_json(9), score_json(5)])
+
+    async def create_client(max_concurrency):
+        return fake
+
+    monkeypatch.setattr(llm_client.AsyncLLMRunner, '_create_client', staticmethod(create_client))
+    runner = llm_client.AsyncLLMRunner(max_concurrency=2)
+    try:
+        assert runner.grade_content("报告", "评分标准").score == 9
+        assert runner.score_content("报告", "评分标准") == (5, "评语")
+    finally:
+        runner.close()
+
+    assert fake.closed
+    assert not runner._thread.is_alive()
+
+
+def test_runner_stops_its_loop_when_the_client_cannot_be_created(monkeypatch):
+    async def create_client(max_concurrency):
+        raise ValueError("API 密钥未设置")
+
+    monkeypatch.setattr(llm_client.AsyncLLMRunner, '_create_client', staticmethod(create_client))
+    threads = []
+    start = llm_client.threading.Thread.start
+
+    def recording_start(thread):
+        threads.append(thread)
+        start(thread)
+
+    monkeypatch.setattr(llm_client.threading.Thread, 'start', recording_start)
+
+    with pytest.raises(ValueError, match="API 密钥"):
+        llm_client.AsyncLLMRunner()
+    assert threads and not threads[0].is_alive()
@@ -0,0 +1,255 @@
+"""
+批量评分测试：用内存中的假 Batch API 客户端代替真实服务
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import batch_grading
+from batch_grading import BatchGrader
+import llm_cache
+from models import ProcessingResult, StudentSubmission
+
+
+class FakeBatchClient:
+    """
+    假的 Batch API 客户端
+
+    创建的批处理任务在被查询 polls 次后完成；每个请求的结果由 respond(custom_id, body) 决定，
+    返回字符串表示成功的消息内容，抛出异常表示该请求失败（写入错误文件）。
+    """
+
+    def __init__(self, respond, polls: int = 2):
+        self.respond = respond
+        self.polls = polls
+        self.uploads = {}
+        self.jobs = {}
+        self.contents = {}
+        self.submitted = []
+        self.retrieved = 0
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+
+    def _create_file(self, file, purpose):
+        assert purpose == "batch"
+        file_id = f"file-{len(self.uploads)}"
+        self.uploads[file_id] = file[1].read().decode('utf-8')
+        return SimpleNamespace(id=file_id)
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch-{len(self.jobs)}"
+        requests = [json.loads(line) for line in self.uploads[input_file_id].splitlines()]
+        self.submitted.append([request['custom_id'] for request in requests])
+        self.jobs[batch_id] = {'requests': requests, 'polls': 0, 'batch': None}
+        return SimpleNamespace(id=batch_id)
+
+    def _retrieve(self, batch_id):
+        self.retrieved += 1
+        job = self.jobs[batch_id]
+        if job['batch'] is not None:
+            return job['batch']
+        job['polls'] += 1
+        if job['polls'] < self.polls:
+            return SimpleNamespace(id=batch_id, status='in_progress', request_counts=None)
+
+        output, errors = [], []
+        for request in job['requests']:
+            custom_id = request['custom_id']
+            try:
+                content = self.respond(custom_id, request['body'])
+            except Exception as e:
+                errors.append({'custom_id': custom_id, 'error': {'message': str(e)}})
+                continue
+            output.append({'custom_id': custom_id, 'response': {'status_code': 200, 'body': {
+                'choices': [{'message': {'content': content}}],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': 5},
+            }}})
+        job['batch'] = SimpleNamespace(
+            id=batch_id, status='completed', request_counts=None,
+            output_file_id=self._store(batch_id + "-out", output),
+            error_file_id=self._store(batch_id + "-err", errors) if errors else None)
+        return job['batch']
+
+    def _store(self, file_id, records):
+        self.contents[file_id] = "".join(json.dumps(record, ensure_ascii=False) + "\n"
+                                         for record in records)
+        return file_id
+
+    def _file_content(self, file_id):
+        return SimpleNamespace(text=self.contents[file_id])
+
+
+def make_result(name: str, content: str) -> ProcessingResult:
+    submission = StudentSubmission(student_id=name, student_name=name, folder_name=name,
+                                   folder_path=name)
+    return ProcessingResult(submission=submission, content=content)
+
+
+def score_json(score: float, comment: str = "评语") -> str:
+    return json.dumps({'score': score, 'comment': comment}, ensure_ascii=False)
+
+
+def user_content(body) -> str:
+    return body['messages'][-1]['content']
+
+
+# 各学生的内容和批量评分返回的分数
+STUDENTS = {'s1': ("第一位学生的报告", 6.0), 's2': ("第二位学生的报告", 7.5),
+            's3': ("第三位学生的报告", 9.0)}
+
+
+def score_by_content(custom_id, body):
+    for content, score in STUDENTS.values():
+        if content in user_content(body):
+            return score_json(score)
+    raise AssertionError(f"未知的请求 {custom_id}")
+
+
+@pytest.fixture(autouse=True)
+def isolated_batches(tmp_path, monkeypatch):
+    """批处理状态写入临时目录，不读写 LLM 缓存"""
+    monkeypatch.setattr(batch_grading, 'LLM_BATCH_DIR', tmp_path / "batches")
+    monkeypatch.setattr(batch_grading, 'SIMILARITY_SHARE_DUPLICATE_GRADES', False)
+    monkeypatch.setattr(llm_cache, '_cache_mode', llm_cache.CACHE_MODE_BYPASS)
+
+
+def test_results_are_mapped_back_by_custom_id():
+    client = FakeBatchClient(score_by_content, polls=3)
+    results = [make_result(name, content) for name, (content, _) in STUDENTS.items()]
+
+    BatchGrader(client, poll_interval=0).grade(results, "评分标准")
+
+    assert [result.score_result.score for result in results] == [6.0, 7.5, 9.0]
+    assert client.submitted == [['0-score', '1-score', '2-score']]
+    # 轮询到任务完成为止
+    assert client.retrieved == 3
+
+
+def test_failed_students_are_skipped():
+    client = FakeBatchClient(score_by_content, polls=1)
+    results = [make_result('s1', STUDENTS['s1'][0]), make_result('s2', STUDENTS['s2'][0])]
+    results[0].errors.append("解压失败")
+
+    BatchGrader(client, poll_interval=0).grade(results, "评分标准")
+
+    assert results[0].score_result is None
+    assert results[1].score_result.score == 7.5
+    assert client.submitted == [['1-score']]
+
+
+def test_requests_are_split_into_batches(monkeypatch):
+    monkeypatch.setattr(batch_grading, 'LLM_BATCH_MAX_REQUESTS', 2)
+    client = FakeBatchClient(score_by_content, polls=1)
+    results = [make_result(name, content) for name, (content, _) in STUDENTS.items()]
+
+    BatchGrader(client, poll_interval=0).grade(results, "评分标准")
+
+    assert client.submitted == [['0-score', '1-score'], ['2-score']]
+    assert [result.score_result.score for result in results] == [6.0, 7.5, 9.0]
+
+
+def test_failed_requests_are_resubmitted():
+    failures = {'0-score': 1}
+
+    def flaky(custom_id, body):
+        if failures.get(custom_id, 0) > 0:
+            failures[custom_id] -= 1
+            raise RuntimeError("server_error")
+        return score_by_content(custom_id, body)
+
+    client = FakeBatchClient(flaky, polls=1)
+    results = [make_result('s1', STUDENTS['s1'][0]), make_result('s2', STUDENTS['s2'][0])]
+
+    BatchGrader(client, poll_interval=0).grade(results, "评分标准")
+
+    # 第二轮只重新提交失败的请求
+    assert client.submitted == [['0-score', '1-score'], ['0-score']]
+    assert [result.score_result.score for result in results] == [6.0, 7.5]
+
+
+def test_unparseable_output_is_resubmitted():
+    replies = iter(["不是 JSON", score_json(8.0)])
+    client = FakeBatchClient(lambda custom_id, body: next(replies), polls=1)
+    results = [make_result('s1', STUDENTS['s1'][0])]
+
+    BatchGrader(client, poll_interval=0).grade(results, "评分标准")
+
+    assert client.submitted == [['0-score'], ['0-score']]
+    assert results[0].score_result.score == 8.0
+
+
+def test_requests_give_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(batch_grading, 'LLM_BATCH_MAX_ATTEMPTS', 2)
+
+    def always_fails(custom_id, body):
+        if custom_id == '0-score':
+            raise RuntimeError("server_error")
+        return score_by_content(custom_id, body)
+
+    client = FakeBatchClient(always_fails, polls=1)
+    results = [make_result('s1', STUDENTS['s1'][0]), make_result('s2', STUDENTS['s2'][0])]
+
+    BatchGrader(client, poll_interval=0).grade(results, "评分标准")
+
+    assert client.submitted == [['0-score', '1-score'], ['0-score']]
+    assert results[0].score_result.score is None
+    assert "提交 2 次均失败" in results[0].score_result.comment
+    assert "server_error" in results[0].score_result.comment
+    assert results[1].score_result.score == 7.5
+
+
+def test_chunked_submissions_are_reduced_in_a_later_round(monkeypatch):
+    chunks = [[{'role': 'user', 'content': "第一块"}], [{'role': 'user', 'content': "第二块"}]]
+    monkeypatch.setattr(batch_grading, 'needs_chunking', lambda content: content == "长报告")
+    monkeypatch.setattr(batch_grading, 'build_chunk_requests', lambda content, rubric: chunks)
+
+    def respond(custom_id, body):
+        if '-chunk-' in custom_id:
+            summary = user_content(body)
+            return json.dumps({'findings': {}, 'summary': f"{summary}的笔记"}, ensure_ascii=False)
+        if custom_id == '0-reduce':
+            assert "第一块的笔记" in user_content(body)
+            assert "第二块的笔记" in user_content(body)
+            return score_json(5.5, "汇总评语")
+        return score_by_content(custom_id, body)
+
+    client = FakeBatchClient(respond, polls=1)
+    results = [make_result('long', "长报告"), make_result('s2', STUDENTS['s2'][0])]
+
+    BatchGrader(client, poll_interval=0).grade(results, "评分标准")
+
+    assert client.submitted == [['0-chunk-0', '0-chunk-1', '1-score'], ['0-reduce']]
+    assert results[0].score_result.score == 5.5
+    assert results[0].score_result.comment == "汇总评语"
+    assert results[1].score_result.score == 7.5
+
+
+def test_pending_batch_is_resumed_after_restart(tmp_path):
+    client = FakeBatchClient(score_by_content, polls=2)
+    requests = {'0-score': [{'role': 'user', 'content': STUDENTS['s1'][0]}]}
+
+    # 提交后程序中断：任务 ID 按请求文件摘要记录在 batches.json 中
+    batch_id = BatchGrader(client, poll_interval=0)._submit(list(requests.items()))
+    state_path = tmp_path / "batches" / "batches.json"
+    assert list(json.loads(state_path.read_text(encoding='utf-8')).values()) == [batch_id]
+
+    # 重新运行时继续等待原来的任务，不重复提交
+    outputs = BatchGrader(client, poll_interval=0).run(requests)
+
+    assert len(client.submitted) == 1
+    assert outputs['0-score'] == (score_json(6.0), None)
+    # 结果取回后不再记录该任务
+    assert json.loads(state_path.read_text(encoding='utf-8')) == {}
+
+
+def test_failed_batch_in_state_is_resubmitted(tmp_path):
+    client = FakeBatchClient(score_by_content, polls=1)
+    requests = {'0-score': [{'role': 'user', 'content': STUDENTS['s1'][0]}]}
+    batch_id = BatchGrader(client, poll_interval=0)._submit(list(requests.items()))
+    client.jobs[batch_id]['batch'] = SimpleNamespace(id=batch_id, status='failed')
+
+    outputs = BatchGrader(client, poll_interval=0).run(requests)
+
+    assert len(client.submitted) == 2
+    assert outputs['0-score'] == (score_json(6.0), None)
@@ -0,0 +1,154 @@
+"""
+长文本分块测试：token 估算、按 token 切分和按章节分块（每块不超过上限，拼接后与原文一致）
+"""
+import random
+import sys
+
+import pytest
+
+import tokenizer
+from chunked_grading import split_into_chunks, split_into_sections
+from tokenizer import _fit_end, count_tokens, estimate_text_tokens, split_by_tokens
+
+
+@pytest.fixture(autouse=True)
+def without_tiktoken(monkeypatch):
+    """按未安装 tiktoken 的情况计数，结果与环境无关"""
+    monkeypatch.setitem(sys.modules, 'tiktoken', None)
+    monkeypatch.setattr(tokenizer, '_encoding', None)
+
+
+def random_text(rng: random.Random, length: int) -> str:
+    alphabet = "abcdefghij klmnop" * 3 + "实验报告测试用例结果分析，。" + "\n"
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("", 0),
+    ("abcd", 1),
+    ("abcde", 2),
+    ("中文", 2),
+    ("中文ab", 3),
+    # 全角标点和假名按宽字符计算
+    ("，。カ", 3),
+    ("print('你好')\n", 2 + 3),
+])
+def test_estimate_text_tokens(text, expected):
+    assert estimate_text_tokens(text) == expected
+
+
+def test_count_tokens_falls_back_to_estimate_without_tiktoken():
+    text = "第一章 实验目的\nverify the sorting algorithm"
+
+    assert count_tokens(text) == estimate_text_tokens(text)
+    assert tokenizer._encoding is False
+    assert tokenizer.count_message_tokens([{'role': 'user', 'content': text}]) == \
+        estimate_text_tokens(text) + tokenizer._MESSAGE_OVERHEAD
+
+
+@pytest.mark.parametrize('text, start, max_tokens, expected', [
+    ("abcdefgh", 0, 1, 4),
+    ("abcdefgh", 2, 1, 6),
+    ("中文字符", 0, 2, 2),
+    ("ab中文", 0, 2, 3),
+    # 整段都放得下
+    ("abc", 0, 5, 3),
+    # 单个字符就超出上限时也至少前进一个字符
+    ("中文", 0, 0, 1),
+])
+def test_fit_end(text, start, max_tokens, expected):
+    assert _fit_end(text, start, max_tokens) == expected
+
+
+def test_fit_end_only_scans_a_window_after_start():
+    text = "a" * 100000
+
+    assert _fit_end(text, 10, 25) == 110
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('max_tokens', [0, 1, 7, 50])
+def test_split_by_tokens_respects_the_limit_and_keeps_the_text(seed, max_tokens):
+    text = random_text(random.Random(seed), 600)
+
+    pieces = split_by_tokens(text, max_tokens)
+
+    assert "".join(pieces) == text
+    assert all(pieces)
+    # 上限为 0 时每段一个字符
+    assert all(count_tokens(piece) <= max(1, max_tokens) for piece in pieces)
+
+
+def test_split_by_tokens_prefers_newlines():
+    text = "a" * 30 + "\n" + "b" * 30 + "\n" + "c" * 10
+
+    assert split_by_tokens(text, 10) == ["a" * 30 + "\n", "b" * 30 + "\n", "c" * 10]
+    # 换行离段首太近时不在换行处断开，避免产生很短的段
+    assert split_by_tokens("a\n" + "b" * 60, 10)[0] == "a\n" + "b" * 38
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("只有正文，没有标题", ["只有正文，没有标题"]),
+    ("前言\n# 实验目的\n内容\n## 步骤\n内容",
+     ["前言\n", "# 实验目的\n内容\n", "## 步骤\n内容"]),
+    ("\n\n--- 文件: a.py ---\n\nprint(1)\n\n--- 文件: 报告.docx ---\n\n正文",
+     ["\n\n", "--- 文件: a.py ---\n\nprint(1)\n\n", "--- 文件: 报告.docx ---\n\n正文"]),
+    ("一、实验目的\n理解测试\n二、实验步骤\n编写用例",
+     ["一、实验目的\n理解测试\n", "二、实验步骤\n编写用例"]),
+    ("第一章 概述\n内容\n第2节 细节\n内容", ["第一章 概述\n内容\n", "第2节 细节\n内容"]),
+    ("1. 准备环境\n安装\n1.2 运行测试\n结果", ["1. 准备环境\n安装\n", "1.2 运行测试\n结果"]),
+    # 行中的编号和过长的“编号标题”不是章节边界
+    ("见第 1. 步\n" + "2. " + "很长的一句话" * 10, ["见第 1. 步\n" + "2. " + "很长的一句话" * 10]),
+])
+def test_split_into_sections(text, expected):
+    sections = split_into_sections(text)
+
+    assert sections == expected
+    assert "".join(sections) == text
+
+
+def report(sections) -> str:
+    return "".join(f"## 第 {i} 节\n" + body for i, body in enumerate(sections, 1))
+
+
+def test_short_sections_are_merged_into_one_chunk():
+    text = report(["短内容\n"] * 5)
+
+    assert split_into_chunks(text, max_tokens=200) == [text]
+
+
+def test_sections_are_not_split_when_they_fit_a_new_chunk():
+    sections = split_into_sections(report(["内容" * 20 + "\n"] * 4))
+
+    chunks = split_into_chunks("".join(sections), max_tokens=100)
+
+    # 每块两节，节不跨块
+    assert chunks == ["".join(sections[0:2]), "".join(sections[2:4])]
+
+
+def test_oversized_section_fills_the_current_chunk_then_splits_at_newlines():
+    long_lines = "".join(f"第 {i} 行测试结果\n" for i in range(40))
+    text = report(["简短的引言\n", long_lines, "结论\n"])
+    max_tokens = 60
+
+    chunks = split_into_chunks(text, max_tokens)
+
+    assert "".join(chunks) == text
+    assert all(count_tokens(chunk) <= max_tokens for chunk in chunks)
+    # 超长节的开头与前一节同块，之后的各块都在换行处结束
+    assert chunks[0].startswith("## 第 1 节\n简短的引言\n## 第 2 节\n")
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert chunks[-1].endswith("## 第 3 节\n结论\n")
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('max_tokens', [5, 40, 300])
+def test_chunks_respect_the_limit_and_keep_the_text(seed, max_tokens):
+    rng = random.Random(seed)
+    text = report([random_text(rng, rng.choice([10, 100, 1500])) + "\n" for _ in range(6)])
+
+    chunks = split_into_chunks(text, max_tokens)
+
+    assert "".join(chunks) == text
+    assert all(chunks)
+    assert all(count_tokens(chunk) <= max_tokens for chunk in chunks)
@@ -0,0 +1,126 @@
+"""
+多次采样一致性评分测试：一致分数的判定、追加采样数、结果汇总和客户端的采样循环
+"""
+import json
+
+import pytest
+
+import consensus
+import llm_client
+from consensus import DISAGREEMENT_MARK, combine_samples, find_agreement, samples_needed
+from fake_llm import completions, isolate, make_client
+
+
+@pytest.mark.parametrize('scores, agreement, tolerance, expected', [
+    ([8, 8.5, 3], 2, 0.5, [8, 8.5]),
+    ([8.5, 3, 8], 2, 0.5, [8, 8.5]),
+    ([1, 2, 3], 2, 0.5, None),
+    ([1, 2, 3], 2, 1.0, [1, 2]),
+    # 同样大小的组取分数较低的一组
+    ([7, 7.5, 8, 8.2], 2, 0.5, [7, 7.5]),
+    ([8, 8.2, 8.4, 3], 3, 0.5, [8, 8.2, 8.4]),
+    ([5, 5, 6], 3, 0, None),
+    ([6], 1, 0.5, [6]),
+    ([], 2, 0.5, None),
+])
+def test_find_agreement(scores, agreement, tolerance, expected):
+    assert find_agreement(scores, agreement, tolerance) == expected
+
+
+@pytest.mark.parametrize('scores, spent, expected', [
+    # 配置：首轮 2 个样本，2 个分差不超过 0.5 的样本视为一致，最多 5 个样本
+    ([8, 8.5], 2, 0),
+    ([5, 8], 2, 1),
+    ([8], 2, 1),
+    ([], 2, 2),
+    ([1, 4, 7, 10], 4, 1),
+    ([], 4, 1),
+    ([1, 4, 7, 10, 13], 5, 0),
+])
+def test_samples_needed(monkeypatch, scores, spent, expected):
+    monkeypatch.setattr(consensus, 'LLM_CONSENSUS_MAX_SAMPLES', 5)
+    assert consensus.LLM_CONSENSUS_AGREEMENT == 2 and consensus.LLM_CONSENSUS_TOLERANCE == 0.5
+
+    assert samples_needed(scores, spent) == expected
+
+
+@pytest.mark.parametrize('samples, expected_score, expected_comment', [
+    # 一致样本的中位数；评语取分数最接近的样本，距离相同时取先出现的
+    ([(8, "a"), (8.5, "b"), (3, "c")], 8.25, "a"),
+    ([(8, "a"), (8.2, "b"), (8.4, "c")], 8.2, "b"),
+    ([(9, "a"), (3, "b"), (8.8, "c"), (8.6, "d")], 8.8, "c"),
+    # 没有一致结果时取全部样本的中位数并提示人工复核
+    ([(1, "a"), (5, "b"), (9, "c")], 5, DISAGREEMENT_MARK + "b"),
+    ([(2, "a"), (6, "b")], 4, DISAGREEMENT_MARK + "a"),
+    # 只有一个可解析的样本
+    ([(6, "a")], 6, "a"),
+])
+def test_combine_samples(samples, expected_score, expected_comment):
+    grade = combine_samples(samples, spent=len(samples) + 1)
+
+    assert grade.score == expected_score
+    assert grade.comment == expected_comment
+    assert grade.samples == [score for score, _ in samples]
+
+
+def test_combine_samples_without_any_parsed_sample():
+    with pytest.raises(ValueError, match="3 次采样均无法解析"):
+        combine_samples([], spent=3)
+
+
+def sample(score, comment=None) -> str:
+    return json.dumps({'score': score, 'comment': comment or f"{score} 分"}, ensure_ascii=False)
+
+
+@pytest.fixture
+def sampling(monkeypatch):
+    pytest.importorskip('openai')
+    isolate(monkeypatch)
+    monkeypatch.setattr(llm_client, '_consensus_enabled', True)
+    monkeypatch.setattr(consensus, 'LLM_CONSENSUS_MAX_SAMPLES', 5)
+
+
+@pytest.mark.parametrize('script, expected_score, expected_comment, expected_n', [
+    # 首轮两个样本一致，提前停止
+    ([[sample(8), sample(8.5)]], 8.25, "8 分", [2]),
+    # 首轮分歧，追加一个样本后一致
+    ([[sample(5), sample(8)], sample(8.4)], 8.2, "8 分", [2, 1]),
+    # 始终没有一致结果，采样到上限后取中位数并提示复核
+    ([[sample(1), sample(3)], sample(5), sample(7), sample(9)],
+     5, DISAGREEMENT_MARK + "5 分", [2, 1, 1, 1]),
+    # 无法解析的样本不参与汇总
+    ([["不是 JSON", sample(8)], sample(8.2)], 8.1, "8 分", [2, 1]),
+])
+def test_grade_messages_samples_until_agreement(sampling, script, expected_score,
+                                                expected_comment, expected_n):
+    client = make_client(script)
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert grade.score == pytest.approx(expected_score)
+    assert grade.comment == expected_comment
+    assert [params.get('n', 1) for params in completions(client).requests] == expected_n
+    assert all(params['temperature'] == consensus.consensus_temperature()
+               for params in completions(client).requests)
+
+
+def test_unparseable_samples_count_toward_the_sample_limit(sampling, monkeypatch):
+    monkeypatch.setattr(consensus, 'LLM_CONSENSUS_MAX_SAMPLES', 3)
+    client = make_client([["不是 JSON", "也不是"], sample(8)])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    # 首轮两个样本都无法解析，只剩一个名额
+    assert [params.get('n', 1) for params in completions(client).requests] == [2, 1]
+    assert grade.score == 8 and grade.samples == [8]
+    assert not grade.comment.startswith(DISAGREEMENT_MARK)
+
+
+def test_all_samples_unparseable_leaves_the_student_ungraded(sampling, monkeypatch):
+    monkeypatch.setattr(consensus, 'LLM_CONSENSUS_MAX_SAMPLES', 2)
+    client = make_client([["不是 JSON", "也不是"]])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert grade.score is None
+    assert grade.comment.startswith(llm_client.UNGRADED_MARK) and "2 次采样均无法解析" in grade.comment
@@ -0,0 +1,95 @@
+"""
+DOC 原生解析测试，样例由 test/fixtures/make_doc_fixtures.py 生成
+"""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import text_extractor
+from doc_extractor import DocFormatError, carve_images, is_native_doc, read_doc
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'doc')
+
+
+def fixture_path(name: str) -> str:
+    return os.path.join(FIXTURE_DIR, name)
+
+
+def load(name: str) -> bytes:
+    with open(fixture_path(name), 'rb') as f:
+        return f.read()
+
+
+def test_compressed_piece_is_decoded_as_cp1252():
+    text, images = read_doc(load('compressed.doc'))
+
+    assert text == "Café “quoted” – résumé"
+    assert images == []
+
+
+def test_utf16_and_compressed_pieces_are_joined_in_order():
+    # WordDocument 流超过短流上限，从普通扇区链读取；1Table 在短流中
+    text, _ = read_doc(load('mixed.doc'))
+
+    assert text == "第一章 实验报告\nPlain English line\n总结：测试通过"
+
+
+def test_field_codes_are_stripped_and_table_cells_joined():
+    text, _ = read_doc(load('fields.doc'))
+
+    assert text == "参见 链接 和 引用。\nA\tB\nC\tD"
+
+
+def test_embedded_images_are_carved_from_data_stream():
+    _, images = read_doc(load('images.doc'))
+
+    formats = [Image.open(io.BytesIO(image)).format for image in images]
+    assert formats == ['PNG', 'JPEG']
+
+
+def test_carve_images_skips_truncated_and_tiny_images():
+    _, (png, jpeg) = read_doc(load('images.doc'))
+    tiny = png[:8] + png[8:33] + png[-12:]  # 只有 IHDR 和 IEND 的小图片
+    data = b"\x89PNG\r\n\x1a\n\0\0" + jpeg[:100] + b"\0" + tiny + png + jpeg + b"\xff\xd8\xff\xd9"
+
+    assert carve_images(data) == [png, jpeg]
+
+
+@pytest.mark.parametrize('name, reason', [
+    ('word95.doc', "Word 95"),
+    ('encrypted.doc', "加密"),
+])
+def test_unsupported_documents_raise_doc_format_error(name, reason):
+    data = load(name)
+
+    with pytest.raises(DocFormatError, match=reason):
+        read_doc(data)
+    assert not is_native_doc(data)
+
+
+def test_non_ole_and_truncated_files_raise_doc_format_error():
+    with pytest.raises(DocFormatError):
+        read_doc(b"{\\rtf1 not a compound file}" * 40)
+    with pytest.raises(DocFormatError):
+        read_doc(load('mixed.doc')[:2048])
+
+
+def test_native_documents_do_not_need_libreoffice(monkeypatch):
+    monkeypatch.setattr(text_extractor, 'is_ocr_available', lambda: False)
+    monkeypatch.setattr(text_extractor, '_iter_text_from_doc_with_office',
+                        lambda file_path: pytest.fail("不应调用 LibreOffice"))
+
+    assert is_native_doc(load('mixed.doc'))
+    assert text_extractor.extract_text_from_doc(fixture_path('mixed.doc')).startswith("第一章")
+
+
+@pytest.mark.parametrize('name', ['word95.doc', 'encrypted.doc'])
+def test_unsupported_documents_fall_back_to_libreoffice(monkeypatch, name):
+    converted = []
+    monkeypatch.setattr(text_extractor, '_iter_text_from_doc_with_office',
+                        lambda file_path: converted.append(file_path) or iter(["转换后的文本"]))
+
+    assert text_extractor.extract_text_from_doc(fixture_path(name)) == "转换后的文本"
+    assert converted == [fixture_path(name)]
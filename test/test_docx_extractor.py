@@ -0,0 +1,122 @@
+"""
+DOCX 流式解析测试，样例由 test/fixtures/make_docx_fixtures.py 生成
+"""
+import os
+
+import pytest
+
+import docx_extractor
+import text_extractor
+from docx_extractor import IMAGE, TEXT, DocxPackage
+from ocr import OcrResult
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'docx')
+
+
+def fixture_path(name: str) -> str:
+    return os.path.join(FIXTURE_DIR, name)
+
+
+def document_blocks(name: str = 'structure.docx') -> list:
+    with open(fixture_path(name), 'rb') as f, DocxPackage(f) as package:
+        return list(package.iter_document())
+
+
+def test_headers_are_deduplicated_and_come_first():
+    blocks = document_blocks()
+
+    assert blocks[:2] == [(TEXT, "软件工程实验报告"), (TEXT, "第二页页眉")]
+    # 页眉中的徽标不输出
+    assert (IMAGE, 'word/media/logo.png') not in blocks
+
+
+def test_runs_tabs_and_breaks_form_one_paragraph():
+    assert document_blocks()[2] == (TEXT, "实验目的\t验证排序算法\n第二行")
+
+
+def test_table_rows_are_tab_separated_with_cell_images_after_the_row():
+    blocks = document_blocks()
+    start = blocks.index((TEXT, "输入\t期望输出"))
+
+    assert blocks[start:start + 4] == [
+        (TEXT, "输入\t期望输出"),
+        # 单元格内的多个段落以空格连接
+        (TEXT, "3 1 2\t1 2 3 通过"),
+        (IMAGE, 'word/media/image2.png'),
+        # 嵌套表格的行并入所在单元格，不增加外层表格的列
+        (TEXT, "嵌套\t内层 A 内层 B 备注"),
+    ]
+
+
+def test_text_box_follows_its_anchor_and_fallback_copy_is_skipped():
+    blocks = document_blocks()
+    anchor = blocks.index((TEXT, "见右侧说明"))
+
+    assert blocks[anchor + 1] == (TEXT, "文本框内容")
+    assert all("副本" not in value for _, value in blocks)
+
+
+def test_images_resolve_relationships_and_skip_external_links():
+    blocks = document_blocks()
+
+    assert blocks[-4:] == [
+        (TEXT, "运行截图"),
+        (IMAGE, 'word/media/image1.png'),
+        # VML 图片，关系目标为绝对路径
+        (IMAGE, 'word/media/image3.png'),
+        (TEXT, "结论"),
+    ]
+    assert [value for kind, value in blocks if kind == IMAGE] == [
+        'word/media/image2.png', 'word/media/image1.png', 'word/media/image3.png']
+
+
+def test_parsed_body_elements_are_released(monkeypatch):
+    iterparse = docx_extractor.ElementTree.iterparse
+    roots = []
+
+    def recording_iterparse(source, events):
+        for event, elem in iterparse(source, events):
+            if event == 'start' and elem.tag == docx_extractor._W + 'body':
+                roots.append(elem)
+            yield event, elem
+
+    monkeypatch.setattr(docx_extractor.ElementTree, 'iterparse', recording_iterparse)
+    with open(fixture_path('structure.docx'), 'rb') as f, DocxPackage(f) as package:
+        for _ in package.iter_blocks():
+            # 输出时最多只保留正在解析的一个正文子元素（表格）
+            assert len(roots[0]) <= 1
+    assert len(roots[0]) == 0
+
+
+def test_missing_document_part_is_rejected():
+    with open(fixture_path('not_a_document.docx'), 'rb') as f:
+        with pytest.raises(ValueError, match="word/document.xml"):
+            DocxPackage(f)
+
+
+def test_images_are_read_only_when_reached(monkeypatch):
+    read_parts = []
+    read_part = DocxPackage.read_part
+
+    def recording_read_part(self, part):
+        read_parts.append(part)
+        return read_part(self, part)
+
+    monkeypatch.setattr(DocxPackage, 'read_part', recording_read_part)
+    monkeypatch.setattr(text_extractor, 'is_ocr_available', lambda: True)
+    monkeypatch.setattr(text_extractor, 'extract_ocr_results',
+                        lambda images, lang=None: [OcrResult(image.decode(), 90.0) for image in images])
+
+    # 遍历文档本身不读取图片数据
+    document_blocks()
+    assert read_parts == []
+
+    # 只取第一段时，其后的图片既不读取也不识别
+    chunks = text_extractor.iter_text_from_docx(fixture_path('structure.docx'))
+    assert next(chunks) == "软件工程实验报告"
+    chunks.close()
+    assert read_parts == []
+
+    text = text_extractor.extract_text_from_docx(fixture_path('structure.docx'))
+    assert read_parts == ['word/media/image2.png', 'word/media/image1.png', 'word/media/image3.png']
+    assert "image-2" in text and text.endswith("\n结论")
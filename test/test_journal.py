@@ -0,0 +1,36 @@
+"""
+评分日志测试
+"""
+import os
+
+from journal import GradingJournal
+from models import ScoreResult
+
+
+def make_score(name: str, score: float) -> ScoreResult:
+    return ScoreResult(student_id=name, student_name=name, folder_name=name, score=score,
+                       comment="评语")
+
+
+def test_reset_keeps_previous_journal_as_backup(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = GradingJournal(path)
+    journal.append(make_score('s1', 8.0))
+
+    backup = journal.reset()
+
+    assert not os.path.exists(path)
+    assert backup.startswith(path + ".") and backup.endswith(".bak")
+    assert GradingJournal(backup).load()['s1'].score == 8.0
+
+    # 同一秒内再次开始新的评分不覆盖已有备份
+    journal.append(make_score('s2', 6.0))
+    second = journal.reset()
+    assert second != backup
+    assert set(GradingJournal(second).load()) == {'s2'}
+    assert journal.load() == {}
+
+
+def test_reset_without_journal_does_nothing(tmp_path):
+    assert GradingJournal(str(tmp_path / "journal.jsonl")).reset() is None
+    assert os.listdir(tmp_path) == []
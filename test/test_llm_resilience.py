@@ -0,0 +1,236 @@
+"""
+LLM 调用容错测试：重试分类、退避、熔断器、JSON 修复、重新询问、备用模型和未评分结果
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('openai')
+
+import llm_client
+import llm_resilience
+from fake_llm import api_error, completions, connection_error, isolate, make_client
+from llm_resilience import (
+    CircuitBreaker, CircuitOpenError, RetryBudget, is_retryable, load_json_object, repair_json,
+    retry_delay
+)
+
+
+@pytest.fixture(autouse=True)
+def delays(monkeypatch):
+    return isolate(monkeypatch)
+
+
+def score_json(score: float, comment: str = "评语") -> str:
+    return json.dumps({'score': score, 'comment': comment}, ensure_ascii=False)
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (api_error(429), True),
+    (api_error(500), True),
+    (api_error(503), True),
+    (api_error(408), True),
+    (connection_error(), True),
+    (api_error(400), False),
+    (api_error(401), False),
+    (ValueError("不是 SDK 异常"), False),
+])
+def test_retry_classification(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_retry_after_header_is_honoured():
+    assert retry_delay(0, api_error(429, {'retry-after': '7'})) == 7 + llm_resilience.LLM_RETRY_BASE_DELAY
+    assert retry_delay(0, api_error(429, {'retry-after-ms': '1500', 'retry-after': '7'})) == pytest.approx(
+        1.5 + llm_resilience.LLM_RETRY_BASE_DELAY)
+
+
+def test_full_jitter_backoff_grows_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(llm_resilience, 'LLM_RETRY_BASE_DELAY', 1.0)
+    monkeypatch.setattr(llm_resilience, 'LLM_RETRY_MAX_DELAY', 5.0)
+
+    # 全抖动的上限（测试中取上限）按 2 的幂增长，不超过 LLM_RETRY_MAX_DELAY
+    assert [retry_delay(attempt, api_error(500)) for attempt in range(5)] == [1, 2, 4, 5, 5]
+    monkeypatch.setattr(llm_resilience, 'random', SimpleNamespace(uniform=lambda low, high: low))
+    assert retry_delay(3, api_error(500)) == 0
+
+
+def test_retry_budget_counts_rate_limits_separately(monkeypatch):
+    monkeypatch.setattr(llm_resilience, 'LLM_MAX_RETRIES', 1)
+    monkeypatch.setattr(llm_resilience, 'LLM_RATE_LIMIT_RETRIES', 2)
+    budget = RetryBudget()
+
+    assert budget.next_delay(api_error(500)) is not None
+    assert budget.next_delay(api_error(429)) is not None
+    assert budget.next_delay(api_error(429)) is not None
+    assert budget.next_delay(api_error(429)) is None
+    assert budget.next_delay(api_error(500)) is None
+    assert RetryBudget().next_delay(api_error(400)) is None
+
+
+def test_rate_limit_waits_for_retry_after(delays):
+    client = make_client([api_error(429, {'retry-after': '7'}), score_json(8)])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert grade.score == 8
+    assert delays == [7 + llm_resilience.LLM_RETRY_BASE_DELAY]
+
+
+def test_server_error_is_retried_until_success(delays):
+    client = make_client([api_error(500), api_error(503), score_json(7.5)])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert grade.score == 7.5
+    assert len(completions(client).requests) == 3
+    assert delays == [1.0, 2.0]
+
+
+def test_bad_request_is_not_retried(delays):
+    client = make_client([api_error(400, message="上下文过长")])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert len(completions(client).requests) == 1
+    assert delays == []
+    assert grade.score is None
+    assert grade.comment.startswith(llm_client.UNGRADED_MARK) and "上下文过长" in grade.comment
+
+
+def test_exhausted_retries_leave_the_student_ungraded(monkeypatch, delays):
+    monkeypatch.setattr(llm_resilience, 'LLM_MAX_RETRIES', 2)
+    client = make_client([api_error(500)] * 3)
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert len(completions(client).requests) == 3
+    assert grade.score is None
+    assert grade.comment.startswith("【未评分】")
+
+
+def test_fallback_model_grades_after_primary_fails(monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_FALLBACK_MODEL', 'backup-model')
+    client = make_client([api_error(400), score_json(6)])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert completions(client).models == [llm_client.LLM_MODEL, 'backup-model']
+    assert grade.score == 6
+    assert grade.comment == "[由备用模型 backup-model 评分] 评语"
+
+
+@pytest.mark.parametrize('content, expected', [
+    ('```json\n{"score": 8, "comment": "好"}\n```', {'score': 8, 'comment': "好"}),
+    ('{"score": 8, "comment": "好",}', {'score': 8, 'comment': "好"}),
+    ('{"items": [1, 2,], "score": 8}', {'items': [1, 2], 'score': 8}),
+    ('评分如下：{"score": 8} 以上。', {'score': 8}),
+    ('[1, 2]', None),
+    ('没有 JSON', None),
+    ('{"score": }', None),
+])
+def test_repair_json(content, expected):
+    assert repair_json(content) == expected
+
+
+def test_load_json_object_repairs_or_raises():
+    assert load_json_object('```\n{"score": 9,}\n```') == {'score': 9}
+    for content in (None, "[1]", "无法解析"):
+        with pytest.raises(ValueError):
+            load_json_object(content)
+
+
+def test_unparseable_output_is_reasked():
+    client = make_client(["分数是 8 分", score_json(8)])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert grade.score == 8
+    first, second = completions(client).requests
+    # 重新询问时附上模型的错误输出和纠正要求
+    assert second['messages'][:-2] == first['messages']
+    assert second['messages'][-2] == {'role': 'assistant', 'content': "分数是 8 分"}
+    assert "JSON" in second['messages'][-1]['content']
+
+
+def test_output_still_unparseable_after_reask_is_ungraded(monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_JSON_REASK_ATTEMPTS', 1)
+    client = make_client(["分数是 8 分", "还是不对"])
+
+    grade = client.grade_content("报告", "评分标准")
+
+    assert len(completions(client).requests) == 2
+    assert grade.score is None and grade.comment.startswith("【未评分】")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_resilience, 'time', SimpleNamespace(monotonic=clock.monotonic,
+                                                                sleep=lambda seconds: None))
+    return clock
+
+
+def test_circuit_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker("test", threshold=2, cooldown=10, max_cooldown=40)
+
+    breaker.record(api_error(500))
+    assert breaker.wait_time() == 0
+    breaker.record(api_error(500))
+    # 连续失败达到阈值后打开
+    assert breaker.wait_time() == 10
+
+    clock.now += 10
+    # 冷却结束：第一个调用方成为试探请求，其余调用方等待试探结果
+    assert breaker.wait_time() == 0
+    assert breaker.wait_time() == llm_resilience._PROBE_WAIT
+
+    # 试探失败：冷却时间加倍后重新打开
+    breaker.record(connection_error())
+    assert breaker.wait_time() == 20
+    clock.now += 20
+    assert breaker.wait_time() == 0
+
+    # 试探成功：关闭并恢复初始冷却时间
+    breaker.record(None)
+    assert breaker.wait_time() == 0
+    breaker.record(api_error(500))
+    breaker.record(api_error(500))
+    assert breaker.wait_time() == 10
+
+
+def test_rate_limits_and_client_errors_do_not_open_the_circuit(clock):
+    breaker = CircuitBreaker("test", threshold=2)
+
+    for error in (api_error(500), api_error(429), api_error(500), api_error(400), api_error(500)):
+        breaker.record(error)
+
+    assert breaker.wait_time() == 0
+
+
+def test_waiting_for_an_open_circuit_gives_up_after_max_wait(monkeypatch, clock):
+    monkeypatch.setattr(llm_resilience, 'LLM_CIRCUIT_MAX_WAIT', 25)
+    breaker = CircuitBreaker("test", threshold=1, cooldown=10, max_cooldown=10)
+    breaker.record(api_error(500))
+    waits = []
+
+    def sleep(seconds):
+        # 冷却期间试探请求一直失败
+        waits.append(seconds)
+        clock.now += seconds
+        if breaker.wait_time() == 0:
+            breaker.record(api_error(500))
+
+    monkeypatch.setattr(llm_resilience, 'time', SimpleNamespace(monotonic=clock.monotonic, sleep=sleep))
+    with pytest.raises(CircuitOpenError):
+        llm_resilience.wait_for_circuit(breaker)
+    assert sum(waits) == 25
@@ -0,0 +1,237 @@
+"""
+OCR 测试：用假的识别引擎代替 tesseract
+"""
+import io
+import os
+import random
+
+import pytest
+from PIL import Image
+
+import ocr
+from cache_store import SQLiteCache
+from ocr import OcrWords
+
+
+class FakeEngine:
+    """
+    假的 OCR 引擎，按 (语言, 是否缩小, 页面分割模式) 返回预设的识别结果
+
+    results 的键中是否缩小按图片宽度判断（小于 full_width 视为快速识别的缩小图）。
+    """
+
+    workers = 1
+    batch_size = 8
+
+    def __init__(self, results, full_width: int):
+        self.results = results
+        self.full_width = full_width
+        self.calls = []
+
+    def recognize_words(self, images, lang, psm=None):
+        outputs = []
+        for image in images:
+            reduced = Image.open(io.BytesIO(image)).size[0] < self.full_width
+            self.calls.append((lang, reduced, psm))
+            outputs.append(self.results.get((lang, reduced, psm)))
+        return outputs
+
+
+def make_image(width: int, height: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new('L', (width, height))
+    image.putdata([rng.choice((0, 255)) for _ in range(width * height)])
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def words(text: str, confidence: float) -> OcrWords:
+    return OcrWords(text=text, words=[(word, confidence) for word in text.split()])
+
+
+@pytest.fixture
+def ocr_cache(tmp_path, monkeypatch):
+    cache = SQLiteCache(tmp_path / "ocr_cache.sqlite3", "ocr_results", 16 * 1024 * 1024)
+    monkeypatch.setattr(ocr, 'get_ocr_cache', lambda: cache)
+    monkeypatch.setattr(ocr, 'is_ocr_available', lambda: True)
+    return cache
+
+
+def use_engine(monkeypatch, engine) -> None:
+    monkeypatch.setattr(ocr, 'get_ocr_engine', lambda: engine)
+
+
+def test_loosened_skip_thresholds_do_not_reuse_cached_skips(monkeypatch, ocr_cache):
+    image = make_image(24, 24)
+    engine = FakeEngine({('eng', False, None): words("icon text", 90)}, full_width=24)
+    use_engine(monkeypatch, engine)
+
+    # 短边小于 OCR_MIN_IMAGE_SIDE 的图片被跳过，空结果写入缓存
+    monkeypatch.setattr(ocr, 'OCR_MIN_IMAGE_SIDE', 32)
+    assert ocr.extract_text_from_images([image]) == [""]
+    assert ocr.extract_text_from_images([image]) == [""]
+    assert engine.calls == []
+
+    # 放宽阈值后重新识别
+    monkeypatch.setattr(ocr, 'OCR_MIN_IMAGE_SIDE', 16)
+    assert ocr.extract_text_from_images([image]) == ["icon text"]
+
+
+def test_skip_thresholds_are_part_of_the_settings_signature(monkeypatch):
+    signature = ocr.ocr_settings_signature()
+
+    monkeypatch.setattr(ocr, 'OCR_MIN_ENTROPY', 0.5)
+    assert ocr.ocr_settings_signature() != signature
+    monkeypatch.setattr(ocr, 'OCR_PREPROCESS_ENABLED', False)
+    assert ocr.ocr_settings_signature().startswith(":s")
+
+
+FIXTURE_TSV = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'fixtures', 'ocr', 'three_pages.tsv')
+
+
+def test_parse_tsv_groups_words_into_lines_and_paragraphs():
+    with open(FIXTURE_TSV, encoding='utf-8') as f:
+        pages = ocr.parse_tsv(f.read())
+
+    assert sorted(pages) == [1, 2, 3]
+    # 同段的行以换行分隔，段落和文本块之间空一行，相邻中日韩文字之间不加空格
+    assert pages[1].text == "Hello world\nsecond line\n\nNew paragraph\n\n中文识别 ABC （完）"
+    assert len(pages[1].words) == 10
+    assert pages[1].mean_confidence() == pytest.approx(79.87)
+    assert pages[2].text == "l1| ~~"
+    assert pages[2].mean_confidence() == pytest.approx(20.0)
+    # 没有识别出文字的页也有结果
+    assert pages[3].text == "" and pages[3].mean_confidence() is None
+
+
+def test_parse_tsv_ignores_header_and_incomplete_rows():
+    tsv = "level\tpage_num\n5\t1\t1\t1\t1\t1\t0\t0\t9\t9\t88\tok\n5\t1\t1\n"
+
+    assert ocr.parse_tsv(tsv)[1].text == "ok"
+
+
+def recognize(image: bytes, engine: FakeEngine, monkeypatch) -> ocr.OcrResult:
+    use_engine(monkeypatch, engine)
+    # 指定语言时不做自动语言选择
+    return ocr.extract_ocr_results([image], lang='eng')[0]
+
+
+@pytest.mark.parametrize('passes, expected, calls', [
+    # 快速识别置信度足够，直接采用
+    ({('eng', True, None): words("fast pass", 90)},
+     ("fast pass", 90), [('eng', True, None)]),
+    # 快速识别置信度不足，原图识别后采用
+    ({('eng', True, None): words("f4st", 50), ('eng', False, None): words("full pass", 75)},
+     ("full pass", 75), [('eng', True, None), ('eng', False, None)]),
+    # 原图仍不足，换页面分割模式后结果更好
+    ({('eng', True, None): words("f4st", 50), ('eng', False, None): words("fu11", 40),
+      ('eng', False, 11): words("sparse text", 60)},
+     ("sparse text", 60), [('eng', True, None), ('eng', False, None), ('eng', False, 11)]),
+    # 换页面分割模式的结果更差时保留置信度最高的一次
+    ({('eng', True, None): words("f4st", 50), ('eng', False, None): words("fu11", 40),
+      ('eng', False, 11): words("~~", 30)},
+     ("f4st", 50), [('eng', True, None), ('eng', False, None), ('eng', False, 11)]),
+])
+def test_progressive_passes_escalate_until_confident(monkeypatch, ocr_cache, passes, expected, calls):
+    monkeypatch.setattr(ocr, 'OCR_RETRY_PSM', 11)
+    monkeypatch.setattr(ocr, 'OCR_MIN_CONFIDENCE', 70)
+    engine = FakeEngine(passes, full_width=200)
+
+    result = recognize(make_image(200, 200), engine, monkeypatch)
+
+    assert (result.text, result.confidence) == expected
+    assert engine.calls == calls
+
+
+def test_confidence_threshold_change_is_not_served_from_cache(monkeypatch, ocr_cache):
+    image = make_image(200, 200)
+    passes = {('eng', True, None): words("fast pass", 50), ('eng', False, None): words("full pass", 75)}
+    monkeypatch.setattr(ocr, 'OCR_MIN_CONFIDENCE', 70)
+    assert recognize(image, FakeEngine(passes, 200), monkeypatch).text == "full pass"
+
+    engine = FakeEngine(passes, 200)
+    assert recognize(image, engine, monkeypatch).text == "full pass"
+    assert engine.calls == []
+
+    # 降低阈值后快速识别的结果即可采用，不复用按旧阈值缓存的结果
+    monkeypatch.setattr(ocr, 'OCR_MIN_CONFIDENCE', 40)
+    assert recognize(image, engine, monkeypatch).text == "fast pass"
+
+
+def test_progressive_settings_are_part_of_the_settings_signature(monkeypatch):
+    signatures = {ocr.ocr_settings_signature()}
+    for name, value in (('OCR_MIN_CONFIDENCE', 60), ('OCR_FAST_PASS_SCALE', None),
+                        ('OCR_RETRY_PSM', None)):
+        monkeypatch.setattr(ocr, name, value)
+        signatures.add(ocr.ocr_settings_signature())
+    assert len(signatures) == 4
+
+
+def test_trim_low_confidence_blocks():
+    low = ocr.format_ocr_block(ocr.OcrResult("l1| ~~", 20.0))
+    high = ocr.format_ocr_block(ocr.OcrResult("Hello world", 88.4))
+    unlabelled = ocr.format_ocr_block(ocr.OcrResult("no confidence"))
+    text = f"正文\n{low}\n中间\n{high}\n{unlabelled}"
+
+    trimmed = ocr.trim_low_confidence_blocks(text, min_confidence=40)
+
+    assert "l1| ~~" not in trimmed
+    assert "[图片OCR内容置信度过低（20），已省略]" in trimmed
+    assert high in trimmed and unlabelled in trimmed
+    assert trimmed.startswith("正文\n") and "\n中间\n" in trimmed
+    # 阈值为 None 时不裁剪，恰好等于阈值的文本块保留
+    assert ocr.trim_low_confidence_blocks(text, min_confidence=None) == text
+    assert ocr.trim_low_confidence_blocks(low, min_confidence=20) == low
+
+
+CJK_PASSES = {
+    # 中文图片在 eng 模型下是低置信度的乱码
+    ('eng', True, None): words("T ## ii", 25),
+    ('chi_sim', False, None): words("实验 报告", 85),
+    ('eng+chi_sim', False, None): words("实验 报告", 85),
+}
+
+
+def recognize_auto(images, engine, monkeypatch):
+    monkeypatch.setattr(ocr, 'OCR_LANGUAGES', 'eng+chi_sim')
+    monkeypatch.setattr(ocr, 'OCR_AUTO_LANGUAGE', True)
+    monkeypatch.setattr(ocr, 'OCR_FAST_LANGUAGE', 'eng')
+    use_engine(monkeypatch, engine)
+    return ocr.extract_ocr_results(images)
+
+
+def test_cjk_language_setting_skips_downscaled_fast_pass(monkeypatch, ocr_cache):
+    engine = FakeEngine(CJK_PASSES, full_width=200)
+
+    use_engine(monkeypatch, engine)
+    result = ocr.extract_ocr_results([make_image(200, 200)], lang='eng+chi_sim')[0]
+
+    assert result.text == "实验 报告"
+    assert engine.calls == [('eng+chi_sim', False, None)]
+
+
+def test_auto_language_is_chosen_per_image(monkeypatch, ocr_cache):
+    engine = FakeEngine(CJK_PASSES, full_width=200)
+
+    # 先用 eng 快速识别缩小图，乱码结果改用中文模型识别原图
+    results = recognize_auto([make_image(200, 200, seed) for seed in range(5)], engine, monkeypatch)
+    assert [result.text for result in results] == ["实验 报告"] * 5
+    assert engine.calls == [('eng', True, None)] * 5 + [('chi_sim', False, None)] * 5
+
+
+def test_auto_language_does_not_depend_on_earlier_images(monkeypatch, ocr_cache):
+    image = make_image(200, 200, 99)
+
+    # 单独识别
+    alone = FakeEngine(CJK_PASSES, full_width=200)
+    expected = recognize_auto([image], alone, monkeypatch)
+    ocr_cache.clear()
+
+    # 在一批中文图片之后识别：第 1 轮仍先用 eng 快速识别，结果相同
+    after = FakeEngine(CJK_PASSES, full_width=200)
+    recognize_auto([make_image(200, 200, seed) for seed in range(10)], after, monkeypatch)
+    after.calls.clear()
+    assert recognize_auto([image], after, monkeypatch) == expected
+    assert after.calls == alone.calls == [('eng', True, None), ('chi_sim', False, None)]
@@ -0,0 +1,70 @@
+"""
+流水线文本提取阶段测试：用线程池代替进程池
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pipeline
+from models import ProcessingResult, StudentSubmission
+from text_extractor import TRUNCATED_MARKER, join_extracted_texts
+
+
+@pytest.fixture
+def fake_files(monkeypatch):
+    """文件夹中的文件及其内容，记录每次提取的文件和字符上限"""
+    files = {}
+    extracted = []
+
+    def extract(file_path, max_chars=None):
+        extracted.append((file_path, max_chars))
+        text = files[file_path]
+        if max_chars is not None and len(text) > max_chars:
+            return text[:max_chars] + TRUNCATED_MARKER
+        return text
+
+    monkeypatch.setattr(pipeline, 'find_supported_files', lambda folder: list(files))
+    monkeypatch.setattr(pipeline, 'prefetch_doc_conversions', lambda paths: None)
+    monkeypatch.setattr(pipeline, 'needs_doc_conversion', lambda path: False)
+    monkeypatch.setattr(pipeline, 'extract_text_from_file', extract)
+    monkeypatch.setattr(pipeline, 'MAX_CHARS_PER_FILE', 40)
+    monkeypatch.setattr(pipeline, 'MAX_CHARS_PER_SUBMISSION', 100)
+    return files, extracted
+
+
+def run_extract(lookahead: int) -> str:
+    submission = StudentSubmission(student_id='s1', student_name='s1', folder_name='s1',
+                                   folder_path='s1')
+    result = ProcessingResult(submission=submission, content="")
+    with ThreadPoolExecutor(max_workers=lookahead) as executor:
+        pipeline._make_extract_handler(executor, lookahead)(result)
+    return result.content
+
+
+def test_files_after_the_submission_budget_are_not_extracted(fake_files):
+    files, extracted = fake_files
+    for i in range(6):
+        files[f"{i}.txt"] = str(i) * 30
+
+    content = run_extract(lookahead=1)
+
+    # 前 4 个文件用完 100 字符的预算，第 4 个文件只解析剩余的 10 个字符
+    assert extracted == [("0.txt", 40), ("1.txt", 40), ("2.txt", 40), ("3.txt", 10)]
+    assert "该文件及其后共 2 个文件已省略" in content
+    assert content == join_extracted_texts(
+        [(path, text[:40]) for path, text in files.items()], max_total_chars=100)
+
+
+def test_lookahead_files_are_bounded_and_text_matches_serial_join(fake_files):
+    files, extracted = fake_files
+    for i in range(10):
+        files[f"{i}.txt"] = str(i) * 50
+
+    content = run_extract(lookahead=2)
+
+    # 预算用完时最多多提交 lookahead 个文件，其余文件不再提交
+    assert len(extracted) <= 3 + 2
+    assert "9.txt" not in [path for path, _ in extracted]
+    expected = join_extracted_texts(
+        [(path, text[:40] + TRUNCATED_MARKER) for path, text in files.items()], max_total_chars=100)
+    assert content == expected
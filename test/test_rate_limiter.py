@@ -0,0 +1,206 @@
+"""
+限流与自适应并发测试：使用假时钟，等待只推进时钟不实际睡眠
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveConcurrency, RateLimiter, TokenBucket
+
+_real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await _real_sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(rate_limiter, 'asyncio', SimpleNamespace(
+        sleep=clock.sleep, Lock=asyncio.Lock, Condition=asyncio.Condition))
+    return clock
+
+
+def test_bucket_spends_its_capacity_then_waits_for_refill(clock):
+    bucket = TokenBucket(60)
+
+    async def scenario():
+        for _ in range(60):
+            await bucket.acquire()
+        assert clock.sleeps == []
+        # 每秒补充 1 个令牌
+        await bucket.acquire()
+        assert clock.sleeps == [pytest.approx(1.0)]
+
+        clock.now += 30
+        await bucket.acquire(30)
+        assert len(clock.sleeps) == 1
+
+    asyncio.run(scenario())
+
+
+def test_bucket_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(60, capacity=10)
+
+    async def scenario():
+        clock.now += 3600
+        await bucket.acquire(10)
+        await bucket.acquire(1)
+
+    asyncio.run(scenario())
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_request_larger_than_capacity_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(600)
+
+    async def scenario():
+        await bucket.acquire(600)
+        # 超过桶容量的请求按桶容量计算，等桶满后即可发出，不会永远等待
+        await bucket.acquire(5000)
+
+    asyncio.run(scenario())
+    assert clock.sleeps == [pytest.approx(60.0)]
+
+
+def test_adjust_refunds_and_charges_tokens(clock):
+    bucket = TokenBucket(60)
+
+    async def scenario():
+        await bucket.acquire(60)
+        bucket.adjust(20)
+        await bucket.acquire(20)
+        bucket.adjust(-10)
+        await bucket.acquire(1)
+
+    asyncio.run(scenario())
+    assert clock.sleeps == [pytest.approx(11.0)]
+
+
+@pytest.mark.parametrize('rpm, tpm, requests, expected_sleeps', [
+    # 只限制请求数：第三个请求等待 30 秒
+    (2, None, [400, 400, 400], [30.0]),
+    # 只限制 token 数：第二个请求缺 400 个 token，按每秒 10 个补充
+    (None, 600, [500, 500], [40.0]),
+    # 两者都限制：请求数先等 30 秒，期间补充的 token 足够
+    (2, 1000, [400, 400, 400], [30.0]),
+    # 不限制
+    (None, None, [10 ** 6] * 3, []),
+])
+def test_rate_limiter_waits_for_both_budgets(clock, rpm, tpm, requests, expected_sleeps):
+    limiter = RateLimiter(rpm, tpm)
+
+    async def scenario():
+        for estimated in requests:
+            await limiter.acquire(estimated)
+
+    asyncio.run(scenario())
+    assert clock.sleeps == pytest.approx(expected_sleeps)
+
+
+def test_token_budget_wait_continues_after_request_wait(clock):
+    limiter = RateLimiter(2, 600)
+
+    async def scenario():
+        await limiter.acquire(300)
+        await limiter.acquire(300)
+        # 请求数等待 30 秒期间只补充了 300 个 token，还要再等 30 秒
+        await limiter.acquire(600)
+
+    asyncio.run(scenario())
+    assert clock.sleeps == pytest.approx([30.0, 30.0])
+
+
+def test_reconcile_returns_overestimated_tokens(clock):
+    limiter = RateLimiter(None, 600)
+
+    async def scenario():
+        await limiter.acquire(500)
+        limiter.reconcile(500, 100)
+        await limiter.acquire(500)
+        # 实际用量未知时不修正
+        limiter.reconcile(500, None)
+        await limiter.acquire(100)
+
+    asyncio.run(scenario())
+    assert clock.sleeps == [pytest.approx(10.0)]
+
+
+def test_rate_limit_halves_concurrency_once_per_second(clock):
+    concurrency = AdaptiveConcurrency(initial=8, minimum=1, maximum=16)
+
+    concurrency.on_rate_limited()
+    assert concurrency.limit == 4
+    # 同一批并发请求的 429 只减半一次
+    clock.now += 0.5
+    concurrency.on_rate_limited()
+    assert concurrency.limit == 4
+
+    clock.now += 0.5
+    concurrency.on_rate_limited()
+    assert concurrency.limit == 2
+    for _ in range(5):
+        clock.now += 1
+        concurrency.on_rate_limited()
+    assert concurrency.limit == 1
+    assert concurrency.rate_limited_count == 8
+
+
+def test_success_grows_concurrency_by_one_per_round(clock):
+    concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=6)
+
+    for _ in range(4):
+        concurrency.on_success(0.1)
+    assert int(concurrency.limit) == 4
+    concurrency.on_success(0.1)
+    assert int(concurrency.limit) == 5
+
+    for _ in range(100):
+        concurrency.on_success(0.1)
+    assert concurrency.limit == 6
+
+
+def test_slow_responses_decrease_concurrency(clock):
+    concurrency = AdaptiveConcurrency(initial=8, minimum=2, maximum=16, latency_target=5.0)
+
+    concurrency.on_success(10.0)
+    assert concurrency.limit == 4
+    clock.now += 1
+    concurrency.on_success(10.0)
+    clock.now += 1
+    concurrency.on_success(10.0)
+    assert concurrency.limit == 2
+    concurrency.on_success(1.0)
+    assert concurrency.limit == 2.5
+
+
+def test_in_flight_requests_never_exceed_the_limit(clock):
+    concurrency = AdaptiveConcurrency(initial=2, minimum=1, maximum=2)
+    peak = []
+
+    async def request():
+        async with concurrency:
+            peak.append(concurrency.in_flight)
+            await _real_sleep(0)
+            await _real_sleep(0)
+
+    async def scenario():
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert len(peak) == 6 and max(peak) == 2
+    assert concurrency.in_flight == 0
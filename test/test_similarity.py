@@ -0,0 +1,154 @@
+"""
+相似提交检测与重复提交共用评分测试
+"""
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from models import Grade, SimilarPair
+from similarity import (
+    DuplicateGrades, MinHasher, SimilarityIndex, exact_fingerprint, find_clusters, shingle_hashes
+)
+
+
+def make_text(seed: int, length: int = 600) -> str:
+    rng = random.Random(seed)
+    return "".join(chr(rng.randrange(0x4E00, 0x4E00 + 3000)) for _ in range(length))
+
+
+def test_minhash_is_deterministic_and_estimates_jaccard():
+    # 两个集合各 1000 个元素，共有 1000 个: Jaccard = 1000 / 3000
+    shared = np.arange(1000, dtype=np.uint64)
+    first = np.concatenate([shared, np.arange(10000, 11000, dtype=np.uint64)])
+    second = np.concatenate([shared, np.arange(20000, 21000, dtype=np.uint64)])
+    hasher = MinHasher(num_perm=256)
+
+    assert (hasher.signature(first) == MinHasher(num_perm=256).signature(first)).all()
+    estimate = (hasher.signature(first) == hasher.signature(second)).mean()
+    assert estimate == pytest.approx(1 / 3, abs=0.1)
+
+
+def test_minhash_signature_is_independent_of_chunking():
+    shingles = np.unique(np.random.default_rng(0).integers(0, 2 ** 32, size=10000, dtype=np.uint64))
+    hasher = MinHasher(num_perm=64)
+
+    halves = np.minimum(hasher.signature(shingles[:5000]), hasher.signature(shingles[5000:]))
+    assert (hasher.signature(shingles) == halves).all()
+
+
+def test_shingles_ignore_duplicates():
+    assert len(shingle_hashes("abcabcabc", size=3)) == 3
+    assert len(shingle_hashes("ab", size=3)) == 0
+
+
+def test_lsh_bands_must_divide_signature():
+    with pytest.raises(ValueError):
+        SimilarityIndex(num_perm=128, bands=30)
+
+
+def test_lsh_only_compares_submissions_sharing_a_band():
+    original = make_text(1)
+    edited = original[:500] + make_text(2, 100)
+    index = SimilarityIndex(num_perm=128, bands=32)
+    for key, text in (('b', original), ('a', edited), ('c', make_text(3)), ('d', "太短")):
+        index.add(key, text)
+
+    # 过短的提交不加入；无关的提交不会落入同一个桶
+    assert len(index) == 3
+    assert index._candidate_pairs() == {(0, 1)}
+    pairs = index.find_similar_pairs(threshold=0.0)
+    assert [(pair.first, pair.second) for pair in pairs] == [('a', 'b')]
+    assert 0.6 < pairs[0].similarity < 1.0 and not pairs[0].identical
+
+
+def test_identical_flag_ignores_whitespace_and_file_headers():
+    text = make_text(4)
+    index = SimilarityIndex()
+    index.add('a', f"--- 文件: a.docx ---\n{text}")
+    index.add('b', f"--- 文件: b.docx ---\n{text[:300]}\n\n{text[300:]}")
+
+    pair, = index.find_similar_pairs()
+    assert pair.similarity == 1.0 and pair.identical
+
+
+def test_find_clusters_merges_transitively():
+    pairs = [SimilarPair('b', 'c', 0.9), SimilarPair('x', 'y', 0.7), SimilarPair('a', 'b', 0.8),
+             SimilarPair('c', 'd', 0.65)]
+
+    assert find_clusters(pairs) == [['a', 'b', 'c', 'd'], ['x', 'y']]
+    assert find_clusters([]) == []
+
+
+def test_exact_fingerprint_only_ignores_file_headers():
+    text = make_text(5)
+
+    assert exact_fingerprint(f"--- 文件: a.docx ---\n{text}") == exact_fingerprint(
+        f"--- 文件: b.pdf ---\n{text}")
+    assert exact_fingerprint(text) != exact_fingerprint(text[:300] + " " + text[300:])
+    assert exact_fingerprint(text) != exact_fingerprint(text[:300] + "，" + text[300:])
+    assert exact_fingerprint("太短") is None
+
+
+def test_duplicate_waits_for_leader_and_shares_grade():
+    text = make_text(6)
+    duplicates = DuplicateGrades()
+    release = threading.Event()
+    calls = []
+
+    def grade_fn(content):
+        calls.append(content)
+        release.wait(5)
+        return Grade(score=8.0, comment="评语")
+
+    leader = threading.Thread(target=duplicates.grade, args=('leader', text, grade_fn))
+    leader.start()
+    while not calls:
+        time.sleep(0.01)
+
+    results = []
+    follower = threading.Thread(
+        target=lambda: results.append(duplicates.grade('follower', text, grade_fn)))
+    follower.start()
+    follower.join(0.2)
+    # 首个提交评分完成前，重复提交一直等待
+    assert follower.is_alive() and not results
+
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(calls) == 1
+    grade, = results
+    assert grade.score == 8.0
+    assert grade.comment.startswith("评语") and "leader" in grade.comment
+
+
+def test_duplicate_sees_leader_exception():
+    text = make_text(7)
+    duplicates = DuplicateGrades()
+
+    def failing(content):
+        raise RuntimeError("LLM 不可用")
+
+    with pytest.raises(RuntimeError):
+        duplicates.grade('leader', text, failing)
+    with pytest.raises(RuntimeError, match="LLM 不可用"):
+        duplicates.grade('follower', text, lambda content: pytest.fail("不应再次评分"))
+
+
+def test_near_duplicates_are_graded_separately():
+    text = make_text(8)
+    duplicates = DuplicateGrades()
+    graded = []
+
+    def grade_fn(content):
+        graded.append(content)
+        return Grade(score=float(len(graded)), comment="评语")
+
+    duplicates.grade('a', text, grade_fn)
+    duplicates.grade('b', text[:300] + "\n" + text[300:], grade_fn)
+    duplicates.grade('c', "太短", grade_fn)
+
+    assert len(graded) == 3
@@ -0,0 +1,105 @@
+"""
+文本提取测试：DOCX 按字符预算提前停止解析
+"""
+import zipfile
+
+import pytest
+
+import text_extractor
+from docx_extractor import DocxPackage
+from ocr import OcrResult, format_ocr_block
+from text_extractor import TRUNCATED_MARKER, extract_text_from_file
+
+_NS = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+       'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+       'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"')
+_IMAGE_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+
+
+def write_large_docx(path, paragraphs: int, image_every: int) -> list:
+    """
+    生成段落之间穿插图片的 DOCX
+
+    Returns:
+        按文档顺序排列的 (块类型, 段落文本或图片内容)
+    """
+    body, rels, order = [], [], []
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as docx:
+        for i in range(paragraphs):
+            text = f"第 {i} 段" + "实验内容" * 20
+            body.append(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>')
+            order.append(('text', text))
+            if i % image_every == image_every - 1:
+                rel_id, part = f"rId{i}", f"word/media/image{i}.png"
+                body.append(f'<w:p><w:r><a:blip r:embed="{rel_id}"/></w:r></w:p>')
+                rels.append(f'<Relationship Id="{rel_id}" Type="{_IMAGE_REL}" '
+                            f'Target="media/image{i}.png"/>')
+                docx.writestr(part, f"image {i}".encode())
+                order.append(('image', f"image {i}"))
+        docx.writestr('word/document.xml',
+                      f'<w:document {_NS}><w:body>{"".join(body)}</w:body></w:document>')
+        docx.writestr('word/_rels/document.xml.rels',
+                      '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+                      f'relationships">{"".join(rels)}</Relationships>')
+    return order
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """OCR 返回图片内容本身，记录识别过的图片和读取过的图片部件"""
+    recognized, read_parts = [], []
+    read_part = DocxPackage.read_part
+
+    def extract_ocr_results(images, lang=None):
+        recognized.extend(images)
+        return [OcrResult(image.decode(), 90.0) for image in images]
+
+    def recording_read_part(self, part):
+        read_parts.append(part)
+        return read_part(self, part)
+
+    monkeypatch.setattr(text_extractor, 'extract_ocr_results', extract_ocr_results)
+    monkeypatch.setattr(text_extractor, 'is_ocr_available', lambda: True)
+    monkeypatch.setattr(text_extractor, 'get_extraction_cache', lambda: None)
+    monkeypatch.setattr(DocxPackage, 'read_part', recording_read_part)
+    return recognized, read_parts
+
+
+def test_full_docx_text_keeps_document_order(tmp_path, fake_ocr):
+    path = str(tmp_path / "report.docx")
+    order = write_large_docx(path, paragraphs=40, image_every=3)
+
+    text = extract_text_from_file(path, max_chars=None)
+
+    # 与一次性拼接全部段落和 OCR 文本块的结果一致
+    expected = [value if kind == 'text' else f"\n{format_ocr_block(OcrResult(value, 90.0))}\n"
+                for kind, value in order]
+    assert text == "\n".join(expected)
+
+
+def test_large_docx_stops_parsing_at_the_char_budget(tmp_path, fake_ocr, monkeypatch):
+    recognized, read_parts = fake_ocr
+    path = str(tmp_path / "report.docx")
+    order = write_large_docx(path, paragraphs=5000, image_every=5)
+    images = [value for kind, value in order if kind == 'image']
+    full = extract_text_from_file(path, max_chars=None)
+    assert len(recognized) == len(read_parts) == len(images)
+
+    recognized.clear()
+    read_parts.clear()
+    blocks = []
+    iter_document = DocxPackage.iter_document
+
+    def recording_iter_document(self):
+        for block in iter_document(self):
+            blocks.append(block)
+            yield block
+
+    monkeypatch.setattr(DocxPackage, 'iter_document', recording_iter_document)
+    truncated = extract_text_from_file(path, max_chars=10000)
+
+    # 截断结果与完整结果的前缀一致
+    assert truncated == full[:10000] + TRUNCATED_MARKER
+    # 预算用完后停止解析：只解析到约一个 OCR 批次之后，其余图片既不读取也不识别
+    assert len(blocks) < len(order) // 10
+    assert len(recognized) == len(read_parts) <= 2 * text_extractor.OCR_BATCH_SIZE
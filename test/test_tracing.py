@@ -0,0 +1,65 @@
+"""
+性能追踪测试
+"""
+import time
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(tracing, '_enabled', True)
+    tracing.drain()
+    yield
+    tracing.drain()
+
+
+@tracing.traced('extract')
+def produce(count: int, delay: float = 0.0):
+    for i in range(count):
+        time.sleep(delay)
+        yield i
+
+
+def test_generator_span_excludes_time_spent_by_the_consumer():
+    for _ in produce(3, delay=0.01):
+        time.sleep(0.05)
+
+    event, = tracing.drain()
+    assert event['name'] == 'produce'
+    assert 30e3 <= event['dur'] < 100e3
+    assert 'error' not in event['args']
+
+
+def test_closing_generator_early_is_not_an_error():
+    items = produce(10)
+    assert next(items) == 0
+    items.close()
+
+    event, = tracing.drain()
+    assert 'error' not in event['args']
+
+
+def test_generator_exception_is_recorded():
+    @tracing.traced('extract')
+    def failing():
+        yield 1
+        raise ValueError("解析失败")
+
+    with pytest.raises(ValueError):
+        list(failing())
+
+    event, = tracing.drain()
+    assert event['args']['error'] == 'ValueError'
+
+
+def test_consumer_spans_of_the_same_stage_are_not_nested():
+    for _ in produce(1):
+        with tracing.span('extract', 'consumer'):
+            pass
+
+    consumer, producer = tracing.drain()
+    assert consumer['name'] == 'consumer' and 'nested' not in consumer['args']
+    assert producer['name'] == 'produce'